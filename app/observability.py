@@ -25,6 +25,7 @@ from pathlib import Path
 from typing import Any, Deque, Dict, List, Optional
 
 from fastapi import APIRouter, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse, PlainTextResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 
@@ -191,6 +192,45 @@ def _prom_line(metric: str, value: float, labels: Optional[Dict[str, str]] = Non
         lbl = "{" + ",".join(parts) + "}"
     return f"{metric}{lbl} {value}\n"
 
+def _queue_metric_lines() -> List[str]:
+    """RQ queue depth/latency (queue_metrics.py); empty without Redis."""
+    if not os.getenv("REDIS_URL"):
+        return []
+    try:
+        import queue_metrics
+        from queue_utils import get_queue_names, get_redis_connection
+        stats = queue_metrics.collect(get_redis_connection(), get_queue_names())
+        import redis_pool
+        return queue_metrics.prometheus_lines(stats, _prom_line) + redis_pool.prometheus_lines(_prom_line)
+    except Exception as exc:
+        log.warning("queue metrics unavailable: %s", exc)
+        return []
+
+def _backend_metric_lines() -> List[str]:
+    """Queue, executor, governor, PDF client and mail outbox; blocking (Redis) → threadpool."""
+    lines = _queue_metric_lines()
+    try:
+        import report_executor
+        lines.extend(report_executor.prometheus_lines(_prom_line))
+    except Exception as exc:
+        log.warning("report executor metrics unavailable: %s", exc)
+    try:
+        import load_governor
+        lines.extend(load_governor.prometheus_lines(_prom_line))
+    except Exception as exc:
+        log.warning("load governor metrics unavailable: %s", exc)
+    try:
+        import pdf_client
+        lines.extend(pdf_client.prometheus_lines(_prom_line))
+    except Exception as exc:
+        log.warning("pdf client metrics unavailable: %s", exc)
+    try:
+        import mail_outbox
+        lines.extend(mail_outbox.prometheus_lines(_prom_line))
+    except Exception as exc:
+        log.warning("mail outbox metrics unavailable: %s", exc)
+    return lines
+
 @router.get("/metrics", response_class=PlainTextResponse)
 async def metrics() -> PlainTextResponse:
     snap = _rolling.snapshot()
@@ -199,24 +239,24 @@ async def metrics() -> PlainTextResponse:
     rate_5xx = float(snap.get("rate_5xx", 0.0))
     rate_429 = float(snap.get("rate_429", 0.0))
     lines = []
-    lines.append("# HELP http_requests_total Total requests observed by middleware")
-    lines.append("# TYPE http_requests_total counter")
+    lines.append("# HELP http_requests_total Total requests observed by middleware\n")
+    lines.append("# TYPE http_requests_total counter\n")
     lines.append(_prom_line("http_requests_total", float(total)))
     for cls in ("2xx", "3xx", "4xx", "5xx", "429"):
         v = float(by.get(cls, 0))
         lines.append(_prom_line("http_requests_class_total", v, {"class": cls}))
-    lines.append("# HELP http_requests_error_rate_5xx Fraction of 5xx responses in window")
-    lines.append("# TYPE http_requests_error_rate_5xx gauge")
+    lines.append("# HELP http_requests_error_rate_5xx Fraction of 5xx responses in window\n")
+    lines.append("# TYPE http_requests_error_rate_5xx gauge\n")
     lines.append(_prom_line("http_requests_error_rate_5xx", rate_5xx))
-    lines.append("# HELP http_upstream_throttle_rate_429 Fraction of 429s in window")
-    lines.append("# TYPE http_upstream_throttle_rate_429 gauge")
+    lines.append("# HELP http_upstream_throttle_rate_429 Fraction of 429s in window\n")
+    lines.append("# TYPE http_upstream_throttle_rate_429 gauge\n")
     lines.append(_prom_line("http_upstream_throttle_rate_429", rate_429))
 
-    lines.append("# HELP alert_5xx_rate_over_threshold 1 if 5xx rate exceeds threshold")
-    lines.append("# TYPE alert_5xx_rate_over_threshold gauge")
+    lines.append("# HELP alert_5xx_rate_over_threshold 1 if 5xx rate exceeds threshold\n")
+    lines.append("# TYPE alert_5xx_rate_over_threshold gauge\n")
     lines.append(_prom_line("alert_5xx_rate_over_threshold", 1.0 if rate_5xx > ALERT_5XX else 0.0, {"threshold": str(ALERT_5XX)}))
-    lines.append("# HELP alert_429_rate_over_threshold 1 if 429 rate exceeds threshold")
-    lines.append("# TYPE alert_429_rate_over_threshold gauge")
+    lines.append("# HELP alert_429_rate_over_threshold 1 if 429 rate exceeds threshold\n")
+    lines.append("# TYPE alert_429_rate_over_threshold gauge\n")
     lines.append(_prom_line("alert_429_rate_over_threshold", 1.0 if rate_429 > ALERT_429 else 0.0, {"threshold": str(ALERT_429)}))
 
     build = {
@@ -230,9 +270,12 @@ async def metrics() -> PlainTextResponse:
         "live_cache_enabled": LIVE_CACHE_ENABLED,
         "eu_funding_enabled": EU_FUNDING_ENABLED,
     }
-    lines.append("# HELP app_build_info LLM/search flags as labels")
-    lines.append("# TYPE app_build_info gauge")
+    lines.append("# HELP app_build_info LLM/search flags as labels\n")
+    lines.append("# TYPE app_build_info gauge\n")
     lines.append(_prom_line("app_build_info", 1.0, build))
 
+    # synchrone Redis-Aufrufe (Queue-Stats, Job.fetch, Outbox) nicht auf dem Event-Loop
+    lines.extend(await run_in_threadpool(_backend_metric_lines))
+
     text = "".join(lines)
     return PlainTextResponse(content=text, media_type="text/plain; version=0.0.4; charset=utf-8")
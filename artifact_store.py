@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed artifact store for PDFs and report HTML.
+
+Redis only holds small references (JSON, see save_ref/load_ref); the bytes live in
+
+  ARTIFACT_BACKEND=fs   ARTIFACT_DIR (default /tmp/ki-artifacts)/objects/<aa>/<sha256>
+  ARTIFACT_BACKEND=s3   ARTIFACT_S3_BUCKET, ARTIFACT_S3_PREFIX (default "artifacts/"),
+                        ARTIFACT_S3_ENDPOINT for S3-compatible services (MinIO, R2, …)
+
+The key is the sha256 of the content: identical reports are stored once and the
+hash doubles as ETag.
+
+Retention: every object carries an expiry depending on its kind
+(ARTIFACT_RETENTION="pdf:30,html:7,payload:1,default:14", days). Storing the same content
+again extends it. `sweep()` removes expired objects; run it periodically:
+
+    python artifact_store.py sweep
+
+Downloads: `artifact_response(request, ref, filename)` streams the object in
+ARTIFACT_CHUNK_SIZE chunks and honours Range, If-Range and If-None-Match.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+try:
+    import boto3  # optional, nur für ARTIFACT_BACKEND=s3
+except Exception:
+    boto3 = None
+
+log = logging.getLogger("artifact_store")
+
+CHUNK_SIZE = int(os.getenv("ARTIFACT_CHUNK_SIZE", str(64 * 1024)))
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def parse_retention(spec: str) -> Dict[str, int]:
+    """'pdf:30,html:7,default:14' → {'pdf': 30, 'html': 7, 'default': 14} (days)."""
+    out: Dict[str, int] = {"default": 14}
+    for part in (spec or "").split(","):
+        kind, sep, days = part.strip().partition(":")
+        if not sep:
+            continue
+        try:
+            out[kind.strip()] = int(days)
+        except ValueError:
+            raise ValueError(f"invalid ARTIFACT_RETENTION entry: {part!r}")
+    return out
+
+
+def _check_digest(digest: str) -> str:
+    if not _DIGEST_RE.match(digest or ""):
+        raise ValueError(f"invalid artifact digest: {digest!r}")
+    return digest
+
+
+# ---------- backends ----------
+
+class FileSystemBackend:
+    """objects/<aa>/<sha256> plus <sha256>.json with content_type/size/expires_at."""
+
+    def __init__(self, root: Any) -> None:
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / "objects" / key[:2] / key
+
+    def _write(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def stat(self, key: str) -> Optional[Dict[str, Any]]:
+        p = self._path(key)
+        try:
+            meta = json.loads(p.with_suffix(".json").read_text(encoding="utf-8"))
+            meta["size"] = p.stat().st_size
+            return meta
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes, meta: Dict[str, Any]) -> None:
+        p = self._path(key)
+        self._write(p, data)
+        # Metadaten zuletzt: erst dann gilt das Objekt als vorhanden
+        self._write(p.with_suffix(".json"), json.dumps(meta).encode("utf-8"))
+
+    def set_meta(self, key: str, meta: Dict[str, Any]) -> None:
+        self._write(self._path(key).with_suffix(".json"), json.dumps(meta).encode("utf-8"))
+
+    def read_range(self, key: str, start: int, end: int, chunk_size: int) -> Iterator[bytes]:
+        with self._path(key).open("rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, key: str) -> None:
+        p = self._path(key)
+        for q in (p.with_suffix(".json"), p):
+            try:
+                q.unlink()
+            except FileNotFoundError:
+                pass
+
+    def keys(self) -> Iterator[str]:
+        base = self.root / "objects"
+        if not base.exists():
+            return
+        for p in base.glob("*/*.json"):
+            yield p.stem
+
+
+def _is_not_found(exc: Exception) -> bool:
+    code = str(getattr(exc, "response", {}).get("Error", {}).get("Code", ""))
+    return code in ("404", "NoSuchKey", "NotFound")
+
+
+class S3Backend:
+    """S3-compatible bucket; accepts any client with the boto3 S3 method subset."""
+
+    def __init__(self, bucket: str, prefix: str = "artifacts/", client: Any = None,
+                 endpoint_url: Optional[str] = None) -> None:
+        if client is None:
+            if boto3 is None:
+                raise RuntimeError("boto3 is not installed – ARTIFACT_BACKEND=s3 unavailable")
+            client = boto3.client("s3", endpoint_url=endpoint_url or None)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    @staticmethod
+    def _s3_meta(meta: Dict[str, Any]) -> Dict[str, str]:
+        return {"expires-at": str(int(meta["expires_at"])), "kind": str(meta.get("kind", ""))}
+
+    def stat(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            h = self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except Exception as exc:
+            if _is_not_found(exc):
+                return None
+            raise
+        md = h.get("Metadata") or {}
+        return {"size": int(h["ContentLength"]), "content_type": h.get("ContentType"),
+                "expires_at": int(md.get("expires-at") or 0), "kind": md.get("kind") or ""}
+
+    def put(self, key: str, data: bytes, meta: Dict[str, Any]) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data,
+                               ContentType=meta["content_type"], Metadata=self._s3_meta(meta))
+
+    def set_meta(self, key: str, meta: Dict[str, Any]) -> None:
+        k = self._key(key)
+        self.client.copy_object(Bucket=self.bucket, Key=k, CopySource={"Bucket": self.bucket, "Key": k},
+                                ContentType=meta["content_type"], Metadata=self._s3_meta(meta),
+                                MetadataDirective="REPLACE")
+
+    def read_range(self, key: str, start: int, end: int, chunk_size: int) -> Iterator[bytes]:
+        body = self.client.get_object(Bucket=self.bucket, Key=self._key(key),
+                                      Range=f"bytes={start}-{end}")["Body"]
+        try:
+            while True:
+                chunk = body.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def keys(self) -> Iterator[str]:
+        kwargs: Dict[str, Any] = {"Bucket": self.bucket, "Prefix": self.prefix}
+        while True:
+            page = self.client.list_objects_v2(**kwargs)
+            for obj in page.get("Contents") or []:
+                yield obj["Key"][len(self.prefix):]
+            if not page.get("IsTruncated"):
+                break
+            kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+
+# ---------- store ----------
+
+class ArtifactStore:
+    def __init__(self, backend: Any, retention: Optional[Dict[str, int]] = None) -> None:
+        self.backend = backend
+        self.retention = retention or parse_retention("")
+
+    def retention_seconds(self, kind: str) -> int:
+        return self.retention.get(kind, self.retention["default"]) * 86400
+
+    def put(self, data: bytes, content_type: str = "application/octet-stream",
+            kind: str = "default", min_ttl: Optional[int] = None) -> Dict[str, Any]:
+        """Stores `data` (once per content) and returns its reference.
+
+        min_ttl (seconds) extends the kind's retention, e.g. for payloads of jobs
+        that may wait and retry longer than a day."""
+        digest = hashlib.sha256(data).hexdigest()
+        expires_at = int(time.time()) + max(self.retention_seconds(kind), int(min_ttl or 0))
+        meta = {"content_type": content_type, "kind": kind, "expires_at": expires_at}
+        st = self.backend.stat(digest)
+        if st is None:
+            self.backend.put(digest, data, meta)
+        elif int(st.get("expires_at") or 0) < expires_at:
+            self.backend.set_meta(digest, meta)
+        return {"sha256": digest, "size": len(data), "content_type": content_type,
+                "kind": kind, "expires_at": expires_at}
+
+    def stat(self, digest: str) -> Optional[Dict[str, Any]]:
+        return self.backend.stat(_check_digest(digest))
+
+    def iter_bytes(self, digest: str, start: int = 0, end: Optional[int] = None,
+                   chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Yields bytes start..end (inclusive); end=None → up to the last byte."""
+        _check_digest(digest)
+        if end is None:
+            st = self.backend.stat(digest)
+            if st is None:
+                raise KeyError(digest)
+            end = st["size"] - 1
+        if end < start:
+            return iter(())
+        return self.backend.read_range(digest, start, end, chunk_size)
+
+    def read(self, digest: str) -> bytes:
+        return b"".join(self.iter_bytes(digest))
+
+    def delete(self, digest: str) -> None:
+        self.backend.delete(_check_digest(digest))
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Deletes expired objects; returns how many were removed."""
+        now = time.time() if now is None else now
+        removed = 0
+        for key in list(self.backend.keys()):
+            if not _DIGEST_RE.match(key):
+                continue
+            st = self.backend.stat(key)
+            if st is not None and int(st.get("expires_at") or 0) <= now:
+                self.backend.delete(key)
+                removed += 1
+        if removed:
+            log.info("Artifact sweep: %d expired object(s) removed", removed)
+        return removed
+
+
+_STORE: Optional[ArtifactStore] = None
+_LOCK = threading.Lock()
+
+
+def store_from_env() -> ArtifactStore:
+    kind = os.getenv("ARTIFACT_BACKEND", "fs").strip().lower()
+    if kind == "s3":
+        backend: Any = S3Backend(os.environ["ARTIFACT_S3_BUCKET"],
+                                 prefix=os.getenv("ARTIFACT_S3_PREFIX", "artifacts/"),
+                                 endpoint_url=os.getenv("ARTIFACT_S3_ENDPOINT"))
+    else:
+        backend = FileSystemBackend(os.getenv("ARTIFACT_DIR", "/tmp/ki-artifacts"))
+    return ArtifactStore(backend, parse_retention(os.getenv("ARTIFACT_RETENTION", "pdf:30,html:7,payload:1,default:14")))
+
+
+def get_store() -> ArtifactStore:
+    global _STORE
+    if _STORE is None:
+        with _LOCK:
+            if _STORE is None:
+                _STORE = store_from_env()
+    return _STORE
+
+
+def reset_store() -> None:
+    global _STORE
+    _STORE = None
+
+
+if hasattr(os, "register_at_fork"):
+    # boto3-Clients dürfen nicht über fork() geteilt werden
+    os.register_at_fork(after_in_child=reset_store)
+
+
+# ---------- references in Redis ----------
+
+def save_ref(redis: Any, key: str, ref: Dict[str, Any], ttl: Optional[int] = None) -> None:
+    """Stores the reference; default TTL = remaining retention of the object."""
+    if ttl is None:
+        ttl = max(1, int(ref["expires_at"] - time.time()))
+    redis.set(key, json.dumps(ref), ex=ttl)
+
+
+def load_ref(redis: Any, key: str) -> Optional[Dict[str, Any]]:
+    raw = redis.get(key)
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except Exception:
+        return None
+
+
+# ---------- HTTP ----------
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Single 'bytes=' range → (start, end) inclusive; None = whole body.
+
+    Raises ValueError when the range cannot be satisfied (→ 416). Multiple ranges
+    are answered with the full body, which RFC 9110 allows.
+    """
+    if not header or not header.strip().lower().startswith("bytes="):
+        return None
+    spec = header.split("=", 1)[1].strip()
+    if "," in spec:
+        return None
+    first, sep, last = spec.partition("-")
+    if not sep:
+        return None
+    try:
+        if first.strip() == "":
+            n = int(last)
+            if n <= 0:
+                raise ValueError("empty suffix range")
+            return max(0, size - n), size - 1
+        start = int(first)
+        end = int(last) if last.strip() else size - 1
+    except ValueError:
+        raise ValueError(f"invalid range: {header!r}")
+    if start >= size or end < start:
+        raise ValueError(f"unsatisfiable range: {header!r}")
+    return start, min(end, size - 1)
+
+
+def artifact_response(request: Any, ref: Dict[str, Any], filename: Optional[str] = None,
+                      store: Optional[ArtifactStore] = None) -> Any:
+    """Streaming response for `ref`; None if the object no longer exists."""
+    from starlette.responses import Response, StreamingResponse
+
+    store = store or get_store()
+    digest = ref["sha256"]
+    st = store.stat(digest)
+    if st is None:
+        return None
+    size = int(st["size"])
+    media_type = st.get("content_type") or ref.get("content_type") or "application/octet-stream"
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "private, max-age=3600"}
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    inm = request.headers.get("if-none-match")
+    if inm and (inm.strip() == "*" or etag in [t.strip() for t in inm.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    rng_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() != etag:
+        rng_header = None  # Objekt hat sich geändert → ganzes Objekt
+    try:
+        rng = parse_range(rng_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}", **headers})
+
+    if rng is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        (start, end), status_code = rng, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(max(0, end - start + 1))
+    return StreamingResponse(store.iter_bytes(digest, start, end), status_code=status_code,
+                             media_type=media_type, headers=headers)
+
+
+__all__ = ["ArtifactStore", "FileSystemBackend", "S3Backend", "get_store", "reset_store",
+           "store_from_env", "parse_retention", "parse_range", "save_ref", "load_ref",
+           "artifact_response"]
+
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) > 1 and sys.argv[1] == "sweep":
+        print(json.dumps({"removed": get_store().sweep()}))
+    else:
+        print("usage: python artifact_store.py sweep")
+        raise SystemExit(2)
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Batch-Verarbeitung vieler Briefings (Partner-Importe, Evals).
+
+Statt N-mal build_html_report() teilt ein Batch die Arbeit:
+  - Scoring für alle Briefings in einem Durchlauf (gpt_analyze.compute_scores_many)
+  - Live-Daten einmal je Kombination der Felder, aus denen fetch_live_data seine
+    Suchanfragen baut (Branche, Bundesland, Hauptleistung, Größe)
+  - identische Overlay-Prompts nur einmal an das LLM (Schlüssel: sha256 der Nachrichten)
+  - Overlays online parallel oder über eine Provider-Batch-API (llm_batch.py)
+
+run_batch() ist ein Generator mit Ereignissen für einen NDJSON-Stream:
+  {"type": "accepted", "items": N}
+  {"type": "phase", "phase": "live_data" | "overlays" | "render", ...}
+  {"type": "item", "index": i, "id": ..., "status": "ok" | "error", ...}
+  {"type": "summary", ...}
+
+Über die API laufen Batches immer als Job in der Lane "batch" (enqueue(), fair_queue.py);
+die Ergebnisse (HTML je Briefing, Ereignisse als NDJSON) sind signierte Links
+(signed_links.py) im Job-Ergebnis.
+
+CLI:
+  python batch_processor.py briefings.jsonl --out batch_out [--lang de] [--provider openai-batch]
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+log = logging.getLogger("batch_processor")
+
+MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "200"))
+LIVE_CONCURRENCY = int(os.getenv("BATCH_LIVE_CONCURRENCY", "4"))
+JOB_TIMEOUT = int(os.getenv("BATCH_JOB_TIMEOUT", "90000"))
+RESULT_TTL = 7 * 86400
+
+Sink = Callable[[int, str, Dict[str, Any]], Dict[str, Any]]
+
+
+def parse_items(body: Any) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """JSON-Array, {"items": [...], ...Optionen} oder JSONL → (items, options)."""
+    if isinstance(body, (bytes, bytearray)):
+        body = body.decode("utf-8-sig")
+    options: Dict[str, Any] = {}
+    if isinstance(body, str):
+        text = body.strip()
+        if not text:
+            raise ValueError("empty batch")
+        try:
+            body = json.loads(text)
+        except json.JSONDecodeError:
+            try:
+                body = [json.loads(line) for line in text.splitlines() if line.strip()]
+            except json.JSONDecodeError as exc:
+                raise ValueError(f"neither JSON nor JSONL: {exc}")
+    if isinstance(body, dict):
+        options = {k: v for k, v in body.items() if k != "items"}
+        body = body.get("items")
+    if not isinstance(body, list) or not all(isinstance(x, dict) for x in body):
+        raise ValueError("expected a list of briefing objects")
+    return body, options
+
+
+def _item_id(raw: Dict[str, Any], index: int) -> str:
+    return str(raw.get("id") or raw.get("case") or index)
+
+
+def _slug(item_id: str, index: int) -> str:
+    return "".join(c if c.isalnum() or c in "-_" else "-" for c in item_id)[:80] or str(index)
+
+
+def _live_key(n: Any) -> Tuple[str, ...]:
+    # alle Felder, die in die Suchanfragen von gpt_analyze.fetch_live_data eingehen
+    return (n.branche_label, n.bundesland_code, n.hauptleistung, n.unternehmensgroesse_label)
+
+
+def _overlay_key(name: str, messages: List[Dict[str, str]]) -> str:
+    raw = json.dumps([name, messages], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:40]
+
+
+def artifact_sink(index: int, item_id: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Default: HTML in den Artifact-Store, im Ereignis Referenz und signierter Link."""
+    import artifact_store
+    import signed_links
+    ref = artifact_store.get_store().put(result["html"].encode("utf-8"), "text/html; charset=utf-8", kind="html")
+    return {"artifact": ref, "url": signed_links.link(ref, f"{_slug(item_id, index)}.html")}
+
+
+def run_batch(items: List[Dict[str, Any]], lang: str = "de", completer: Any = None,
+              sink: Optional[Sink] = None) -> Iterator[Dict[str, Any]]:
+    import gpt_analyze as ga
+    from llm_batch import OnlineCompleter
+
+    t0 = time.perf_counter()
+    completer = completer or OnlineCompleter()
+    sink = sink or artifact_sink
+    yield {"type": "accepted", "items": len(items), "provider": getattr(completer, "name", "custom")}
+
+    # 1. Normalisieren (Fehler betreffen nur das einzelne Briefing)
+    langs: List[str] = []
+    norm: Dict[int, Any] = {}
+    failed = 0
+    for i, raw in enumerate(items):
+        langs.append(str(raw.get("lang") or raw.get("language") or lang).lower())
+        try:
+            norm[i] = ga.normalize_briefing(raw, lang=langs[i])
+        except Exception as exc:
+            failed += 1
+            yield {"type": "item", "index": i, "id": _item_id(raw, i), "status": "error", "error": str(exc)}
+
+    # 2. Scoring in einem Durchlauf
+    idx = list(norm)
+    scores = dict(zip(idx, ga.compute_scores_many([norm[i] for i in idx])))
+
+    # 3. Live-Daten einmal je Suchprofil
+    groups: Dict[Tuple[str, ...], int] = {}
+    for i in idx:
+        groups.setdefault(_live_key(norm[i]), i)
+    yield {"type": "phase", "phase": "live_data", "groups": len(groups)}
+    live: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+    if groups:
+        with ThreadPoolExecutor(max_workers=min(LIVE_CONCURRENCY, len(groups)), thread_name_prefix="live") as ex:
+            for key, data in zip(groups, ex.map(lambda k: ga.fetch_live_data(norm[groups[k]], langs[groups[k]]),
+                                                groups)):
+                live[key] = data
+
+    # 4. Entwürfe + Overlay-Nachrichten, identische Prompts teilen
+    drafts: Dict[int, Any] = {}
+    overlay_ids: Dict[int, Dict[str, str]] = {}
+    requests: Dict[str, Tuple[str, List[Dict[str, str]]]] = {}
+    total_overlays = 0
+    for i in idx:
+        try:
+            n = norm[i]
+            d = ga.prepare_report(items[i], langs[i], n=n, score=scores[i],
+                                  live_data=live[_live_key(n)])
+        except Exception as exc:
+            failed += 1
+            yield {"type": "item", "index": i, "id": _item_id(items[i], i), "status": "error", "error": str(exc)}
+            continue
+        drafts[i] = d
+        overlay_ids[i] = {}
+        for name in ga.OVERLAY_NAMES:
+            msgs = ga.overlay_messages(name, langs[i], d.ctx, d.critical_fields)
+            if not msgs:
+                continue
+            cid = _overlay_key(name, msgs)
+            requests.setdefault(cid, (name, msgs))
+            overlay_ids[i][name] = cid
+            total_overlays += 1
+
+    yield {"type": "phase", "phase": "overlays", "requests": total_overlays, "unique": len(requests)}
+    outputs = completer.complete_many(requests)
+
+    # 5. Rendern und pro Briefing melden
+    yield {"type": "phase", "phase": "render"}
+    ok = 0
+    for i, d in drafts.items():
+        item_id = _item_id(items[i], i)
+        try:
+            overlays = {name: outputs.get(cid, "") for name, cid in overlay_ids[i].items()}
+            result = ga.render_report(d, langs[i], overlays)
+            event = {"type": "item", "index": i, "id": item_id, "status": "ok",
+                     "score": result["meta"]["score"], "badge": result["meta"]["badge"]}
+            event.update(sink(i, item_id, result))
+            ok += 1
+        except Exception as exc:
+            failed += 1
+            event = {"type": "item", "index": i, "id": item_id, "status": "error", "error": str(exc)}
+        yield event
+
+    yield {"type": "summary", "items": len(items), "ok": ok, "failed": failed,
+           "live_groups": len(groups), "overlay_requests": total_overlays, "overlay_unique": len(requests),
+           "provider": getattr(completer, "name", "custom"), "ms": round((time.perf_counter() - t0) * 1000)}
+
+
+def run_batch_job(packed: Dict[str, Any], lang: str = "de", provider: str = "online") -> Dict[str, Any]:
+    """RQ-Job: Ereignisse als NDJSON in den Artifact-Store; Ergebnis mit signierten Links."""
+    import artifact_store
+    import signed_links
+    from job_payload import unpack
+    from llm_batch import get_completer
+
+    items = unpack(packed)["items"]
+    events = list(run_batch(items, lang=lang, completer=get_completer(provider)))
+    lines = "\n".join(json.dumps(e, ensure_ascii=False) for e in events).encode("utf-8")
+    ref = artifact_store.get_store().put(lines, "application/x-ndjson", kind="batch")
+    return {"summary": events[-1], "events": ref, "events_url": signed_links.link(ref, "batch-events.ndjson"),
+            "items": [e for e in events if e["type"] == "item"]}
+
+
+def payload_ttl() -> int:
+    """Payload-Retention für einen Batch-Job: Laufzeit × Versuche + Backoff + ein Tag Wartezeit in der Lane."""
+    from retry_policy import policy_for
+    policy = policy_for("batch")
+    return JOB_TIMEOUT * max(1, policy.max_attempts) + int(policy.max_delay) * max(0, policy.max_attempts - 1) + 86400
+
+
+def enqueue(connection: Any, items: List[Dict[str, Any]], lang: str = "de", provider: str = "online",
+            tenant: str = "anonymous") -> Any:
+    """Reiht einen Batch in die Lane "batch" ein (fair je Mandant, eigene Worker)."""
+    import fair_queue
+    from job_payload import describe, pack
+    from retry_policy import policy_for
+    packed = pack({"items": items}, min_ttl=payload_ttl())
+    return fair_queue.submit(connection, "batch", tenant, run_batch_job, packed, lang, provider,
+                             job_timeout=JOB_TIMEOUT, result_ttl=RESULT_TTL, retry=policy_for("batch").rq_retry(),
+                             description=describe("batch_processor.run_batch_job", packed, provider))
+
+
+def _file_sink(out_dir: Path) -> Sink:
+    def sink(index: int, item_id: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        path = out_dir / f"{index:04d}_{_slug(item_id, index)}.html"
+        path.write_text(result["html"], encoding="utf-8")
+        return {"file": str(path)}
+    return sink
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+    from llm_batch import COMPLETERS, get_completer
+
+    ap = argparse.ArgumentParser(description="Briefings im Batch zu Reports verarbeiten")
+    ap.add_argument("input", help="JSONL- oder JSON-Datei mit Briefings")
+    ap.add_argument("--out", default="batch_out")
+    ap.add_argument("--lang", default="de")
+    ap.add_argument("--provider", default="online", choices=sorted(COMPLETERS))
+    args = ap.parse_args(argv)
+
+    items, options = parse_items(Path(args.input).read_bytes())
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with (out_dir / "results.jsonl").open("w", encoding="utf-8") as f:
+        for event in run_batch(items, lang=options.get("lang") or args.lang,
+                               completer=get_completer(args.provider), sink=_file_sink(out_dir)):
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+            if event["type"] in ("item", "summary"):
+                print(json.dumps(event, ensure_ascii=False), flush=True)
+    return 0 if event.get("failed") == 0 else 1
+
+
+__all__ = ["parse_items", "run_batch", "run_batch_job", "enqueue", "payload_ttl", "artifact_sink", "MAX_ITEMS"]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    raise SystemExit(main())
@@ -0,0 +1,347 @@
+# filename: benchmark_repository.py
+# -*- coding: utf-8 -*-
+"""
+Benchmark-Repository: lädt alle Branchen-Benchmarks einmal in eine dichte Tabelle.
+
+Quellen (data/):
+  - benchmarks_<branche>_<größe>.json  – flach ({"digitalisierung": 58, ...})
+                                         oder als KPI-Liste ({"kpis": [{"name", "value" 0..1, "source"}]})
+  - benchmark_<branche>.csv            – Cluster-Zeilen (Solo/Klein/KMU/Groß) oder Kategorie/Wert
+  - benchmark_default.csv              – Kriterium × Solo/Klein/KMU
+
+Alle Werte werden auf 0..100 normalisiert. Die Fallback-Kette wird beim Laden für
+jede Kombination (Branche × Größe) aufgelöst:
+  1. JSON exakt  2. CSV der Branche  3. JSON der Branche mit Nachbargröße
+  4. benchmark_default.csv  5. eingebaute Defaults
+`get(branche, size)` ist danach ein Dict-Lookup. Ändert sich eine Datei, wird die
+Tabelle beim nächsten Zugriff neu gebaut (Prüfung höchstens alle
+BENCHMARK_RELOAD_SECONDS Sekunden).
+"""
+from __future__ import annotations
+
+import csv
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from funding_index import normalize_size
+
+log = logging.getLogger("benchmark_repository")
+
+DATA_DIR = Path(os.getenv("DATA_DIR") or Path(os.getcwd()) / "data")
+RELOAD_SECONDS = float(os.getenv("BENCHMARK_RELOAD_SECONDS", "30"))
+
+KPIS: Tuple[str, ...] = ("digitalisierung", "automatisierung", "compliance", "prozessreife", "innovation")
+SIZES: Tuple[str, ...] = ("solo", "team", "kmu")
+DEFAULTS: Dict[str, float] = {
+    "digitalisierung": 60.0,
+    "automatisierung": 55.0,
+    "compliance": 60.0,
+    "prozessreife": 55.0,
+    "innovation": 60.0,
+}
+
+# Dateinamen-Suffixe → Größenklasse
+_SIZE_SUFFIX = {"solo": "solo", "team": "team", "small": "team", "kmu": "kmu"}
+# Reihenfolge der Nachbargrößen für Stufe 3
+_NEIGHBOURS = {"solo": ("team", "kmu"), "team": ("solo", "kmu"), "kmu": ("team", "solo")}
+# CSV-Spalten/-Kategorien → KPI
+_CSV_KPI = {
+    "score_ki_readiness": "digitalisierung",
+    "score_compliance": "compliance",
+    "score_innovation": "innovation",
+    "digitalisierungsgrad": "digitalisierung",
+    "automatisierungsgrad": "automatisierung",
+    "datenschutz-compliance": "compliance",
+    "datenschutzkonformität": "compliance",
+    "innovationsgrad": "innovation",
+    "innovationsindex": "innovation",
+    "papierloser anteil (%)": "prozessreife",
+}
+# Freitext-Branchen ohne eigene Datei
+_ALIASES = {
+    "produktion": "industrie",
+    "software": "it",
+    "transport": "logistik",
+    "kreativwirtschaft": "medien",
+    "werbung": "marketing",
+    "architektur": "bau",
+    "bauwesen": "bau",
+    "versicherungen": "finanzen",
+    "pflege": "gesundheit",
+    "dienstleistungen": "beratung",
+    "e_commerce": "handel",
+}
+
+
+def slugify(value: Any) -> str:
+    s = str(value or "").strip().lower()
+    for a, b in (("ä", "ae"), ("ö", "oe"), ("ü", "ue"), ("ß", "ss")):
+        s = s.replace(a, b)
+    return re.sub(r"[^a-z0-9]+", "_", s).strip("_")
+
+
+def _scale(v: Any) -> Optional[float]:
+    """0..1 → %, 0..10 → %, sonst unverändert; Nicht-Zahlen → None."""
+    try:
+        f = float(str(v).replace(",", ".").strip())
+    except (TypeError, ValueError):
+        return None
+    if f <= 1.0:
+        f *= 100.0
+    elif f <= 10.0:
+        f *= 10.0
+    return round(max(0.0, min(100.0, f)), 1)
+
+
+@dataclass
+class BenchmarkEntry:
+    branche: str
+    size: str
+    values: Dict[str, float]
+    sources: Dict[str, str] = field(default_factory=dict)
+    origin: str = "defaults"
+    level: int = 5  # Stufe der Fallback-Kette (1 = exakt)
+
+    def as_dict(self) -> Dict[str, float]:
+        return dict(self.values)
+
+    def as_kpi_list(self) -> Dict[str, Any]:
+        """Format der KPI-Listen-JSONs (für postprocess_report)."""
+        return {"kpis": [
+            {"name": k, "value": v, "source": self.sources.get(k) or self.origin}
+            for k, v in self.values.items()
+        ]}
+
+
+def _read_json(p: Path) -> Tuple[Dict[str, float], Dict[str, str]]:
+    data = json.loads(p.read_text(encoding="utf-8"))
+    values: Dict[str, float] = {}
+    sources: Dict[str, str] = {}
+    if isinstance(data, dict) and isinstance(data.get("kpis"), list):
+        for k in data["kpis"]:
+            name = str(k.get("name") or "").lower()
+            val = _scale(k.get("value"))
+            if name in KPIS and val is not None:
+                values[name] = val
+                if k.get("source"):
+                    sources[name] = str(k["source"])
+    elif isinstance(data, dict):
+        for name in KPIS:
+            val = _scale(data.get(name))
+            if val is not None:
+                values[name] = val
+    return values, sources
+
+
+def _size_of_label(label: str) -> Optional[str]:
+    s = label.lower()
+    if s.startswith("groß") or s.startswith("gross"):
+        return None
+    return normalize_size(s)
+
+
+def _read_csv(p: Path) -> Dict[str, Dict[str, float]]:
+    """Liefert {size: {kpi: value}} für beide CSV-Layouts."""
+    with p.open("r", encoding="utf-8-sig", newline="") as f:
+        rows = [r for r in csv.DictReader(f) if any((v or "").strip() for v in r.values() if isinstance(v, str))]
+    out: Dict[str, Dict[str, float]] = {}
+    if rows and "cluster" in rows[0]:
+        for r in rows:
+            size = _size_of_label(r.get("cluster") or "")
+            if not size:
+                continue
+            for col, kpi in _CSV_KPI.items():
+                val = _scale(r.get(col))
+                if val is not None:
+                    out.setdefault(size, {})[kpi] = val
+    elif rows and "Kategorie" in rows[0]:
+        for r in rows:
+            kpi = _CSV_KPI.get((r.get("Kategorie") or "").strip().lower())
+            val = _scale(r.get("Wert_Durchschnitt"))
+            if kpi and val is not None:
+                for size in SIZES:
+                    out.setdefault(size, {})[kpi] = val
+    elif rows and "Kriterium" in rows[0]:
+        for r in rows:
+            kpi = _CSV_KPI.get((r.get("Kriterium") or "").strip().lower())
+            if not kpi:
+                continue
+            for col, size in (("Solo", "solo"), ("Klein", "team"), ("KMU", "kmu")):
+                val = _scale(r.get(col))
+                if val is not None:
+                    out.setdefault(size, {})[kpi] = val
+    return out
+
+
+class BenchmarkRepository:
+    """Dichte (Branche × Größe)-Tabelle mit aufgelöster Fallback-Kette."""
+
+    def __init__(self, data_dir: Optional[Path] = None) -> None:
+        self.data_dir = Path(data_dir) if data_dir else DATA_DIR
+        self._lock = threading.Lock()
+        self._table: Dict[Tuple[str, str], BenchmarkEntry] = {}
+        self._aliases: Dict[str, str] = {}
+        self._signature: Tuple[Tuple[str, float], ...] = ()
+        self._checked_at = 0.0
+        self.branches: Tuple[str, ...] = ()
+        self.missing: List[Tuple[str, str]] = []
+        self.reload()
+
+    # ---------- Laden ----------
+
+    def _files(self) -> List[Path]:
+        if not self.data_dir.exists():
+            return []
+        return sorted(list(self.data_dir.glob("benchmarks_*.json")) + list(self.data_dir.glob("benchmark_*.csv")))
+
+    def _current_signature(self) -> Tuple[Tuple[str, float], ...]:
+        sig = []
+        for p in self._files():
+            try:
+                sig.append((p.name, p.stat().st_mtime))
+            except OSError:
+                continue
+        return tuple(sig)
+
+    def reload(self) -> None:
+        json_data: Dict[Tuple[str, str], Tuple[Dict[str, float], Dict[str, str], str]] = {}
+        csv_data: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for p in self._files():
+            try:
+                if p.suffix == ".json":
+                    stem = p.stem[len("benchmarks_"):]
+                    branche, _, suffix = stem.rpartition("_")
+                    size = _SIZE_SUFFIX.get(suffix)
+                    if not branche or not size:
+                        continue
+                    values, sources = _read_json(p)
+                    if values and (branche, size) not in json_data:
+                        json_data[(branche, size)] = (values, sources, p.name)
+                else:
+                    csv_data[p.stem[len("benchmark_"):]] = _read_csv(p)
+            except Exception as exc:
+                log.warning("Benchmark-Datei %s nicht lesbar: %s", p.name, exc)
+
+        default_csv = csv_data.pop("default", {})
+        branches = sorted({b for b, _ in json_data} | set(csv_data))
+        table: Dict[Tuple[str, str], BenchmarkEntry] = {}
+        missing: List[Tuple[str, str]] = []
+        for b in branches + ["default"]:
+            for size in SIZES:
+                entry = self._resolve(b, size, json_data, csv_data, default_csv)
+                table[(b, size)] = entry
+                if entry.level > 1 and b != "default":
+                    missing.append((b, size))
+
+        aliases = {b: b for b in branches}
+        for alias, target in _ALIASES.items():
+            if target in aliases:
+                aliases.setdefault(alias, target)
+
+        with self._lock:
+            self._table = table
+            self._aliases = aliases
+            self.branches = tuple(branches)
+            self.missing = missing
+            self._signature = self._current_signature()
+            self._checked_at = time.monotonic()
+        log.info("Benchmarks geladen: %d Branchen, %d Kombinationen per Fallback", len(branches), len(missing))
+
+    @staticmethod
+    def _resolve(b: str, size: str, json_data, csv_data, default_csv) -> BenchmarkEntry:
+        def fill(values: Dict[str, float]) -> Dict[str, float]:
+            return {k: float(values.get(k, DEFAULTS[k])) for k in KPIS}
+
+        if (b, size) in json_data:
+            values, sources, origin = json_data[(b, size)]
+            return BenchmarkEntry(b, size, fill(values), dict(sources), origin, 1)
+        if size in csv_data.get(b, {}):
+            return BenchmarkEntry(b, size, fill(csv_data[b][size]), {}, f"benchmark_{b}.csv", 2)
+        for other in _NEIGHBOURS[size]:
+            if (b, other) in json_data:
+                values, sources, origin = json_data[(b, other)]
+                return BenchmarkEntry(b, size, fill(values), dict(sources), origin, 3)
+        if size in default_csv:
+            return BenchmarkEntry(b, size, fill(default_csv[size]), {}, "benchmark_default.csv", 4)
+        return BenchmarkEntry(b, size, dict(DEFAULTS), {}, "defaults", 5)
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if RELOAD_SECONDS <= 0 or now - self._checked_at < RELOAD_SECONDS:
+            return
+        self._checked_at = now
+        if self._current_signature() != self._signature:
+            log.info("Benchmark-Dateien geändert – lade neu")
+            self.reload()
+
+    # ---------- Lookup ----------
+
+    def canonical_branche(self, branche: Any) -> str:
+        slug = slugify(branche)
+        hit = self._aliases.get(slug)
+        if hit:
+            return hit
+        # Freitext ("Beratung & Dienstleistungen") über Token auflösen – nicht merken:
+        # die Alias-Tabelle soll nicht mit beliebigen Nutzereingaben wachsen
+        for tok in slug.split("_"):
+            if tok in self._aliases:
+                return self._aliases[tok]
+        return "default"
+
+    def entry(self, branche: Any, size: Any) -> BenchmarkEntry:
+        self._maybe_reload()
+        key = (self.canonical_branche(branche), normalize_size(size))
+        return self._table.get(key) or self._table[("default", key[1])]
+
+    def get(self, branche: Any, size: Any) -> Dict[str, float]:
+        return self.entry(branche, size).as_dict()
+
+    def validation_report(self) -> Dict[str, Any]:
+        exact = sum(1 for e in self._table.values() if e.level == 1)
+        return {
+            "branches": list(self.branches),
+            "sizes": list(SIZES),
+            "combinations": len(self.branches) * len(SIZES),
+            "exact": exact,
+            "missing": [
+                {"branche": b, "size": s, "resolved_from": self._table[(b, s)].origin, "level": self._table[(b, s)].level}
+                for b, s in self.missing
+            ],
+        }
+
+
+_REPO: Optional[BenchmarkRepository] = None
+_REPO_LOCK = threading.Lock()
+
+
+def get_benchmark_repository() -> BenchmarkRepository:
+    global _REPO
+    if _REPO is None:
+        with _REPO_LOCK:
+            if _REPO is None:
+                _REPO = BenchmarkRepository()
+    return _REPO
+
+
+def log_validation_report() -> Dict[str, Any]:
+    report = get_benchmark_repository().validation_report()
+    if report["missing"]:
+        log.warning(
+            "Benchmarks: %d/%d Kombinationen ohne exakte Datei: %s",
+            len(report["missing"]), report["combinations"],
+            ", ".join(f"{m['branche']}/{m['size']}←{m['resolved_from']}" for m in report["missing"]),
+        )
+    return report
+
+
+__all__ = ["BenchmarkEntry", "BenchmarkRepository", "get_benchmark_repository", "log_validation_report"]
+
+if __name__ == "__main__":
+    print(json.dumps(get_benchmark_repository().validation_report(), ensure_ascii=False, indent=2))
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Threaded RQ worker: N jobs concurrently in one process.
+
+Report jobs are I/O-bound (LLM, search, PDF), so a forking worker that runs one
+job at a time idles most of the time. This mode starts one `SimpleWorker` per
+slot in a thread. Each slot registers as a normal RQ worker (name, heartbeat,
+StartedJobRegistry), so `rq info`, the dashboard and the abandoned-job cleanup
+keep working.
+
+Configure via env:
+  RQ_WORKER_MODE=thread           enable (default: fork, see worker.py)
+  RQ_CONCURRENCY="reports:8,pdf:4,2"
+      <queue>:<n>  → n slots listening only on that queue
+      <n>          → n slots listening on all RQ_QUEUES (in priority order)
+  RQ_POLL_SECONDS=5               how often idle slots check for a stop request
+
+Timeouts use TimerDeathPenalty (SIGALRM only works in the main thread).
+SIGTERM/SIGINT → warm stop: slots finish their current job and exit. A second
+signal exits immediately; the interrupted jobs are then cleaned up by RQ as
+abandoned.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import signal
+import socket
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+from redis import Redis
+from rq import Queue, SimpleWorker
+from rq.timeouts import TimerDeathPenalty
+
+from fair_queue import FairWorkerMixin
+from queue_metrics import MetricsWorkerMixin
+from retry_policy import RetryPolicyWorkerMixin
+
+logger = logging.getLogger("rq.concurrent")
+
+POLL_SECONDS = int(os.getenv("RQ_POLL_SECONDS", "5"))
+
+
+def parse_concurrency(spec: str, queue_names: Sequence[str]) -> List[Tuple[Tuple[str, ...], int]]:
+    """'reports:8,pdf:4,2' → [(('reports',), 8), (('pdf',), 4), (all queues, 2)]."""
+    groups: List[Tuple[Tuple[str, ...], int]] = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, sep, n = part.rpartition(":")
+        try:
+            count = int(n)
+        except ValueError:
+            raise ValueError(f"invalid RQ_CONCURRENCY entry: {part!r}")
+        if count <= 0:
+            continue
+        groups.append(((name.strip(),) if sep else tuple(queue_names), count))
+    return groups or [(tuple(queue_names), 1)]
+
+
+class ThreadedWorker(FairWorkerMixin, RetryPolicyWorkerMixin, MetricsWorkerMixin, SimpleWorker):
+    """SimpleWorker that can live in a non-main thread."""
+
+    death_penalty_class = TimerDeathPenalty
+
+    def _install_signal_handlers(self) -> None:
+        # signal.signal() is main-thread only; the pool handles signals
+        pass
+
+    def procline(self, message: str) -> None:
+        # setproctitle would make the slots overwrite each other's title
+        pass
+
+    def dequeue_job_and_maintain_ttl(self, timeout: Optional[int], max_idle_time: Optional[int] = None):
+        if timeout is None:  # burst mode
+            return super().dequeue_job_and_maintain_ttl(timeout, max_idle_time)
+        # Block in short slices so a stop request is noticed while idle
+        while not self._stop_requested:
+            result = super().dequeue_job_and_maintain_ttl(POLL_SECONDS, POLL_SECONDS)
+            if result is not None:
+                return result
+        return None
+
+
+class ConcurrentWorkerPool:
+    def __init__(self, connection: Redis, groups: Sequence[Tuple[Sequence[str], int]],
+                 default_timeout: Optional[int] = None, name_prefix: Optional[str] = None) -> None:
+        self.connection = connection
+        self.groups = groups
+        self.default_timeout = default_timeout
+        self.name_prefix = name_prefix or f"{socket.gethostname()}.{os.getpid()}"
+        self.workers: List[ThreadedWorker] = []
+        self.threads: List[threading.Thread] = []
+        self._stopping = False
+
+    @property
+    def size(self) -> int:
+        return sum(n for _, n in self.groups)
+
+    def _make_workers(self) -> None:
+        slot = 0
+        for names, count in self.groups:
+            queues = [Queue(n, connection=self.connection, default_timeout=self.default_timeout) for n in names]
+            for _ in range(count):
+                slot += 1
+                self.workers.append(ThreadedWorker(
+                    queues, connection=self.connection, name=f"{self.name_prefix}.{slot}"))
+
+    def start(self, burst: bool = False, with_scheduler: bool = False, logging_level: str = "INFO") -> None:
+        self._make_workers()
+        for i, w in enumerate(self.workers):
+            t = threading.Thread(
+                target=w.work, name=f"rq-slot-{i + 1}", daemon=True,
+                kwargs={"burst": burst, "logging_level": logging_level,
+                        # one scheduler per process is enough
+                        "with_scheduler": with_scheduler and i == 0},
+            )
+            t.start()
+            self.threads.append(t)
+        logger.info("Concurrent worker started: %d slots %s",
+                    self.size, {",".join(n): c for n, c in self.groups})
+
+    def request_stop(self, signum=None, frame=None) -> None:
+        if self._stopping:
+            logger.warning("Second stop signal – exiting without waiting for running jobs")
+            raise SystemExit(1)
+        self._stopping = True
+        logger.info("Warm shutdown: waiting for %d running job(s)",
+                    sum(1 for w in self.workers if w.get_current_job_id()))
+        for w in self.workers:
+            w._stop_requested = True
+
+    def install_signal_handlers(self) -> None:
+        signal.signal(signal.SIGINT, self.request_stop)
+        signal.signal(signal.SIGTERM, self.request_stop)
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        for t in self.threads:
+            # short waits keep the main thread responsive to signals
+            while t.is_alive():
+                t.join(1.0 if timeout is None else timeout)
+                if timeout is not None:
+                    break
+
+    def run(self, burst: bool = False, with_scheduler: bool = False, logging_level: str = "INFO") -> int:
+        self.start(burst=burst, with_scheduler=with_scheduler, logging_level=logging_level)
+        self.install_signal_handlers()
+        self.join()
+        return 0
+
+
+def concurrency_groups_from_env(queue_names: Sequence[str]) -> List[Tuple[Tuple[str, ...], int]]:
+    return parse_concurrency(os.getenv("RQ_CONCURRENCY", "4"), queue_names)
+
+
+__all__ = ["ThreadedWorker", "ConcurrentWorkerPool", "parse_concurrency", "concurrency_groups_from_env"]
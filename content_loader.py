@@ -8,16 +8,73 @@ Utility to load curated content blocks (bilingual) for injection into the PDF re
 - Optional translation via OpenAI (if OPENAI_API_KEY present)
 - Sanitises to an HTML fragment (no <html>/<head>/<body> tags)
 
+- Persistent cache for extracted (.docx) and translated fragments, keyed by
+  sha256(source) + target language + model; warm it with
+  `python content_loader.py warm` so reports never wait on a translation
+
 ENV:
   CONTENT_DIR        default: ./content
   CONTENT_TRANSLATE  '1'|'true' to translate if only other language available
+  CONTENT_CACHE_DIR  default: <CONTENT_DIR>/.cache
 """
 from __future__ import annotations
 
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 from pathlib import Path
+import hashlib
+import json
 import re
 import os
+import threading
+
+SECTIONS = {
+    "pillars": ("4-pillars-ai-readiness", "4-Saeulen-KI-Readiness"),
+    "legal": ("legal-pitfalls-ai", "rechtliche-Stolpersteine-KI-im-Unternehmen"),
+    "formula": ("transformation-formula-10-20-70", "Formel-fuer-Transformation"),
+}
+
+_MEMO: Dict[str, str] = {}
+_MEMO_LOCK = threading.Lock()
+
+def _content_dir() -> Path:
+    return Path(os.getenv("CONTENT_DIR","content")).resolve()
+
+def _cache_dir() -> Path:
+    return Path(os.getenv("CONTENT_CACHE_DIR") or (_content_dir() / ".cache"))
+
+def _translate_model() -> str:
+    return os.getenv("OPENAI_MODEL_TRANSLATE", os.getenv("OPENAI_MODEL_DEFAULT", "gpt-4o"))
+
+def _cache_key(kind: str, source: bytes, *parts: str) -> str:
+    h = hashlib.sha256(source)
+    for part in (kind,) + parts:
+        h.update(b"\0" + part.encode("utf-8"))
+    return h.hexdigest()
+
+def _cache_get(key: str) -> Optional[str]:
+    hit = _MEMO.get(key)
+    if hit is not None:
+        return hit
+    try:
+        data = json.loads((_cache_dir() / f"{key}.json").read_text(encoding="utf-8"))
+        html = data["html"]
+    except Exception:
+        return None
+    with _MEMO_LOCK:
+        _MEMO[key] = html
+    return html
+
+def _cache_put(key: str, html: str, **meta: str) -> None:
+    with _MEMO_LOCK:
+        _MEMO[key] = html
+    try:
+        d = _cache_dir()
+        d.mkdir(parents=True, exist_ok=True)
+        tmp = d / f"{key}.json.tmp"
+        tmp.write_text(json.dumps({"html": html, **meta}, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, d / f"{key}.json")
+    except Exception:
+        pass  # read-only FS: in-process memo still applies
 
 def _read_text(p: Path) -> str:
     try:
@@ -41,29 +98,69 @@ def _docx_to_html(p: Path) -> str:
         import zipfile, xml.etree.ElementTree as ET
         with zipfile.ZipFile(p, "r") as z:
             xml = z.read("word/document.xml").decode("utf-8", errors="ignore")
-        xml = re.sub(r'xmlns(:\w+)?="[^"]+"', "", xml)  # strip namespaces for easier parsing
         root = ET.fromstring(xml)
+        local = lambda el: el.tag.rsplit("}", 1)[-1]  # compare local names, namespaces stay bound
         paras = []
         for t in root.iter():
-            if t.tag.endswith("p"):
-                texts = [x.text for x in t.iter() if x.tag.endswith("t") and x.text]
+            if local(t) == "p":
+                texts = [x.text for x in t.iter() if local(x) == "t" and x.text]
                 if texts:
                     paras.append("<p>" + re.sub(r"\s+", " ", "".join(texts)).strip() + "</p>")
         return "\n".join(paras)
     except Exception:
         return ""
 
+def _cached_html(p: Path) -> str:
+    """In-process memo keyed by path + mtime; HTML is cheap enough not to persist."""
+    try:
+        key = f"html:{p}:{p.stat().st_mtime_ns}"
+    except OSError:
+        return ""
+    hit = _MEMO.get(key)
+    if hit is None:
+        hit = _strip_outer_html(_read_text(p))
+        with _MEMO_LOCK:
+            _MEMO[key] = hit
+    return hit
+
+def _cached_docx_html(p: Path) -> str:
+    try:
+        raw = p.read_bytes()
+    except Exception:
+        return ""
+    key = _cache_key("docx", raw)
+    hit = _cache_get(key)
+    if hit is not None:
+        return hit
+    html = _strip_outer_html(_docx_to_html(p))
+    if html:
+        _cache_put(key, html, source=p.name, kind="docx")
+    return html
+
 def _maybe_translate(html: str, lang_target: str) -> str:
+    if not html:
+        return html
+    key = _cache_key("translate", html.encode("utf-8"), lang_target[:2], _translate_model())
+    hit = _cache_get(key)
+    if hit is not None:
+        return hit
+    out = _translate(html, lang_target)
+    if out is None:
+        return html  # fallback, not cached so a later call can retry
+    _cache_put(key, out, lang=lang_target[:2], model=_translate_model(), kind="translate")
+    return out
+
+def _translate(html: str, lang_target: str) -> Optional[str]:
     key = (os.getenv("OPENAI_API_KEY") or "").strip()
-    if not key or not html:
-        return html  # no translation possible -> original
+    if not key:
+        return None  # no translation possible
     # lightweight translation via OpenAI
     try:
         import httpx, json
         sys = "Translate the following HTML fragment. Keep tags, translate only visible text."
         user = f"Target language: {'German' if lang_target.startswith('de') else 'English'}\n\n{html}"
         payload = {
-            "model": os.getenv("OPENAI_MODEL_TRANSLATE", os.getenv("OPENAI_MODEL_DEFAULT", "gpt-4o")),
+            "model": _translate_model(),
             "messages": [{"role": "system", "content": sys}, {"role": "user", "content": user}],
             "temperature": 0.0,
             "max_tokens": 1500,
@@ -75,9 +172,9 @@ def _maybe_translate(html: str, lang_target: str) -> str:
             r.raise_for_status()
             data = r.json()
             content = (data.get("choices") or [{}])[0].get("message", {}).get("content") or ""
-            return _strip_outer_html(content)
+            return _strip_outer_html(content) or None
     except Exception:
-        return html  # fallback
+        return None
 
 def _load_one(base: Path, stem: str, lang: str) -> Tuple[str, str]:
     """
@@ -97,14 +194,13 @@ def _load_one(base: Path, stem: str, lang: str) -> Tuple[str, str]:
     for p in q:
         if p.exists():
             if p.suffix.lower() == ".html":
-                return _strip_outer_html(_read_text(p)), str(p)
+                return _cached_html(p), str(p)
             if p.suffix.lower() == ".docx":
-                html = _docx_to_html(p)
-                return _strip_outer_html(html), str(p)
+                return _cached_docx_html(p), str(p)
     # try other language html and translate (optional)
     other = base / f"{stem}.{ 'en' if lang.startswith('de') else 'de'}.html"
     if other.exists() and (os.getenv("CONTENT_TRANSLATE","1").lower() in {"1","true","yes"}):
-        html = _strip_outer_html(_read_text(other))
+        html = _cached_html(other)
         return _maybe_translate(html, lang), str(other)
     return "", ""
 
@@ -116,16 +212,23 @@ def load_content_sections(lang: str = "de") -> dict:
       - transformation formula 10-20-70
     Returns dict with HTML fragments (may be empty strings).
     """
-    base = Path(os.getenv("CONTENT_DIR","content")).resolve()
-    sections = {
-        "pillars": ("4-pillars-ai-readiness", "4-Saeulen-KI-Readiness"),
-        "legal": ("legal-pitfalls-ai", "rechtliche-Stolpersteine-KI-im-Unternehmen"),
-        "formula": ("transformation-formula-10-20-70", "Formel-fuer-Transformation"),
-    }
+    base = _content_dir()
     out = {}
-    for key, (en_stem, de_stem) in sections.items():
+    for key, (en_stem, de_stem) in SECTIONS.items():
         stem = de_stem if lang.startswith("de") else en_stem
         html, src = _load_one(base, stem, lang)
         out[key] = {"html": html, "source": src}
     return out
+
+def warm_cache(langs: Tuple[str, ...] = ("de", "en")) -> dict:
+    """Pre-extracts/pre-translates all sections; returns {lang: {section: source}}."""
+    return {lang: {k: v["source"] for k, v in load_content_sections(lang).items()} for lang in langs}
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "warm":
+        langs = tuple(sys.argv[2].split(",")) if len(sys.argv) > 2 else ("de", "en")
+        print(json.dumps(warm_cache(langs), ensure_ascii=False, indent=2))
+    else:
+        print("usage: python content_loader.py warm [de,en]")
 # end of file
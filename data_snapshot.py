@@ -0,0 +1,266 @@
+# filename: data_snapshot.py
+# -*- coding: utf-8 -*-
+"""
+Kompilierter Daten-Snapshot für schnellen Start und günstige RQ-Forks.
+
+Build-Schritt (Dockerfile / CI):
+    python scripts/build_data_snapshot.py            # → data/.snapshot.bin
+
+Der Snapshot enthält alle CSV/JSON/MD-Dateien aus data/ bereits geparst:
+  - CSV  → Liste von Dicts (BOM entfernt, ';'/','-Erkennung, Keys/Werte getrimmt)
+  - JSON → geparstes Objekt
+  - MD   → Text
+plus vorberechnete Indexe (Spaltenwert → Zeilennummern) für häufig gefilterte
+Spalten wie region/industry/name.
+
+Dateiformat: MAGIC | Version (u32) | Fingerprint (32 Byte) | Pickle.
+Zur Laufzeit wird der Header geprüft und der Pickle einmal pro Prozess direkt aus
+der Datei geladen; wird der Snapshot im Parent-Prozess geladen, teilen sich
+geforkte Jobs die Seiten (copy-on-write).
+Passt der Fingerprint (Name, Größe, mtime aller Quelldateien) nicht mehr – oder
+fehlt der Snapshot wie in der Entwicklung –, liefern die Helfer None und die
+Loader lesen die Rohdateien. CSV geht dabei immer durch read_csv()/parse_csv(),
+damit Snapshot und Rohdatei exakt dieselben Zeilen liefern.
+Der Fingerprint wird alle DATA_SNAPSHOT_RECHECK_SECONDS (Standard 30) erneut
+geprüft: geänderte Daten verwerfen den Snapshot, ein neu gebauter wird geladen.
+"""
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import pickle
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+log = logging.getLogger("data_snapshot")
+
+DATA_DIR = Path(os.getenv("DATA_DIR") or Path(os.getcwd()) / "data").resolve()
+SNAPSHOT_PATH = Path(os.getenv("DATA_SNAPSHOT_PATH") or DATA_DIR / ".snapshot.bin")
+SNAPSHOT_ENABLED = os.getenv("DATA_SNAPSHOT", "1").lower() not in ("0", "false", "no", "off")
+# Fingerprint-Prüfung abschaltbar, wenn das Image unveränderlich ist
+SNAPSHOT_VERIFY = os.getenv("DATA_SNAPSHOT_VERIFY", "1").lower() not in ("0", "false", "no", "off")
+SNAPSHOT_RECHECK_SECONDS = float(os.getenv("DATA_SNAPSHOT_RECHECK_SECONDS", "30"))
+
+MAGIC = b"KISNAP\x00\x01"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct(">8sI32s")
+_SUFFIXES = (".csv", ".json", ".md")
+# Spalten, für die beim Build ein Wert→Zeilen-Index angelegt wird
+INDEX_COLUMNS = ("region", "industry", "industry_slugs", "name", "category", "bundesland")
+
+
+def _source_files(data_dir: Path) -> List[Path]:
+    if not data_dir.exists():
+        return []
+    return sorted(p for p in data_dir.iterdir()
+                  if p.is_file() and p.suffix in _SUFFIXES and not p.name.startswith("."))
+
+
+def fingerprint(data_dir: Path) -> bytes:
+    h = hashlib.sha256()
+    for p in _source_files(data_dir):
+        st = p.stat()
+        h.update(f"{p.name}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.digest()
+
+
+def parse_csv(text: str) -> List[Dict[str, str]]:
+    """Der eine CSV-Parser für Snapshot und Rohdateien: BOM weg, ';'/','-Erkennung,
+    Keys/Werte getrimmt, überzählige Felder unter "" mit ', ' verbunden."""
+    text = text.lstrip("﻿").lstrip()
+    if not text:
+        return []
+    header = text.split("\n", 1)[0]
+    delim = ";" if header.count(";") > header.count(",") else ","
+    rows: List[Dict[str, str]] = []
+    # über StringIO statt Zeilenliste: mehrzeilige, gequotete Felder behalten ihren Umbruch
+    for row in csv.DictReader(io.StringIO(text, newline=""), delimiter=delim):
+        rec = {(k or "").strip(): (", ".join(v) if isinstance(v, list) else (v or "")).strip()
+               for k, v in row.items()}
+        if any(rec.values()):  # Leer- und reine Trennzeichen-Zeilen
+            rows.append(rec)
+    return rows
+
+
+def _build_index(rows: List[Dict[str, str]]) -> Dict[str, Dict[str, List[int]]]:
+    out: Dict[str, Dict[str, List[int]]] = {}
+    if not rows:
+        return out
+    for col in INDEX_COLUMNS:
+        if col not in rows[0]:
+            continue
+        idx: Dict[str, List[int]] = {}
+        for i, r in enumerate(rows):
+            for val in (r.get(col) or "").replace(";", ",").split(","):
+                val = val.strip().lower()
+                if val:
+                    idx.setdefault(val, []).append(i)
+        out[col] = idx
+    return out
+
+
+def build_snapshot(data_dir: Optional[Path] = None) -> Dict[str, Any]:
+    data_dir = Path(data_dir or DATA_DIR).resolve()
+    files: Dict[str, Dict[str, Any]] = {}
+    for p in _source_files(data_dir):
+        try:
+            text = p.read_text(encoding="utf-8-sig")
+            if p.suffix == ".csv":
+                rows = parse_csv(text)
+                files[p.name] = {"kind": "csv", "rows": rows, "index": _build_index(rows)}
+            elif p.suffix == ".json":
+                files[p.name] = {"kind": "json", "data": json.loads(text)}
+            else:
+                files[p.name] = {"kind": "text", "text": text}
+        except Exception as exc:
+            # Kaputte Dateien nicht einfrieren – der Loader liest sie roh und meldet selbst
+            log.warning("Snapshot: %s übersprungen (%s)", p.name, exc)
+    return {"data_dir": str(data_dir), "files": files}
+
+
+def write_snapshot(out_path: Optional[Path] = None, data_dir: Optional[Path] = None) -> Dict[str, Any]:
+    data_dir = Path(data_dir or DATA_DIR).resolve()
+    out_path = Path(out_path or SNAPSHOT_PATH)
+    snap = build_snapshot(data_dir)
+    payload = pickle.dumps(snap, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp = out_path.with_suffix(out_path.suffix + ".tmp")
+    with tmp.open("wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, fingerprint(data_dir)))
+        f.write(payload)
+    os.replace(tmp, out_path)
+    return {"path": str(out_path), "files": len(snap["files"]), "bytes": _HEADER.size + len(payload)}
+
+
+def read_snapshot(path: Path, data_dir: Optional[Path] = None, verify: bool = True) -> Optional[Dict[str, Any]]:
+    """Liest einen Snapshot; None bei fehlender/veralteter/fremder Datei."""
+    try:
+        with path.open("rb") as f:
+            magic, version, fp = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC or version != FORMAT_VERSION:
+                log.warning("Snapshot %s: unbekanntes Format – ignoriert", path)
+                return None
+            if verify and data_dir is not None and fp != fingerprint(Path(data_dir)):
+                log.warning("Snapshot %s ist veraltet – lese Rohdateien", path)
+                return None
+            snap = pickle.load(f)
+            snap["fingerprint"] = fp
+            return snap
+    except FileNotFoundError:
+        return None
+    except Exception as exc:
+        log.warning("Snapshot %s nicht lesbar: %s", path, exc)
+        return None
+
+
+def _file_stat(path: Path) -> Optional[tuple]:
+    try:
+        st = path.stat()
+        return st.st_size, st.st_mtime_ns
+    except OSError:
+        return None
+
+
+_SNAPSHOT: Optional[Dict[str, Any]] = None
+_LOADED = False
+_CHECKED_AT = 0.0
+_FILE_STAT: Optional[tuple] = None
+_LOCK = threading.Lock()
+
+
+def _load() -> None:
+    global _SNAPSHOT, _LOADED, _CHECKED_AT, _FILE_STAT
+    _FILE_STAT = _file_stat(SNAPSHOT_PATH)
+    _SNAPSHOT = read_snapshot(SNAPSHOT_PATH, DATA_DIR, SNAPSHOT_VERIFY) if SNAPSHOT_ENABLED else None
+    if _SNAPSHOT is not None:
+        log.info("Daten-Snapshot geladen: %d Dateien", len(_SNAPSHOT["files"]))
+    _CHECKED_AT = time.monotonic()
+    _LOADED = True
+
+
+def _stale() -> bool:
+    """Daten seit dem Laden geändert oder Snapshot-Datei neu gebaut?"""
+    if _file_stat(SNAPSHOT_PATH) != _FILE_STAT:
+        return True
+    return _SNAPSHOT is not None and _SNAPSHOT.get("fingerprint") != fingerprint(DATA_DIR)
+
+
+def get_snapshot() -> Optional[Dict[str, Any]]:
+    global _SNAPSHOT, _CHECKED_AT
+    recheck = SNAPSHOT_ENABLED and SNAPSHOT_VERIFY and time.monotonic() - _CHECKED_AT >= SNAPSHOT_RECHECK_SECONDS
+    if _LOADED and not recheck:
+        return _SNAPSHOT
+    with _LOCK:
+        if not _LOADED:
+            _load()
+        elif time.monotonic() - _CHECKED_AT >= SNAPSHOT_RECHECK_SECONDS:
+            _CHECKED_AT = time.monotonic()
+            if _stale():
+                log.warning("Daten oder Snapshot geändert – lade neu")
+                _SNAPSHOT = None
+                _load()
+    return _SNAPSHOT
+
+
+def reset_snapshot() -> None:
+    global _SNAPSHOT, _LOADED
+    with _LOCK:
+        _SNAPSHOT, _LOADED = None, False
+
+
+def _entry(path: Any, kind: str) -> Optional[Dict[str, Any]]:
+    snap = get_snapshot()
+    if snap is None:
+        return None
+    p = Path(path)
+    try:
+        if str(p.resolve().parent) != snap["data_dir"]:
+            return None
+    except OSError:
+        return None
+    e = snap["files"].get(p.name)
+    return e if e and e["kind"] == kind else None
+
+
+def csv_rows(path: Any) -> Optional[List[Dict[str, str]]]:
+    """Zeilen aus dem Snapshot (Kopien, dürfen verändert werden) oder None."""
+    e = _entry(path, "csv")
+    return [dict(r) for r in e["rows"]] if e else None
+
+
+def read_csv(path: Any) -> List[Dict[str, str]]:
+    """CSV-Zeilen aus dem Snapshot oder, gleich geparst, aus der Rohdatei; [] wenn sie fehlt.
+
+    Andere Lesefehler (Encoding, Rechte) werden weitergereicht – der Loader meldet sie."""
+    rows = csv_rows(path)
+    if rows is not None:
+        return rows
+    try:
+        return parse_csv(Path(path).read_text(encoding="utf-8-sig"))
+    except FileNotFoundError:
+        return []
+
+
+def csv_index(path: Any, column: str) -> Optional[Dict[str, List[int]]]:
+    e = _entry(path, "csv")
+    return e["index"].get(column) if e else None
+
+
+def json_data(path: Any) -> Optional[Any]:
+    e = _entry(path, "json")
+    return e["data"] if e else None
+
+
+def text(path: Any) -> Optional[str]:
+    e = _entry(path, "text")
+    return e["text"] if e else None
+
+
+__all__ = ["build_snapshot", "write_snapshot", "read_snapshot", "get_snapshot", "reset_snapshot",
+           "csv_rows", "read_csv", "csv_index", "json_data", "text", "fingerprint", "parse_csv"]
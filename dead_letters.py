@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Dead-letter queue for RQ jobs.
+
+Jobs whose retry policy is exhausted (or whose error is not retryable, see
+retry_policy.py) stay in RQ's FailedJobRegistry of their queue. This module
+inspects and requeues them across all RQ_QUEUES:
+
+    list_dead(conn, queues, stage=..., exception=...)   newest first
+    get_dead(conn, job_id)                              incl. traceback
+    requeue(conn, queues, job_ids=... | filters)        fresh retry budget
+    delete(conn, job_id)
+
+Requeued report jobs from a lane (fair_queue.py) are staged again instead of
+being pushed to the front, so a bulk requeue of partner jobs stays fair.
+Analyze jobs whose offloaded payload has expired (job_payload.readable) are
+re-packed from the report's stored briefing.json before they run again.
+"""
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from rq.job import Job
+from rq.registry import FailedJobRegistry
+
+from retry_policy import policy_for, stage_of
+
+log = logging.getLogger("dead_letters")
+
+
+def _last_line(exc_info: Optional[str]) -> str:
+    lines = [ln for ln in (exc_info or "").strip().splitlines() if ln.strip()]
+    return lines[-1].strip()[:300] if lines else ""
+
+
+def _iter_dead(connection: Any, queues: Sequence[str]) -> Iterator[Tuple[str, Job]]:
+    for name in queues:
+        registry = FailedJobRegistry(name, connection=connection)
+        ids = registry.get_job_ids(desc=True, cleanup=False)
+        for job in Job.fetch_many(ids, connection=connection):
+            if job is not None:
+                yield name, job
+
+
+def _exc_string(job: Job) -> str:
+    try:
+        result = job.latest_result()
+    except Exception:
+        return ""
+    return (result.exc_string or "") if result is not None else ""
+
+
+def describe(job: Job, queue: str, with_traceback: bool = False) -> Dict[str, Any]:
+    meta = job.meta or {}
+    exc_info = _exc_string(job)
+    try:
+        func = job.func_name
+    except Exception:
+        func = None
+    out = {
+        "job_id": job.id,
+        "queue": queue,
+        "stage": stage_of(job),
+        "func": func,
+        "exception": meta.get("last_exception"),
+        "error": _last_line(exc_info),
+        "enqueued_at": job.enqueued_at.isoformat() if job.enqueued_at else None,
+        "ended_at": job.ended_at.isoformat() if job.ended_at else None,
+        "lane": meta.get("lane"),
+    }
+    if with_traceback:
+        out["traceback"] = exc_info
+    return out
+
+
+def _matches(info: Dict[str, Any], stage: Optional[str], exception: Optional[str]) -> bool:
+    return (not stage or info["stage"] == stage) and (not exception or info["exception"] == exception)
+
+
+def list_dead(connection: Any, queues: Sequence[str], stage: Optional[str] = None,
+              exception: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    for name, job in _iter_dead(connection, queues):
+        info = describe(job, name)
+        if _matches(info, stage, exception):
+            out.append(info)
+            if len(out) >= limit:
+                break
+    return out
+
+
+def summary(connection: Any, queues: Sequence[str]) -> Dict[str, int]:
+    """{"<queue>": count} – O(1) per queue."""
+    return {n: FailedJobRegistry(n, connection=connection).get_job_count(cleanup=False) for n in queues}
+
+
+def _find(connection: Any, job_id: str) -> Optional[Tuple[str, Job]]:
+    try:
+        job = Job.fetch(job_id, connection=connection)
+    except Exception:
+        return None
+    if job_id in FailedJobRegistry(job.origin, connection=connection):
+        return job.origin, job
+    return None
+
+
+def get_dead(connection: Any, job_id: str) -> Optional[Dict[str, Any]]:
+    hit = _find(connection, job_id)
+    return describe(hit[1], hit[0], with_traceback=True) if hit else None
+
+
+def _refresh_payload(connection: Any, job: Job) -> None:
+    """Expired offloaded payloads: analyze jobs are re-packed from briefing.json,
+    every other job (e.g. tasks.analyze_and_render with client html) is refused."""
+    import job_payload
+    if job.func_name != "report_pipeline.stage_analyze" or len(job.args) < 2:
+        if not all(job_payload.readable(a) for a in (*job.args, *job.kwargs.values())):
+            raise RuntimeError(f"payload of {job.id} ({job.func_name}) expired from the artifact store "
+                               "and cannot be rebuilt – submit the job again")
+        return
+    if job_payload.readable(job.args[1]):
+        return
+    import report_pipeline
+    report_id = job.args[0]
+    raw = report_pipeline.load_artifact(report_id, "briefing.json", connection=connection)
+    if raw is None:
+        raise RuntimeError(f"payload of {job.id} expired and no briefing stored for {report_id}")
+    job.args = (report_id, job_payload.pack(json.loads(raw)), *job.args[2:])
+    log.info("dead letters: re-packed expired payload of %s from briefing.json", job.id)
+
+
+def _requeue_one(connection: Any, queue: str, job: Job) -> None:
+    registry = FailedJobRegistry(queue, connection=connection)
+    _refresh_payload(connection, job)
+    policy = policy_for(stage_of(job))
+    retry = policy.rq_retry()
+    job.retries_left = retry.max if retry else None
+    job.retry_intervals = retry.intervals if retry else None
+    job.save()
+    lane = (job.meta or {}).get("lane")
+    if lane:
+        import fair_queue
+        registry.remove(job, delete_job=False)
+        fair_queue.restage(connection, job)
+    else:
+        registry.requeue(job)
+
+
+def requeue(connection: Any, queues: Sequence[str], job_ids: Optional[Sequence[str]] = None,
+            stage: Optional[str] = None, exception: Optional[str] = None) -> Dict[str, Any]:
+    """Requeues the given ids, or every dead job matching the filters.
+
+    {"requeued": n, "missing": [ids], "errors": {id: reason}} – failed requeues are in both."""
+    done, missing, errors = 0, [], {}
+    if job_ids:
+        targets = []
+        for job_id in job_ids:
+            hit = _find(connection, job_id)
+            if hit is None:
+                missing.append(job_id)
+            else:
+                targets.append(hit)
+    else:
+        targets = [(n, j) for n, j in _iter_dead(connection, queues) if _matches(describe(j, n), stage, exception)]
+    for name, job in targets:
+        try:
+            _requeue_one(connection, name, job)
+            done += 1
+        except Exception as exc:
+            log.warning("requeue of %s failed: %s", job.id, exc)
+            missing.append(job.id)
+            errors[job.id] = str(exc)[:300]
+    log.info("dead letters: requeued %d job(s)", done)
+    return {"requeued": done, "missing": missing, "errors": errors}
+
+
+def delete(connection: Any, job_id: str) -> bool:
+    hit = _find(connection, job_id)
+    if hit is None:
+        return False
+    FailedJobRegistry(hit[0], connection=connection).remove(hit[1], delete_job=True)
+    return True
+
+
+__all__ = ["list_dead", "get_dead", "requeue", "delete", "summary", "describe"]
@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+"""
+Priority lanes and per-tenant fairness for report jobs.
+
+Lanes are separate RQ queues; workers listen in priority order (RQ_QUEUES), so an
+interactive job never waits behind bulk work:
+
+    interactive   RQ_QUEUE_REPORTS          (default "reports")      – POST /api/briefing
+    batch         RQ_QUEUE_REPORTS_BATCH    (default "reports-batch") – partner imports, offline batches
+    maintenance   RQ_QUEUE_REPORTS_MAINT    (default "reports-maint") – resumes, re-runs
+
+Inside a lane jobs are not pushed to RQ directly. They are staged per tenant
+(partner id or e-mail) and released by deficit round robin, only FAIR_READY_DEPTH
+at a time: 200 briefings from one partner and one from a single user alternate
+instead of queueing FIFO. Weights per tenant: FAIR_TENANT_WEIGHTS="partner-a:3,default:1".
+A tenant with FAIR_INTERACTIVE_MAX_PENDING or more staged interactive jobs is demoted
+to the batch lane.
+
+Tenant and lane are decided on the server (`caller_of`): a partner authenticated by
+its token (FAIR_PARTNER_TOKENS="partner-a:<token>", header X-Partner-Token or Bearer)
+is its own tenant and may pick a lane (X-Report-Lane / "lane"); the admin token may
+also name a tenant (X-Tenant-Id / "tenant"). Public submissions always go to the
+interactive lane as tenant = normalised e-mail, whatever the request claims.
+
+Redis layout per lane:
+    fair:<lane>:ring        LIST  tenants with staged jobs (head = next)
+    fair:<lane>:t:<tenant>  LIST  staged job ids
+    fair:<lane>:deficit     HASH  tenant → remaining credit
+    fair:job:<job_id>       STR   "<lane>|<tenant>" (position lookup)
+
+Staged jobs are real RQ jobs with status "deferred", so dependent pipeline stages
+can be enqueued against them right away. pump() runs on submit and after every
+finished job (FairWorkerMixin).
+"""
+from __future__ import annotations
+
+import hmac
+import logging
+import math
+import os
+import secrets
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from rq import Queue, Worker
+from rq.job import Job, JobStatus
+
+from queue_metrics import MetricsSimpleWorker, MetricsWorker, histogram
+from retry_policy import RetryPolicyWorkerMixin
+
+log = logging.getLogger("fair_queue")
+
+LANES = ("interactive", "batch", "maintenance")
+LANE_QUEUES = {
+    "interactive": os.getenv("RQ_QUEUE_REPORTS", "reports"),
+    "batch": os.getenv("RQ_QUEUE_REPORTS_BATCH", "reports-batch"),
+    "maintenance": os.getenv("RQ_QUEUE_REPORTS_MAINT", "reports-maint"),
+}
+READY_DEPTH = int(os.getenv("FAIR_READY_DEPTH", "2"))
+INTERACTIVE_MAX_PENDING = int(os.getenv("FAIR_INTERACTIVE_MAX_PENDING", "5"))
+MARKER_TTL = int(os.getenv("FAIR_MARKER_TTL", str(7 * 86400)))
+LOCK_TIMEOUT = 10
+
+
+def _parse_weights(raw: str) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for part in raw.split(","):
+        if ":" in part:
+            k, v = part.rsplit(":", 1)
+            try:
+                out[k.strip().lower()] = max(0.1, float(v))
+            except ValueError:
+                log.warning("FAIR_TENANT_WEIGHTS: invalid weight %r", part)
+    return out
+
+
+WEIGHTS = _parse_weights(os.getenv("FAIR_TENANT_WEIGHTS", "default:1"))
+
+
+def _parse_tokens(raw: str) -> Dict[str, str]:
+    """"partner-a:<token>,…" → {token: partner}"""
+    out: Dict[str, str] = {}
+    for part in raw.split(","):
+        if ":" in part:
+            k, v = part.split(":", 1)
+            if k.strip() and v.strip():
+                out[v.strip()] = k.strip()[:64].lower()
+    return out
+
+
+PARTNER_TOKENS = _parse_tokens(os.getenv("FAIR_PARTNER_TOKENS", ""))
+ADMIN_TOKEN = os.getenv("ADMIN_API_TOKEN", "").strip()
+
+
+def weight(tenant: str) -> float:
+    return WEIGHTS.get(tenant, WEIGHTS.get("default", 1.0))
+
+
+def caller_of(headers: Any = None) -> Optional[str]:
+    """'admin', die Partner-ID eines gültigen Partner-Tokens oder None (öffentlich)."""
+    if headers is None:
+        return None
+    token = (headers.get("x-admin-token") or headers.get("x-partner-token") or "").strip()
+    auth = headers.get("authorization") or ""
+    if not token and auth.lower().startswith("bearer "):
+        token = auth.split(" ", 1)[1].strip()
+    if not token:
+        return None
+    if ADMIN_TOKEN and hmac.compare_digest(token, ADMIN_TOKEN):
+        return "admin"
+    for known, partner in PARTNER_TOKENS.items():
+        if hmac.compare_digest(token, known):
+            return partner
+    return None
+
+
+def _email_tenant(data: Dict[str, Any]) -> str:
+    email = data.get("email") or data.get("user_email")
+    if not isinstance(email, str) or "@" not in email:
+        return "anonymous"
+    local, _, domain = email.strip().lower().rpartition("@")
+    return f"{local.split('+', 1)[0]}@{domain}"  # a+1@x, a+2@x → ein Mandant
+
+
+def tenant_of(data: Dict[str, Any], headers: Any = None) -> str:
+    """Partner-ID des authentifizierten Aufrufers, sonst normalisierte E-Mail, sonst 'anonymous'.
+
+    Nur der Admin-Token darf einen Mandanten benennen (X-Tenant-Id, "tenant"/"partner")."""
+    caller = caller_of(headers)
+    if caller is None:
+        return _email_tenant(data)
+    if caller != "admin":
+        return caller
+    val = (headers.get("x-tenant-id") or "").strip()
+    for key in ("tenant", "tenant_id", "partner", "partner_id"):
+        if val:
+            break
+        raw = data.get(key)
+        val = raw.strip() if isinstance(raw, str) else ""
+    return val[:64].lower() if val else "admin"
+
+
+def lane_of(data: Dict[str, Any], headers: Any = None, default: str = "interactive") -> str:
+    """Gewünschte Lane (X-Report-Lane / "lane") nur für Partner und Admin; öffentlich immer `default`."""
+    if caller_of(headers) is None:
+        return default
+    val = (headers.get("x-report-lane") or "").strip().lower()
+    val = val or str(data.get("lane") or "").strip().lower()
+    return val if val in LANES else default
+
+
+def _k(lane: str, *parts: str) -> str:
+    return ":".join(("fair", lane) + parts)
+
+
+def _s(v: Any) -> Optional[str]:
+    return v.decode("utf-8") if isinstance(v, bytes) else v
+
+
+@contextmanager
+def _lane_lock(connection: Any, lane: str) -> Iterator[None]:
+    """SET NX EX mit Token; kurze Haltezeit, daher einfaches Polling."""
+    key, token = _k(lane, "lock"), secrets.token_hex(8)
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while not connection.set(key, token, nx=True, ex=LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"fair_queue: lock for lane {lane} not acquired")
+        time.sleep(0.01)
+    try:
+        yield
+    finally:
+        if _s(connection.get(key)) == token:
+            connection.delete(key)
+
+
+def lane_queue(connection: Any, lane: str, **kwargs: Any) -> Queue:
+    return Queue(LANE_QUEUES[lane], connection=connection, **kwargs)
+
+
+def staged_count(connection: Any, lane: str, tenant: Optional[str] = None) -> int:
+    if tenant is not None:
+        return int(connection.llen(_k(lane, "t", tenant)))
+    return sum(int(connection.llen(_k(lane, "t", t))) for t in _ring(connection, lane))
+
+
+def _ring(connection: Any, lane: str) -> List[str]:
+    return [_s(t) for t in connection.lrange(_k(lane, "ring"), 0, -1)]
+
+
+def choose_lane(connection: Any, lane: str, tenant: str) -> str:
+    """Demotes bulk senders from the interactive lane."""
+    if lane == "interactive" and staged_count(connection, "interactive", tenant) >= INTERACTIVE_MAX_PENDING:
+        log.info("tenant %s has %d staged interactive jobs → batch lane", tenant, INTERACTIVE_MAX_PENDING)
+        return "batch"
+    return lane
+
+
+def submit(connection: Any, lane: str, tenant: str, func: Any, *args: Any,
+           job_id: Optional[str] = None, job_timeout: Optional[int] = None, **options: Any) -> Job:
+    """Creates the job (status deferred), stages it for `tenant` and pumps the lane."""
+    q = lane_queue(connection, lane)
+    meta = dict(options.pop("meta", None) or {}, lane=lane, tenant=tenant)
+    job = q.create_job(func, args=args, job_id=job_id, timeout=job_timeout, meta=meta,
+                       status=JobStatus.DEFERRED, **options)
+    _stage(connection, lane, tenant, job, q)
+    return job
+
+
+def restage(connection: Any, job: Job) -> None:
+    """Stages an existing job again (dead-letter requeue); lane/tenant from job.meta."""
+    lane = job.meta.get("lane") if job.meta.get("lane") in LANES else "batch"
+    job.started_at = job.ended_at = None
+    job.set_status(JobStatus.DEFERRED)
+    _stage(connection, lane, job.meta.get("tenant") or "anonymous", job, lane_queue(connection, lane))
+
+
+def _stage(connection: Any, lane: str, tenant: str, job: Job, q: Queue) -> None:
+    with _lane_lock(connection, lane):
+        with connection.pipeline() as pipe:
+            job.save(pipeline=pipe)
+            pipe.rpush(_k(lane, "t", tenant), job.id)
+            pipe.set(f"fair:job:{job.id}", f"{lane}|{tenant}", ex=MARKER_TTL)
+            pipe.execute()
+        if tenant not in _ring(connection, lane):
+            connection.rpush(_k(lane, "ring"), tenant)
+        _pump_locked(connection, lane, q)
+
+
+def _pump_locked(connection: Any, lane: str, q: Queue) -> int:
+    ring, dkey = _k(lane, "ring"), _k(lane, "deficit")
+    moved = 0
+    while q.count < READY_DEPTH:
+        tenant = _s(connection.lindex(ring, 0))
+        if tenant is None:
+            break
+        tkey = _k(lane, "t", tenant)
+        deficit = float(connection.hget(dkey, tenant) or 0)
+        if deficit < 1:
+            deficit += weight(tenant)
+        job_id = _s(connection.lpop(tkey))
+        if job_id is None:
+            connection.lpop(ring)
+            connection.hdel(dkey, tenant)
+            continue
+        deficit -= 1
+        if not connection.llen(tkey):
+            connection.lpop(ring)
+            connection.hdel(dkey, tenant)
+        else:
+            connection.hset(dkey, tenant, deficit)
+            if deficit < 1:  # Guthaben aufgebraucht → nächster Mandant
+                connection.lmove(ring, ring, "LEFT", "RIGHT")
+        try:
+            job = Job.fetch(job_id, connection=connection)
+        except Exception:  # gelöscht oder abgelaufen
+            continue
+        if job.get_status(refresh=False) != JobStatus.DEFERRED:
+            continue
+        job.set_status(JobStatus.QUEUED)
+        q.enqueue_job(job)
+        moved += 1
+    return moved
+
+
+def pump(connection: Any, lane: str) -> int:
+    """Moves staged jobs into the lane's RQ queue until FAIR_READY_DEPTH; returns the count."""
+    q = lane_queue(connection, lane)
+    try:
+        with _lane_lock(connection, lane):
+            return _pump_locked(connection, lane, q)
+    except Exception as exc:
+        log.warning("fair_queue: pump %s failed: %s", lane, exc)
+        return 0
+
+
+def pump_all(connection: Any) -> int:
+    return sum(pump(connection, lane) for lane in LANES)
+
+
+# ---------- position / ETA ----------
+
+def _ahead_in_ring(connection: Any, lane: str, tenant: str, index: int) -> int:
+    """Jobs other tenants get released before the (index+1)-th staged job of `tenant`."""
+    own = weight(tenant)
+    rounds = (index + 1) / own
+    ahead = 0
+    for other in _ring(connection, lane):
+        if other != tenant:
+            ahead += min(staged_count(connection, lane, other), int(rounds * weight(other)))
+    return ahead
+
+
+def _avg_run_seconds(connection: Any, queue: str) -> Optional[float]:
+    h = histogram(connection, queue, "run")
+    return h["sum"] / h["count"] if h["count"] else None
+
+
+def position(connection: Any, job_id: str) -> Optional[Dict[str, Any]]:
+    """{lane, state, position, eta_seconds} for a staged or queued job; None otherwise.
+
+    position counts the jobs that will start before this one, including those in
+    higher-priority lanes. The ETA assumes the lane's mean run time (rq_job_run_seconds)
+    and the workers currently listening on the lane; None without history or workers.
+    """
+    marker = _s(connection.get(f"fair:job:{job_id}"))
+    if not marker:
+        return None
+    lane, tenant = marker.split("|", 1)
+    try:
+        job = Job.fetch(job_id, connection=connection)
+    except Exception:
+        return None
+    status = job.get_status(refresh=False)
+    q = lane_queue(connection, lane)
+    if status == JobStatus.QUEUED:
+        pos, state = job.get_position() or 0, "queued"
+    elif status == JobStatus.DEFERRED:
+        ids = [_s(x) for x in connection.lrange(_k(lane, "t", tenant), 0, -1)]
+        if job_id not in ids:
+            return None
+        idx = ids.index(job_id)
+        pos, state = q.count + idx + _ahead_in_ring(connection, lane, tenant, idx), "staged"
+    else:
+        return None
+    for higher in LANES[:LANES.index(lane)]:
+        pos += lane_queue(connection, higher).count + staged_count(connection, higher)
+
+    eta = None
+    avg = _avg_run_seconds(connection, q.name)
+    workers = Worker.count(queue=q)
+    if avg is not None and workers:
+        eta = round(math.ceil((pos + 1) / workers) * avg)
+    return {"lane": lane, "state": state, "position": pos, "eta_seconds": eta}
+
+
+# ---------- workers ----------
+
+class FairWorkerMixin:
+    """Refills the lane from the staging area whenever a lane job ends and drains the mail outbox."""
+
+    def _refill(self, job: Job) -> None:
+        lane = (job.meta or {}).get("lane")
+        if lane in LANES:
+            pump(self.connection, lane)
+        import mail_outbox
+        mail_outbox.worker_drain(self.connection)  # Mails des Jobs gleich versenden
+
+    def handle_job_success(self, job, queue, started_job_registry):
+        super().handle_job_success(job, queue, started_job_registry)
+        self._refill(job)
+
+    def handle_job_failure(self, job, queue, started_job_registry=None, exc_string=""):
+        super().handle_job_failure(job, queue, started_job_registry=started_job_registry, exc_string=exc_string)
+        self._refill(job)
+
+    def run_maintenance_tasks(self):
+        super().run_maintenance_tasks()
+        pump_all(self.connection)  # Sicherheitsnetz, falls ein Pump-Aufruf ausfiel
+        import report_store
+        report_store.maybe_sweep()  # Aufbewahrung der Job-Verzeichnisse auf diesem Host
+        import mail_outbox
+        mail_outbox.worker_drain(self.connection)  # fällige Retries ohne eigenen Mailer
+
+
+class FairWorker(FairWorkerMixin, RetryPolicyWorkerMixin, MetricsWorker):
+    pass
+
+
+class FairSimpleWorker(FairWorkerMixin, RetryPolicyWorkerMixin, MetricsSimpleWorker):
+    pass
+
+
+__all__ = ["LANES", "LANE_QUEUES", "submit", "restage", "pump", "pump_all", "position", "choose_lane",
+           "tenant_of", "lane_of", "staged_count", "FairWorkerMixin", "FairWorker", "FairSimpleWorker"]
@@ -8,11 +8,12 @@ for funding even when the live layer has no results.
 """
 from __future__ import annotations
 
-import csv
 from dataclasses import dataclass, asdict
 from pathlib import Path
 from typing import Any, Dict, List
 
+import data_snapshot
+
 DATA_DIR = Path("data")
 CSV_BASELINE = DATA_DIR / "foerder_baseline.csv"
 
@@ -30,22 +31,18 @@ class FundingItem:
 
 def _read_csv(path: Path) -> List[FundingItem]:
     items: List[FundingItem] = []
-    if not path.exists():
-        return items
-    with path.open("r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            items.append(FundingItem(
-                title=(row.get("name") or row.get("title") or "").strip(),
-                url=(row.get("link") or row.get("url") or "").strip(),
-                source=(row.get("sponsor") or "Förderprogramm").strip(),
-                region=(row.get("region") or "DE").strip(),
-                type=(row.get("foerderart") or row.get("type") or "").strip(),
-                rate=(row.get("rate") or "").strip(),
-                cap_eur=(row.get("cap_eur") or "").strip(),
-                date=(row.get("updated") or "").strip(),
-                notes=(row.get("notes") or "").strip(),
-            ))
+    for row in data_snapshot.read_csv(path):
+        items.append(FundingItem(
+            title=(row.get("name") or row.get("title") or "").strip(),
+            url=(row.get("link") or row.get("url") or "").strip(),
+            source=(row.get("sponsor") or "Förderprogramm").strip(),
+            region=(row.get("region") or "DE").strip(),
+            type=(row.get("foerderart") or row.get("type") or "").strip(),
+            rate=(row.get("rate") or "").strip(),
+            cap_eur=(row.get("cap_eur") or "").strip(),
+            date=(row.get("updated") or "").strip(),
+            notes=(row.get("notes") or "").strip(),
+        ))
     return items
 
 def load_baseline() -> List[FundingItem]:
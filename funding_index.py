@@ -0,0 +1,443 @@
+# filename: funding_index.py
+# -*- coding: utf-8 -*-
+"""
+Vorberechneter Förder-Index (einmal beim Start aufgebaut).
+
+Führt alle Förderquellen zu einem Katalog zusammen:
+  - ENHANCED_FUNDING_DATABASE.FUNDING_PROGRAMS_2025 (inkl. fit_small/fit_medium)
+  - data/foerderprogramme.csv   (kuratierte Länderprogramme)
+  - data/funding_whitelist.csv  (via funding_loader)
+  - data/foerdermittel.csv
+  - data/foerder_baseline.csv   (via funding_baseline_fallback)
+  - Kernprogramme, die bisher in gpt_analyze.get_funding_programs hart kodiert waren
+
+Pro Dimension (Bundesland, Größenklasse, Use-Case) hält der Index ein Bitset über
+alle Programme (Bit i == Programm i). Ein Briefing zu matchen ist damit ein paar
+bitweise ANDs plus Top-k über vorberechnete Scores. Die Scores folgen der Logik
+von match_funding_programs_smart (Fit + Regional-/Status-/Erfolgsquoten-Bonus).
+
+Usage:
+    from funding_index import get_funding_index
+    idx = get_funding_index()
+    idx.match({"bundesland_code": "DE-BE", "unternehmensgroesse": "solo"}, k=5)
+    idx.match_many(briefings, k=5)      # Batch/Analytics
+"""
+from __future__ import annotations
+
+import heapq
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import data_snapshot
+
+log = logging.getLogger("funding_index")
+
+DATA_DIR = Path(os.getenv("DATA_DIR") or Path(os.getcwd()) / "data")
+
+BUNDESLAENDER: Tuple[str, ...] = (
+    "BW", "BY", "BE", "BB", "HB", "HH", "HE", "MV",
+    "NI", "NW", "RP", "SL", "SN", "ST", "SH", "TH",
+)
+SIZE_CLASSES: Tuple[str, ...] = ("solo", "team", "kmu")
+USE_CASES: Tuple[str, ...] = (
+    "digitalisierung", "ki", "beratung", "innovation", "forschung",
+    "gruendung", "it_sicherheit", "marketing", "qualifizierung", "investition",
+)
+
+_STATE_NAMES = {
+    "baden-württemberg": "BW", "baden-wuerttemberg": "BW", "bayern": "BY", "berlin": "BE",
+    "brandenburg": "BB", "bremen": "HB", "hamburg": "HH", "hessen": "HE",
+    "mecklenburg-vorpommern": "MV", "niedersachsen": "NI", "nordrhein-westfalen": "NW",
+    "nrw": "NW", "rheinland-pfalz": "RP", "saarland": "SL", "sachsen": "SN",
+    "sachsen-anhalt": "ST", "schleswig-holstein": "SH", "thüringen": "TH", "thueringen": "TH",
+}
+
+_USE_CASE_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "digitalisierung": ("digital", "software", "hardware", "e-commerce", "prozess"),
+    "ki": ("ki", "ai", "künstliche intelligenz", "machine learning"),
+    "beratung": ("beratung", "coaching", "consulting"),
+    "innovation": ("innovation", "technologie", "transfer", "patent"),
+    "forschung": ("f&e", "forschung", "entwicklung", "ikt"),
+    "gruendung": ("gründ", "start-up", "startup", "wachstum"),
+    "it_sicherheit": ("it-sicherheit", "cyber", "sicherheit"),
+    "marketing": ("marketing", "markterschließung", "vertrieb", "handel"),
+    "qualifizierung": ("qualifizierung", "weiterbildung", "schulung"),
+    "investition": ("investition", "kredit", "darlehen"),
+}
+
+# Heuristische Basis-Fits für Quellen ohne fit_small/fit_medium
+_SOURCE_FIT = {
+    "enhanced_db": 70,
+    "foerderprogramme": 75,
+    "whitelist": 75,
+    "foerdermittel": 70,
+    "core": 65,
+    "baseline": 60,
+}
+
+# Ehemals hart kodiert in gpt_analyze.get_funding_programs
+CORE_PROGRAMS: Tuple[Dict[str, str], ...] = (
+    {"name": "Digital Jetzt", "amount": "50.000€", "region": "DE", "url": "https://www.bmwk.de/digital-jetzt",
+     "requirements": "KMU", "use_case": "Digitalisierung, Qualifizierung"},
+    {"name": "go-digital", "amount": "16.500€", "region": "DE", "url": "https://www.bmwk.de/go-digital",
+     "requirements": "KMU bis 100 Mitarbeiter", "use_case": "Digitalisierung, IT-Sicherheit, Online-Marketing"},
+    {"name": "Digitalprämie Berlin", "amount": "17.000€", "region": "BE", "url": "https://www.ibb.de/digitalpraemie",
+     "requirements": "Berliner KMU", "use_case": "Digitalisierung, KI"},
+    {"name": "Digitalbonus Bayern", "amount": "10.000€", "region": "BY", "url": "https://www.stmwi.bayern.de/digitalbonus",
+     "requirements": "Bayerische KMU", "use_case": "Digitalisierung, IT-Sicherheit"},
+    {"name": "Mittelstand Innovativ NRW", "amount": "15.000€", "region": "NW", "url": "https://www.mittelstand-innovativ.nrw",
+     "requirements": "NRW KMU", "use_case": "Innovation, Digitalisierung"},
+)
+
+
+# ============== NORMALISIERUNG ==============
+
+def normalize_region(value: Any) -> str:
+    """'DE-BE', 'BE', 'Berlin', 'nrw' → 'BE'/'NW'; bundesweit/unbekannt → 'DE'."""
+    s = str(value or "").strip()
+    if not s:
+        return "DE"
+    up = s.upper()
+    if up.startswith("DE-"):
+        up = up[3:]
+    if up in BUNDESLAENDER:
+        return up
+    return _STATE_NAMES.get(s.lower(), "DE")
+
+
+def normalize_size(value: Any) -> str:
+    """Formular-/Freitext-Größen auf die Klassen solo/team/kmu abbilden."""
+    s = str(value or "").strip().lower()
+    if not s or s in ("1", "solo") or "solo" in s or "selbst" in s or "freiberuf" in s:
+        return "solo"
+    if s.startswith("2-10") or s.startswith("team") or s in ("klein", "small") or "kleines team" in s:
+        return "team"
+    return "kmu"
+
+
+def _slug_name(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "", name.lower().replace("ä", "ae").replace("ö", "oe").replace("ü", "ue"))
+
+
+def _bit(values: Sequence[str], value: str) -> int:
+    try:
+        return 1 << values.index(value)
+    except ValueError:
+        return 0
+
+
+def _use_case_mask(text: str) -> int:
+    t = text.lower()
+    mask = 0
+    for uc, words in _USE_CASE_KEYWORDS.items():
+        # Kurze Kürzel (KI/AI) nur als ganzes Wort, sonst Teilstring
+        if any(re.search(rf"\b{re.escape(w)}\b", t) if len(w) <= 2 else w in t for w in words):
+            mask |= _bit(USE_CASES, uc)
+    return mask or (1 << len(USE_CASES)) - 1  # ohne Signal: für alle Use-Cases offen
+
+
+def _size_mask(text: str) -> int:
+    t = text.lower()
+    if not t or "aller größen" in t:
+        return (1 << len(SIZE_CLASSES)) - 1
+    mask = 0
+    if any(w in t for w in ("solo", "freiberuf", "kleinst", "gründer", "start-up", "selbst")):
+        mask |= _bit(SIZE_CLASSES, "solo") | _bit(SIZE_CLASSES, "team")
+    if any(w in t for w in ("kmu", "mittelstand", "mitarbeiter", "unternehmen", "handwerk", "midcap")):
+        mask |= (1 << len(SIZE_CLASSES)) - 1
+    return mask or (1 << len(SIZE_CLASSES)) - 1
+
+
+# ============== PROGRAMME ==============
+
+@dataclass
+class FundingProgram:
+    name: str
+    url: str
+    region: str = "DE"
+    provider: str = ""
+    amount: str = ""
+    deadline: str = ""
+    requirements: str = ""
+    use_case: str = ""
+    status: str = ""
+    source: str = ""
+    size_mask: int = 0
+    use_case_mask: int = 0
+    scores: Dict[str, int] = field(default_factory=dict)
+
+    def as_item(self, size_class: str = "solo") -> Dict[str, Any]:
+        """Render-fähiges Dict (kompatibel zu gpt_analyze.get_funding_programs)."""
+        return {
+            "name": self.name,
+            "title": self.name,
+            "provider": self.provider,
+            "max_funding": self.amount,
+            "amount": self.amount,
+            "eligibility": self.requirements,
+            "deadline": self.deadline,
+            "url": self.url,
+            "region": "Bundesweit" if self.region == "DE" else self.region,
+            "source": self.source,
+            "final_score": self.scores.get(size_class, 0),
+        }
+
+
+def _score(fit_small: int, fit_medium: int, *, regional: bool, active: bool, success_rate: int) -> Dict[str, int]:
+    """Scores pro Größenklasse analog match_funding_programs_smart."""
+    out: Dict[str, int] = {}
+    for size in SIZE_CLASSES:
+        s = fit_small if size in ("solo", "team") else fit_medium
+        if regional:
+            s += 10
+        if active:
+            s += 5
+        if not regional and success_rate > 80:
+            s += 5
+        out[size] = s
+    return out
+
+
+def _from_enhanced_db() -> List[FundingProgram]:
+    try:
+        from ENHANCED_FUNDING_DATABASE import FUNDING_PROGRAMS_2025  # type: ignore
+    except Exception as exc:
+        log.info("ENHANCED_FUNDING_DATABASE nicht verfügbar: %s", exc)
+        return []
+    out: List[FundingProgram] = []
+    for region_key, progs in FUNDING_PROGRAMS_2025.items():
+        region = "DE" if region_key == "bundesweit" else normalize_region(region_key)
+        fit_default = _SOURCE_FIT["enhanced_db"]
+        for p in progs:
+            out.append(FundingProgram(
+                name=p.get("name", ""),
+                url=p.get("url", ""),
+                region=region,
+                provider=p.get("provider", ""),
+                amount=p.get("amount", ""),
+                deadline=p.get("deadline", ""),
+                requirements=p.get("requirements", ""),
+                use_case=p.get("use_case", ""),
+                status=p.get("status", ""),
+                source="enhanced_db",
+                size_mask=(1 << len(SIZE_CLASSES)) - 1,
+                use_case_mask=_use_case_mask(p.get("use_case", "")),
+                scores=_score(
+                    int(p.get("fit_small", fit_default)), int(p.get("fit_medium", fit_default)),
+                    regional=region != "DE", active=p.get("status") == "AKTIV",
+                    success_rate=int(p.get("success_rate", 0) or 0),
+                ),
+            ))
+    return out
+
+
+def _read_rows(path: Path) -> List[Dict[str, str]]:
+    try:
+        return data_snapshot.read_csv(path)
+    except Exception as exc:
+        log.warning("CSV nicht lesbar %s: %s", path, exc)
+        return []
+
+
+def _make(source: str, *, name: str, url: str, region: Any, provider: str = "", amount: str = "",
+          deadline: str = "", target: str = "", use_case: str = "", status: str = "") -> FundingProgram:
+    reg = normalize_region(region)
+    fit = _SOURCE_FIT[source]
+    return FundingProgram(
+        name=name, url=url, region=reg, provider=provider, amount=amount, deadline=deadline,
+        requirements=target, use_case=use_case, status=status, source=source,
+        size_mask=_size_mask(target), use_case_mask=_use_case_mask(f"{use_case} {name}"),
+        scores=_score(fit, fit, regional=reg != "DE", active=status.lower() in ("offen", "aktiv"), success_rate=0),
+    )
+
+
+def _from_csv_sources(data_dir: Path) -> List[FundingProgram]:
+    out: List[FundingProgram] = []
+    for r in _read_rows(data_dir / "foerderprogramme.csv"):
+        out.append(_make(
+            "foerderprogramme", name=r.get("Programmname", ""), url=r.get("Website", ""),
+            region=r.get("Region_Code") or r.get("Bundesland"), provider=r.get("Fördergeber", ""),
+            amount=r.get("Förderhöhe", ""), deadline=r.get("Deadline", ""), target=r.get("Zielgruppe", ""),
+            use_case=f"{r.get('Förderbereich', '')} {r.get('Kurzbeschreibung', '')}", status=r.get("Status", ""),
+        ))
+    for r in _read_rows(data_dir / "funding_whitelist.csv"):
+        cap = r.get("cap_eur", "")
+        out.append(_make(
+            "whitelist", name=r.get("title", ""), url=r.get("url", ""), region=r.get("region"),
+            provider=r.get("sponsor", ""), amount=f"Bis {cap} €" if cap.isdigit() else r.get("rate", ""),
+            target=r.get("notes", ""), use_case=r.get("notes", ""),
+        ))
+    for r in _read_rows(data_dir / "foerdermittel.csv"):
+        out.append(_make(
+            "foerdermittel", name=r.get("name", ""), url=r.get("link", "") or r.get("", "").split(",")[-1].strip(),
+            region=r.get("region"), amount=r.get("foerderart", ""), target=r.get("zielgruppe", ""),
+            use_case=f"{r.get('einsatz', '')} {r.get('', '')}",
+        ))
+    try:
+        from funding_baseline_fallback import _read_csv as _read_baseline  # type: ignore
+        for it in _read_baseline(data_dir / "foerder_baseline.csv"):
+            out.append(_make(
+                "baseline", name=it.title, url=it.url, region=it.region, provider=it.source,
+                amount=it.type, target="kmu", use_case=it.notes,
+            ))
+    except Exception as exc:
+        log.info("Baseline-Fallback nicht verfügbar: %s", exc)
+    return out
+
+
+def _from_core() -> List[FundingProgram]:
+    return [_make("core", name=p["name"], url=p["url"], region=p["region"], amount=p["amount"],
+                  target=p["requirements"], use_case=p["use_case"]) for p in CORE_PROGRAMS]
+
+
+# ============== INDEX ==============
+
+class FundingIndex:
+    """Bitset-Index über alle Förderprogramme."""
+
+    def __init__(self, programs: Iterable[FundingProgram]) -> None:
+        # Dedupe per normalisiertem Namen; erste Quelle gewinnt (Reihenfolge = Qualität)
+        seen: Dict[str, FundingProgram] = {}
+        for p in programs:
+            key = _slug_name(p.name)
+            if p.name and p.url and key not in seen:
+                seen[key] = p
+        self.programs: List[FundingProgram] = list(seen.values())
+        n = len(self.programs)
+        self.all_bits = (1 << n) - 1
+        self.nationwide_bits = 0
+        self.region_bits: Dict[str, int] = {bl: 0 for bl in BUNDESLAENDER}
+        self.size_bits: Dict[str, int] = {s: 0 for s in SIZE_CLASSES}
+        self.use_case_bits: Dict[str, int] = {u: 0 for u in USE_CASES}
+        for i, p in enumerate(self.programs):
+            b = 1 << i
+            if p.region == "DE":
+                self.nationwide_bits |= b
+            elif p.region in self.region_bits:
+                self.region_bits[p.region] |= b
+            for j, s in enumerate(SIZE_CLASSES):
+                if p.size_mask & (1 << j):
+                    self.size_bits[s] |= b
+            for j, u in enumerate(USE_CASES):
+                if p.use_case_mask & (1 << j):
+                    self.use_case_bits[u] |= b
+        # Scores je Größenklasse als dichte Liste (Index == Bitposition)
+        self.scores: Dict[str, List[int]] = {s: [p.scores.get(s, 0) for p in self.programs] for s in SIZE_CLASSES}
+        log.info("Förder-Index aufgebaut: %d Programme", n)
+
+    def __len__(self) -> int:
+        return len(self.programs)
+
+    @staticmethod
+    def _use_cases_of(briefing: Dict[str, Any]) -> List[str]:
+        raw = briefing.get("ki_usecases") or briefing.get("use_cases") or []
+        if isinstance(raw, str):
+            raw = [raw]
+        found: List[str] = []
+        for it in raw:
+            mask = _use_case_mask(str(it))
+            if mask != (1 << len(USE_CASES)) - 1:
+                found.extend(u for j, u in enumerate(USE_CASES) if mask & (1 << j))
+        return sorted(set(found))
+
+    def key_for(self, briefing: Dict[str, Any]) -> Tuple[str, str, Tuple[str, ...]]:
+        b = briefing
+        if isinstance(b.get("answers"), dict):
+            b = {**b, **b["answers"]}
+        region = normalize_region(b.get("bundesland_code") or b.get("bundesland") or b.get("state"))
+        size = normalize_size(b.get("unternehmensgroesse") or b.get("company_size") or b.get("size"))
+        return region, size, tuple(self._use_cases_of(b))
+
+    def eligible_bits(self, region: str, size: str, use_cases: Sequence[str] = ()) -> int:
+        bits = (self.nationwide_bits | self.region_bits.get(region, 0)) & self.size_bits.get(size, self.all_bits)
+        if use_cases:
+            uc = 0
+            for u in use_cases:
+                uc |= self.use_case_bits.get(u, 0)
+            if bits & uc:
+                bits &= uc
+        return bits
+
+    def _top_k(self, bits: int, size: str, k: int) -> List[int]:
+        scores = self.scores.get(size) or self.scores["kmu"]
+        idx = []
+        i = 0
+        while bits:
+            if bits & 1:
+                idx.append(i)
+            bits >>= 1
+            i += 1
+        return heapq.nlargest(k, idx, key=lambda j: (scores[j], -j))
+
+    def match_key(self, region: str, size: str, use_cases: Sequence[str] = (), k: int = 8) -> List[Dict[str, Any]]:
+        top = self._top_k(self.eligible_bits(region, size, use_cases), size, k)
+        return [self.programs[j].as_item(size) for j in top]
+
+    def match(self, briefing: Dict[str, Any], k: int = 8) -> List[Dict[str, Any]]:
+        region, size, use_cases = self.key_for(briefing)
+        return self.match_key(region, size, use_cases, k)
+
+    def match_many(self, briefings: Iterable[Dict[str, Any]], k: int = 8) -> List[List[Dict[str, Any]]]:
+        """Batch-Matching; identische (Region, Größe, Use-Cases) werden nur einmal berechnet."""
+        memo: Dict[Tuple[str, str, Tuple[str, ...]], List[Dict[str, Any]]] = {}
+        out: List[List[Dict[str, Any]]] = []
+        for b in briefings:
+            key = self.key_for(b)
+            if key not in memo:
+                memo[key] = self.match_key(*key, k=k)
+            out.append([dict(it) for it in memo[key]])
+        return out
+
+    def summarize(self, briefings: Iterable[Dict[str, Any]], k: int = 8) -> Dict[str, Any]:
+        """Analytics: wie oft wird welches Programm gematcht, wie viele Briefings bleiben ohne Treffer."""
+        counts: Dict[str, int] = {}
+        total = empty = 0
+        for items in self.match_many(briefings, k=k):
+            total += 1
+            if not items:
+                empty += 1
+            for it in items:
+                counts[it["name"]] = counts.get(it["name"], 0) + 1
+        ranking = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))
+        return {"briefings": total, "without_match": empty, "programs": dict(ranking)}
+
+
+def build_funding_index(data_dir: Optional[Path] = None) -> FundingIndex:
+    d = Path(data_dir) if data_dir else DATA_DIR
+    return FundingIndex(_from_enhanced_db() + _from_csv_sources(d) + _from_core())
+
+
+_INDEX: Optional[FundingIndex] = None
+_LOCK = threading.Lock()
+
+
+def get_funding_index() -> FundingIndex:
+    """Prozessweiter Index; wird beim ersten Zugriff (bzw. im Startup-Hook) gebaut."""
+    global _INDEX
+    if _INDEX is None:
+        with _LOCK:
+            if _INDEX is None:
+                _INDEX = build_funding_index()
+    return _INDEX
+
+
+def reset_funding_index() -> None:
+    global _INDEX
+    with _LOCK:
+        _INDEX = None
+
+
+__all__ = [
+    "FundingIndex",
+    "FundingProgram",
+    "build_funding_index",
+    "get_funding_index",
+    "reset_funding_index",
+    "normalize_region",
+    "normalize_size",
+]
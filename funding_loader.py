@@ -13,26 +13,20 @@ region: 'DE' (landesoffen), 'BE' (Berlin), 'BY' (Bayern) etc.
 
 from __future__ import annotations
 
-import csv
 import os
 from datetime import datetime
 from typing import Dict, List
 
+import data_snapshot
+
 DATA_DIR = os.path.abspath(os.getenv("DATA_DIR") or os.path.join(os.getcwd(), "data"))
 
 def _read_csv(path: str) -> List[Dict[str, str]]:
-    out: List[Dict[str, str]] = []
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            for row in csv.DictReader(f):
-                row = {k.strip(): (v or "").strip() for k, v in row.items()}
-                if row.get("title") and row.get("url"):
-                    out.append(row)
-    except FileNotFoundError:
-        return []
+        rows = data_snapshot.read_csv(path)
     except Exception:
         return []
-    return out
+    return [r for r in rows if r.get("title") and r.get("url")]
 
 def _parse_dt(s: str) -> datetime:
     try:
@@ -14,7 +14,11 @@ from datetime import date
 from typing import Any, Dict, List, Optional
 from pathlib import Path
 from functools import lru_cache
-import json, re, os, logging, httpx
+from collections import OrderedDict
+import json, re, os, logging, hashlib, threading, time
+
+import http_clients
+import load_governor
 
 # Optional hybrid search
 try:
@@ -22,6 +26,18 @@ try:
 except Exception:
     websearch_utils = None
 
+# Vorberechneter Förder-Index
+try:
+    import funding_index
+except Exception:
+    funding_index = None
+
+# Vorgeladene Benchmark-Tabelle
+try:
+    import benchmark_repository
+except Exception:
+    benchmark_repository = None
+
 # Source helpers
 try:
     from utils_sources import classify_source, filter_and_rank
@@ -66,12 +82,17 @@ SEARCH_DAYS_NEWS = int(os.getenv("SEARCH_DAYS_NEWS","30"))
 SEARCH_DAYS_TOOLS = int(os.getenv("SEARCH_DAYS_TOOLS","60"))
 SEARCH_DAYS_FUNDING = int(os.getenv("SEARCH_DAYS_FUNDING","60"))
 LIVE_MAX_ITEMS = int(os.getenv("LIVE_MAX_ITEMS","8"))
+FUNDING_TOP_K = int(os.getenv("FUNDING_TOP_K","6"))
 
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY","")
 SERPAPI_KEY = os.getenv("SERPAPI_KEY","")
 
 ROI_BASELINE_MONTHS = float(os.getenv("ROI_BASELINE_MONTHS","4"))
 
+# Overlay-Cache für die Lastreduktion (load_governor.py, Tier "reduced")
+OVERLAY_CACHE_SIZE = int(os.getenv("OVERLAY_CACHE_SIZE","256"))
+OVERLAY_CACHE_TTL = float(os.getenv("OVERLAY_CACHE_TTL","86400"))
+
 # ============== HELPER FUNKTIONEN ==============
 
 def _read_text(path: Path) -> str:
@@ -286,6 +307,12 @@ def normalize_briefing(raw: Dict[str,Any], lang: str = "de") -> Normalized:
 
 def _load_benchmarks(branche: str, groesse: str) -> Dict[str, float]:
     """Lädt branchenspezifische Benchmarks"""
+    if benchmark_repository is not None:
+        try:
+            return benchmark_repository.get_benchmark_repository().get(branche, groesse)
+        except Exception as e:
+            log.warning(f"Benchmark-Repository nicht verfügbar: {e}")
+
     # Versuche spezifische Benchmarks zu laden
     patterns = [
         f"benchmarks_{branche}_{groesse}",
@@ -321,39 +348,41 @@ class ScorePack:
     weights: Dict[str, float]
     benchmarks: Dict[str, float]
 
+KPI_ORDER = ("digitalisierung", "automatisierung", "compliance", "prozessreife", "innovation")
+
 def compute_scores(n: Normalized) -> ScorePack:
     """Berechnet Scores mit Branchenbenchmarks"""
-    weights = {
-        "digitalisierung": 0.2,
-        "automatisierung": 0.2,
-        "compliance": 0.2,
-        "prozessreife": 0.2,
-        "innovation": 0.2
-    }
-    
-    bm = _load_benchmarks(n.branche, n.unternehmensgroesse)
-    
-    vals = {
-        "digitalisierung": n.kpi_digitalisierung,
-        "automatisierung": n.kpi_automatisierung,
-        "compliance": n.kpi_compliance,
-        "prozessreife": n.kpi_prozessreife,
-        "innovation": n.kpi_innovation
-    }
-    
-    kpis: Dict[str, Dict[str,float]] = {}
-    total = 0.0
-    
-    for k, v in vals.items():
-        m = float(bm.get(k, 60.0))
-        d = float(v) - m
-        kpis[k] = {"value": float(v), "benchmark": m, "delta": d}
-        total += weights[k] * float(v)
-    
-    t = int(round(total))
-    badge = "EXCELLENT" if t >= 85 else "GOOD" if t >= 70 else "FAIR" if t >= 55 else "BASIC"
-    
-    return ScorePack(total=t, badge=badge, kpis=kpis, weights=weights, benchmarks=bm)
+    return compute_scores_many([n])[0]
+
+def compute_scores_many(ns: List[Normalized]) -> List[ScorePack]:
+    """
+    Batch-Scoring: Benchmarks einmal je (Branche, Größe) laden,
+    Gesamtscores spaltenweise über alle Briefings berechnen.
+    """
+    weights = {k: 0.2 for k in KPI_ORDER}
+    
+    bms: Dict[tuple, Dict[str, float]] = {}
+    for n in ns:
+        key = (n.branche, n.unternehmensgroesse)
+        if key not in bms:
+            bms[key] = _load_benchmarks(*key)
+    
+    cols = {k: [float(getattr(n, f"kpi_{k}")) for n in ns] for k in KPI_ORDER}
+    totals = [0.0] * len(ns)
+    for k in KPI_ORDER:
+        totals = [t + weights[k] * v for t, v in zip(totals, cols[k])]
+    
+    packs: List[ScorePack] = []
+    for i, n in enumerate(ns):
+        bm = bms[(n.branche, n.unternehmensgroesse)]
+        kpis: Dict[str, Dict[str,float]] = {}
+        for k in KPI_ORDER:
+            m = float(bm.get(k, 60.0))
+            kpis[k] = {"value": cols[k][i], "benchmark": m, "delta": cols[k][i] - m}
+        t = int(round(totals[i]))
+        badge = "EXCELLENT" if t >= 85 else "GOOD" if t >= 70 else "FAIR" if t >= 55 else "BASIC"
+        packs.append(ScorePack(total=t, badge=badge, kpis=kpis, weights=dict(weights), benchmarks=bm))
+    return packs
 
 # ============== BUSINESS CASE ==============
 
@@ -400,6 +429,34 @@ def business_case(n: Normalized) -> BusinessCase:
 
 # ============== LLM INTEGRATION ==============
 
+def openai_payload(messages: List[Dict[str,str]], model: Optional[str] = None, max_tokens: Optional[int] = None) -> Dict[str,Any]:
+    """Request-Body für /v1/chat/completions (auch für die Batch-API)"""
+    return {
+        "model": model or OPENAI_MODEL,
+        "messages": messages,
+        "max_tokens": int(max_tokens or OPENAI_MAX_TOKENS),
+        "temperature": GPT_TEMPERATURE,
+        "top_p": 0.95
+    }
+
+def anthropic_payload(messages: List[Dict[str,str]], model: Optional[str] = None, max_tokens: int = 1500) -> Dict[str,Any]:
+    """Request-Body für /v1/messages (auch für Message Batches)"""
+    sys = ""
+    user_content = ""
+    for m in messages:
+        role = m.get("role","")
+        if role == "system":
+            sys = m.get("content","")
+        elif role == "user":
+            user_content += m.get("content","") + "\n"
+    
+    return {
+        "model": model or CLAUDE_MODEL,
+        "max_tokens": max_tokens,
+        "system": sys,
+        "messages": [{"role":"user","content": user_content}]
+    }
+
 def _openai_chat(messages: List[Dict[str,str]], model: Optional[str] = None, max_tokens: Optional[int] = None) -> str:
     """OpenAI API Aufruf"""
     if not OPENAI_API_KEY:
@@ -412,22 +469,19 @@ def _openai_chat(messages: List[Dict[str,str]], model: Optional[str] = None, max
         "Content-Type": "application/json"
     }
     
-    payload = {
-        "model": model or OPENAI_MODEL,
-        "messages": messages,
-        "max_tokens": int(max_tokens or OPENAI_MAX_TOKENS),
-        "temperature": GPT_TEMPERATURE,
-        "top_p": 0.95
-    }
+    payload = openai_payload(messages, model, max_tokens)
     
+    t0 = time.perf_counter()
     try:
-        with httpx.Client(timeout=OPENAI_TIMEOUT) as cli:
+        with http_clients.client("openai", OPENAI_TIMEOUT) as cli:
             r = cli.post(url, headers=headers, json=payload)
             r.raise_for_status()
             data = r.json()
             content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+            load_governor.record_provider("openai", time.perf_counter() - t0, True)
             return _strip_llm(content)
     except Exception as exc:
+        load_governor.record_provider("openai", time.perf_counter() - t0, False)
         log.warning("OpenAI call failed: %s", exc)
         return ""
 
@@ -443,24 +497,11 @@ def _anthropic_chat(messages: List[Dict[str,str]], model: Optional[str] = None,
         "content-type": "application/json"
     }
     
-    sys = ""
-    user_content = ""
-    for m in messages:
-        role = m.get("role","")
-        if role == "system":
-            sys = m.get("content","")
-        elif role == "user":
-            user_content += m.get("content","") + "\n"
-    
-    payload = {
-        "model": model or CLAUDE_MODEL,
-        "max_tokens": max_tokens,
-        "system": sys,
-        "messages": [{"role":"user","content": user_content}]
-    }
+    payload = anthropic_payload(messages, model, max_tokens)
     
+    t0 = time.perf_counter()
     try:
-        with httpx.Client(timeout=ANTHROPIC_TIMEOUT) as cli:
+        with http_clients.client("anthropic", ANTHROPIC_TIMEOUT) as cli:
             r = cli.post(url, headers=headers, json=payload)
             r.raise_for_status()
             data = r.json() or {}
@@ -468,8 +509,10 @@ def _anthropic_chat(messages: List[Dict[str,str]], model: Optional[str] = None,
             for block in data.get("content", []):
                 if block.get("type") == "text":
                     content += block.get("text","")
+            load_governor.record_provider("anthropic", time.perf_counter() - t0, True)
             return _strip_llm(content)
     except Exception as exc:
+        load_governor.record_provider("anthropic", time.perf_counter() - t0, False)
         log.warning("Anthropic call failed: %s", exc)
         return ""
 
@@ -477,9 +520,14 @@ def render_overlay(name: str, lang: str, ctx: Dict[str,Any], critical_fields: Di
     """
     WICHTIG: Rendert Overlay mit GARANTIERTER Nutzung der kritischen Felder
     """
+    messages = overlay_messages(name, lang, ctx, critical_fields)
+    return complete_overlay(name, messages) if messages else ""
+
+def overlay_messages(name: str, lang: str, ctx: Dict[str,Any], critical_fields: Dict[str, str]) -> List[Dict[str,str]]:
+    """Baut die Chat-Nachrichten eines Overlays; [] wenn kein Prompt existiert"""
     prompt = _load_prompt_cached(lang, name)
     if not prompt:
-        return ""
+        return []
     
     # KRITISCHE FELDER EXTRAHIEREN
     branche = critical_fields.get("branche", "Beratung")
@@ -524,26 +572,75 @@ CRITICAL - These parameters MUST be considered in your response:
 All recommendations must be specific to {branche} and appropriate for {groesse}.
 Answer as clean HTML fragment without <html>/<head>/<body> tags."""
     
-    messages = [
+    return [
         {"role": "system", "content": system},
         {"role": "user", "content": prompt}
     ]
-    
-    # Provider-Auswahl
+
+def overlay_model(name: str, provider: str) -> str:
+    if provider == "anthropic":
+        return CLAUDE_MODEL if name != "executive_summary" else EXEC_SUMMARY_MODEL
+    return EXEC_SUMMARY_MODEL if name == "executive_summary" else OPENAI_MODEL
+
+def overlay_provider() -> str:
     provider = OVERLAY_PROVIDER
     if provider == "auto":
         provider = "anthropic" if ANTHROPIC_API_KEY else "openai"
+    return provider
+
+def complete_overlay(name: str, messages: List[Dict[str,str]]) -> str:
+    """LLM-Aufruf für ein Overlay inkl. Provider-Fallback (offene Circuit-Breaker werden übersprungen)"""
+    # Provider-Auswahl
+    provider = overlay_provider()
+    allow = load_governor.HEALTH.allow
     
+    out = ""
     if provider == "anthropic":
-        out = _anthropic_chat(messages, CLAUDE_MODEL if name != "executive_summary" else EXEC_SUMMARY_MODEL)
-        if not out and OPENAI_API_KEY:
+        if allow("anthropic"):
+            out = _anthropic_chat(messages, overlay_model(name, provider))
+        if not out and OPENAI_API_KEY and allow("openai"):
             out = _openai_chat(messages, OPENAI_MODEL, OPENAI_MAX_TOKENS)
     else:
-        out = _openai_chat(messages, EXEC_SUMMARY_MODEL if name == "executive_summary" else OPENAI_MODEL, OPENAI_MAX_TOKENS)
-        if not out and ANTHROPIC_API_KEY:
+        if allow("openai"):
+            out = _openai_chat(messages, overlay_model(name, provider), OPENAI_MAX_TOKENS)
+        if not out and ANTHROPIC_API_KEY and allow("anthropic"):
             out = _anthropic_chat(messages, CLAUDE_MODEL)
     
-    return _minify_html_soft(_as_fragment(out))
+    return finish_overlay(out)
+
+_OVERLAY_CACHE: "OrderedDict[str, tuple]" = OrderedDict()
+_OVERLAY_CACHE_LOCK = threading.Lock()
+
+def _overlay_key(name: str, messages: List[Dict[str,str]]) -> str:
+    blob = json.dumps([name, messages], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def cached_overlay(name: str, messages: List[Dict[str,str]], use_cache: bool = False) -> str:
+    """
+    complete_overlay() mit LRU-Cache (je Prozess): Ergebnisse werden immer abgelegt,
+    gelesen nur mit use_cache=True (Tier "reduced"). Schlüssel sind die vollständigen
+    Nachrichten – jedes Overlay enthält Briefing und Hauptleistung der Firma, ein
+    Treffer entsteht also nur für denselben Report (Retry, Resume), nie firmenübergreifend.
+    """
+    key = _overlay_key(name, messages)
+    if use_cache:
+        with _OVERLAY_CACHE_LOCK:
+            hit = _OVERLAY_CACHE.get(key)
+            if hit and time.monotonic() - hit[0] < OVERLAY_CACHE_TTL:
+                _OVERLAY_CACHE.move_to_end(key)
+                return hit[1]
+    out = complete_overlay(name, messages)
+    if out:
+        with _OVERLAY_CACHE_LOCK:
+            _OVERLAY_CACHE[key] = (time.monotonic(), out)
+            _OVERLAY_CACHE.move_to_end(key)
+            while len(_OVERLAY_CACHE) > OVERLAY_CACHE_SIZE:
+                _OVERLAY_CACHE.popitem(last=False)
+    return out
+
+def finish_overlay(text: str) -> str:
+    """Rohantwort eines Providers → sauberes HTML-Fragment"""
+    return _minify_html_soft(_as_fragment(_strip_llm(text)))
 
 # ============== LIVE-DATEN INTEGRATION ==============
 
@@ -728,7 +825,21 @@ def generate_tool_recommendations(n: Normalized) -> List[Dict[str, Any]]:
     return tools
 
 def get_funding_programs(n: Normalized) -> List[Dict[str, Any]]:
-    """Holt bundeslandspezifische Förderprogramme"""
+    """Holt bundeslandspezifische Förderprogramme (vorberechneter Förder-Index)"""
+    if funding_index is not None:
+        try:
+            items = funding_index.get_funding_index().match({**n.raw, **{
+                "bundesland_code": n.bundesland_code,
+                "unternehmensgroesse": n.unternehmensgroesse,
+            }}, k=FUNDING_TOP_K)
+            if items:
+                return items
+        except Exception as exc:
+            log.warning("Förder-Index nicht verfügbar: %s", exc)
+    return _static_funding_programs(n)
+
+def _static_funding_programs(n: Normalized) -> List[Dict[str, Any]]:
+    """Statischer Fallback, falls der Förder-Index nicht geladen werden kann"""
     programs = []
     
     # Bundesweite Programme
@@ -774,10 +885,71 @@ def get_funding_programs(n: Normalized) -> List[Dict[str, Any]]:
 
 # ============== HAUPTFUNKTIONEN ==============
 
-def build_html_report(raw: Dict[str,Any], lang: str = "de") -> Dict[str,Any]:
+OVERLAY_NAMES = (
+    "executive_summary", "quick_wins", "roadmap", "risks",
+    "compliance", "business", "recommendations"
+)
+
+@dataclass
+class ReportDraft:
+    """Alles vor den LLM-Overlays – im Batch-Modus werden die Overlays gebündelt"""
+    raw: Dict[str,Any]
+    critical_fields: Dict[str, str]
+    n: Normalized
+    score: ScorePack
+    ctx: Dict[str,Any]
+    live_data_available: bool
+
+def _llm_providers() -> List[str]:
+    return [p for p, key in (("openai", OPENAI_API_KEY), ("anthropic", ANTHROPIC_API_KEY)) if key]
+
+def build_html_report(raw: Dict[str,Any], lang: str = "de", tier: Optional[str] = None) -> Dict[str,Any]:
     """
     Hauptfunktion: Erstellt vollständigen HTML-Report
     GARANTIERT Nutzung der kritischen Felder!
+
+    tier: full | reduced | minimal – ohne Angabe entscheidet load_governor anhand
+    von Queue-Wartezeit und Provider-Zustand. Das Tier steht in meta["tier"].
+    """
+    if tier is None:
+        decision = load_governor.decide(_llm_providers() or ["openai"], overlay_provider())
+        tier, reasons = decision["tier"], decision["reasons"]
+    else:
+        reasons = ["requested"]
+    
+    if tier == "minimal":
+        result = build_preview_report(raw, lang)
+    else:
+        live_data = {"news": [], "tools": [], "funding": []} if tier == "reduced" else None
+        draft = prepare_report(raw, lang, live_data=live_data)
+        
+        # 6. Overlays mit kritischen Feldern rendern
+        overlays = {}
+        for name in OVERLAY_NAMES:
+            messages = overlay_messages(name, lang, draft.ctx, draft.critical_fields)
+            overlays[name] = cached_overlay(name, messages, use_cache=tier == "reduced") if messages else ""
+        result = render_report(draft, lang, overlays)
+    
+    result["meta"].update(tier=tier, tier_reasons=reasons)
+    return result
+
+def build_preview_report(raw: Dict[str,Any], lang: str = "de") -> Dict[str,Any]:
+    """
+    Deterministische Vorschau ohne LLM und Live-Daten (Scores, Profil, Template).
+    Millisekunden statt Minuten – für Lastspitzen (report_executor.py).
+    """
+    draft = prepare_report(raw, lang, live_data={"news": [], "tools": [], "funding": []})
+    result = render_report(draft, lang, {})
+    result["meta"]["preview"] = True
+    return result
+
+def prepare_report(raw: Dict[str,Any], lang: str = "de", *,
+                   n: Optional[Normalized] = None,
+                   score: Optional[ScorePack] = None,
+                   live_data: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> ReportDraft:
+    """
+    Schritte 1–5 des Reports. Batch-Läufe übergeben bereits berechnete
+    Normalisierung, Scores und (je Branche/Bundesland geteilte) Live-Daten.
     """
     log.info("=== Starte Report-Generierung ===")
     
@@ -785,14 +957,15 @@ def build_html_report(raw: Dict[str,Any], lang: str = "de") -> Dict[str,Any]:
     critical_fields = validate_and_extract_critical_fields(raw)
     
     # 2. Normalisierung mit kritischen Feldern
-    n = normalize_briefing(raw, lang=lang)
+    n = n or normalize_briefing(raw, lang=lang)
     
     # 3. Scoring & Business Case
-    score = compute_scores(n)
+    score = score or compute_scores(n)
     case = business_case(n)
     
     # 4. Live-Daten abrufen (wenn APIs verfügbar)
-    live_data = fetch_live_data(n, lang)
+    if live_data is None:
+        live_data = fetch_live_data(n, lang)
     news = live_data["news"]
     tools = live_data["tools"] or generate_tool_recommendations(n)
     funding = live_data["funding"] or get_funding_programs(n)
@@ -826,15 +999,12 @@ def build_html_report(raw: Dict[str,Any], lang: str = "de") -> Dict[str,Any]:
         "industry_snippet": f"Spezifisch für {n.branche_label} mit Fokus auf {n.hauptleistung}"
     }
     
-    # 6. Overlays mit kritischen Feldern rendern
-    overlays = {}
-    overlay_names = [
-        "executive_summary", "quick_wins", "roadmap", "risks",
-        "compliance", "business", "recommendations"
-    ]
-    
-    for name in overlay_names:
-        overlays[name] = render_overlay(name, lang, ctx, critical_fields)
+    return ReportDraft(raw=raw, critical_fields=critical_fields, n=n, score=score, ctx=ctx,
+                       live_data_available=bool(news or tools or funding))
+
+def render_report(draft: ReportDraft, lang: str, overlays: Dict[str, str]) -> Dict[str,Any]:
+    """Schritte 7–9: Template mit Overlays befüllen, Metadaten erzeugen"""
+    raw, critical_fields, n, score = draft.raw, draft.critical_fields, draft.n, draft.score
     
     # 7. Template laden und befüllen
     tpl = _template(lang)
@@ -868,7 +1038,7 @@ def build_html_report(raw: Dict[str,Any], lang: str = "de") -> Dict[str,Any]:
         "bundesland": n.bundesland_code,
         "kpis": score.kpis,
         "benchmarks": score.benchmarks,
-        "live_data_available": bool(news or tools or funding)
+        "live_data_available": draft.live_data_available
     }
     
     log.info(f"=== Report generiert für {n.branche}/{n.unternehmensgroesse} ===")
@@ -902,8 +1072,15 @@ __all__ = [
     "analyze_briefing",
     "build_report", 
     "build_html_report",
+    "build_preview_report",
+    "prepare_report",
+    "render_report",
+    "overlay_messages",
+    "complete_overlay",
+    "cached_overlay",
     "normalize_briefing",
     "compute_scores",
+    "compute_scores_many",
     "business_case",
     "validate_and_extract_critical_fields"
 ]
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide, pooled httpx clients (OpenAI, Anthropic, PDF service, search).
+
+Instead of opening a new TCP/TLS connection per call:
+
+    with http_clients.client("openai", OPENAI_TIMEOUT) as cli:
+        cli.post(...)
+
+The context manager does NOT close the client; connections stay in the pool for
+the next call. After os.fork() the child drops the inherited clients (sockets must
+not be shared between processes) and builds its own on first use; the SSL context
+(loading the CA bundle is the expensive part) is created once and survives the fork.
+
+ENV:
+  HTTP_MAX_CONNECTIONS            default 20
+  HTTP_MAX_KEEPALIVE_CONNECTIONS  default 10
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import ssl
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import httpx
+
+_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "20")),
+    max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10")),
+)
+
+_CLIENTS: Dict[Tuple[str, float], httpx.Client] = {}
+_LOCK = threading.Lock()
+_SSL_CONTEXT: Optional[ssl.SSLContext] = None
+
+
+def ssl_context() -> ssl.SSLContext:
+    global _SSL_CONTEXT
+    if _SSL_CONTEXT is None:
+        _SSL_CONTEXT = httpx.create_ssl_context()
+    return _SSL_CONTEXT
+
+
+def get_client(name: str, timeout: float = 30.0) -> httpx.Client:
+    key = (name, float(timeout))
+    cli = _CLIENTS.get(key)
+    if cli is None or cli.is_closed:
+        with _LOCK:
+            cli = _CLIENTS.get(key)
+            if cli is None or cli.is_closed:
+                cli = httpx.Client(timeout=timeout, limits=_LIMITS, verify=ssl_context())
+                _CLIENTS[key] = cli
+    return cli
+
+
+@contextmanager
+def client(name: str, timeout: float = 30.0) -> Iterator[httpx.Client]:
+    """Drop-in for `with httpx.Client(timeout=...) as cli:` that keeps the pool open."""
+    yield get_client(name, timeout)
+
+
+def warm(names: Sequence[str], timeout: float = 30.0) -> None:
+    for n in names:
+        get_client(n, timeout)
+
+
+def close_all() -> None:
+    with _LOCK:
+        for cli in _CLIENTS.values():
+            try:
+                cli.close()
+            except Exception:
+                pass
+        _CLIENTS.clear()
+
+
+def _forget_after_fork() -> None:
+    # Do not close: the sockets belong to the parent
+    global _LOCK
+    _CLIENTS.clear()
+    _LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_after_fork)
+atexit.register(close_all)
+
+__all__ = ["get_client", "client", "warm", "close_all"]
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Idempotente Briefing-Submission.
+
+Doppelklicks und Frontend-Retries sollen keine zweite LLM-Pipeline starten.
+Schlüssel (in dieser Reihenfolge):
+  1. Header `Idempotency-Key` bzw. `X-Idempotency-Key` des Clients, auf den
+     Aufrufer (E-Mail) beschränkt – fremde Clients mit gleichem Header-Wert
+     bekommen nie die job_id eines anderen
+  2. sha256 des normalisierten Briefings (Strings getrimmt, E-Mail klein,
+     Mehrfachauswahlen sortiert, flüchtige Felder wie Zeitstempel entfernt)
+
+`claim(key, job_id)` speichert key → job_id für IDEMPOTENCY_WINDOW_SECONDS
+(Default 3600) per Redis `SET NX EX` – atomar auch bei mehreren Web-Prozessen.
+Ohne Redis greift ein prozesslokaler Speicher. Ist der Schlüssel schon belegt,
+wird die vorhandene job_id zurückgegeben. Scheitert der Job endgültig, gibt
+`release_job(job_id)` den Schlüssel frei, damit der Nutzer erneut absenden kann.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+log = logging.getLogger("idempotency")
+
+WINDOW_SECONDS = int(os.getenv("IDEMPOTENCY_WINDOW_SECONDS", "3600"))
+KEY_PREFIX = "idem:briefing:"
+HEADERS = ("idempotency-key", "x-idempotency-key")
+# Felder, die sich bei einem Retry ändern, ohne dass sich das Briefing ändert
+VOLATILE_FIELDS = frozenset({
+    "timestamp", "submitted_at", "submittedAt", "ts", "_ts", "client_ts", "nonce",
+    "csrf", "csrf_token", "recaptcha", "g-recaptcha-response", "request_id",
+})
+
+
+def new_job_id() -> str:
+    """Zeitlich sortierbar und über Prozesse hinweg eindeutig."""
+    return f"job_{datetime.now().strftime('%Y%m%d%H%M%S')}_{secrets.token_hex(6)}"
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()
+                if k not in VOLATILE_FIELDS and v not in (None, "", [], {})}
+    if isinstance(value, (list, tuple, set)):
+        items = [_normalize(v) for v in value]
+        if all(isinstance(v, (str, int, float, bool)) for v in items):
+            # Mehrfachauswahl: Reihenfolge ohne Bedeutung
+            return sorted(items, key=lambda v: (type(v).__name__, str(v)))
+        return items
+    return value
+
+
+_EMAIL_FIELDS = ("email", "user_email", "to")
+
+
+def canonical_hash(data: Dict[str, Any]) -> str:
+    norm = _normalize(data)
+    for k in _EMAIL_FIELDS:
+        if isinstance(norm.get(k), str):
+            norm[k] = norm[k].lower()
+    raw = json.dumps(norm, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def request_key(headers: Any, data: Dict[str, Any], caller: Optional[str] = None) -> Tuple[str, str]:
+    """(key, source) – source ist 'header' oder 'body'; caller = E-Mail (Default: aus data)."""
+    for h in HEADERS:
+        val = (headers.get(h) or "").strip()
+        if val:
+            if caller is None:
+                caller = next((str(data[k]) for k in _EMAIL_FIELDS if data.get(k)), "")
+            scoped = f"{caller.strip().lower()}|{val[:256]}"
+            return "h:" + hashlib.sha256(scoped.encode("utf-8")).hexdigest(), "header"
+    return "b:" + canonical_hash(data), "body"
+
+
+# ---------- Speicher ----------
+
+_MEMORY: Dict[str, Tuple[str, float]] = {}
+_JOB = "job:"  # Rückverweis job_id → Schlüssel für release_job()
+_LOCK = threading.Lock()
+
+
+def _redis() -> Any:
+    if not os.getenv("REDIS_URL"):
+        return None
+    try:
+        from queue_utils import get_redis_connection
+        return get_redis_connection()
+    except Exception as exc:
+        log.warning("Idempotenz: Redis nicht verfügbar (%s) – prozesslokal", exc)
+        return None
+
+
+def _memory_claim(key: str, job_id: str, ttl: int) -> Optional[str]:
+    now = time.time()
+    with _LOCK:
+        hit = _MEMORY.get(key)
+        if hit and hit[1] > now:
+            return hit[0]
+        if len(_MEMORY) > 10000:
+            for k in [k for k, (_, exp) in _MEMORY.items() if exp <= now]:
+                del _MEMORY[k]
+        _MEMORY[key] = (job_id, now + ttl)
+        _MEMORY[_JOB + job_id] = (key, now + ttl)
+    return None
+
+
+def claim(key: str, job_id: str, ttl: Optional[int] = None, redis: Any = None) -> Optional[str]:
+    """Belegt `key` für `job_id`. None = neu; sonst die bereits vergebene job_id."""
+    ttl = WINDOW_SECONDS if ttl is None else ttl
+    redis = redis if redis is not None else _redis()
+    if redis is not None:
+        try:
+            full = KEY_PREFIX + key
+            if redis.set(full, job_id, nx=True, ex=ttl):
+                redis.set(KEY_PREFIX + _JOB + job_id, key, ex=ttl)
+                return None
+            existing = redis.get(full)
+            if existing:
+                return existing.decode("utf-8") if isinstance(existing, bytes) else str(existing)
+            # zwischen SET und GET abgelaufen → erneut versuchen
+            if redis.set(full, job_id, nx=True, ex=ttl):
+                redis.set(KEY_PREFIX + _JOB + job_id, key, ex=ttl)
+                return None
+            return job_id
+        except Exception as exc:
+            log.warning("Idempotenz: Redis-Fehler (%s) – prozesslokal", exc)
+    return _memory_claim(key, job_id, ttl)
+
+
+def release(key: str, job_id: str, redis: Any = None) -> None:
+    """Gibt den Schlüssel frei, falls die Submission nicht gestartet werden konnte."""
+    redis = redis if redis is not None else _redis()
+    if redis is not None:
+        try:
+            full = KEY_PREFIX + key
+            cur = redis.get(full)
+            if cur is not None and (cur.decode("utf-8") if isinstance(cur, bytes) else cur) == job_id:
+                redis.delete(full, KEY_PREFIX + _JOB + job_id)
+            return
+        except Exception:
+            pass
+    with _LOCK:
+        if _MEMORY.get(key, ("",))[0] == job_id:
+            _MEMORY.pop(key, None)
+            _MEMORY.pop(_JOB + job_id, None)
+
+
+def release_job(job_id: str, redis: Any = None) -> None:
+    """Gibt den Schlüssel eines endgültig gescheiterten Jobs frei (Worker/Hintergrund-Task)."""
+    redis = redis if redis is not None else _redis()
+    if redis is not None:
+        try:
+            key = redis.get(KEY_PREFIX + _JOB + job_id)
+            if key:
+                release(key.decode("utf-8") if isinstance(key, bytes) else str(key), job_id, redis=redis)
+            return
+        except Exception as exc:
+            log.warning("Idempotenz: Freigabe von %s fehlgeschlagen (%s)", job_id, exc)
+    with _LOCK:
+        key = _MEMORY.get(_JOB + job_id, ("",))[0]
+    if key:
+        release(key, job_id, redis=None)
+
+
+__all__ = ["new_job_id", "canonical_hash", "request_key", "claim", "release", "release_job", "WINDOW_SECONDS"]
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Job status as a compact Redis hash plus push notifications via pub/sub.
+
+Workers (and the web process for "queued") write state transitions with
+`publish(conn, job_id, **fields)`: one MULTI updates the hash jobstatus:<id>
+(TTL JOB_STATUS_TTL) and returns the complete snapshot, which is published on
+the channel jobstatus:<id>. Subscribers therefore always get the full state,
+never a diff they could apply out of order.
+
+Polling endpoints read the hash (`read`) instead of Job.fetch, artifact lookups
+or directory globs. Push endpoints (routes/job_status.py, SSE + WebSocket) use one
+pattern subscription per web process (`hub()`), fanned out to per-connection
+asyncio queues – a few hundred open streams cost one Redis connection.
+
+Field conventions: state (plain jobs), stage:<name> (JSON of the report
+pipeline stage status), has_pdf / download_available ("1"), result (JSON),
+updated_at. Publishing is best effort: a Redis outage must not fail a job.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Set
+
+log = logging.getLogger("job_events")
+
+PREFIX = "jobstatus:"
+STATUS_TTL = int(os.getenv("JOB_STATUS_TTL", str(2 * 86400)))
+SUBSCRIBER_QUEUE = 32
+TERMINAL = {"completed", "failed", "finished", "stopped", "canceled"}
+
+
+def key(job_id: str) -> str:
+    return f"{PREFIX}{job_id}"
+
+
+def _encode(value: Any) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return str(value)
+
+
+def _decode(raw: Dict[Any, Any]) -> Dict[str, str]:
+    return {(k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+            for k, v in (raw or {}).items()}
+
+
+def _connection(connection: Any = None) -> Any:
+    if connection is not None:
+        return connection
+    try:
+        from rq import get_current_job
+        job = get_current_job()
+        if job is not None:
+            return job.connection
+    except Exception:
+        pass
+    from queue_utils import get_redis_connection
+    return get_redis_connection()
+
+
+def publish(connection: Any, job_id: str, **fields: Any) -> Optional[Dict[str, str]]:
+    """Updates the status hash and pushes the snapshot; None if Redis is unavailable."""
+    fields["updated_at"] = f"{time.time():.3f}"
+    try:
+        conn = _connection(connection)
+        pipe = conn.pipeline(transaction=True)
+        pipe.hset(key(job_id), mapping={k: _encode(v) for k, v in fields.items() if v is not None})
+        pipe.expire(key(job_id), STATUS_TTL)
+        pipe.hgetall(key(job_id))
+        snapshot = _decode(pipe.execute()[-1])
+        conn.publish(key(job_id), json.dumps(snapshot, ensure_ascii=False))
+        return snapshot
+    except Exception as exc:
+        log.debug("status publish for %s failed: %s", job_id, exc)
+        return None
+
+
+def read(connection: Any, job_id: str) -> Dict[str, str]:
+    """Status hash of a job; {} if unknown or expired."""
+    return _decode(connection.hgetall(key(job_id)))
+
+
+def is_terminal(snapshot: Dict[str, Any]) -> bool:
+    return str(snapshot.get("state", "")) in TERMINAL
+
+
+# ---------- fan-out (web process) ----------
+
+class StatusHub:
+    """One psubscribe per event loop; events are dispatched to per-subscriber queues."""
+
+    def __init__(self, client: Any) -> None:
+        self._client = client
+        self._subs: Dict[str, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE)
+        self._subs.setdefault(job_id, set()).add(q)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return q
+
+    def unsubscribe(self, job_id: str, q: asyncio.Queue) -> None:
+        subs = self._subs.get(job_id)
+        if subs is not None:
+            subs.discard(q)
+            if not subs:
+                self._subs.pop(job_id, None)
+
+    def subscribers(self) -> int:
+        return sum(len(s) for s in self._subs.values())
+
+    def _dispatch(self, job_id: str, snapshot: Dict[str, Any]) -> None:
+        for q in list(self._subs.get(job_id, ())):
+            if q.full():  # langsamer Client: nur der neueste Stand zählt
+                q.get_nowait()
+            q.put_nowait(snapshot)
+
+    async def _resync(self) -> None:
+        # Events vor dem (Re-)psubscribe fehlen → aktuellen Stand nachreichen
+        for job_id in list(self._subs):
+            snapshot = _decode(await self._client.hgetall(key(job_id)))
+            if snapshot:
+                self._dispatch(job_id, snapshot)
+
+    async def _run(self) -> None:
+        backoff = 0.5
+        while self._subs:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(f"{PREFIX}*")
+                # auch beim ersten Start: stream() liest den Hash evtl. vor dem psubscribe
+                await self._resync()
+                backoff = 0.5
+                while self._subs:
+                    msg = await pubsub.get_message(timeout=1.0)
+                    if not msg or msg.get("type") != "pmessage":
+                        continue
+                    channel = msg["channel"]
+                    channel = channel.decode() if isinstance(channel, bytes) else channel
+                    try:
+                        self._dispatch(channel[len(PREFIX):], json.loads(msg["data"]))
+                    except ValueError:
+                        continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                log.warning("status hub lost Redis: %s (retry in %.1fs)", exc, backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+_HUBS: Dict[int, StatusHub] = {}
+
+
+def hub() -> StatusHub:
+    loop_id = id(asyncio.get_running_loop())
+    h = _HUBS.get(loop_id)
+    if h is None:
+        from redis_pool import get_async_redis
+        h = _HUBS[loop_id] = StatusHub(get_async_redis(decode=True))
+    return h
+
+
+def reset() -> None:
+    _HUBS.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset)
+
+
+async def stream(job_id: str, terminal: Callable[[Dict[str, Any]], bool] = is_terminal,
+                 heartbeat: float = 15.0, max_seconds: float = 1800.0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """Current snapshot, then every change until a terminal state; None = heartbeat.
+
+    The hub may still be connecting when the hash is read; it resyncs every
+    subscribed job after its psubscribe, so a change in between still arrives.
+    Snapshots not newer than the last one yielded (updated_at) are skipped."""
+    h = hub()
+    q = h.subscribe(job_id)
+    deadline = time.monotonic() + max_seconds
+    seen = ""
+    try:
+        snapshot = _decode(await h._client.hgetall(key(job_id)))
+        if snapshot:
+            yield snapshot
+            if terminal(snapshot):
+                return
+            seen = snapshot.get("updated_at", "")
+        while time.monotonic() < deadline:
+            try:
+                snapshot = await asyncio.wait_for(q.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            stamp = str(snapshot.get("updated_at", ""))
+            if seen and stamp and float(stamp) <= float(seen):
+                continue  # Resync-Duplikat oder überholter Stand
+            seen = stamp or seen
+            yield snapshot
+            if terminal(snapshot):
+                return
+    finally:
+        h.unsubscribe(job_id, q)
+
+
+__all__ = ["publish", "read", "stream", "hub", "is_terminal", "key", "StatusHub", "TERMINAL"]
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Compact RQ job payloads.
+
+RQ pickles job arguments into the job hash, and the default job description
+repeats them as repr(). A 300 KB `html` field therefore ends up in Redis twice
+per job. `pack()` is applied at enqueue time:
+
+  - string/bytes fields larger than JOB_PAYLOAD_INLINE_MAX (default 16 KB) go to
+    the artifact store (kind "payload"); the job only carries the reference
+  - smaller top-level bytes stay inline base64-encoded; bytes nested deeper are
+    rejected (TypeError) instead of being turned into their repr
+  - the remaining dict is zlib-compressed when its JSON exceeds
+    JOB_PAYLOAD_COMPRESS_MIN (default 2 KB)
+
+Jobs call `unpack()` first; it returns plain dicts unchanged, so jobs enqueued
+before this change keep working.
+
+Offloaded fields live as long as the "payload" retention (ARTIFACT_RETENTION, 1 day);
+dead letters can be requeued much later, so dead_letters.py checks `readable()`,
+re-packs analyze jobs from the stored briefing.json and refuses all other jobs.
+"""
+from __future__ import annotations
+
+import base64
+import json
+import logging
+import os
+import zlib
+from typing import Any, Dict, Optional
+
+log = logging.getLogger("job_payload")
+
+INLINE_MAX = int(os.getenv("JOB_PAYLOAD_INLINE_MAX", str(16 * 1024)))
+COMPRESS_MIN = int(os.getenv("JOB_PAYLOAD_COMPRESS_MIN", "2048"))
+
+_PACKED = "__packed__"
+_REF = "__artifact__"
+_B64 = "__b64__"
+
+
+def _offload(value: Any, store: Any, min_ttl: Optional[int] = None) -> Any:
+    if isinstance(value, str):
+        data, text = value.encode("utf-8"), True
+    elif isinstance(value, (bytes, bytearray)):
+        data, text = bytes(value), False
+    else:
+        return value
+    if len(data) <= INLINE_MAX:
+        return value if text else {_B64: base64.b64encode(data).decode("ascii")}
+    try:
+        ref = store.put(data, "text/plain; charset=utf-8" if text else "application/octet-stream",
+                        kind="payload", min_ttl=min_ttl)
+    except Exception as exc:
+        log.warning("Payload offload failed, keeping field inline: %s", exc)
+        return value
+    return {_REF: ref["sha256"], "text": text, "size": len(data)}
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (bytes, bytearray)):
+        raise TypeError("job_payload.pack: bytes are only supported as top-level fields")
+    return str(value)
+
+
+def pack(payload: Dict[str, Any], store: Any = None, min_ttl: Optional[int] = None) -> Dict[str, Any]:
+    """Enqueue-side: large fields → artifact references, rest optionally compressed.
+
+    min_ttl: keep offloaded fields at least this long (job timeout × attempts + backoff)."""
+    if store is None:
+        import artifact_store
+        store = artifact_store.get_store()
+    slim = {k: _offload(v, store, min_ttl) for k, v in payload.items()}
+    raw = json.dumps(slim, ensure_ascii=False, default=_json_default).encode("utf-8")
+    if len(raw) < COMPRESS_MIN:
+        return slim
+    return {_PACKED: 1, "z": zlib.compress(raw, 6)}
+
+
+def is_packed(payload: Any) -> bool:
+    return isinstance(payload, dict) and payload.get(_PACKED) == 1
+
+
+def unpack(payload: Dict[str, Any], store: Any = None) -> Dict[str, Any]:
+    """Job-side inverse of pack(); plain payloads pass through."""
+    if is_packed(payload):
+        payload = json.loads(zlib.decompress(payload["z"]).decode("utf-8"))
+    out: Dict[str, Any] = {}
+    for k, v in payload.items():
+        if isinstance(v, dict) and _REF in v:
+            if store is None:
+                import artifact_store
+                store = artifact_store.get_store()
+            data = store.read(v[_REF])
+            v = data.decode("utf-8") if v.get("text") else data
+        elif isinstance(v, dict) and _B64 in v and len(v) == 1:
+            v = base64.b64decode(v[_B64])
+        out[k] = v
+    return out
+
+
+def readable(payload: Any, store: Any = None) -> bool:
+    """False if an offloaded field is gone from the artifact store (retention expired)."""
+    if not isinstance(payload, dict):
+        return True
+    if is_packed(payload):
+        payload = json.loads(zlib.decompress(payload["z"]).decode("utf-8"))
+    refs = [v[_REF] for v in payload.values() if isinstance(v, dict) and _REF in v]
+    if not refs:
+        return True
+    if store is None:
+        import artifact_store
+        store = artifact_store.get_store()
+    return all(store.stat(digest) is not None for digest in refs)
+
+
+def describe(func_name: str, payload: Dict[str, Any], extra: Optional[str] = None) -> str:
+    """Short job description (RQ's default repeats the full arguments)."""
+    keys = ",".join(sorted(payload)) if not is_packed(payload) else "packed"
+    return f"{func_name}({extra + ', ' if extra else ''}<{keys}>)"
+
+
+__all__ = ["pack", "unpack", "is_packed", "readable", "describe"]
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Overlay-Completion für Batch-Läufe.
+
+`complete_many({custom_id: (overlay_name, messages)})` → {custom_id: html_fragment}
+
+  online           – direkte API-Aufrufe, BATCH_CONCURRENCY parallel (Default)
+  openai-batch     – OpenAI Batch API (/files + /batches), ~50 % günstiger, asynchron
+  anthropic-batch  – Anthropic Message Batches (/messages/batches), ebenso
+
+Die Provider-Batches sind für Offline-Läufe gedacht (Evals, Partner-Importe):
+Ergebnisse kommen nach Minuten bis Stunden. Einträge, die im Batch fehlschlagen,
+werden online nachgeholt. OPENAI_BASE_URL / ANTHROPIC_BASE_URL lassen sich auf
+einen lokalen Stand-in mit denselben Endpunkten umbiegen.
+
+ENV: BATCH_CONCURRENCY (4), BATCH_POLL_SECONDS (30), BATCH_MAX_WAIT_SECONDS (86400)
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+import http_clients
+
+log = logging.getLogger("llm_batch")
+
+CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", "30"))
+MAX_WAIT_SECONDS = float(os.getenv("BATCH_MAX_WAIT_SECONDS", "86400"))
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+ANTHROPIC_BASE_URL = os.getenv("ANTHROPIC_BASE_URL", "https://api.anthropic.com/v1").rstrip("/")
+
+Requests = Dict[str, Tuple[str, List[Dict[str, str]]]]
+
+
+class OnlineCompleter:
+    name = "online"
+
+    def __init__(self, concurrency: int = CONCURRENCY) -> None:
+        self.concurrency = max(1, concurrency)
+
+    def complete_many(self, requests: Requests) -> Dict[str, str]:
+        from gpt_analyze import complete_overlay
+        if not requests:
+            return {}
+        ids = list(requests)
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(ids)), thread_name_prefix="overlay") as ex:
+            outs = ex.map(lambda cid: complete_overlay(*requests[cid]), ids)
+            return dict(zip(ids, outs))
+
+
+class _ProviderBatch:
+    """Gemeinsamer Ablauf: einreichen → pollen → Ergebnisse lesen → Lücken online nachholen."""
+
+    name = ""
+
+    def __init__(self, client: Optional[httpx.Client] = None, poll_seconds: float = POLL_SECONDS,
+                 max_wait_seconds: float = MAX_WAIT_SECONDS, fallback: Any = None) -> None:
+        self.client = client or http_clients.get_client(self.name, 120.0)
+        self.poll_seconds = poll_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.fallback = fallback if fallback is not None else OnlineCompleter()
+
+    def complete_many(self, requests: Requests) -> Dict[str, str]:
+        from gpt_analyze import finish_overlay
+        if not requests:
+            return {}
+        batch_id = self.submit(requests)
+        log.info("%s: batch %s submitted (%d requests)", self.name, batch_id, len(requests))
+        deadline = time.monotonic() + self.max_wait_seconds
+        while True:
+            done, info = self.poll(batch_id)
+            if done:
+                break
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{self.name} batch {batch_id} not finished in time")
+            time.sleep(self.poll_seconds)
+        raw = self.results(info)
+        out = {cid: finish_overlay(text) for cid, text in raw.items() if cid in requests and text}
+        missing = {cid: requests[cid] for cid in requests if cid not in out}
+        if missing:
+            log.warning("%s: %d of %d requests without result – completing online",
+                        self.name, len(missing), len(requests))
+            out.update(self.fallback.complete_many(missing))
+        return out
+
+    def submit(self, requests: Requests) -> str:
+        raise NotImplementedError
+
+    def poll(self, batch_id: str) -> Tuple[bool, Dict[str, Any]]:
+        raise NotImplementedError
+
+    def results(self, info: Dict[str, Any]) -> Dict[str, str]:
+        raise NotImplementedError
+
+
+def _jsonl(text: str) -> List[Dict[str, Any]]:
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+class OpenAIBatchCompleter(_ProviderBatch):
+    name = "openai-batch"
+
+    def _headers(self) -> Dict[str, str]:
+        from gpt_analyze import OPENAI_API_KEY
+        return {"Authorization": f"Bearer {OPENAI_API_KEY}"}
+
+    def submit(self, requests: Requests) -> str:
+        from gpt_analyze import openai_payload, overlay_model
+        lines = [json.dumps({"custom_id": cid, "method": "POST", "url": "/v1/chat/completions",
+                             "body": openai_payload(msgs, overlay_model(name, "openai"))}, ensure_ascii=False)
+                 for cid, (name, msgs) in requests.items()]
+        r = self.client.post(f"{OPENAI_BASE_URL}/files", headers=self._headers(), data={"purpose": "batch"},
+                             files={"file": ("overlays.jsonl", "\n".join(lines).encode("utf-8"), "application/jsonl")})
+        r.raise_for_status()
+        r = self.client.post(f"{OPENAI_BASE_URL}/batches", headers=self._headers(), json={
+            "input_file_id": r.json()["id"], "endpoint": "/v1/chat/completions", "completion_window": "24h"})
+        r.raise_for_status()
+        return r.json()["id"]
+
+    def poll(self, batch_id: str) -> Tuple[bool, Dict[str, Any]]:
+        r = self.client.get(f"{OPENAI_BASE_URL}/batches/{batch_id}", headers=self._headers())
+        r.raise_for_status()
+        info = r.json()
+        return info.get("status") in ("completed", "failed", "expired", "cancelled"), info
+
+    def results(self, info: Dict[str, Any]) -> Dict[str, str]:
+        if not info.get("output_file_id"):
+            log.warning("openai-batch %s ended with status %s", info.get("id"), info.get("status"))
+            return {}
+        r = self.client.get(f"{OPENAI_BASE_URL}/files/{info['output_file_id']}/content", headers=self._headers())
+        r.raise_for_status()
+        out: Dict[str, str] = {}
+        for row in _jsonl(r.text):
+            resp = row.get("response") or {}
+            if resp.get("status_code") == 200:
+                choices = (resp.get("body") or {}).get("choices") or [{}]
+                out[row["custom_id"]] = (choices[0].get("message") or {}).get("content") or ""
+        return out
+
+
+class AnthropicBatchCompleter(_ProviderBatch):
+    name = "anthropic-batch"
+
+    def _headers(self) -> Dict[str, str]:
+        from gpt_analyze import ANTHROPIC_API_KEY
+        return {"x-api-key": ANTHROPIC_API_KEY, "anthropic-version": "2023-06-01"}
+
+    def submit(self, requests: Requests) -> str:
+        from gpt_analyze import anthropic_payload, overlay_model
+        body = {"requests": [{"custom_id": cid, "params": anthropic_payload(msgs, overlay_model(name, "anthropic"))}
+                             for cid, (name, msgs) in requests.items()]}
+        r = self.client.post(f"{ANTHROPIC_BASE_URL}/messages/batches", headers=self._headers(), json=body)
+        r.raise_for_status()
+        return r.json()["id"]
+
+    def poll(self, batch_id: str) -> Tuple[bool, Dict[str, Any]]:
+        r = self.client.get(f"{ANTHROPIC_BASE_URL}/messages/batches/{batch_id}", headers=self._headers())
+        r.raise_for_status()
+        info = r.json()
+        return info.get("processing_status") == "ended", info
+
+    def results(self, info: Dict[str, Any]) -> Dict[str, str]:
+        if not info.get("results_url"):
+            return {}
+        r = self.client.get(info["results_url"], headers=self._headers())
+        r.raise_for_status()
+        out: Dict[str, str] = {}
+        for row in _jsonl(r.text):
+            result = row.get("result") or {}
+            if result.get("type") == "succeeded":
+                blocks = (result.get("message") or {}).get("content") or []
+                out[row["custom_id"]] = "".join(b.get("text", "") for b in blocks if b.get("type") == "text")
+        return out
+
+
+COMPLETERS = {
+    "online": OnlineCompleter,
+    "openai-batch": OpenAIBatchCompleter,
+    "anthropic-batch": AnthropicBatchCompleter,
+}
+
+
+def get_completer(name: str = "online", **kwargs: Any) -> Any:
+    try:
+        return COMPLETERS[name](**kwargs)
+    except KeyError:
+        raise ValueError(f"unknown batch provider {name!r} (use one of {', '.join(COMPLETERS)})")
+
+
+__all__ = ["OnlineCompleter", "OpenAIBatchCompleter", "AnthropicBatchCompleter", "get_completer", "COMPLETERS"]
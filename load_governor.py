@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Load governor: picks a generation tier per report.
+
+    full     live search + all LLM overlays
+    reduced  no live search; overlays may come from the overlay cache
+    minimal  deterministic sections only (scores, profile, template) – no LLM
+
+Signals:
+    queue_wait_seconds     how long reports currently wait (own RQ wait, oldest job in
+                           the queue, or the in-process executor's estimate)
+    provider_latency       EWMA of LLM call duration of the preferred provider
+    breakers               circuit breaker per LLM provider (opens after
+                           PROVIDER_BREAKER_FAILURES consecutive failures for
+                           PROVIDER_BREAKER_COOLDOWN seconds, then half-open)
+
+Policy (env, seconds):
+    LOAD_TIER_REDUCED_WAIT (120)     LOAD_TIER_MINIMAL_WAIT (900)
+    LOAD_TIER_REDUCED_LATENCY (30)   LOAD_TIER_MINIMAL_LATENCY (90)
+    LOAD_TIER_FORCE                  full|reduced|minimal (Ops-Override)
+Preferred provider breaker open → reduced; all providers open → minimal.
+
+Provider health is per process (every worker judges its own calls).
+Try a policy against simulated load:
+    python load_governor.py --wait 300 --latency 12 --open openai
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+log = logging.getLogger("load_governor")
+
+TIERS = ("full", "reduced", "minimal")
+BREAKER_FAILURES = int(os.getenv("PROVIDER_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("PROVIDER_BREAKER_COOLDOWN", "60"))
+LATENCY_ALPHA = 0.2
+
+
+# ---------- provider health / circuit breaker ----------
+
+class ProviderHealth:
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN) -> None:
+        self.failures_to_open = max(1, failures)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._latency: Dict[str, float] = {}
+        self._failures: Dict[str, int] = {}
+        self._opened_at: Dict[str, float] = {}
+        self._probe_at: Dict[str, float] = {}  # laufender Probe-Aufruf im half_open
+
+    def record(self, provider: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self._probe_at.pop(provider, None)
+            prev = self._latency.get(provider)
+            self._latency[provider] = seconds if prev is None else (1 - LATENCY_ALPHA) * prev + LATENCY_ALPHA * seconds
+            if ok:
+                self._failures[provider] = 0
+                self._opened_at.pop(provider, None)
+            else:
+                self._failures[provider] = self._failures.get(provider, 0) + 1
+                if self._failures[provider] >= self.failures_to_open:
+                    if provider not in self._opened_at:
+                        log.warning("circuit breaker for %s opened after %d failures", provider, self._failures[provider])
+                    self._opened_at[provider] = time.monotonic()
+
+    def _state(self, provider: str) -> str:
+        opened = self._opened_at.get(provider)
+        if opened is None:
+            return "closed"
+        return "open" if time.monotonic() - opened < self.cooldown else "half_open"
+
+    def state(self, provider: str) -> str:
+        """closed | open | half_open (cooldown over: one call may probe)."""
+        with self._lock:
+            return self._state(provider)
+
+    def allow(self, provider: str) -> bool:
+        """closed: yes; open: no; half_open: only the first caller (the probe) until it records.
+
+        A probe that never records (killed worker) is replaced after another cooldown."""
+        with self._lock:
+            state = self._state(provider)
+            if state != "half_open":
+                return state == "closed"
+            now = time.monotonic()
+            probe = self._probe_at.get(provider)
+            if probe is not None and now - probe < self.cooldown:
+                return False
+            self._probe_at[provider] = now
+            return True
+
+    def latency(self, provider: str) -> Optional[float]:
+        with self._lock:
+            return self._latency.get(provider)
+
+    def providers(self) -> List[str]:
+        with self._lock:
+            return sorted(set(self._latency) | set(self._failures))
+
+    def snapshot(self, providers: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        return {p: {"state": self.state(p), "latency_seconds": self.latency(p),
+                    "consecutive_failures": self._failures.get(p, 0)} for p in providers}
+
+
+HEALTH = ProviderHealth()
+TIER_COUNTS: Dict[str, int] = {t: 0 for t in TIERS}
+
+
+def record_provider(provider: str, seconds: float, ok: bool) -> None:
+    HEALTH.record(provider, seconds, ok)
+
+
+# ---------- policy ----------
+
+@dataclass
+class LoadSignals:
+    queue_wait_seconds: float = 0.0
+    provider_latency_seconds: Optional[float] = None
+    breakers: Dict[str, str] = field(default_factory=dict)   # provider → closed|open|half_open
+    preferred_provider: str = ""
+
+
+@dataclass(frozen=True)
+class TierPolicy:
+    reduced_wait: float = 120.0
+    minimal_wait: float = 900.0
+    reduced_latency: float = 30.0
+    minimal_latency: float = 90.0
+    force: str = ""
+
+    @classmethod
+    def from_env(cls) -> "TierPolicy":
+        env = lambda k, d: float(os.getenv(k, str(d)))  # noqa: E731
+        force = os.getenv("LOAD_TIER_FORCE", "").strip().lower()
+        return cls(reduced_wait=env("LOAD_TIER_REDUCED_WAIT", 120), minimal_wait=env("LOAD_TIER_MINIMAL_WAIT", 900),
+                   reduced_latency=env("LOAD_TIER_REDUCED_LATENCY", 30),
+                   minimal_latency=env("LOAD_TIER_MINIMAL_LATENCY", 90),
+                   force=force if force in TIERS else "")
+
+
+def choose_tier(signals: LoadSignals, policy: Optional[TierPolicy] = None) -> Tuple[str, List[str]]:
+    """Pure function: (tier, reasons). The most degraded tier any signal asks for wins."""
+    policy = policy or TierPolicy.from_env()
+    if policy.force:
+        return policy.force, ["forced"]
+    level, reasons = 0, []
+
+    def want(tier: str, reason: str) -> None:
+        nonlocal level
+        level = max(level, TIERS.index(tier))
+        reasons.append(reason)
+
+    wait = signals.queue_wait_seconds
+    if wait >= policy.minimal_wait:
+        want("minimal", f"queue_wait {wait:.0f}s >= {policy.minimal_wait:.0f}s")
+    elif wait >= policy.reduced_wait:
+        want("reduced", f"queue_wait {wait:.0f}s >= {policy.reduced_wait:.0f}s")
+
+    lat = signals.provider_latency_seconds
+    if lat is not None:
+        if lat >= policy.minimal_latency:
+            want("minimal", f"provider_latency {lat:.1f}s >= {policy.minimal_latency:.0f}s")
+        elif lat >= policy.reduced_latency:
+            want("reduced", f"provider_latency {lat:.1f}s >= {policy.reduced_latency:.0f}s")
+
+    states = signals.breakers
+    if states and all(s == "open" for s in states.values()):
+        want("minimal", "all provider breakers open")
+    elif states.get(signals.preferred_provider) == "open":
+        want("reduced", f"breaker {signals.preferred_provider} open")
+    return TIERS[level], reasons
+
+
+# ---------- live signals ----------
+
+def _aware(dt: datetime) -> datetime:
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _queue_wait() -> float:
+    """Own RQ wait / oldest queued job in the same queue; else in-process executor estimate."""
+    try:
+        from rq import Queue, get_current_job
+        job = get_current_job()
+    except Exception:
+        job = None
+    if job is not None:
+        wait = 0.0
+        if job.enqueued_at and job.started_at:
+            wait = (_aware(job.started_at) - _aware(job.enqueued_at)).total_seconds()
+        try:
+            from queue_metrics import oldest_job_age
+            wait = max(wait, oldest_job_age(Queue(job.origin, connection=job.connection)))
+        except Exception:
+            pass
+        return max(0.0, wait)
+    try:
+        import report_executor
+        if report_executor._EXECUTOR is not None:
+            s = report_executor._EXECUTOR.stats()
+            return s["queued"] / max(1, s["workers"]) * (s["avg_seconds"] or 0.0)
+    except Exception:
+        pass
+    return 0.0
+
+
+def current_signals(providers: Sequence[str], preferred: str) -> LoadSignals:
+    return LoadSignals(
+        queue_wait_seconds=_queue_wait(),
+        provider_latency_seconds=HEALTH.latency(preferred),
+        breakers={p: HEALTH.state(p) for p in providers},
+        preferred_provider=preferred,
+    )
+
+
+def decide(providers: Sequence[str] = ("openai", "anthropic"), preferred: str = "openai",
+           signals: Optional[LoadSignals] = None) -> Dict[str, Any]:
+    """{tier, reasons, signals} for the report about to be built; logs degradations."""
+    signals = signals or current_signals(providers, preferred)
+    tier, reasons = choose_tier(signals)
+    TIER_COUNTS[tier] += 1
+    if tier != "full":
+        log.info("report tier %s (%s)", tier, "; ".join(reasons))
+    return {"tier": tier, "reasons": reasons, "signals": asdict(signals)}
+
+
+def prometheus_lines(prom_line: Any) -> List[str]:
+    lines = [
+        "# HELP report_tier_total Reports built per generation tier (this process)\n",
+        "# TYPE report_tier_total counter\n",
+    ] + [prom_line("report_tier_total", float(n), {"tier": t}) for t, n in TIER_COUNTS.items()]
+    providers = HEALTH.providers()
+    if providers:
+        lines += ["# HELP llm_provider_breaker_open 1 while the provider's circuit breaker is open\n",
+                  "# TYPE llm_provider_breaker_open gauge\n"]
+        lines += [prom_line("llm_provider_breaker_open", 1.0 if HEALTH.state(p) == "open" else 0.0,
+                            {"provider": p}) for p in providers]
+        lines += ["# HELP llm_provider_latency_seconds EWMA of LLM call duration\n",
+                  "# TYPE llm_provider_latency_seconds gauge\n"]
+        lines += [prom_line("llm_provider_latency_seconds", HEALTH.latency(p) or 0.0, {"provider": p})
+                  for p in providers]
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+    import json
+    ap = argparse.ArgumentParser(description="Tier-Entscheidung für simulierte Last")
+    ap.add_argument("--wait", type=float, default=0.0, help="queue wait in seconds")
+    ap.add_argument("--latency", type=float, default=None, help="provider latency in seconds")
+    ap.add_argument("--open", nargs="*", default=[], help="providers with an open breaker")
+    ap.add_argument("--providers", default="openai,anthropic")
+    args = ap.parse_args(argv)
+    providers = [p for p in args.providers.split(",") if p]
+    signals = LoadSignals(queue_wait_seconds=args.wait, provider_latency_seconds=args.latency,
+                          breakers={p: "open" if p in args.open else "closed" for p in providers},
+                          preferred_provider=providers[0] if providers else "")
+    tier, reasons = choose_tier(signals)
+    print(json.dumps({"tier": tier, "reasons": reasons, "policy": asdict(TierPolicy.from_env())}, indent=2))
+    return 0
+
+
+__all__ = ["TIERS", "LoadSignals", "TierPolicy", "choose_tier", "decide", "current_signals",
+           "record_provider", "ProviderHealth", "HEALTH", "prometheus_lines"]
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+"""
+Durable outbox for outgoing mail.
+
+Jobs persist a message (`submit`, via mail_utils.queue_email) and return at once;
+the RQ workers drain the outbox after every job and in their maintenance round
+(`worker_drain`, fair_queue.FairWorkerMixin), an optional dedicated sender
+(`python mail_outbox.py run`, Procfile "mailer") delivers it within seconds and
+picks up retries on time. Both use the pooled, authenticated SMTP sessions of
+mail_utils:
+
+    mailout:msg:<id>   hash  to, from, kind, subject, ref (artifact of the RFC 822 bytes),
+                             state queued|sending|sent|failed, attempts, next_at, error
+    mailout:due        zset  id → time of the next attempt
+    mailout:inflight   zset  id → claimed at; claims of a crashed sender go back to due
+    mailout:wake       list  nudges the sender right after a submit
+
+The MIME bytes live in the artifact store like PDFs (Redis only holds the
+reference). Each drain claims up to MAIL_OUTBOX_BATCH due messages and sends
+them over one SMTP session.
+
+- throttle: at most MAIL_THROTTLE_PER_USER_PER_HOUR mails per recipient and clock
+  hour (admin copies exempt); the rest waits for the next hour, no attempt counted
+- retry: transient SMTP errors (4xx incl. greylisting, disconnects, timeouts) back
+  off per the "mail" retry policy (retry_policy.py); 5xx and exhausted attempts
+  end as failed
+- the same message_id again (job retry, pipeline resume) is a no-op; a failed
+  message is queued again
+
+Without Redis (or MAIL_OUTBOX=false) `submit` sends directly over the pool.
+alert_mail_outbox_stalled (metrics) turns 1 once the oldest due message waits
+longer than MAIL_OUTBOX_ALERT_SECONDS – no sender is draining.
+Delivery is at-least-once: a sender stuck longer than MAIL_OUTBOX_CLAIM_TIMEOUT
+may see its messages sent again by another sender.
+
+    python mail_outbox.py run | drain | status
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import random
+import smtplib
+import threading
+import time
+import uuid
+from email.message import EmailMessage
+from email.utils import parseaddr
+from typing import Any, Dict, List, Optional, Tuple
+
+log = logging.getLogger("mail_outbox")
+
+ENABLED = os.getenv("MAIL_OUTBOX", "true").strip().lower() in {"1", "true", "yes", "on"}
+THROTTLE_PER_HOUR = int(os.getenv("MAIL_THROTTLE_PER_USER_PER_HOUR", "10"))
+BATCH = max(1, int(os.getenv("MAIL_OUTBOX_BATCH", "20")))
+POLL = float(os.getenv("MAIL_OUTBOX_POLL", "2"))
+CLAIM_TIMEOUT = float(os.getenv("MAIL_OUTBOX_CLAIM_TIMEOUT", "300"))
+DONE_TTL = int(os.getenv("MAIL_OUTBOX_TTL", str(7 * 86400)))
+WORKER_DRAIN = os.getenv("MAIL_OUTBOX_WORKER_DRAIN", "true").strip().lower() in {"1", "true", "yes", "on"}
+ALERT_SECONDS = float(os.getenv("MAIL_OUTBOX_ALERT_SECONDS", "900"))
+MAX_RECONNECTS = 3  # je drain()
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PREFIX = "mailout:"
+DUE = f"{PREFIX}due"
+INFLIGHT = f"{PREFIX}inflight"
+WAKE = f"{PREFIX}wake"
+
+_LOCK = threading.Lock()
+STATS: Dict[str, int] = {"queued": 0, "sent": 0, "retry": 0, "failed": 0, "throttled": 0, "direct": 0}
+_LATENCY: Dict[str, Any] = {"buckets": [0] * len(LATENCY_BUCKETS), "count": 0, "sum": 0.0}
+
+
+def key(message_id: str) -> str:
+    return f"{PREFIX}msg:{message_id}"
+
+
+def _count(name: str, delta: int = 1) -> None:
+    with _LOCK:
+        STATS[name] += delta
+
+
+def _observe(seconds: float) -> None:
+    with _LOCK:
+        _LATENCY["count"] += 1
+        _LATENCY["sum"] += seconds
+        for i, le in enumerate(LATENCY_BUCKETS):
+            if seconds <= le:
+                _LATENCY["buckets"][i] += 1
+
+
+def _s(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def _connection(connection: Any = None) -> Any:
+    if connection is not None:
+        return connection
+    if not os.getenv("REDIS_URL"):
+        return None
+    import job_events
+    try:
+        return job_events._connection(None)
+    except Exception:
+        return None
+
+
+# ---------- submit ----------
+
+def _send_direct(msg: EmailMessage) -> None:
+    import mail_utils
+    t0 = time.monotonic()
+    mail_utils._smtp_send(msg)
+    _observe(time.monotonic() - t0)
+    _count("direct")
+
+
+def submit(msg: EmailMessage, message_id: Optional[str] = None, kind: str = "user",
+           connection: Any = None) -> str:
+    """Persists `msg` for the sender; returns the outbox id. Sends directly without Redis."""
+    import artifact_store
+    import mail_utils
+    mid = "".join(c for c in (message_id or uuid.uuid4().hex) if c.isalnum() or c in "-_.:")
+    conn = _connection(connection) if ENABLED else None
+    if conn is None:
+        _send_direct(msg)
+        return mid
+    if _s(conn.hget(key(mid), "state") or "") in {"queued", "sending", "sent"}:
+        return mid  # schon im Outbox – kein zweites Mal
+    ref = artifact_store.get_store().put(msg.as_bytes(), "message/rfc822", kind="mail")
+    now = time.time()
+    pipe = conn.pipeline(transaction=True)
+    pipe.hset(key(mid), mapping={
+        "state": "queued", "to": parseaddr(str(msg["To"]))[1], "kind": kind,
+        "from": parseaddr(str(msg["From"]))[1] or mail_utils.sender_address(),
+        "subject": str(msg["Subject"] or "")[:200], "ref": json.dumps(ref), "attempts": 0,
+        "created_at": f"{now:.3f}", "next_at": f"{now:.3f}", "error": "",
+    })
+    pipe.persist(key(mid))
+    pipe.zadd(DUE, {mid: now})
+    pipe.lpush(WAKE, mid)
+    pipe.ltrim(WAKE, 0, 99)
+    pipe.execute()
+    _count("queued")
+    return mid
+
+
+# ---------- sender ----------
+
+def _requeue_stale(conn: Any, now: float) -> int:
+    stale = [_s(m) for m in conn.zrangebyscore(INFLIGHT, "-inf", now - CLAIM_TIMEOUT)]
+    for mid in stale:
+        pipe = conn.pipeline(transaction=True)
+        pipe.zrem(INFLIGHT, mid)
+        pipe.zadd(DUE, {mid: now})
+        pipe.hset(key(mid), "state", "queued")
+        pipe.execute()
+    if stale:
+        log.warning("mail outbox: %d stale claim(s) requeued", len(stale))
+    return len(stale)
+
+
+def _claim(conn: Any, now: float, limit: int) -> List[str]:
+    from redis.exceptions import WatchError
+    claimed = []
+    for mid in [_s(m) for m in conn.zrangebyscore(DUE, "-inf", now, start=0, num=limit)]:
+        with conn.pipeline() as pipe:
+            try:
+                pipe.watch(DUE)
+                if pipe.zscore(DUE, mid) is None:
+                    continue
+                pipe.multi()
+                pipe.zrem(DUE, mid)
+                pipe.zadd(INFLIGHT, {mid: now})
+                pipe.hset(key(mid), "state", "sending")
+                pipe.execute()
+                claimed.append(mid)
+            except WatchError:  # ein anderer Sender war schneller (oder neuer Submit) → nächste Runde
+                continue
+    return claimed
+
+
+def _schedule(conn: Any, mid: str, at: float, **fields: Any) -> None:
+    pipe = conn.pipeline(transaction=True)
+    pipe.hset(key(mid), mapping={"state": "queued", "next_at": f"{at:.3f}", **fields})
+    pipe.zrem(INFLIGHT, mid)
+    pipe.zadd(DUE, {mid: at})
+    pipe.execute()
+
+
+def _finish(conn: Any, mid: str, state: str, **fields: Any) -> None:
+    pipe = conn.pipeline(transaction=True)
+    pipe.hset(key(mid), mapping={"state": state, **fields})
+    pipe.expire(key(mid), DONE_TTL)
+    pipe.zrem(INFLIGHT, mid)
+    pipe.execute()
+
+
+def _throttle_ok(conn: Any, meta: Dict[str, str], now: float) -> bool:
+    if THROTTLE_PER_HOUR <= 0 or meta.get("kind") == "admin":
+        return True
+    rcpt = hashlib.sha1(meta.get("to", "").lower().encode("utf-8")).hexdigest()[:16]
+    bucket = f"mailthrottle:{rcpt}:{int(now // 3600)}"
+    pipe = conn.pipeline(transaction=True)
+    pipe.incr(bucket)
+    pipe.expire(bucket, 7200)
+    if int(pipe.execute()[0]) <= THROTTLE_PER_HOUR:
+        return True
+    conn.decr(bucket)
+    return False
+
+
+def _retryable(exc: BaseException) -> bool:
+    import retry_policy
+    if isinstance(exc, smtplib.SMTPRecipientsRefused) and exc.recipients:
+        code, text = next(iter(exc.recipients.values()))
+        exc = smtplib.SMTPResponseException(code, text)  # 450 (Greylisting) ≠ 550
+    return retry_policy.policy_for("mail").is_retryable(exc)
+
+
+def _attempt_failed(conn: Any, mid: str, meta: Dict[str, str], exc: BaseException, now: float) -> str:
+    import retry_policy
+    policy = retry_policy.policy_for("mail")
+    attempts = int(meta.get("attempts") or 0) + 1
+    error = f"{type(exc).__name__}: {exc}"[:300]
+    if _retryable(exc) and attempts < policy.max_attempts:
+        _schedule(conn, mid, now + policy.delays()[attempts - 1], attempts=attempts, error=error)
+        _count("retry")
+        return "retry"
+    _finish(conn, mid, "failed", attempts=attempts, error=error)
+    _count("failed")
+    log.error("mail %s to %s failed for good: %s", mid, meta.get("to"), error)
+    return "failed"
+
+
+def _deliver(conn: Any, pending: List[Tuple[str, Dict[str, str]]], now: float, out: Dict[str, int]) -> None:
+    import artifact_store
+    import mail_utils
+    store = artifact_store.get_store()
+    i, reconnects, resent = 0, 0, -1
+    while i < len(pending):
+        current: Optional[int] = None
+        try:
+            with mail_utils.POOL.session() as session:
+                while i < len(pending):
+                    mid, meta = pending[i]
+                    try:
+                        raw = store.read(json.loads(meta["ref"])["sha256"])
+                    except Exception as exc:
+                        _finish(conn, mid, "failed", error=f"message body lost: {exc}"[:300])
+                        _count("failed")
+                        out["failed"] += 1
+                        i += 1
+                        continue
+                    current = i
+                    t0 = time.monotonic()
+                    try:
+                        session.sendmail(meta["from"], [meta["to"]], raw)
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as exc:
+                        # Antwort zu dieser Nachricht – die Session bleibt nutzbar
+                        out[_attempt_failed(conn, mid, meta, exc, now)] += 1
+                        current, i = None, i + 1
+                        continue
+                    _observe(time.monotonic() - t0)
+                    _finish(conn, mid, "sent", sent_at=f"{time.time():.3f}", error="")
+                    _count("sent")
+                    out["sent"] += 1
+                    current, i = None, i + 1
+        except Exception as exc:  # Verbindung/Login: Session verworfen
+            reconnects += 1
+            if current is None or reconnects > MAX_RECONNECTS:
+                # keine (stabile) Verbindung → jede restliche Nachricht zählt einen Versuch
+                for mid, meta in pending[i:]:
+                    out[_attempt_failed(conn, mid, meta, exc, now)] += 1
+                return
+            if current != resent:
+                # gepoolte Session vom Server geschlossen: gleiche Nachricht über eine frische Session
+                resent, i = current, current
+                continue
+            mid, meta = pending[current]
+            out[_attempt_failed(conn, mid, meta, exc, now)] += 1
+            i = current + 1
+
+
+def drain(connection: Any = None, limit: int = BATCH, now: Optional[float] = None) -> Dict[str, int]:
+    """Sends up to `limit` due messages over one SMTP session; returns counts per outcome."""
+    out = {"claimed": 0, "sent": 0, "retry": 0, "failed": 0, "throttled": 0}
+    conn = _connection(connection)
+    if conn is None:
+        return out
+    now = time.time() if now is None else now
+    _requeue_stale(conn, now)
+    claimed = _claim(conn, now, limit)
+    out["claimed"] = len(claimed)
+    pending: List[Tuple[str, Dict[str, str]]] = []
+    for mid in claimed:
+        meta = {_s(k): _s(v) for k, v in (conn.hgetall(key(mid)) or {}).items()}
+        if not meta.get("ref"):
+            conn.zrem(INFLIGHT, mid)
+            continue
+        if not _throttle_ok(conn, meta, now):
+            _schedule(conn, mid, (int(now // 3600) + 1) * 3600 + random.uniform(0, 60))
+            _count("throttled")
+            out["throttled"] += 1
+            continue
+        pending.append((mid, meta))
+    if pending:
+        _deliver(conn, pending, now, out)
+    return out
+
+
+def worker_drain(connection: Any = None) -> Dict[str, int]:
+    """drain() for RQ workers (after a job, maintenance round); never raises."""
+    if not (ENABLED and WORKER_DRAIN):
+        return {}
+    try:
+        conn = _connection(connection)
+        if conn is None or not conn.zcount(DUE, "-inf", time.time()) and not conn.zcard(INFLIGHT):
+            return {}
+        return drain(conn)
+    except Exception as exc:
+        log.warning("mail outbox drain in worker failed: %s", exc)
+        return {}
+
+
+def run(connection: Any = None, stop: Optional[threading.Event] = None) -> None:
+    """Sender loop: drain, then wait for a submit (or MAIL_OUTBOX_POLL seconds)."""
+    import mail_utils
+    conn = _connection(connection)
+    if conn is None:
+        raise RuntimeError("mail outbox sender needs Redis (REDIS_URL)")
+    log.info("mail outbox sender started (batch %d, throttle %d/h)", BATCH, THROTTLE_PER_HOUR)
+    try:
+        while not (stop and stop.is_set()):
+            try:
+                if drain(conn)["claimed"] >= BATCH:
+                    continue  # Rückstand: sofort weiter
+                if conn.blpop([WAKE], timeout=max(1, int(POLL))):
+                    conn.delete(WAKE)
+            except Exception as exc:
+                log.warning("mail outbox drain failed: %s", exc)
+                time.sleep(POLL)
+    finally:
+        mail_utils.POOL.close_all()
+
+
+def status(connection: Any = None) -> Dict[str, Any]:
+    conn = _connection(connection)
+    if conn is None:
+        return {"enabled": False}
+    oldest = conn.zrange(DUE, 0, 0, withscores=True)
+    return {"enabled": ENABLED, "due": conn.zcard(DUE), "inflight": conn.zcard(INFLIGHT),
+            "oldest_due_age": round(max(0.0, time.time() - oldest[0][1]), 1) if oldest else 0.0}
+
+
+def prometheus_lines(prom_line: Any) -> List[str]:
+    import mail_utils
+    with _LOCK:
+        s, lat = dict(STATS), {"buckets": list(_LATENCY["buckets"]), "count": _LATENCY["count"],
+                               "sum": _LATENCY["sum"]}
+    lines = [
+        "# HELP mail_outbox_messages_total Mail outbox outcomes (this process)\n",
+        "# TYPE mail_outbox_messages_total counter\n",
+        *[prom_line("mail_outbox_messages_total", float(v), {"outcome": k}) for k, v in s.items()],
+        "# HELP mail_send_seconds SMTP send latency per message\n",
+        "# TYPE mail_send_seconds histogram\n",
+        *[prom_line("mail_send_seconds_bucket", float(n), {"le": str(le)})
+          for le, n in zip(LATENCY_BUCKETS, lat["buckets"])],
+        prom_line("mail_send_seconds_bucket", float(lat["count"]), {"le": "+Inf"}),
+        prom_line("mail_send_seconds_sum", round(lat["sum"], 6)),
+        prom_line("mail_send_seconds_count", float(lat["count"])),
+        "# HELP smtp_sessions_total SMTP sessions opened, reused and closed (this process)\n",
+        "# TYPE smtp_sessions_total counter\n",
+        *[prom_line("smtp_sessions_total", float(v), {"event": k}) for k, v in mail_utils.POOL.stats.items()],
+    ]
+    if os.getenv("REDIS_URL"):
+        try:
+            st = status()
+            lines += [
+                "# HELP mail_outbox_depth Messages waiting in the outbox\n",
+                "# TYPE mail_outbox_depth gauge\n",
+                prom_line("mail_outbox_depth", float(st["due"]), {"state": "due"}),
+                prom_line("mail_outbox_depth", float(st["inflight"]), {"state": "inflight"}),
+                "# HELP mail_outbox_oldest_due_seconds Age of the oldest due message\n",
+                "# TYPE mail_outbox_oldest_due_seconds gauge\n",
+                prom_line("mail_outbox_oldest_due_seconds", float(st["oldest_due_age"])),
+                "# HELP alert_mail_outbox_stalled 1 if the oldest due message waits longer than the threshold\n",
+                "# TYPE alert_mail_outbox_stalled gauge\n",
+                prom_line("alert_mail_outbox_stalled", 1.0 if st["oldest_due_age"] > ALERT_SECONDS else 0.0,
+                          {"threshold": str(ALERT_SECONDS)}),
+            ]
+        except Exception:
+            pass
+    return lines
+
+
+__all__ = ["submit", "drain", "worker_drain", "run", "status", "key", "prometheus_lines"]
+
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "run"
+    if cmd == "run":
+        run()
+    elif cmd == "drain":
+        print(drain())
+    elif cmd == "status":
+        print(json.dumps(status()))
+    else:
+        print("usage: python mail_outbox.py run|drain|status")
@@ -1,35 +1,265 @@
 # -*- coding: utf-8 -*-
+"""
+Building and sending report mails.
+
+SMTP sessions are pooled per process (`SmtpPool`): connect, STARTTLS and login
+happen once per session, not per message. A session is reused for up to
+SMTP_SESSION_MAX_MESSAGES messages / SMTP_SESSION_MAX_AGE seconds, checked with
+NOOP after idling and dropped on any connection error. Jobs do not send
+themselves but hand messages to the durable outbox (`queue_email`, mail_outbox.py);
+the outbox sender drains it over these sessions.
+
+Attachments are encoded once: `attachment_part` keeps the base64-encoded MIME part
+per content hash and name, so the user and admin copy of a report share it.
+Attachments above MAIL_ATTACH_MAX_BYTES become a signed, expiring download link
+(signed_links.py, streamed from the artifact store) – only if PUBLIC_API_URL is
+set, otherwise they stay attached.
+
+ENV: SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, SMTP_TLS, SMTP_SSL, SMTP_FROM,
+SMTP_TIMEOUT (20), SMTP_POOL_SIZE (2), SMTP_SESSION_MAX_MESSAGES (100),
+SMTP_SESSION_MAX_AGE (240), MAIL_ATTACH_MAX_BYTES (5 MB)
+"""
 from __future__ import annotations
-from typing import Dict, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 import asyncio
+import hashlib
+import html
+import logging
+import os
 import smtplib
-from email.message import EmailMessage
+import ssl
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from email.message import EmailMessage, MIMEPart
 from settings import settings
 
+log = logging.getLogger("mail_utils")
+
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "20"))
+POOL_SIZE = max(1, int(os.getenv("SMTP_POOL_SIZE", "2")))
+SESSION_MAX_MESSAGES = int(os.getenv("SMTP_SESSION_MAX_MESSAGES", "100"))
+SESSION_MAX_AGE = float(os.getenv("SMTP_SESSION_MAX_AGE", "240"))
+IDLE_CHECK_AFTER = 30.0
+ATTACH_MAX_BYTES = int(os.getenv("MAIL_ATTACH_MAX_BYTES", str(5 * 1024 * 1024)))
+PART_CACHE_SIZE = 16
+
+
+class Session:
+    """Pooled SMTP session; counts messages for SMTP_SESSION_MAX_MESSAGES."""
+
+    def __init__(self, smtp: smtplib.SMTP) -> None:
+        self.smtp = smtp
+        self.created = self.used = time.monotonic()
+        self.messages = 0
+
+    def sendmail(self, from_addr: str, to_addrs: List[str], msg: bytes) -> Dict[str, Any]:
+        refused = self.smtp.sendmail(from_addr, to_addrs, msg)
+        self.messages += 1
+        return refused
+
+    def send_message(self, msg: EmailMessage) -> Dict[str, Any]:
+        refused = self.smtp.send_message(msg)
+        self.messages += 1
+        return refused
+
+
+class SmtpPool:
+    """Authenticated SMTP sessions, reused across messages (per process)."""
+
+    def __init__(self, size: int = POOL_SIZE) -> None:
+        self.size = size
+        self._idle: List[Session] = []
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "reused": 0, "closed": 0}
+
+    def _connect(self) -> Session:
+        host, port = settings.SMTP_HOST, settings.SMTP_PORT
+        if not host:
+            raise RuntimeError("SMTP_HOST is not configured")
+        if settings.SMTP_SSL:
+            smtp: smtplib.SMTP = smtplib.SMTP_SSL(host, port, timeout=SMTP_TIMEOUT,
+                                                  context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(host, port, timeout=SMTP_TIMEOUT)
+        try:
+            if settings.SMTP_USER and settings.SMTP_PASSWORD:
+                if settings.SMTP_TLS and not settings.SMTP_SSL:
+                    smtp.starttls(context=ssl.create_default_context())
+                smtp.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        except Exception:
+            _close(smtp)
+            raise
+        with self._lock:
+            self.stats["opened"] += 1
+        return Session(smtp)
+
+    def _usable(self, s: Session) -> bool:
+        now = time.monotonic()
+        if now - s.created > SESSION_MAX_AGE or s.messages >= SESSION_MAX_MESSAGES:
+            return False
+        if now - s.used > IDLE_CHECK_AFTER:  # Server schließen stille Sessions gern
+            try:
+                return s.smtp.noop()[0] == 250
+            except Exception:
+                return False
+        return True
+
+    def _checkout(self) -> Session:
+        while True:
+            with self._lock:
+                s = self._idle.pop() if self._idle else None
+            if s is None:
+                return self._connect()
+            if self._usable(s):
+                with self._lock:
+                    self.stats["reused"] += 1
+                return s
+            self._discard(s)
+
+    def _discard(self, s: Session) -> None:
+        _close(s.smtp)
+        with self._lock:
+            self.stats["closed"] += 1
+
+    @contextmanager
+    def session(self) -> Iterator[Session]:
+        """An authenticated session; broken sessions (exception escaping) are not reused."""
+        s = self._checkout()
+        try:
+            yield s
+        except BaseException:
+            self._discard(s)
+            raise
+        s.used = time.monotonic()
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(s)
+                return
+        self._discard(s)
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for s in idle:
+            self._discard(s)
+
+    def reset(self) -> None:
+        # nach fork(): Sockets gehören dem Elternprozess – vergessen, nicht schließen
+        self._idle = []
+        self._lock = threading.Lock()
+
+
+def _close(smtp: smtplib.SMTP) -> None:
+    try:
+        smtp.quit()
+    except Exception:
+        try:
+            smtp.close()
+        except Exception:
+            pass
+
+
+POOL = SmtpPool()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=POOL.reset)
+
+
+def sender_address() -> str:
+    return settings.SMTP_FROM or settings.SMTP_USER or "no-reply@example.com"
+
+
 def _smtp_send(msg: EmailMessage) -> None:
-    with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=20) as s:
-        if settings.SMTP_USER and settings.SMTP_PASS:
-            s.starttls()
-            s.login(settings.SMTP_USER, settings.SMTP_PASS)
+    with POOL.session() as s:
         s.send_message(msg)
 
-def _build_message(to_address: str, subject: str, html_body: str, attachments: Optional[Dict[str, bytes]] = None) -> EmailMessage:
+
+# ---------- attachments ----------
+
+_PARTS: "OrderedDict[Tuple[str, str], MIMEPart]" = OrderedDict()
+_PARTS_LOCK = threading.Lock()
+
+
+def _mime_type(name: str) -> Tuple[str, str]:
+    if name.lower().endswith(".pdf"):
+        return "application", "pdf"
+    if name.lower().endswith(".json"):
+        return "application", "json"
+    if name.lower().endswith(".html"):
+        return "text", "html"
+    return "application", "octet-stream"
+
+
+def attachment_part(name: str, content: bytes) -> MIMEPart:
+    """Base64-encoded attachment part, built once per content and name."""
+    key = (hashlib.sha256(content).hexdigest(), name)
+    with _PARTS_LOCK:
+        part = _PARTS.get(key)
+        if part is not None:
+            _PARTS.move_to_end(key)
+            return part
+    maintype, subtype = _mime_type(name)
+    part = MIMEPart()
+    part.set_content(content, maintype=maintype, subtype=subtype, filename=name)
+    with _PARTS_LOCK:
+        _PARTS[key] = part
+        while len(_PARTS) > PART_CACHE_SIZE:
+            _PARTS.popitem(last=False)
+    return part
+
+
+def download_link(name: str, content: bytes) -> Optional[str]:
+    """Signed link to `content` in the artifact store; None if links are not configured."""
+    import signed_links
+    if not signed_links.PUBLIC_API_URL:
+        return None
+    try:
+        import artifact_store
+        maintype, subtype = _mime_type(name)
+        ref = artifact_store.get_store().put(content, f"{maintype}/{subtype}",
+                                             kind="pdf" if subtype == "pdf" else "default")
+        return signed_links.url_for(ref, name)
+    except Exception as exc:
+        log.warning("download link for %s failed, attaching instead: %s", name, exc)
+        return None
+
+
+def _links_html(links: List[Tuple[str, int, str]]) -> str:
+    import signed_links
+    days = max(1, signed_links.LINK_TTL // 86400)
+    items = "".join(f'<li><a href="{html.escape(url)}">{html.escape(name)}</a> ({size / 1048576:.1f} MB)</li>'
+                    for name, size, url in links)
+    return f"<p>Download (gültig {days} Tage / valid for {days} days):</p><ul>{items}</ul>"
+
+
+def _build_message(to_address: str, subject: str, html_body: str,
+                   attachments: Optional[Dict[str, Union[bytes, MIMEPart]]] = None) -> EmailMessage:
     msg = EmailMessage()
     msg["Subject"] = subject
-    msg["From"] = f"{settings.SMTP_FROM_NAME} <{settings.SMTP_FROM}>"
+    msg["From"] = f"{settings.SMTP_FROM_NAME} <{sender_address()}>"
     msg["To"] = to_address
-    msg.set_content("HTML-only message; please use an HTML-capable client.")
-    msg.add_alternative(html_body or "<p>—</p>", subtype="html")
-    if attachments:
-        for name, content in attachments.items():
-            maintype, subtype = ("application", "octet-stream")
-            if name.lower().endswith(".pdf"):
-                maintype, subtype = ("application", "pdf")
-            elif name.lower().endswith(".json"):
-                maintype, subtype = ("application", "json")
-            elif name.lower().endswith(".html"):
-                maintype, subtype = ("text", "html")
-            msg.add_attachment(content, maintype=maintype, subtype=subtype, filename=name)
+    parts: List[MIMEPart] = []
+    links: List[Tuple[str, int, str]] = []
+    for name, content in (attachments or {}).items():
+        if isinstance(content, MIMEPart):
+            parts.append(content)
+            continue
+        url = download_link(name, content) if len(content) > ATTACH_MAX_BYTES else None
+        if url:
+            links.append((name, len(content), url))
+        else:
+            parts.append(attachment_part(name, content))
+    text = "HTML-only message; please use an HTML-capable client."
+    if links:
+        text += "\n\n" + "\n".join(f"{name}: {url}" for name, _, url in links)
+    msg.set_content(text)
+    msg.add_alternative((html_body or "<p>—</p>") + (_links_html(links) if links else ""), subtype="html")
+    if parts:
+        msg.make_mixed()
+        for part in parts:
+            msg.attach(part)  # geteilte, bereits kodierte Parts – kein zweites base64
     return msg
 
 async def send_email_with_attachments(to_address: str, subject: str, html_body: str, attachments: Optional[Dict[str, bytes]] = None) -> None:
@@ -40,3 +270,13 @@ async def send_email_with_attachments(to_address: str, subject: str, html_body:
 def send_email_with_attachments_sync(to_address: str, subject: str, html_body: str, attachments: Optional[Dict[str, bytes]] = None) -> None:
     msg = _build_message(to_address, subject, html_body, attachments)
     _smtp_send(msg)
+
+def queue_email(to_address: str, subject: str, html_body: str, attachments: Optional[Dict[str, bytes]] = None,
+                message_id: Optional[str] = None, kind: str = "user", connection: Any = None) -> str:
+    """Persists the mail in the outbox (sent by the outbox sender); returns the outbox id.
+
+    Same message_id again (job retry, pipeline resume) → no second mail.
+    """
+    import mail_outbox
+    msg = _build_message(to_address, subject, html_body, attachments)
+    return mail_outbox.submit(msg, message_id=message_id, kind=kind, connection=connection)
@@ -6,7 +6,7 @@ KI-Status-Report Backend - FastAPI entrypoint (Queue-enabled).
 - Robust logging & settings
 - CORS via env
 - Health/diag endpoints
-- Routers: login, admin, feedback, briefing, tasks_api (queue)
+- Routers: login, admin, feedback, briefing, tasks_api (queue), job_status (push)
 - Admin user update endpoint (TEMPORARY - remove after setup!)
 """
 from __future__ import annotations
@@ -68,6 +68,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# /healthz und /metrics (HTTP-Raten, RQ-Queue-Tiefe und -Latenz)
+try:
+    from app.observability import MetricsMiddleware, router as observability_router
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(observability_router)
+except Exception as exc:
+    logger.warning("Observability not available: %s", exc)
+
+@app.on_event("startup")
+async def warm_reference_data() -> None:
+    """Build in-memory reference indexes once instead of on the first report."""
+    try:
+        from data_snapshot import get_snapshot
+        snap = get_snapshot()
+        logger.info("Data snapshot: %s", f"{len(snap['files'])} files" if snap else "not found, reading raw files")
+    except Exception as exc:
+        logger.warning("Data snapshot load failed: %s", exc)
+    try:
+        from funding_index import get_funding_index
+        logger.info("Funding index ready: %d programs", len(get_funding_index()))
+    except Exception as exc:
+        logger.warning("Funding index warm-up failed: %s", exc)
+    try:
+        from benchmark_repository import log_validation_report
+        report = log_validation_report()
+        logger.info("Benchmark table ready: %d/%d exact", report["exact"], report["combinations"])
+    except Exception as exc:
+        logger.warning("Benchmark warm-up failed: %s", exc)
+
 @app.get("/", response_class=PlainTextResponse)
 async def root() -> str:
     return "KI–Status–Report backend is running.\n"
@@ -122,6 +151,10 @@ _include_router("routes.feedback", prefix="/api")
 _include_router("routes.briefing", prefix="/api")
 # NEW: tasks/queue API
 _include_router("routes.tasks_api", prefix="/api")
+# Push-Status (SSE/WebSocket) für Queue-Jobs
+_include_router("routes.job_status", prefix="/api")
+# Signierte, ablaufende Download-Links (große Reports in Mails)
+_include_router("routes.files", prefix="/api")
 
 # TEMPORARY: Admin user update router
 # SECURITY WARNING: Disable this after initial user setup!
@@ -1,27 +1,445 @@
 # -*- coding: utf-8 -*-
+"""
+The one client for the PDF service (tasks, report pipeline, legacy worker, eval).
+
+- pooled connections (http_clients "pdf")
+- at most PDF_MAX_CONCURRENCY renders per process in flight; size it to the PDF
+  service's capacity divided by the processes calling it (e.g. pdf worker slots)
+- idempotent retries (PDF_RETRIES, default 2) on connection errors, timeouts,
+  429 and 502/503/504 with exponential backoff, honouring Retry-After
+- result cache keyed by sha256 of the HTML: the PDF goes to the artifact store,
+  the html-hash → PDF reference to Redis (pdfcache:<sha256>) and a small
+  per-process LRU. Re-downloads and retried mail jobs never render twice.
+  URL renders are not cached (the page may change).
+- on a cache miss the HTML goes through pdf_prerender.prepare() (assets inlined
+  as data URIs, unused CSS purged, minified) and the JSON body is sent gzipped
+  (Content-Encoding: gzip). A service answering 415 gets plain JSON from then on.
+- several documents at once (`render_many`, eval runs, partner uploads, DE+EN):
+  cache hits are answered locally, the rest goes in chunks of PDF_BATCH_MAX to
+  PDF_BATCH_URL ({"documents": [...]} → {"results": [...]}) or, without batch
+  support, as parallel single requests over the keep-alive pool. Per-document
+  result and timing, errors never abort the whole batch.
+- PDF_SERVICE_URL=local:// renders with the in-process stand-in (pdf_local.py).
+
+    pdf = render(html=html)                 # bytes, raises PdfRenderError
+    pdf = render_or_none(html, "x.pdf")     # None when disabled/failing
+    pdf = await render_pdf(html)            # async variant (worker thread)
+    results = render_many([{"html": de, "filename": "de.pdf"}, (en, "en.pdf")])
+
+ENV: PDF_SERVICE_URL, PDF_TIMEOUT (ms, default 45000), PDF_MAX_CONCURRENCY (4),
+PDF_RETRIES (2), PDF_CACHE (true), PDF_CACHE_LOCAL_SIZE (256), PDF_PRERENDER (true),
+PDF_GZIP (true), PDF_BATCH_URL (unset), PDF_BATCH_MAX (10)
+"""
 from __future__ import annotations
-from typing import Optional
+
+import asyncio
 import base64
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple, Union
+
 import httpx
-from settings import settings
 
-async def render_pdf(html: str, filename: str = "report.pdf") -> Optional[bytes]:
-    if not settings.PDF_SERVICE_URL:
+import http_clients
+import pdf_prerender
+
+log = logging.getLogger("pdf_client")
+
+SERVICE_URL = os.getenv("PDF_SERVICE_URL", "").strip()
+TIMEOUT = int(os.getenv("PDF_TIMEOUT", "45000")) / 1000.0  # ms → s
+MAX_CONCURRENCY = max(1, int(os.getenv("PDF_MAX_CONCURRENCY", "4")))
+RETRIES = max(0, int(os.getenv("PDF_RETRIES", "2")))
+CACHE_ENABLED = os.getenv("PDF_CACHE", "true").strip().lower() in {"1", "true", "yes", "on"}
+LOCAL_CACHE_SIZE = int(os.getenv("PDF_CACHE_LOCAL_SIZE", "256"))
+PRERENDER = os.getenv("PDF_PRERENDER", "true").strip().lower() in {"1", "true", "yes", "on"}
+GZIP = os.getenv("PDF_GZIP", "true").strip().lower() in {"1", "true", "yes", "on"}
+BATCH_URL = os.getenv("PDF_BATCH_URL", "").strip()
+BATCH_MAX = max(1, int(os.getenv("PDF_BATCH_MAX", "10")))
+RETRY_STATUS = {429, 502, 503, 504}
+BATCH_UNSUPPORTED_STATUS = {404, 405, 501}
+
+_SEMAPHORE = threading.BoundedSemaphore(MAX_CONCURRENCY)
+_LOCAL: "OrderedDict[str, str]" = OrderedDict()  # html-sha256 → PDF-sha256 im Artifact-Store
+_LOCK = threading.Lock()
+_NO_BATCH: Set[str] = set()  # Batch-URLs, die der Dienst nicht kennt
+STATS: Dict[str, int] = {"rendered": 0, "cache_hit": 0, "retry": 0, "error": 0, "inflight": 0,
+                         "bytes_sent": 0, "batch_requests": 0}
+Document = Union[Dict[str, Any], Tuple[str, str]]
+
+
+def _reset_after_fork() -> None:
+    global _SEMAPHORE, _LOCK
+    # im Kind läuft kein Render-Thread mehr, der Slots freigeben könnte
+    _SEMAPHORE = threading.BoundedSemaphore(MAX_CONCURRENCY)
+    _LOCK = threading.Lock()
+    STATS["inflight"] = 0
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class PdfRenderError(RuntimeError):
+    pass
+
+
+class PdfServiceUnavailable(PdfRenderError):
+    """Retries exhausted on transient errors – the job-level retry policy may try later."""
+
+
+def html_key(html: str) -> str:
+    return hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+
+def _count(name: str, delta: int = 1) -> None:
+    with _LOCK:
+        STATS[name] += delta
+
+
+# ---------- cache ----------
+
+def _redis() -> Any:
+    from queue_utils import get_redis_connection
+    return get_redis_connection()
+
+
+def _cache_get(key: str) -> Optional[bytes]:
+    import artifact_store
+    store = artifact_store.get_store()
+    with _LOCK:
+        digest = _LOCAL.get(key)
+        if digest:
+            _LOCAL.move_to_end(key)
+    if not digest:
+        try:
+            ref = artifact_store.load_ref(_redis(), f"pdfcache:{key}")
+            digest = ref["sha256"] if ref else None
+        except Exception:
+            digest = None
+    if not digest:
         return None
     try:
-        async with httpx.AsyncClient(timeout=settings.PDF_TIMEOUT/1000) as client:
-            r = await client.post(settings.PDF_SERVICE_URL, json={"html": html, "filename": filename})
-            r.raise_for_status()
-            ct = (r.headers.get("content-type") or "").lower()
-            if "application/pdf" in ct or "application/octet-stream" in ct:
-                return r.content
-            data = r.json()
-            for key in ("pdf_base64", "data", "pdf"):
-                if isinstance(data.get(key), str):
-                    s = data[key]
-                    if ";base64," in s:
-                        s = s.split(",", 1)[1]
-                    return base64.b64decode(s)
-    except Exception:
+        return store.read(digest)
+    except Exception:  # abgelaufen/gelöscht → neu rendern
+        with _LOCK:
+            _LOCAL.pop(key, None)
         return None
+
+
+def _cache_put(key: str, pdf: bytes) -> None:
+    import artifact_store
+    try:
+        ref = artifact_store.get_store().put(pdf, "application/pdf", kind="pdf")
+    except Exception as exc:
+        log.warning("PDF cache store failed: %s", exc)
+        return
+    with _LOCK:
+        _LOCAL[key] = ref["sha256"]
+        _LOCAL.move_to_end(key)
+        while len(_LOCAL) > LOCAL_CACHE_SIZE:
+            _LOCAL.popitem(last=False)
+    try:
+        artifact_store.save_ref(_redis(), f"pdfcache:{key}", ref)
+    except Exception:
+        pass  # ohne Redis bleibt der prozesslokale Cache
+
+
+# ---------- rendering ----------
+
+_local_client: Optional[httpx.Client] = None
+
+
+def _client(service_url: str, timeout: float) -> Tuple[httpx.Client, str]:
+    global _local_client
+    if service_url.startswith("local://"):
+        if _local_client is None:
+            import pdf_local
+            _local_client = pdf_local.LocalPdfService().client(timeout)
+        return _local_client, "http://pdf.local/" + service_url[len("local://"):]
+    return http_clients.get_client("pdf", timeout), service_url
+
+
+def _b64(data: Dict[str, Any]) -> Optional[bytes]:
+    for key in ("pdf_base64", "data", "pdf"):
+        if isinstance(data.get(key), str):
+            s = data[key]
+            if ";base64," in s:
+                s = s.split(",", 1)[1]
+            return base64.b64decode(s)
     return None
+
+
+def _extract(client: httpx.Client, r: httpx.Response) -> bytes:
+    ct = (r.headers.get("content-type") or "").lower()
+    if "application/pdf" in ct or "application/octet-stream" in ct:
+        return r.content
+    data = r.json()
+    pdf_url = data.get("pdf_url") or data.get("url")
+    if pdf_url:
+        rr = client.get(pdf_url)
+        rr.raise_for_status()
+        return rr.content
+    pdf = _b64(data)
+    if pdf is None:
+        raise PdfRenderError("PDF service returned no PDF")
+    return pdf
+
+
+def _extract_batch(client: httpx.Client, r: httpx.Response) -> List[Dict[str, Any]]:
+    results = r.json().get("results")
+    if not isinstance(results, list):
+        raise PdfRenderError("PDF batch response without results")
+    return results
+
+
+def _delay(attempt: int, response: Optional[httpx.Response]) -> float:
+    if response is not None:
+        try:
+            return min(30.0, float(response.headers.get("retry-after", "")))
+        except ValueError:
+            pass
+    return min(10.0, 0.5 * 2 ** attempt) * random.uniform(0.8, 1.2)
+
+
+def _body(payload: Dict[str, Any]) -> Tuple[bytes, Dict[str, str]]:
+    raw = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    headers = {"Accept": "application/pdf", "Content-Type": "application/json"}
+    if GZIP:
+        headers["Content-Encoding"] = "gzip"
+        raw = gzip.compress(raw, compresslevel=6)
+    return raw, headers
+
+
+def _send(client: httpx.Client, service_url: str, payload: Dict[str, Any]) -> httpx.Response:
+    global GZIP
+    body, headers = _body(payload)
+    _count("bytes_sent", len(body))
+    response = client.post(service_url, content=body, headers=headers)
+    if response.status_code == 415 and "Content-Encoding" in headers:
+        log.warning("PDF service rejects gzip bodies (415) – sending plain JSON from now on")
+        GZIP = False
+        body, headers = _body(payload)
+        _count("bytes_sent", len(body))
+        response = client.post(service_url, content=body, headers=headers)
+    return response
+
+
+def _post(service_url: str, payload: Dict[str, Any], timeout: float,
+          extract: Callable[[httpx.Client, httpx.Response], Any] = _extract) -> Any:
+    client, service_url = _client(service_url, timeout)
+    last: Optional[BaseException] = None
+    for attempt in range(RETRIES + 1):
+        response = None
+        try:
+            with _SEMAPHORE:
+                _count("inflight")
+                try:
+                    response = _send(client, service_url, payload)
+                    if response.status_code not in RETRY_STATUS:
+                        response.raise_for_status()
+                        return extract(client, response)
+                finally:
+                    _count("inflight", -1)
+            last = PdfRenderError(f"PDF service answered {response.status_code}")
+        except (httpx.TransportError, httpx.TimeoutException) as exc:
+            last = exc
+        if attempt < RETRIES:
+            _count("retry")
+            time.sleep(_delay(attempt, response))
+    raise PdfServiceUnavailable(f"PDF render failed after {RETRIES + 1} attempt(s): {last}") from last
+
+
+def render(html: Optional[str] = None, url: Optional[str] = None, filename: str = "report.pdf",
+           service_url: Optional[str] = None, timeout: Optional[float] = None) -> bytes:
+    """Renders html (cached by content hash) or url; raises PdfRenderError / HTTPStatusError."""
+    service_url = service_url if service_url is not None else SERVICE_URL
+    if not service_url:
+        raise PdfRenderError("PDF_SERVICE_URL is not configured")
+    if not html and not url:
+        raise ValueError("Provide 'html' or 'url'")
+    key = html_key(html) if html and CACHE_ENABLED else None
+    if key:
+        cached = _cache_get(key)
+        if cached is not None:
+            _count("cache_hit")
+            return cached
+    return _render_uncached(html, url, filename, service_url, TIMEOUT if timeout is None else timeout, key)
+
+
+def _prepared(html: str) -> str:
+    # Cache-Schlüssel bleibt der Hash des Original-HTML
+    return pdf_prerender.prepare(html) if PRERENDER else html
+
+
+def _render_uncached(html: Optional[str], url: Optional[str], filename: str, service_url: str,
+                     timeout: float, key: Optional[str]) -> bytes:
+    payload: Dict[str, Any] = {"filename": filename}
+    if html:
+        payload["html"] = _prepared(html)
+    if url:
+        payload["url"] = url
+    try:
+        pdf = _post(service_url, payload, timeout)
+    except Exception:
+        _count("error")
+        raise
+    _count("rendered")
+    if key:
+        _cache_put(key, pdf)
+    return pdf
+
+
+# ---------- several documents ----------
+
+def _result(filename: str, pdf: Optional[bytes], error: Optional[str], seconds: float, source: str,
+            **extra: Any) -> Dict[str, Any]:
+    return {"filename": filename, "pdf": pdf, "error": error, "seconds": round(seconds, 4),
+            "source": source, **extra}
+
+
+def _single(doc: Dict[str, Any], service_url: str, timeout: float) -> Dict[str, Any]:
+    t0 = time.monotonic()
+    try:
+        pdf = _render_uncached(doc["html"], None, doc["filename"], service_url, timeout, doc["key"])
+        return _result(doc["filename"], pdf, None, time.monotonic() - t0, "single")
+    except Exception as exc:
+        return _result(doc["filename"], None, str(exc) or type(exc).__name__, time.monotonic() - t0, "single")
+
+
+def _batch(docs: List[Dict[str, Any]], batch_url: str, timeout: float) -> List[Dict[str, Any]]:
+    """One request for all docs; raises if the batch as a whole failed."""
+    payload = {"documents": [{"filename": d["filename"], "html": _prepared(d["html"])} for d in docs]}
+    t0 = time.monotonic()
+    _count("batch_requests")
+    results = _post(batch_url, payload, timeout, extract=_extract_batch)
+    if len(results) != len(docs):
+        raise PdfRenderError(f"PDF batch returned {len(results)} results for {len(docs)} documents")
+    seconds = time.monotonic() - t0
+    out = []
+    for doc, res in zip(docs, results):
+        pdf = _b64(res) if isinstance(res, dict) else None
+        if pdf is None:
+            _count("error")
+            error = str(res.get("error") if isinstance(res, dict) else res) or "no PDF in batch result"
+            out.append(_result(doc["filename"], None, error, seconds, "batch", batch_size=len(docs)))
+            continue
+        _count("rendered")
+        if doc["key"]:
+            _cache_put(doc["key"], pdf)
+        out.append(_result(doc["filename"], pdf, None, seconds, "batch", batch_size=len(docs)))
+    return out
+
+
+def render_many(docs: Sequence[Document], service_url: Optional[str] = None, timeout: Optional[float] = None,
+                batch_url: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Renders several HTML documents; one result per document, in input order.
+
+    Documents are {"html", "filename"} dicts or (html, filename) tuples. A result is
+    {"filename", "pdf" (bytes or None), "error" (str or None), "seconds", "source":
+    cache|batch|single}; batch results share the request's wall time ("batch_size").
+    """
+    service_url = service_url if service_url is not None else SERVICE_URL
+    batch_url = batch_url if batch_url is not None else BATCH_URL
+    timeout = TIMEOUT if timeout is None else timeout
+    results: List[Optional[Dict[str, Any]]] = [None] * len(docs)
+    pending: List[Dict[str, Any]] = []
+    for i, d in enumerate(docs):
+        html, filename = (d.get("html"), d.get("filename")) if isinstance(d, dict) else d
+        filename = filename or f"report-{i + 1}.pdf"
+        if not (service_url and html):
+            results[i] = _result(filename, None, "PDF_SERVICE_URL is not configured" if html else "empty html",
+                                 0.0, "single")
+            continue
+        t0 = time.monotonic()
+        key = html_key(html) if CACHE_ENABLED else None
+        cached = _cache_get(key) if key else None
+        if cached is not None:
+            _count("cache_hit")
+            results[i] = _result(filename, cached, None, time.monotonic() - t0, "cache")
+        else:
+            pending.append({"index": i, "html": html, "filename": filename, "key": key})
+
+    singles: List[Dict[str, Any]] = []
+    if batch_url and batch_url not in _NO_BATCH:
+        for start in range(0, len(pending), BATCH_MAX):
+            chunk = pending[start:start + BATCH_MAX]
+            if batch_url in _NO_BATCH:
+                singles.extend(chunk)
+                continue
+            try:
+                for doc, res in zip(chunk, _batch(chunk, batch_url, timeout)):
+                    results[doc["index"]] = res
+            except httpx.HTTPStatusError as exc:
+                if exc.response.status_code in BATCH_UNSUPPORTED_STATUS:
+                    log.warning("PDF service has no batch endpoint (%s) – rendering one by one",
+                                exc.response.status_code)
+                    _NO_BATCH.add(batch_url)
+                singles.extend(chunk)  # z. B. 413: einzeln klappt es ggf. noch
+            except Exception as exc:
+                _count("error", len(chunk))
+                for doc in chunk:
+                    results[doc["index"]] = _result(doc["filename"], None, str(exc), 0.0, "batch",
+                                                    batch_size=len(chunk))
+    else:
+        singles = pending
+
+    if singles:
+        # parallel über den Keep-alive-Pool; _SEMAPHORE begrenzt die Requests im Flug
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENCY, len(singles)),
+                                thread_name_prefix="pdf-render") as pool:
+            for doc, res in zip(singles, pool.map(lambda d: _single(d, service_url, timeout), singles)):
+                results[doc["index"]] = res
+    return [r for r in results if r is not None]
+
+
+def render_or_none(html: Optional[str], filename: str = "report.pdf", **kwargs: Any) -> Optional[bytes]:
+    service_url = kwargs.get("service_url", SERVICE_URL)
+    if not (service_url and html):
+        return None
+    try:
+        return render(html=html, filename=filename, **kwargs)
+    except Exception as exc:
+        log.warning("PDF render failed: %s", exc)
+        return None
+
+
+async def render_pdf(html: str, filename: str = "report.pdf") -> Optional[bytes]:
+    """Async API (unchanged signature): same pool, limit and cache, in a worker thread."""
+    return await asyncio.to_thread(render_or_none, html, filename)
+
+
+def prometheus_lines(prom_line: Any) -> List[str]:
+    with _LOCK:
+        s = dict(STATS)
+    return [
+        "# HELP pdf_render_total PDF requests by outcome (this process)\n",
+        "# TYPE pdf_render_total counter\n",
+        *[prom_line("pdf_render_total", float(s[k]), {"outcome": k}) for k in ("rendered", "cache_hit", "error")],
+        "# HELP pdf_render_retries_total Retried PDF service calls\n",
+        "# TYPE pdf_render_retries_total counter\n",
+        prom_line("pdf_render_retries_total", float(s["retry"])),
+        "# HELP pdf_render_batch_requests_total Batched PDF service calls\n",
+        "# TYPE pdf_render_batch_requests_total counter\n",
+        prom_line("pdf_render_batch_requests_total", float(s["batch_requests"])),
+        "# HELP pdf_render_request_bytes_total Request body bytes sent to the PDF service\n",
+        "# TYPE pdf_render_request_bytes_total counter\n",
+        prom_line("pdf_render_request_bytes_total", float(s["bytes_sent"])),
+        "# HELP pdf_render_inflight PDF service calls in flight\n",
+        "# TYPE pdf_render_inflight gauge\n",
+        prom_line("pdf_render_inflight", float(s["inflight"])),
+        "# HELP pdf_render_concurrency_limit PDF_MAX_CONCURRENCY\n",
+        "# TYPE pdf_render_concurrency_limit gauge\n",
+        prom_line("pdf_render_concurrency_limit", float(MAX_CONCURRENCY)),
+    ]
+
+
+__all__ = ["render", "render_many", "render_or_none", "render_pdf", "html_key", "PdfRenderError", "PdfServiceUnavailable",
+           "prometheus_lines"]
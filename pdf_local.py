@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the PDF service (tests, development without the service).
+
+Speaks the same protocol as the real service, in-process via httpx.MockTransport:
+
+    POST <any>        {"html"|"url", "filename"}      → application/pdf
+    POST <…>/batch    {"documents": [{"html", "filename"}, …]}
+                      → {"results": [{"filename", "pdf_base64"} | {"filename", "error"}, …]}
+
+Request bodies may be gzip-encoded. The PDF is a minimal one-page document with
+the first characters of the document text – enough to check plumbing, caching and
+batching, not layout. pdf_client uses it for PDF_SERVICE_URL=local://.
+
+    svc = LocalPdfService(latency=0.05)
+    client = svc.client()           # httpx.Client for http_clients / pdf_client
+    svc.calls, svc.documents        # requests and documents seen
+"""
+from __future__ import annotations
+
+import base64
+import gzip
+import json
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+_TAG_RE = re.compile(r"<(script|style)\b.*?</\1>|<[^>]+>", re.S | re.I)
+
+
+def _text(html: str, limit: int = 80) -> str:
+    text = " ".join(_TAG_RE.sub(" ", html or "").split())
+    return text[:limit]
+
+
+def minimal_pdf(text: str) -> bytes:
+    """Valid single-page PDF 1.4 showing `text` (Latin-1, Helvetica)."""
+    safe = text.encode("latin-1", "replace").decode("latin-1")
+    safe = safe.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    stream = f"BT /F1 12 Tf 72 770 Td ({safe}) Tj ET".encode("latin-1")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, obj)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+class LocalPdfService:
+    """httpx handler rendering minimal PDFs; `fail` maps filenames to forced errors."""
+
+    def __init__(self, latency: float = 0.0, batch: bool = True, fail: Optional[Dict[str, str]] = None) -> None:
+        self.latency = latency
+        self.batch = batch
+        self.fail = dict(fail or {})
+        self.calls: List[Dict[str, Any]] = []
+        self.documents = 0
+        self._lock = threading.Lock()
+
+    def _render(self, doc: Dict[str, Any]) -> bytes:
+        name = str(doc.get("filename") or "report.pdf")
+        if name in self.fail:
+            raise ValueError(self.fail[name])
+        with self._lock:
+            self.documents += 1
+        return minimal_pdf(_text(doc.get("html") or doc.get("url") or name))
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = request.content
+        if request.headers.get("content-encoding") == "gzip":
+            body = gzip.decompress(body)
+        payload = json.loads(body or b"{}")
+        is_batch = request.url.path.rstrip("/").endswith("/batch")
+        with self._lock:
+            self.calls.append({"path": request.url.path, "batch": is_batch,
+                               "documents": len(payload.get("documents") or []) if is_batch else 1})
+        if self.latency:
+            time.sleep(self.latency)
+        if is_batch:
+            if not self.batch:
+                return httpx.Response(404)
+            results = []
+            for doc in payload.get("documents") or []:
+                try:
+                    pdf = self._render(doc)
+                    results.append({"filename": doc.get("filename"),
+                                    "pdf_base64": base64.b64encode(pdf).decode("ascii")})
+                except ValueError as exc:
+                    results.append({"filename": doc.get("filename"), "error": str(exc)})
+            return httpx.Response(200, json={"results": results})
+        try:
+            pdf = self._render(payload)
+        except ValueError as exc:
+            return httpx.Response(422, json={"error": str(exc)})
+        return httpx.Response(200, content=pdf, headers={"content-type": "application/pdf"})
+
+    def client(self, timeout: float = 30.0) -> httpx.Client:
+        return httpx.Client(transport=httpx.MockTransport(self), timeout=timeout)
+
+
+__all__ = ["LocalPdfService", "minimal_pdf"]
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Pre-render stage for HTML on its way to the PDF service (used by pdf_client.py).
+
+1. Assets: <img src>, CSS url() and <link rel="stylesheet"> pointing at
+   ASSETS_BASE_URL, "{{ASSETS_BASE}}" or /assets/ are replaced by data URIs /
+   inline <style>, so the PDF service needs no outbound fetches. Files come from
+   PDF_ASSETS_DIRS (default templates/assets, templates). Encoded once per file
+   version (path + mtime); PNG/JPEG use a smaller .webp sibling if present, SVG is
+   minified and URL-encoded instead of base64. Files above PDF_INLINE_MAX_BYTES
+   and external URLs stay untouched.
+2. CSS purge: rules whose selectors need a class or id the document does not
+   contain are dropped (template CSS, _print_overrides.css); @media/@supports are
+   purged recursively, @page/@font-face and element rules are kept.
+3. Minify: HTML and CSS comments, whitespace between tags.
+
+    html = prepare(html)
+"""
+from __future__ import annotations
+
+import base64
+import logging
+import mimetypes
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+from urllib.parse import quote
+
+log = logging.getLogger("pdf_prerender")
+
+BASE_DIR = Path(os.getenv("APP_BASE") or Path(__file__).resolve().parent)
+ASSETS_BASE_URL = os.getenv("ASSETS_BASE_URL", "/assets").rstrip("/")
+INLINE_MAX_BYTES = int(os.getenv("PDF_INLINE_MAX_BYTES", str(512 * 1024)))
+ASSET_DIRS = [Path(p) for p in os.getenv(
+    "PDF_ASSETS_DIRS", f"{BASE_DIR / 'templates' / 'assets'}{os.pathsep}{BASE_DIR / 'templates'}"
+).split(os.pathsep) if p]
+
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/svg+xml", ".svg")
+
+_STYLE_RE = re.compile(r"(<style[^>]*>)(.*?)(</style>)", re.S | re.I)
+_LINK_RE = re.compile(r"<link\b[^>]*\brel=[\"']?stylesheet[\"']?[^>]*>", re.I)
+_HREF_RE = re.compile(r"\bhref=[\"']([^\"']+)[\"']", re.I)
+_SRC_RE = re.compile(r"(\bsrc=)([\"'])([^\"']+)\2", re.I)
+_URL_RE = re.compile(r"url\(\s*([\"']?)([^\"')]+)\1\s*\)", re.I)
+_COMMENT_RE = re.compile(r"<!--(?!\[if).*?-->", re.S)
+_CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_CLASS_ATTR_RE = re.compile(r"\bclass=[\"']([^\"']*)[\"']", re.I)
+_ID_ATTR_RE = re.compile(r"\bid=[\"']([^\"']*)[\"']", re.I)
+_SEL_TOKEN_RE = re.compile(r"([.#])(-?[_a-zA-Z][\w-]*)")
+_NOT_RE = re.compile(r":not\([^)]*\)")
+
+
+# ---------- assets ----------
+
+def _asset_name(ref: str) -> Optional[str]:
+    """Asset-relative name for references into our asset space; None for anything else."""
+    ref = ref.strip()
+    for prefix in ("{{ASSETS_BASE}}/", f"{ASSETS_BASE_URL}/", "/assets/", "assets/"):
+        if prefix != "/" and ref.startswith(prefix):
+            name = ref[len(prefix):].split("?", 1)[0].split("#", 1)[0]
+            return name or None
+    return None
+
+
+def _resolve(name: str) -> Optional[Path]:
+    for root in ASSET_DIRS:
+        p = (root / name).resolve()
+        try:
+            p.relative_to(root.resolve())  # kein ../ aus dem Asset-Verzeichnis heraus
+        except ValueError:
+            continue
+        if p.is_file():
+            return p
+    return None
+
+
+def _optimized(path: Path) -> Path:
+    if path.suffix.lower() in (".png", ".jpg", ".jpeg"):
+        webp = path.with_suffix(".webp")
+        if webp.is_file() and webp.stat().st_size < path.stat().st_size:
+            return webp
+    return path
+
+
+def _minify_svg(text: str) -> str:
+    text = re.sub(r"<\?xml.*?\?>|<!--.*?-->", "", text, flags=re.S)
+    return re.sub(r">\s+<", "><", re.sub(r"\s+", " ", text)).strip()
+
+
+@lru_cache(maxsize=128)
+def _data_uri(path_str: str, mtime_ns: int, size: int) -> Optional[str]:
+    path = _optimized(Path(path_str))
+    if path.stat().st_size > INLINE_MAX_BYTES:
+        return None
+    mime = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    if mime == "image/svg+xml":
+        svg = _minify_svg(path.read_text(encoding="utf-8"))
+        return "data:image/svg+xml;charset=utf-8," + quote(svg, safe="=:/;,-_.()")
+    return f"data:{mime};base64," + base64.b64encode(path.read_bytes()).decode("ascii")
+
+
+def asset_data_uri(ref: str) -> Optional[str]:
+    name = _asset_name(ref)
+    path = _resolve(name) if name else None
+    if path is None:
+        return None
+    st = path.stat()
+    return _data_uri(str(path), st.st_mtime_ns, st.st_size)
+
+
+def _inline_urls(css: str) -> str:
+    def repl(m: "re.Match[str]") -> str:
+        uri = asset_data_uri(m.group(2))
+        return f'url("{uri}")' if uri else m.group(0)
+    return _URL_RE.sub(repl, css)
+
+
+@lru_cache(maxsize=32)
+def _stylesheet(path_str: str, mtime_ns: int) -> str:
+    return Path(path_str).read_text(encoding="utf-8")
+
+
+def inline_assets(html: str) -> str:
+    def link(m: "re.Match[str]") -> str:
+        href = _HREF_RE.search(m.group(0))
+        name = _asset_name(href.group(1)) if href else None
+        path = _resolve(name) if name else None
+        if path is None or path.suffix.lower() != ".css":
+            return m.group(0)
+        return f"<style>{_stylesheet(str(path), path.stat().st_mtime_ns)}</style>"
+
+    def src(m: "re.Match[str]") -> str:
+        uri = asset_data_uri(m.group(3))
+        return f"{m.group(1)}{m.group(2)}{uri}{m.group(2)}" if uri else m.group(0)
+
+    html = _LINK_RE.sub(link, html)
+    html = _SRC_RE.sub(src, html)
+    return _STYLE_RE.sub(lambda m: m.group(1) + _inline_urls(m.group(2)) + m.group(3), html)
+
+
+# ---------- css purge ----------
+
+def _used(html: str) -> Tuple[Set[str], Set[str]]:
+    body = _STYLE_RE.sub("", html)
+    classes = {c for m in _CLASS_ATTR_RE.finditer(body) for c in m.group(1).split()}
+    ids = {m.group(1).strip() for m in _ID_ATTR_RE.finditer(body)}
+    return classes, ids
+
+
+def _selector_used(selector: str, classes: Set[str], ids: Set[str]) -> bool:
+    sel = _NOT_RE.sub("", re.sub(r"\[[^\]]*\]", "", selector))
+    for kind, name in _SEL_TOKEN_RE.findall(sel):
+        if (kind == "." and name not in classes) or (kind == "#" and name not in ids):
+            return False
+    return True
+
+
+def _blocks(css: str) -> List[Tuple[str, str]]:
+    """Top-level (prelude, body) pairs; at-rules without a block get body None-equivalent ''."""
+    out: List[Tuple[str, str]] = []
+    i, n = 0, len(css)
+    while i < n:
+        brace = css.find("{", i)
+        semi = css.find(";", i)
+        if brace == -1:
+            break
+        if css[i:].lstrip().startswith("@") and semi != -1 and semi < brace:
+            out.append((css[i:semi + 1].strip(), ""))  # @import/@charset
+            i = semi + 1
+            continue
+        depth, j = 1, brace + 1
+        while j < n and depth:
+            depth += {"{": 1, "}": -1}.get(css[j], 0)
+            j += 1
+        out.append((css[i:brace].strip(), css[brace + 1:j - 1]))
+        i = j
+    return out
+
+
+def purge_css(css: str, classes: Set[str], ids: Set[str]) -> str:
+    css = _CSS_COMMENT_RE.sub("", css)
+    parts: List[str] = []
+    for prelude, body in _blocks(css):
+        if not prelude:
+            continue
+        if prelude.startswith("@"):
+            if not body and prelude.endswith(";"):
+                parts.append(prelude)
+            elif prelude.lower().startswith(("@media", "@supports")):
+                inner = purge_css(body, classes, ids)
+                if inner:
+                    parts.append(f"{prelude}{{{inner}}}")
+            else:
+                parts.append(f"{prelude}{{{body.strip()}}}")
+            continue
+        kept = [s.strip() for s in prelude.split(",") if _selector_used(s, classes, ids)]
+        if kept:
+            decls = re.sub(r"\s+", " ", body).strip()
+            parts.append(f"{','.join(kept)}{{{decls}}}")
+    return "".join(parts)
+
+
+# ---------- pipeline ----------
+
+def minify_html(html: str) -> str:
+    html = _COMMENT_RE.sub("", html)
+    if re.search(r"<(pre|textarea)\b", html, re.I):
+        return html.strip()
+    # Leerraum zwischen Tags → ein Leerzeichen (zwischen Inline-Elementen sichtbar)
+    return re.sub(r">\s+<", "> <", html).strip()
+
+
+def prepare(html: str) -> str:
+    """Self-contained, compacted HTML for the PDF service."""
+    try:
+        out = minify_html(inline_assets(html))
+        classes, ids = _used(out)
+        return _STYLE_RE.sub(lambda m: m.group(1) + purge_css(m.group(2), classes, ids) + m.group(3), out)
+    except Exception as exc:  # nie am Vorverarbeiten scheitern – das Original rendert auch
+        log.warning("PDF pre-render failed, sending original HTML: %s", exc)
+        return html
+
+
+__all__ = ["prepare", "inline_assets", "purge_css", "minify_html", "asset_data_uri"]
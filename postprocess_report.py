@@ -3,7 +3,8 @@
 """
 Post-Processing: Aus Sections + Live-Addins werden HTML-Blöcke für den PDF-Service.
 - Einheitliche Komponenten (Karten, Progress-Bars, Quellenliste, Deadlines-Tabelle).
-- Benchmarks (data/benchmarks_<branche>_kmu.json) werden bei Verfügbarkeit eingespielt.
+- Benchmarks (data/benchmarks_<branche>_kmu.json) werden bei Verfügbarkeit eingespielt
+  (über benchmark_repository, sofern importierbar).
 - Jede Kachel erhält "Stand: YYYY-MM-DD | Quelle(n): …" (Gold-Standard+ "Transparenz").
 
 Export:
@@ -19,10 +20,19 @@ from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List
 
+try:
+    from benchmark_repository import get_benchmark_repository
+except Exception:
+    get_benchmark_repository = None
+
 DATA_DIR = Path("data")
 
 
 def _load_benchmarks(industry: str) -> Dict[str, Any]:
+    if get_benchmark_repository is not None:
+        entry = get_benchmark_repository().entry(industry, "kmu")
+        # nur branchenspezifische Werte anzeigen, keine Default-Richtwerte
+        return entry.as_kpi_list() if entry.level <= 3 and entry.branche != "default" else {}
     path = DATA_DIR / f"benchmarks_{industry}_kmu.json"
     if not path.exists():
         return {}
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Queue statistics and job latency histograms for RQ.
+
+Counts are O(1): LLEN of the queue and ZCARD of the registries (no job is
+fetched or unpickled; registry cleanup is left to the workers).
+
+Workers record per queue (MetricsWorkerMixin, see worker.py / concurrent_worker.py):
+  wait time  enqueued_at → started_at
+  run time   started_at  → ended_at
+as cumulative histogram counters in Redis (`rq:metrics:<queue>:wait|run`), so
+every web process exports the same numbers. Together with the age of the oldest
+queued job this is the signal for autoscaling worker services:
+
+  rq_queue_jobs{queue,state}
+  rq_queue_oldest_job_age_seconds{queue}
+  rq_job_wait_seconds_bucket{queue,le} / _sum / _count
+  rq_job_run_seconds_bucket{queue,le}  / _sum / _count
+  rq_jobs_total{queue,status}
+  rq_job_failures_total{queue,stage,exception,outcome}   (retry_policy.py)
+
+ENV: RQ_WAIT_BUCKETS, RQ_RUN_BUCKETS (seconds, comma separated)
+"""
+from __future__ import annotations
+
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from rq import Queue, SimpleWorker, Worker
+from rq.job import Job
+
+log = logging.getLogger("queue_metrics")
+
+
+def _buckets(env: str, default: str) -> List[float]:
+    return sorted(float(x) for x in os.getenv(env, default).split(",") if x.strip())
+
+
+WAIT_BUCKETS = _buckets("RQ_WAIT_BUCKETS", "1,5,15,30,60,120,300,600,1800,3600")
+RUN_BUCKETS = _buckets("RQ_RUN_BUCKETS", "1,5,15,30,60,120,300,600,1200,1800")
+KEY = "rq:metrics:{queue}:{kind}"
+STATES = ("queued", "started", "deferred", "scheduled", "finished", "failed")
+
+
+def _le(b: float) -> str:
+    return "+Inf" if b == float("inf") else f"{b:g}"
+
+
+# ---------- counts ----------
+
+def queue_counts(q: Queue) -> Dict[str, int]:
+    return {
+        "queued": q.count,
+        "started": q.started_job_registry.get_job_count(cleanup=False),
+        "deferred": q.deferred_job_registry.get_job_count(cleanup=False),
+        "scheduled": q.scheduled_job_registry.get_job_count(cleanup=False),
+        "finished": q.finished_job_registry.get_job_count(cleanup=False),
+        "failed": q.failed_job_registry.get_job_count(cleanup=False),
+    }
+
+
+def oldest_job_age(q: Queue, now: Optional[datetime] = None) -> float:
+    """Seconds the head of the queue has been waiting; 0 for an empty queue."""
+    ids = q.get_job_ids(0, 0)
+    if not ids:
+        return 0.0
+    try:
+        job = Job.fetch(ids[0], connection=q.connection)
+    except Exception:  # zwischen LRANGE und Fetch abgeholt/gelöscht
+        return 0.0
+    if job.enqueued_at is None:
+        return 0.0
+    now = now or datetime.now(timezone.utc)
+    enq = job.enqueued_at if job.enqueued_at.tzinfo else job.enqueued_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (now - enq).total_seconds())
+
+
+# ---------- histograms ----------
+
+def _observe(pipe: Any, queue: str, kind: str, value: float, buckets: Sequence[float]) -> None:
+    key = KEY.format(queue=queue, kind=kind)
+    bucket = next((b for b in buckets if value <= b), float("inf"))
+    pipe.hincrby(key, _le(bucket), 1)
+    pipe.hincrbyfloat(key, "sum", value)
+    pipe.hincrby(key, "count", 1)
+
+
+def _aware(dt: datetime) -> datetime:
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def record_job(connection: Any, job: Job, status: str) -> None:
+    """Records wait/run time of a finished or failed job; never raises."""
+    try:
+        queue = job.origin
+        with connection.pipeline(transaction=False) as pipe:
+            if job.enqueued_at and job.started_at:
+                wait = (_aware(job.started_at) - _aware(job.enqueued_at)).total_seconds()
+                _observe(pipe, queue, "wait", max(0.0, wait), WAIT_BUCKETS)
+            if job.started_at and job.ended_at:
+                run = (_aware(job.ended_at) - _aware(job.started_at)).total_seconds()
+                _observe(pipe, queue, "run", max(0.0, run), RUN_BUCKETS)
+            pipe.hincrby(KEY.format(queue=queue, kind="jobs"), status, 1)
+            pipe.execute()
+    except Exception as exc:
+        log.debug("queue metrics not recorded for %s: %s", getattr(job, "id", "?"), exc)
+
+
+def histogram(connection: Any, queue: str, kind: str) -> Dict[str, Any]:
+    """{'buckets': [(le, cumulative_count), ...], 'sum': float, 'count': int}"""
+    raw = {(k.decode() if isinstance(k, bytes) else k): v
+           for k, v in (connection.hgetall(KEY.format(queue=queue, kind=kind)) or {}).items()}
+    bounds = WAIT_BUCKETS if kind == "wait" else RUN_BUCKETS
+    cum, out = 0, []
+    for b in list(bounds) + [float("inf")]:
+        cum += int(raw.get(_le(b), 0))
+        out.append((_le(b), cum))
+    return {"buckets": out, "sum": float(raw.get("sum", 0) or 0), "count": int(raw.get("count", 0) or 0)}
+
+
+def job_totals(connection: Any, queue: str) -> Dict[str, int]:
+    raw = connection.hgetall(KEY.format(queue=queue, kind="jobs")) or {}
+    return {(k.decode() if isinstance(k, bytes) else k): int(v) for k, v in raw.items()}
+
+
+def record_failure(connection: Any, queue: str, stage: str, exc_type: str, outcome: str) -> None:
+    """outcome: 'retry' (will run again) or 'dead' (in the failed registry); never raises."""
+    try:
+        connection.hincrby(KEY.format(queue=queue, kind="failures"), f"{stage}|{exc_type}|{outcome}", 1)
+    except Exception as exc:
+        log.debug("failure metric not recorded for %s: %s", queue, exc)
+
+
+def failure_totals(connection: Any, queue: str) -> Dict[str, int]:
+    """{"stage|exception|outcome": count}"""
+    raw = connection.hgetall(KEY.format(queue=queue, kind="failures")) or {}
+    return {(k.decode() if isinstance(k, bytes) else k): int(v) for k, v in raw.items()}
+
+
+class MetricsWorkerMixin:
+    """Put in front of an RQ worker class to record wait/run histograms."""
+
+    def handle_job_success(self, job, queue, started_job_registry):
+        super().handle_job_success(job, queue, started_job_registry)
+        record_job(self.connection, job, "finished")
+
+    def handle_job_failure(self, job, queue, started_job_registry=None, exc_string=""):
+        super().handle_job_failure(job, queue, started_job_registry=started_job_registry, exc_string=exc_string)
+        record_job(self.connection, job, "failed")
+
+
+class MetricsWorker(MetricsWorkerMixin, Worker):
+    pass
+
+
+class MetricsSimpleWorker(MetricsWorkerMixin, SimpleWorker):
+    pass
+
+
+# ---------- aggregate ----------
+
+def collect(connection: Any, queue_names: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    for name in queue_names:
+        q = Queue(name, connection=connection)
+        out[name] = {
+            "counts": queue_counts(q),
+            "oldest_age_seconds": oldest_job_age(q),
+            "wait": histogram(connection, name, "wait"),
+            "run": histogram(connection, name, "run"),
+            "jobs": job_totals(connection, name),
+            "failures": failure_totals(connection, name),
+        }
+    return out
+
+
+def prometheus_lines(stats: Dict[str, Dict[str, Any]], prom_line: Any) -> List[str]:
+    """Exposition lines; prom_line(metric, value, labels) formats one sample."""
+    lines = ["# HELP rq_queue_jobs Jobs per queue and state\n", "# TYPE rq_queue_jobs gauge\n"]
+    for q, s in stats.items():
+        for state in STATES:
+            lines.append(prom_line("rq_queue_jobs", float(s["counts"].get(state, 0)), {"queue": q, "state": state}))
+    lines += ["# HELP rq_queue_oldest_job_age_seconds Wait time of the job at the head of the queue\n",
+              "# TYPE rq_queue_oldest_job_age_seconds gauge\n"]
+    for q, s in stats.items():
+        lines.append(prom_line("rq_queue_oldest_job_age_seconds", round(s["oldest_age_seconds"], 3), {"queue": q}))
+    for kind, help_text in (("wait", "Time from enqueue to start"), ("run", "Job execution time")):
+        metric = f"rq_job_{kind}_seconds"
+        lines += [f"# HELP {metric} {help_text}\n", f"# TYPE {metric} histogram\n"]
+        for q, s in stats.items():
+            h = s[kind]
+            for le, cnt in h["buckets"]:
+                lines.append(prom_line(f"{metric}_bucket", float(cnt), {"queue": q, "le": le}))
+            lines.append(prom_line(f"{metric}_sum", round(h["sum"], 6), {"queue": q}))
+            lines.append(prom_line(f"{metric}_count", float(h["count"]), {"queue": q}))
+    lines += ["# HELP rq_jobs_total Jobs completed per queue and status\n", "# TYPE rq_jobs_total counter\n"]
+    for q, s in stats.items():
+        for status in ("finished", "failed"):
+            lines.append(prom_line("rq_jobs_total", float(s["jobs"].get(status, 0)), {"queue": q, "status": status}))
+    lines += ["# HELP rq_job_failures_total Failed attempts per stage and exception (outcome retry|dead)\n",
+              "# TYPE rq_job_failures_total counter\n"]
+    for q, s in stats.items():
+        for key, cnt in sorted(s.get("failures", {}).items()):
+            stage, exc, outcome = (key.split("|") + ["", ""])[:3]
+            lines.append(prom_line("rq_job_failures_total", float(cnt),
+                                   {"queue": q, "stage": stage, "exception": exc, "outcome": outcome}))
+    return lines
+
+
+__all__ = ["queue_counts", "oldest_job_age", "record_job", "record_failure", "failure_totals", "histogram", "collect",
+           "prometheus_lines", "MetricsWorkerMixin", "MetricsWorker", "MetricsSimpleWorker"]
@@ -10,31 +10,29 @@ def enqueue_report(report_id: str, payload: Dict[str, Any]) -> bool:
     if not enabled():
         return False
     try:
-        import redis
-        from rq import Queue
-        from worker_tasks import process_report
-        conn = redis.from_url(os.environ["REDIS_URL"], decode_responses=False)
-        q = Queue("reports", connection=conn, default_timeout=900)
-        q.enqueue(process_report, report_id, payload)
+        from redis_pool import get_redis
+        from report_pipeline import enqueue_pipeline
+        conn = get_redis()
+        enqueue_pipeline(report_id, payload, connection=conn)
         return True
     except Exception:
         return False
 
 def get_stats() -> Dict[str, int]:
+    """Summe über alle RQ_QUEUES; O(1) je Queue (LLEN/ZCARD, kein Job wird geladen)."""
+    empty = {"queued": 0, "started": 0, "finished": 0, "failed": 0, "deferred": 0, "scheduled": 0}
     if not enabled():
-        return {"queued": 0, "started": 0, "finished": 0, "failed": 0, "deferred": 0, "scheduled": 0}
+        return empty
     try:
-        import redis
         from rq import Queue
-        conn = redis.from_url(os.environ["REDIS_URL"], decode_responses=False)
-        q = Queue("reports", connection=conn)
-        return {
-            "queued": len(q.jobs),
-            "started": 0,
-            "finished": 0,
-            "failed": len(q.failed_job_registry),
-            "deferred": len(q.deferred_job_registry),
-            "scheduled": len(q.scheduled_job_registry),
-        }
+        from queue_metrics import queue_counts
+        from queue_utils import get_queue_names
+        from redis_pool import get_redis
+        conn = get_redis()
+        totals = dict(empty)
+        for name in get_queue_names():
+            for k, v in queue_counts(Queue(name, connection=conn)).items():
+                totals[k] += v
+        return totals
     except Exception:
-        return {"queued": 0, "started": 0, "finished": 0, "failed": 0, "deferred": 0, "scheduled": 0}
+        return empty
@@ -9,13 +9,12 @@ from redis import Redis
 from rq import Queue
 
 def get_redis_connection() -> Redis:
-    url = os.getenv("REDIS_URL", "").strip()
-    if not url:
-        raise RuntimeError("REDIS_URL is not set")
-    return Redis.from_url(url, decode_responses=False)
+    """Binary client on the shared process-wide pool (redis_pool.py)."""
+    from redis_pool import get_redis
+    return get_redis(decode=False)
 
 def get_queue_names() -> List[str]:
-    raw = os.getenv("RQ_QUEUES", "reports,emails")
+    raw = os.getenv("RQ_QUEUES", "reports,pdf,emails,reports-batch,reports-maint")
     names = [n.strip() for n in raw.split(",") if n.strip()]
     return names or ["default"]
 
@@ -8,9 +8,8 @@ _memory_store = {}
 
 def _redis_client():
     try:
-        import redis  # type: ignore
-        url = os.environ.get("REDIS_URL")
-        return redis.from_url(url, decode_responses=True) if url else None
+        from redis_pool import get_redis  # shared pool, no handshake per request
+        return get_redis(decode=True) if os.environ.get("REDIS_URL") else None
     except Exception:
         return None
 
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide Redis connection pools.
+
+`Redis.from_url()` per request builds a new pool each time: under load that means
+a TCP (and TLS) handshake per call and many half-idle connections on the server.
+Instead, all code shares:
+
+    get_redis()              binary client (RQ, pickled job data, artifacts refs)
+    get_redis(decode=True)   str client (rate limits, counters)
+    get_async_redis(...)     redis.asyncio client for async FastAPI handlers
+
+Pools are blocking: when REDIS_MAX_CONNECTIONS are in use, callers wait up to
+REDIS_POOL_TIMEOUT seconds instead of opening more connections. Idle connections
+are health-checked (PING) after REDIS_HEALTH_CHECK_INTERVAL seconds. redis-py
+resets pools in forked children on first use (pid check), so RQ work horses get
+their own connections.
+
+ENV: REDIS_URL, REDIS_MAX_CONNECTIONS (50), REDIS_POOL_TIMEOUT (5),
+     REDIS_HEALTH_CHECK_INTERVAL (30), REDIS_SOCKET_TIMEOUT (10)
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from typing import Any, Dict, Tuple
+
+from redis import BlockingConnectionPool, Redis
+
+try:
+    import redis.asyncio as aioredis
+except Exception:
+    aioredis = None
+
+MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "10"))
+
+_CLIENTS: Dict[bool, Redis] = {}
+_ASYNC_CLIENTS: Dict[Tuple[bool, int], Any] = {}
+_LOCK = threading.Lock()
+
+
+def redis_url() -> str:
+    url = os.getenv("REDIS_URL", "").strip()
+    if not url:
+        raise RuntimeError("REDIS_URL is not set")
+    return url
+
+
+def _pool_kwargs(decode: bool) -> Dict[str, Any]:
+    return {
+        "max_connections": MAX_CONNECTIONS,
+        "timeout": POOL_TIMEOUT,
+        "health_check_interval": HEALTH_CHECK_INTERVAL,
+        "socket_timeout": SOCKET_TIMEOUT,
+        "socket_connect_timeout": 5,
+        "socket_keepalive": True,
+        "retry_on_timeout": True,
+        "decode_responses": decode,
+    }
+
+
+def get_redis(decode: bool = False) -> Redis:
+    cli = _CLIENTS.get(decode)
+    if cli is None:
+        with _LOCK:
+            cli = _CLIENTS.get(decode)
+            if cli is None:
+                pool = BlockingConnectionPool.from_url(redis_url(), **_pool_kwargs(decode))
+                cli = Redis(connection_pool=pool)
+                _CLIENTS[decode] = cli
+    return cli
+
+
+def get_async_redis(decode: bool = False) -> Any:
+    """asyncio client bound to the running event loop (one pool per loop)."""
+    if aioredis is None:
+        raise RuntimeError("redis.asyncio is not available")
+    key = (decode, id(asyncio.get_running_loop()))
+    cli = _ASYNC_CLIENTS.get(key)
+    if cli is None:
+        pool = aioredis.BlockingConnectionPool.from_url(redis_url(), **_pool_kwargs(decode))
+        cli = aioredis.Redis(connection_pool=pool)
+        _ASYNC_CLIENTS[key] = cli
+    return cli
+
+
+def _pool_usage(pool: Any) -> Dict[str, int]:
+    created = len(getattr(pool, "_connections", []) or [])
+    q = getattr(pool, "pool", None)
+    idle = sum(1 for c in list(getattr(q, "_queue", None) or getattr(q, "queue", [])) if c is not None)
+    return {"max": int(pool.max_connections), "created": created, "idle": idle, "in_use": max(0, created - idle)}
+
+
+def pool_stats() -> Dict[str, Dict[str, int]]:
+    """{'binary': {...}, 'decoded': {...}, 'async-binary': {...}} for the pools in use."""
+    out: Dict[str, Dict[str, int]] = {}
+    for decode, cli in list(_CLIENTS.items()):
+        out["decoded" if decode else "binary"] = _pool_usage(cli.connection_pool)
+    for (decode, _), cli in list(_ASYNC_CLIENTS.items()):
+        name = "async-decoded" if decode else "async-binary"
+        usage = _pool_usage(cli.connection_pool)
+        agg = out.setdefault(name, {"max": 0, "created": 0, "idle": 0, "in_use": 0})
+        for k, v in usage.items():
+            agg[k] += v
+    return out
+
+
+def health() -> Dict[str, Any]:
+    try:
+        ok = bool(get_redis().ping())
+    except Exception as exc:
+        return {"ok": False, "error": str(exc), "pools": pool_stats()}
+    return {"ok": ok, "pools": pool_stats()}
+
+
+def prometheus_lines(prom_line: Any) -> list:
+    lines = ["# HELP redis_pool_connections Redis pool connections by state\n",
+             "# TYPE redis_pool_connections gauge\n"]
+    for pool, usage in pool_stats().items():
+        for state in ("in_use", "idle", "created", "max"):
+            lines.append(prom_line("redis_pool_connections", float(usage[state]), {"pool": pool, "state": state}))
+    return lines
+
+
+def reset() -> None:
+    """Disconnects and forgets all sync pools (tests, URL change)."""
+    with _LOCK:
+        for cli in _CLIENTS.values():
+            try:
+                cli.connection_pool.disconnect()
+            except Exception:
+                pass
+        _CLIENTS.clear()
+        _ASYNC_CLIENTS.clear()
+
+
+__all__ = ["get_redis", "get_async_redis", "pool_stats", "health", "prometheus_lines", "reset", "redis_url"]
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Bounded in-process executor for report work (path without ENABLE_QUEUE).
+
+`build_html_report` used to run on the event loop's default executor via
+BackgroundTasks: every submission started another LLM pipeline, and a burst
+starved the threads the web process needs for request handling.
+
+    REPORT_EXECUTOR_WORKERS (4)   reports built concurrently
+    REPORT_EXECUTOR_QUEUE   (16)  admitted reports waiting for a worker
+    REPORT_OVERLOAD_MODE    reject | preview
+
+Admission happens in the request: `admit()` returns a ticket or None when
+workers + queue are taken. The endpoint then answers 503 with Retry-After
+(estimated from the mean build time), or with REPORT_OVERLOAD_MODE=preview it
+returns the deterministic preview (scores and template, no LLM/live data).
+
+Exported on /metrics: report_executor_jobs{state="active|queued"},
+report_executor_capacity, report_executor_rejected_total,
+report_executor_completed_total{outcome="ok|error"}.
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+log = logging.getLogger("report_executor")
+
+WORKERS = int(os.getenv("REPORT_EXECUTOR_WORKERS", "4"))
+QUEUE_MAX = int(os.getenv("REPORT_EXECUTOR_QUEUE", "16"))
+OVERLOAD_MODE = os.getenv("REPORT_OVERLOAD_MODE", "reject").strip().lower()
+RETRY_AFTER_MIN = int(os.getenv("REPORT_RETRY_AFTER_MIN", "10"))
+RETRY_AFTER_MAX = int(os.getenv("REPORT_RETRY_AFTER_MAX", "600"))
+
+
+class Ticket:
+    """An admitted report; release() exactly once when it is done (idempotent)."""
+
+    def __init__(self, executor: "ReportExecutor") -> None:
+        self._executor = executor
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._executor._release()
+
+
+class ReportExecutor:
+    def __init__(self, workers: int = WORKERS, queue_max: int = QUEUE_MAX) -> None:
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, queue_max)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="report")
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.active = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self._avg_seconds: Optional[float] = None
+
+    # ---------- admission ----------
+
+    def admit(self) -> Optional[Ticket]:
+        with self._lock:
+            if self.admitted >= self.capacity:
+                self.rejected += 1
+                return None
+            self.admitted += 1
+        return Ticket(self)
+
+    def _release(self) -> None:
+        with self._lock:
+            self.admitted = max(0, self.admitted - 1)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free: waiting reports / workers × mean build time."""
+        with self._lock:
+            waiting = max(0, self.admitted - self.workers) + 1
+            avg = self._avg_seconds or 60.0
+        return int(min(RETRY_AFTER_MAX, max(RETRY_AFTER_MIN, math.ceil(waiting / self.workers * avg))))
+
+    # ---------- execution ----------
+
+    def _timed(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            self.active += 1
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            result = fn(*args)
+            ok = True
+            return result
+        finally:
+            took = time.perf_counter() - t0
+            with self._lock:
+                self.active -= 1
+                self.completed += ok
+                self.failed += not ok
+                # gleitender Mittelwert für Retry-After
+                self._avg_seconds = took if self._avg_seconds is None else 0.8 * self._avg_seconds + 0.2 * took
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Runs fn(*args) on the bounded pool without blocking the event loop."""
+        return await asyncio.get_running_loop().run_in_executor(self._pool, self._timed, fn, *args)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "active": self.active,
+                "queued": max(0, self.admitted - self.active),
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_seconds": round(self._avg_seconds, 3) if self._avg_seconds is not None else None,
+            }
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+async def run_admitted(ticket: Ticket, fn: Callable[..., Any], *args: Any) -> Any:
+    """Background-task wrapper: runs fn (sync or async) and frees the ticket afterwards."""
+    try:
+        result = fn(*args)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+    finally:
+        ticket.release()
+
+
+_EXECUTOR: Optional[ReportExecutor] = None
+_LOCK = threading.Lock()
+
+
+def get_executor() -> ReportExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = ReportExecutor()
+    return _EXECUTOR
+
+
+def reset_executor() -> None:
+    global _EXECUTOR
+    _EXECUTOR = None
+
+
+if hasattr(os, "register_at_fork"):
+    # Threads des Pools existieren im Kind nicht
+    os.register_at_fork(after_in_child=reset_executor)
+
+
+def prometheus_lines(prom_line: Any) -> List[str]:
+    if _EXECUTOR is None:
+        return []
+    s = _EXECUTOR.stats()
+    return [
+        "# HELP report_executor_jobs In-process report builds by state\n",
+        "# TYPE report_executor_jobs gauge\n",
+        prom_line("report_executor_jobs", float(s["active"]), {"state": "active"}),
+        prom_line("report_executor_jobs", float(s["queued"]), {"state": "queued"}),
+        "# HELP report_executor_capacity Workers plus queue slots\n",
+        "# TYPE report_executor_capacity gauge\n",
+        prom_line("report_executor_capacity", float(s["capacity"])),
+        "# HELP report_executor_rejected_total Submissions shed because the executor was full\n",
+        "# TYPE report_executor_rejected_total counter\n",
+        prom_line("report_executor_rejected_total", float(s["rejected"])),
+        "# HELP report_executor_completed_total Finished in-process report builds\n",
+        "# TYPE report_executor_completed_total counter\n",
+        prom_line("report_executor_completed_total", float(s["completed"]), {"outcome": "ok"}),
+        prom_line("report_executor_completed_total", float(s["failed"]), {"outcome": "error"}),
+    ]
+
+
+__all__ = ["ReportExecutor", "Ticket", "get_executor", "reset_executor", "run_admitted",
+           "prometheus_lines", "OVERLOAD_MODE"]
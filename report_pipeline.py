@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+"""
+Staged report pipeline as dependent RQ jobs.
+
+    analyze  (lane queue)       briefing → report.html + meta.json
+       └─ pdf   (queue "pdf")   report.html → report.pdf        (skipped without PDF_SERVICE_URL)
+            ├─ mail:user  (queue "emails")
+            └─ mail:admin (queue "emails")
+
+Every stage writes its artifact to the job's directory (report_store.py) and returns
+early when the artifact already exists. A retried or re-enqueued pipeline therefore
+resumes at the failed stage; it never reruns the LLM stage just because SMTP failed.
+The mail stages run even if the PDF stage ultimately failed (HTML attachment fallback).
+
+Artifacts handed between stages (SHARED: briefing, meta, admin attachments, HTML,
+PDF) are also published to the artifact store (artifact_store.py); Redis keeps only
+the reference under artifact:<report_id>:<kind>. load_artifact/has_artifact fall
+back to that reference, so analyze, pdf and mail may run on workers that do not
+share a disk, and the web process can stream the report.
+
+Unlike the legacy worker_tasks.process_report, the pipeline does not update a DB
+Task row on purpose: the status hash (job_events.py) is the job state the API reads,
+and db.py only provides async sessions.
+
+Each stage has its own queue, so worker counts scale independently, e.g.
+RQ_WORKER_MODE=thread RQ_CONCURRENCY="reports:8,pdf:4,emails:2".
+The analyze stage goes through fair_queue.py: lane "interactive" ("reports"),
+"batch" or "maintenance", released round robin per tenant.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from html import escape as html_escape
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from redis import Redis
+from rq import Queue, Retry, get_current_job
+from rq.job import Dependency
+
+import report_store
+
+log = logging.getLogger("report_pipeline")
+
+REPORTS_QUEUE = os.getenv("RQ_QUEUE_REPORTS", "reports")
+PDF_QUEUE = os.getenv("RQ_QUEUE_PDF", "pdf")
+EMAILS_QUEUE = os.getenv("RQ_QUEUE_EMAILS", "emails")
+
+ANALYZE_TIMEOUT = int(os.getenv("RQ_JOB_TIMEOUT", "600"))
+PDF_TIMEOUT = int(os.getenv("PIPELINE_PDF_TIMEOUT", "180"))
+MAIL_TIMEOUT = int(os.getenv("PIPELINE_MAIL_TIMEOUT", "120"))
+RESULT_TTL = int(os.getenv("RQ_RESULT_TTL", "3600"))
+MAX_RETRIES = int(os.getenv("PIPELINE_MAX_RETRIES", "3"))  # 0 = keine Retries; sonst gilt retry_policy.py
+
+STAGES = ("analyze", "pdf", "mail_user", "mail_admin")
+
+
+# ---------- artifacts ----------
+
+def job_dir(report_id: str) -> Path:
+    return report_store.job_dir(report_id)
+
+
+def save_artifact(report_id: str, name: str, data: bytes) -> Path:
+    return report_store.save(report_id, name, data)
+
+
+# Dateiname → (Artifact-Kind, Content-Type) für alles, was eine andere Stufe liest
+SHARED = {
+    "briefing.json": ("briefing", "application/json"),
+    "meta.json": ("meta", "application/json"),
+    "admin_attachments.json": ("admin", "application/json"),
+    "report.html": ("html", "text/html; charset=utf-8"),
+    "report.pdf": ("pdf", "application/pdf"),
+}
+
+
+def ref_key(report_id: str, kind: str) -> str:
+    return f"artifact:{report_id}:{kind}"
+
+
+def _connection(connection: Optional[Redis] = None) -> Optional[Redis]:
+    if connection is not None:
+        return connection
+    job = get_current_job()
+    return job.connection if job is not None else None
+
+
+def _ref(report_id: str, name: str, connection: Optional[Redis]) -> Optional[Dict[str, Any]]:
+    spec, conn = SHARED.get(name), _connection(connection)
+    if spec is None or conn is None:
+        return None
+    import artifact_store
+    try:
+        return artifact_store.load_ref(conn, ref_key(report_id, spec[0]))
+    except Exception as exc:
+        log.warning("Artifact ref for %s/%s unavailable: %s", report_id, name, exc)
+        return None
+
+
+def load_artifact(report_id: str, name: str, connection: Optional[Redis] = None) -> Optional[bytes]:
+    """Local copy first, else the published artifact (cached locally for later stages)."""
+    p = job_dir(report_id) / name
+    try:
+        return p.read_bytes()
+    except FileNotFoundError:
+        pass
+    ref = _ref(report_id, name, connection)
+    if ref is None:
+        return None
+    import artifact_store
+    try:
+        data = artifact_store.get_store().read(ref["sha256"])
+    except Exception as exc:  # abgelaufen/gelöscht
+        log.warning("Artifact %s/%s not readable from store: %s", report_id, name, exc)
+        return None
+    save_artifact(report_id, name, data)
+    return data
+
+
+def has_artifact(report_id: str, name: str, connection: Optional[Redis] = None) -> bool:
+    if report_store.locate(report_id, name) is not None:
+        return True
+    ref = _ref(report_id, name, connection)
+    if ref is None:
+        return False
+    import artifact_store
+    try:
+        return artifact_store.get_store().stat(ref["sha256"]) is not None
+    except Exception:
+        return False
+
+
+def store_artifact(report_id: str, name: str, data: bytes, connection: Optional[Redis] = None) -> Path:
+    """Writes the local copy and, for SHARED names, publishes it for other workers."""
+    path = save_artifact(report_id, name, data)
+    spec, conn = SHARED.get(name), _connection(connection)
+    if spec is not None:
+        import artifact_store
+        try:
+            ref = artifact_store.get_store().put(data, spec[1], kind=spec[0])
+            if conn is not None:
+                artifact_store.save_ref(conn, ref_key(report_id, spec[0]), ref)
+        except Exception as exc:
+            # lokale Kopie bleibt; nur Stufen auf anderen Workern (und der Download) sehen sie nicht
+            log.warning("Artifact publish failed for %s/%s: %s", report_id, name, exc)
+    return path
+
+
+def _summarize(report_id: str, stages: Dict[str, Any]) -> Dict[str, Any]:
+    if not stages:
+        return {}
+    states = {v.get("state") for v in stages.values()}
+    if "failed" in states:
+        overall = "failed"
+    elif all(stages.get(s, {}).get("state") in ("done", "skipped") for s in STAGES):
+        overall = "completed"
+    else:
+        overall = "processing"
+    return {"report_id": report_id, "state": overall, "stages": stages}
+
+
+def status_from_fields(report_id: str, fields: Dict[str, str]) -> Dict[str, Any]:
+    """Same shape as read_status() from a job_events status hash (or pub/sub snapshot)."""
+    stages: Dict[str, Any] = {}
+    for stage in STAGES:
+        raw = fields.get(f"stage:{stage}")
+        if raw:
+            stages[stage] = json.loads(raw)
+    out = _summarize(report_id, stages)
+    if out:
+        out["download_available"] = fields.get("download_available") == "1"
+    return out
+
+
+def read_status(report_id: str, connection: Optional[Redis] = None) -> Dict[str, Any]:
+    """{report_id, state, stages: {stage: {state, at, ...}}}; {} if unknown.
+
+    With a connection the compact status hash (job_events.py) is read first;
+    the per-stage files remain the fallback (e.g. hash expired, Redis down).
+    """
+    if connection is not None:
+        try:
+            import job_events
+            out = status_from_fields(report_id, job_events.read(connection, report_id))
+            if out:
+                return out
+        except Exception as exc:
+            log.debug("status hash for %s unavailable: %s", report_id, exc)
+    stages: Dict[str, Any] = {}
+    for stage in STAGES:
+        raw = load_artifact(report_id, f"status.{stage}.json")
+        if raw:
+            stages[stage] = json.loads(raw)
+    return _summarize(report_id, stages)
+
+
+def _set_stage(report_id: str, stage: str, state: str, connection: Optional[Redis] = None,
+               flags: Optional[Dict[str, Any]] = None, **extra: Any) -> None:
+    # eine Datei pro Stufe: parallele Stufen (mail_user/mail_admin) überschreiben sich nicht
+    st = {"state": state, "at": datetime.utcnow().isoformat() + "Z", **extra}
+    save_artifact(report_id, f"status.{stage}.json", json.dumps(st, ensure_ascii=False).encode("utf-8"))
+    # ein Hash-Feld pro Stufe, gleiche Begründung; Abonnenten bekommen den ganzen Stand
+    import job_events
+    job_events.publish(connection, report_id, **{f"stage:{stage}": st}, **(flags or {}))
+
+
+# ---------- stages ----------
+
+def stage_analyze(report_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    if has_artifact(report_id, "report.html"):
+        return {"report_id": report_id, "resumed": True}
+    from job_payload import unpack
+    payload = unpack(payload)
+    _set_stage(report_id, "analyze", "running")
+    store_artifact(report_id, "briefing.json", json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8"))
+    import gpt_analyze
+    from gpt_analyze import build_html_report
+    lang = str(payload.get("lang") or payload.get("language") or "de").lower()
+    t0 = time.perf_counter()
+    try:
+        result = build_html_report(payload, lang)
+    except Exception as exc:
+        _set_stage(report_id, "analyze", "failed", error=str(exc))
+        job = get_current_job()
+        if not (job and job.retries_left):  # endgültig: erneutes Absenden wieder zulassen
+            import idempotency
+            idempotency.release_job(report_id, redis=job.connection if job else None)
+        raise
+    meta = result.get("meta") or {}
+    store_artifact(report_id, "meta.json", json.dumps(meta, ensure_ascii=False, default=str).encode("utf-8"))
+    # Admin-Anhänge wie im Legacy-Job (process_report); best effort
+    produce = getattr(gpt_analyze, "produce_admin_attachments", None)
+    if produce is not None:
+        try:
+            extra = produce(payload, lang) or {}
+            store_artifact(report_id, "admin_attachments.json", json.dumps(extra, ensure_ascii=False).encode("utf-8"))
+        except Exception as exc:
+            log.warning("Admin attachments for %s failed: %s", report_id, exc)
+    # report.html zuletzt: sein Vorhandensein markiert die Stufe als fertig
+    html = (result.get("html") or "").encode("utf-8")
+    store_artifact(report_id, "report.html", html)
+    _set_stage(report_id, "analyze", "done", flags={"download_available": True},
+               ms=round((time.perf_counter() - t0) * 1000), tier=meta.get("tier"))
+    return {"report_id": report_id, "score": meta.get("score"), "badge": meta.get("badge")}
+
+
+def stage_pdf(report_id: str) -> Dict[str, Any]:
+    if has_artifact(report_id, "report.pdf"):
+        return {"report_id": report_id, "resumed": True}
+    html = load_artifact(report_id, "report.html")
+    if html is None:
+        raise RuntimeError(f"report.html missing for {report_id}")
+    import tasks
+    if not tasks.PDF_SERVICE_URL:
+        _set_stage(report_id, "pdf", "skipped", reason="PDF_SERVICE_URL not set")
+        return {"report_id": report_id, "pdf": False}
+    _set_stage(report_id, "pdf", "running")
+    t0 = time.perf_counter()
+    try:
+        pdf = tasks._fetch_pdf(html=html.decode("utf-8"))
+    except Exception as exc:
+        _set_stage(report_id, "pdf", "failed", error=str(exc))
+        raise
+    store_artifact(report_id, "report.pdf", pdf)
+    _set_stage(report_id, "pdf", "done", flags={"has_pdf": True},
+               ms=round((time.perf_counter() - t0) * 1000), bytes=len(pdf))
+    return {"report_id": report_id, "pdf": True}
+
+
+def _subject(prefix: str, lang: str) -> str:
+    today = datetime.now().strftime("%Y-%m-%d")
+    return f"{prefix} – KI-Status-Report ({today})" if lang.startswith("de") else f"{prefix} – AI Status Report ({today})"
+
+
+def stage_mail(report_id: str, recipient: str) -> Dict[str, Any]:
+    """recipient: 'user' | 'admin'. Hands the mail to the outbox (mail_outbox.py).
+
+    The outbox id is fixed per report and recipient and a sent-marker is kept (local
+    file, and the stage state in the status hash for other workers), so retries and
+    resumes never produce a second mail.
+    """
+    stage = f"mail_{recipient}"
+    marker = f"{stage}.sent"
+    if has_artifact(report_id, marker) or (
+            read_status(report_id, _connection()).get("stages", {}).get(stage, {}).get("state") == "done"):
+        return {"report_id": report_id, "resumed": True}
+    from settings import settings
+    from mail_utils import queue_email
+
+    briefing = json.loads(load_artifact(report_id, "briefing.json") or b"{}")
+    meta = json.loads(load_artifact(report_id, "meta.json") or b"{}")
+    lang = str(briefing.get("lang") or briefing.get("language") or "de").lower()
+    email = briefing.get("email") or briefing.get("user_email")
+    company = briefing.get("company_name") or briefing.get("company") or briefing.get("unternehmen") or "Unbekannt"
+
+    attachments: Dict[str, bytes] = {}
+    pdf = load_artifact(report_id, "report.pdf")
+    html = load_artifact(report_id, "report.html")
+    if pdf:
+        attachments["KI-Status-Report.pdf"] = pdf
+    elif html and getattr(settings, "ATTACH_HTML_FALLBACK", True):
+        attachments["KI-Status-Report.html"] = html
+
+    if recipient == "user":
+        if not (settings.SEND_USER_MAIL and isinstance(email, str) and "@" in email):
+            _set_stage(report_id, stage, "skipped")
+            return {"report_id": report_id, "sent": False}
+        to, subject = email, _subject("Ihr Ergebnis" if lang.startswith("de") else "Your result", lang)
+        body = "<p>Ihr KI-Status-Report ist da.</p>" if lang.startswith("de") else "<p>Your AI status report is ready.</p>"
+    else:
+        if not (settings.SEND_ADMIN_MAIL and settings.ADMIN_EMAIL):
+            _set_stage(report_id, stage, "skipped")
+            return {"report_id": report_id, "sent": False}
+        to, subject = settings.ADMIN_EMAIL, _subject("Admin: neuer Report", lang)
+        extra = json.loads(load_artifact(report_id, "admin_attachments.json") or b"{}")
+        attachments = {**attachments, **{n: str(c).encode("utf-8") for n, c in extra.items()}}
+        # Firma und E-Mail stammen aus dem Formular → escapen
+        body = (f"<p>Neuer Report: <b>{html_escape(str(company))}</b> ({html_escape(str(email or '—'))}) – "
+                f"Score {html_escape(str(meta.get('score', '—')))}, Badge {html_escape(str(meta.get('badge', '—')))}</p>")
+
+    job = get_current_job()
+    try:
+        outbox_id = queue_email(to_address=to, subject=subject, html_body=body, attachments=attachments or None,
+                                message_id=f"{report_id}-{stage}", kind=recipient,
+                                connection=job.connection if job else None)
+    except Exception as exc:
+        _set_stage(report_id, stage, "failed", error=str(exc))
+        raise
+    save_artifact(report_id, marker, to.encode("utf-8"))
+    _set_stage(report_id, stage, "done", outbox=outbox_id)
+    return {"report_id": report_id, "sent": True, "outbox": outbox_id}
+
+
+# ---------- enqueue ----------
+
+def _retry(stage: str) -> Optional[Retry]:
+    from retry_policy import policy_for
+    return policy_for(stage).rq_retry() if MAX_RETRIES > 0 else None
+
+
+def enqueue_pipeline(report_id: str, payload: Dict[str, Any], connection: Optional[Redis] = None,
+                     lane: str = "interactive", tenant: Optional[str] = None) -> Dict[str, str]:
+    """Enqueues all stages; returns {stage: rq_job_id}. Bulk tenants may be demoted to the batch lane."""
+    import fair_queue
+    if connection is None:
+        from queue_utils import get_redis_connection
+        connection = get_redis_connection()
+    tenant = tenant or fair_queue.tenant_of(payload)
+    lane = fair_queue.choose_lane(connection, lane, tenant)
+    q_pdf = Queue(PDF_QUEUE, connection=connection)
+    q_emails = Queue(EMAILS_QUEUE, connection=connection)
+    common = {"result_ttl": RESULT_TTL}
+    if not has_artifact(report_id, "report.html", connection):  # beim Resume den Status "done" nicht überschreiben
+        _set_stage(report_id, "analyze", "queued", connection=connection)
+
+    from job_payload import describe, pack
+    packed = pack(payload)
+    analyze = fair_queue.submit(connection, lane, tenant, stage_analyze, report_id, packed,
+                                job_id=f"{report_id}-analyze", job_timeout=ANALYZE_TIMEOUT,
+                                description=describe("report_pipeline.stage_analyze", packed, report_id),
+                                retry=_retry("analyze"), **common)
+    pdf = q_pdf.enqueue(stage_pdf, report_id, job_id=f"{report_id}-pdf", depends_on=analyze,
+                        job_timeout=PDF_TIMEOUT, retry=_retry("pdf"), **common)
+    # Mails auch ohne PDF (HTML-Fallback) → allow_failure
+    after_pdf = Dependency(jobs=[pdf], allow_failure=True)
+    mail_user = q_emails.enqueue(stage_mail, report_id, "user", job_id=f"{report_id}-mail_user",
+                                 depends_on=after_pdf, job_timeout=MAIL_TIMEOUT, retry=_retry("mail"), **common)
+    mail_admin = q_emails.enqueue(stage_mail, report_id, "admin", job_id=f"{report_id}-mail_admin",
+                                  depends_on=after_pdf, job_timeout=MAIL_TIMEOUT, retry=_retry("mail"), **common)
+    log.info("Pipeline enqueued for %s (lane %s)", report_id, lane)
+    return {"analyze": analyze.id, "pdf": pdf.id, "mail_user": mail_user.id, "mail_admin": mail_admin.id}
+
+
+def resume_pipeline(report_id: str, connection: Optional[Redis] = None, lane: str = "maintenance") -> Dict[str, str]:
+    """Re-enqueues a pipeline from its stored briefing; finished stages are skipped."""
+    if connection is None:
+        from queue_utils import get_redis_connection
+        connection = get_redis_connection()
+    raw = load_artifact(report_id, "briefing.json", connection=connection)
+    if raw is None:
+        raise KeyError(f"no briefing stored for {report_id}")
+    return enqueue_pipeline(report_id, json.loads(raw), connection=connection, lane=lane)
+
+
+__all__ = ["enqueue_pipeline", "resume_pipeline", "stage_analyze", "stage_pdf", "stage_mail",
+           "read_status", "status_from_fields", "ref_key", "load_artifact", "has_artifact", "store_artifact", "job_dir", "STAGES", "SHARED"]
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk layout, index and retention for generated reports.
+
+Every job owns one directory, sharded by a hash of the job id so no directory
+grows without bound:
+
+    REPORT_OUTPUT_DIR/jobs/<aa>/<bb>/<job_id>/
+        report.html  report.pdf  meta.json  briefing.json  status.*.json  admin/…
+
+The path follows from the job id alone, so "is the report there?" is one stat()
+– no glob, independent of how many reports exist. When Redis is available the
+location and state are also recorded in the job's status hash (job_events.py:
+state, html_path, download_available), which is what the status endpoints read.
+Directories of the old flat layout (jobs/<job_id>/) are still found.
+
+Retention: `sweep()` removes job directories untouched for REPORT_RETENTION_DAYS
+(default 30) plus leftovers of the pre-index layout (report_*.html, preview_*.html
+and admin/ directly under REPORT_OUTPUT_DIR). Workers and the web process call
+`maybe_sweep()` at most every REPORT_SWEEP_INTERVAL seconds; manually:
+
+    python report_store.py sweep
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+log = logging.getLogger("report_store")
+
+RETENTION_DAYS = float(os.getenv("REPORT_RETENTION_DAYS", "30"))
+SWEEP_INTERVAL = float(os.getenv("REPORT_SWEEP_INTERVAL", "3600"))
+LEGACY_PATTERNS = ("report_*.html", "preview_*.html")
+
+
+def base_dir() -> Path:
+    return Path(os.getenv("REPORT_OUTPUT_DIR", "/tmp/ki-reports"))
+
+
+def _safe(job_id: str) -> str:
+    return "".join(c for c in job_id if c.isalnum() or c in "-_.")
+
+
+def job_dir(job_id: str) -> Path:
+    safe = _safe(job_id)
+    legacy = base_dir() / "jobs" / safe
+    if legacy.is_dir():  # vor dem Sharding angelegt (laufende Pipelines, Resume)
+        return legacy
+    h = hashlib.sha1(safe.encode("utf-8")).hexdigest()
+    return base_dir() / "jobs" / h[:2] / h[2:4] / safe
+
+
+def save(job_id: str, name: str, data: bytes) -> Path:
+    target = job_dir(job_id) / name
+    tmp = target.parent / f".{target.name}.tmp"
+    for attempt in (1, 2):
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            tmp.write_bytes(data)
+            break
+        except FileNotFoundError:  # leeren Shard gerade vom Sweeper entfernt
+            if attempt == 2:
+                raise
+    os.replace(tmp, target)  # atomar: halbe Dateien gelten nie als fertig
+    return target
+
+
+def locate(job_id: str, name: str = "report.html") -> Optional[Path]:
+    p = job_dir(job_id) / name
+    return p if p.is_file() else None
+
+
+def index(job_id: str, connection: Any = None, **fields: Any) -> None:
+    """Records location/state in the job's status hash (best effort)."""
+    import job_events
+    job_events.publish(connection, job_id, **fields)
+
+
+def save_report(job_id: str, html: str, meta: Dict[str, Any], connection: Any = None) -> Path:
+    """report.html + meta.json of an in-process report, indexed as completed."""
+    import json
+    save(job_id, "meta.json", json.dumps(meta, ensure_ascii=False, default=str).encode("utf-8"))
+    path = save(job_id, "report.html", html.encode("utf-8"))
+    index(job_id, connection, state="completed", html_path=str(path), download_available=True,
+          tier=meta.get("tier"))
+    return path
+
+
+# ---------- retention ----------
+
+def _is_shard(d: Path) -> bool:
+    return d.is_dir() and len(d.name) == 2 and all(c in "0123456789abcdef" for c in d.name)
+
+
+def _job_dirs(root: Path) -> Iterator[Path]:
+    """Job directories of the sharded and the legacy flat layout."""
+    if not root.is_dir():
+        return
+    for first in root.iterdir():
+        if not first.is_dir():
+            continue
+        if _is_shard(first):
+            for second in first.iterdir():
+                if second.is_dir():
+                    yield from (d for d in second.iterdir() if d.is_dir())
+        else:
+            yield first
+
+
+def _newest_mtime(path: Path) -> float:
+    newest = path.stat().st_mtime
+    for p in path.rglob("*"):
+        try:
+            newest = max(newest, p.stat().st_mtime)
+        except OSError:
+            pass
+    return newest
+
+
+def sweep(now: Optional[float] = None, retention_days: Optional[float] = None) -> int:
+    """Deletes expired job directories and legacy files; returns how many were removed."""
+    now = time.time() if now is None else now
+    cutoff = now - (RETENTION_DAYS if retention_days is None else retention_days) * 86400
+    root, removed = base_dir(), 0
+    for d in list(_job_dirs(root / "jobs")):
+        try:
+            if _newest_mtime(d) < cutoff:
+                shutil.rmtree(d, ignore_errors=True)
+                removed += 1
+        except OSError:
+            continue
+    legacy = [p for pattern in LEGACY_PATTERNS for p in root.glob(pattern)]
+    if (root / "admin").is_dir():
+        legacy += [p for p in (root / "admin").iterdir() if p.is_file()]
+    for p in legacy:
+        try:
+            if p.stat().st_mtime < cutoff:
+                p.unlink()
+                removed += 1
+        except OSError:
+            continue
+    # leere Shards aufräumen (rmdir schlägt bei belegten Verzeichnissen fehl)
+    for first in [d for d in (root / "jobs").glob("*") if _is_shard(d)]:
+        for d in [*first.iterdir(), first]:
+            try:
+                d.rmdir()
+            except OSError:
+                pass
+    if removed:
+        log.info("Report sweep: %d expired item(s) removed", removed)
+    return removed
+
+
+_last_sweep = 0.0
+_sweep_lock = threading.Lock()
+
+
+def maybe_sweep() -> bool:
+    """Starts sweep() in a background thread if the last run is SWEEP_INTERVAL ago."""
+    global _last_sweep
+    if SWEEP_INTERVAL <= 0:
+        return False
+    with _sweep_lock:
+        if time.monotonic() - _last_sweep < SWEEP_INTERVAL and _last_sweep:
+            return False
+        _last_sweep = time.monotonic()
+    threading.Thread(target=sweep, name="report-sweep", daemon=True).start()
+    return True
+
+
+__all__ = ["job_dir", "save", "locate", "index", "save_report", "sweep", "maybe_sweep", "base_dir"]
+
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) > 1 and sys.argv[1] == "sweep":
+        print(sweep())
+    else:
+        print("usage: python report_store.py sweep")
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Declarative retry policies per job stage.
+
+A policy says how often a stage is attempted, how the backoff grows and which
+exceptions are worth retrying at all:
+
+    analyze  4 attempts, 30 s × 2^n  (LLM/search outages)
+    pdf      5 attempts, 10 s × 3^n  (PDF service restarts)
+    mail     6 attempts, 60 s × 3^n  (SMTP greylisting, 4xx)
+    render   3 attempts (tasks.analyze_and_render), batch 2, default 3
+
+Override per stage via env, e.g.
+    RETRY_POLICY_PDF="attempts=8,base=5,factor=2,max=600,jitter=0.1"
+    RETRY_POLICY_ANALYZE="on=ConnectionError|TimeoutError|RateLimitError"
+
+Transient errors are matched by class name along the MRO (so `redis.ConnectionError`
+and the builtin `ConnectionError` both count); HTTP status errors only for 429/5xx,
+SMTP response errors only for 4xx codes. Everything else – ValueError, KeyError,
+4xx responses – fails at once. Jobs without retries left end up in RQ's
+FailedJobRegistry, which is the dead-letter queue (dead_letters.py).
+
+Workers apply the classification via RetryPolicyWorkerMixin and record
+`rq_job_failures_total{queue,stage,exception,outcome}` (outcome: retry | dead).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import random
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional, Tuple
+
+from rq import Retry
+
+log = logging.getLogger("retry_policy")
+
+TRANSIENT = (
+    "ConnectionError", "TimeoutError", "TransportError", "JobTimeoutException",
+    "RateLimitError", "APIConnectionError", "APITimeoutError", "InternalServerError",
+    "SMTPServerDisconnected", "SMTPConnectError", "HTTPStatusError", "SMTPResponseException",
+    "PdfServiceUnavailable",
+)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int = 3
+    base_delay: float = 10.0
+    factor: float = 3.0
+    max_delay: float = 900.0
+    jitter: float = 0.2
+    retry_on: Tuple[str, ...] = TRANSIENT
+
+    def delays(self) -> List[int]:
+        """Backoff before attempt 2..n, with ±jitter so retries of a burst spread out."""
+        out = []
+        for n in range(max(0, self.max_attempts - 1)):
+            d = min(self.max_delay, self.base_delay * self.factor ** n)
+            d *= 1 + random.uniform(-self.jitter, self.jitter)
+            out.append(max(1, int(round(d))))
+        return out
+
+    def rq_retry(self) -> Optional[Retry]:
+        return Retry(max=self.max_attempts - 1, interval=self.delays()) if self.max_attempts > 1 else None
+
+    def is_retryable(self, exc: BaseException) -> bool:
+        names = {c.__name__ for c in type(exc).__mro__}
+        if not names.intersection(self.retry_on):
+            return False
+        response = getattr(exc, "response", None)
+        if "HTTPStatusError" in names and response is not None:
+            return response.status_code == 429 or response.status_code >= 500
+        code = getattr(exc, "smtp_code", None)
+        if "SMTPResponseException" in names and isinstance(code, int):
+            return 400 <= code < 500
+        return True
+
+
+POLICIES: Dict[str, RetryPolicy] = {
+    "analyze": RetryPolicy(max_attempts=4, base_delay=30, factor=2, max_delay=600),
+    "pdf": RetryPolicy(max_attempts=5, base_delay=10, factor=3, max_delay=600),
+    "mail": RetryPolicy(max_attempts=6, base_delay=60, factor=3, max_delay=3600),
+    "render": RetryPolicy(max_attempts=3, base_delay=10, factor=3),
+    "batch": RetryPolicy(max_attempts=2, base_delay=300, factor=1),
+    "default": RetryPolicy(),
+}
+
+# RQ func_name → stage
+STAGE_BY_FUNC = {
+    "report_pipeline.stage_analyze": "analyze",
+    "report_pipeline.stage_pdf": "pdf",
+    "report_pipeline.stage_mail": "mail",
+    "tasks.analyze_and_render": "render",
+    "batch_processor.run_batch_job": "batch",
+    "worker_tasks.process_report": "analyze",
+}
+
+_FIELDS = {"attempts": ("max_attempts", int), "base": ("base_delay", float), "factor": ("factor", float),
+           "max": ("max_delay", float), "jitter": ("jitter", float)}
+
+
+def _from_env(stage: str, base: RetryPolicy) -> RetryPolicy:
+    raw = os.getenv(f"RETRY_POLICY_{stage.upper()}", "").strip()
+    if not raw:
+        return base
+    changes: Dict[str, Any] = {}
+    for part in raw.split(","):
+        key, _, val = part.partition("=")
+        key, val = key.strip(), val.strip()
+        try:
+            if key == "on":
+                changes["retry_on"] = tuple(x.strip() for x in val.split("|") if x.strip())
+            elif key in _FIELDS:
+                name, cast = _FIELDS[key]
+                changes[name] = cast(val)
+        except ValueError:
+            log.warning("RETRY_POLICY_%s: invalid value %r", stage.upper(), part)
+    return replace(base, **changes)
+
+
+def policy_for(stage: str) -> RetryPolicy:
+    return _from_env(stage, POLICIES.get(stage, POLICIES["default"]))
+
+
+def stage_of(job: Any) -> str:
+    meta = getattr(job, "meta", None) or {}
+    if meta.get("stage"):
+        return str(meta["stage"])
+    try:
+        return STAGE_BY_FUNC.get(job.func_name, "default")
+    except Exception:  # Funktion nicht importierbar/deserialisierbar
+        return "default"
+
+
+class RetryPolicyWorkerMixin:
+    """Stops retries for non-transient errors and counts failures per stage/exception.
+
+    RQ calls handle_exception() (with the exception) before handle_job_failure().
+    A killed work horse never reaches handle_exception() and is treated as transient.
+    """
+
+    def handle_exception(self, job, *exc_info):
+        exc = exc_info[1] if len(exc_info) > 1 else None
+        if exc is not None:
+            job._failure_exc = type(exc).__name__
+            if job.retries_left and not policy_for(stage_of(job)).is_retryable(exc):
+                log.info("job %s: %s is not retryable – dead letter", job.id, type(exc).__name__)
+                job.retries_left = 0
+        return super().handle_exception(job, *exc_info)
+
+    def handle_job_failure(self, job, queue, started_job_registry=None, exc_string=""):
+        outcome = "retry" if job.should_retry else "dead"
+        super().handle_job_failure(job, queue, started_job_registry=started_job_registry, exc_string=exc_string)
+        from queue_metrics import record_failure
+        exc_type = getattr(job, "_failure_exc", None) or "WorkHorseKilled"
+        record_failure(self.connection, job.origin, stage_of(job), exc_type, outcome)
+        try:
+            job.meta.update(last_exception=exc_type, stage=stage_of(job))
+            job.save_meta()
+        except Exception:
+            pass
+        try:
+            import job_events
+            if self.connection.exists(job_events.key(job.id)):  # nur Jobs mit Status-Hash (tasks_api)
+                job_events.publish(self.connection, job.id, state="retrying" if outcome == "retry" else "failed",
+                                   error=exc_type)
+        except Exception:
+            pass
+
+
+__all__ = ["RetryPolicy", "POLICIES", "policy_for", "stage_of", "RetryPolicyWorkerMixin", "TRANSIENT"]
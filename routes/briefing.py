@@ -13,7 +13,8 @@ from datetime import datetime
 from typing import Any, Dict, Optional, List
 from pathlib import Path
 
-from fastapi import APIRouter, Request, BackgroundTasks, HTTPException
+from fastapi import APIRouter, Request, BackgroundTasks, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse, FileResponse
 from pydantic import BaseModel, EmailStr, Field
 
@@ -45,8 +46,24 @@ except ImportError as e:
     def analyze_briefing(data: Dict, lang: str = "de") -> str:
         return build_report(data, lang)["html"]
 
+try:
+    import report_pipeline
+except Exception:
+    report_pipeline = None
+
+import idempotency
+import job_events
+import report_executor
+import report_store
+from routes.admin_status import _require_admin
+
 logger = logging.getLogger("ki-backend.briefing")
 
+def queue_enabled() -> bool:
+    return (report_pipeline is not None
+            and os.getenv("ENABLE_QUEUE", "false").lower() in ("1", "true", "yes", "on")
+            and bool(os.getenv("REDIS_URL")))
+
 router = APIRouter(tags=["briefing"])
 
 # ===================== SCHEMA DEFINITION =====================
@@ -214,36 +231,22 @@ async def generate_report_async(data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Generiert Report asynchron mit Live-Daten wenn verfügbar
     """
-    loop = asyncio.get_event_loop()
-    
-    # Führe CPU-intensive Operationen in Thread-Pool aus
-    result = await loop.run_in_executor(
-        None,  # Default executor
+    # Begrenzter Report-Pool statt Default-Executor: Request-Threads bleiben frei
+    return await report_executor.get_executor().run(
         build_html_report,  # Die erweiterte Funktion aus gpt_analyze
         data,
         data.get('language', 'de')
     )
-    
-    return result
 
-def save_report_to_file(html: str, email: str, meta: Dict[str, Any]) -> str:
+def save_report_to_file(html: str, job_id: str, meta: Dict[str, Any]) -> str:
     """
-    Speichert Report als HTML-Datei (temporär für Testing)
+    Speichert Report + Meta im Job-Verzeichnis (report_store.py) und indexiert ihn
     """
-    output_dir = Path(os.getenv("REPORT_OUTPUT_DIR", "/tmp/ki-reports"))
-    output_dir.mkdir(parents=True, exist_ok=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    score = meta.get('score', 0)
-    badge = meta.get('badge', 'UNKNOWN')
-    
-    filename = f"report_{email.replace('@', '_')}_{timestamp}_{badge}_{score}.html"
-    output_file = output_dir / filename
-    
     try:
-        output_file.write_text(html, encoding='utf-8')
-        logger.info(f"Report gespeichert: {output_file}")
-        return str(output_file)
+        path = report_store.save_report(job_id, html, meta)
+        logger.info(f"Report gespeichert: {path}")
+        report_store.maybe_sweep()
+        return str(path)
     except Exception as e:
         logger.error(f"Fehler beim Speichern: {e}")
         return ""
@@ -257,6 +260,7 @@ async def process_analysis_background(
     Führt die GPT-Analyse im Hintergrund aus mit Live-Daten
     """
     try:
+        job_events.publish(None, job_id, state="processing")
         logger.info(f"🚀 Starte Gold Standard+ Analyse für {email}")
         logger.info(f"Kritische Felder: Bundesland={data.get('bundesland_code')}, "
                    f"Branche={data.get('branche')}, Größe={data.get('unternehmensgroesse')}")
@@ -275,17 +279,14 @@ async def process_analysis_background(
                    f"Tools={meta.get('live_counts', {}).get('tools', 0)}, "
                    f"Funding={meta.get('live_counts', {}).get('funding', 0)}")
         
-        # Speichere Report
-        file_path = save_report_to_file(html, email, meta)
-        
         # Admin-Attachments generieren (für Debugging)
         if os.getenv("ENABLE_ADMIN_ATTACHMENTS", "false").lower() == "true":
             attachments = produce_admin_attachments(data, data.get('language', 'de'))
-            attachment_dir = Path(os.getenv("REPORT_OUTPUT_DIR", "/tmp/ki-reports")) / "admin"
-            attachment_dir.mkdir(parents=True, exist_ok=True)
-            
             for filename, content in attachments.items():
-                (attachment_dir / f"{job_id}_{filename}").write_text(content, encoding='utf-8')
+                report_store.save(job_id, f"admin/{filename}", content.encode('utf-8'))
+        
+        # Speichere Report (zuletzt: setzt den Index auf "completed")
+        file_path = save_report_to_file(html, job_id, meta)
         
         # TODO: In Produktion würde hier:
         # 1. Report in Datenbank speichern
@@ -302,6 +303,8 @@ async def process_analysis_background(
         
     except Exception as e:
         logger.error(f"❌ Fehler bei Analyse für {email}: {str(e)}", exc_info=True)
+        job_events.publish(None, job_id, state="failed", error=str(e)[:300])
+        idempotency.release_job(job_id)  # Nutzer darf dasselbe Briefing erneut absenden
         return {
             "success": False,
             "error": str(e),
@@ -348,6 +351,53 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat()
     }
 
+def _duplicate_response(job_id: str, email: Optional[str]) -> Dict[str, Any]:
+    status = "processing"
+    if report_pipeline is not None:
+        status = {"completed": "completed", "failed": "failed"}.get(
+            report_pipeline.read_status(job_id).get("state"), status)
+    return {
+        "ok": True,
+        "duplicate": True,
+        "message": "Diese Anfrage wurde bereits entgegengenommen – Ihr Report wird erstellt.",
+        "job_id": job_id,
+        "status": status,
+        "email": email,
+    }
+
+def _overloaded_response(data: Dict[str, Any], email: Optional[str], job_id: str) -> JSONResponse:
+    """Report-Pool voll: 503 + Retry-After oder (REPORT_OVERLOAD_MODE=preview) deterministische Vorschau."""
+    executor = report_executor.get_executor()
+    retry_after = executor.retry_after()
+    logger.warning(f"⏳ Report-Pool ausgelastet ({executor.stats()}) → {report_executor.OVERLOAD_MODE}")
+    if report_executor.OVERLOAD_MODE == "preview":
+        try:
+            from gpt_analyze import build_preview_report
+            preview = build_preview_report(data, data.get("language", "de"))
+            report_store.save(job_id, "meta.json", json.dumps(preview["meta"], ensure_ascii=False,
+                                                               default=str).encode("utf-8"))
+            report_store.save(job_id, "report.html", preview["html"].encode("utf-8"))
+            return JSONResponse(status_code=200, headers={"Retry-After": str(retry_after)}, content={
+                "ok": True,
+                "job_id": job_id,
+                "status": "preview",
+                "degraded": True,
+                "message": ("Hohe Auslastung: Sie erhalten vorab eine Kurzauswertung. "
+                            "Für den vollständigen Report senden Sie das Formular bitte später erneut."),
+                "email": email,
+                "score": preview["meta"].get("score"),
+                "badge": preview["meta"].get("badge"),
+                "download_available": True,
+            })
+        except Exception as e:
+            logger.error(f"Vorschau fehlgeschlagen: {e}", exc_info=True)
+    return JSONResponse(status_code=503, headers={"Retry-After": str(retry_after)}, content={
+        "ok": False,
+        "status": "overloaded",
+        "message": "Der Report-Service ist gerade ausgelastet. Bitte versuchen Sie es in Kürze erneut.",
+        "retry_after": retry_after,
+    })
+
 @router.post("/briefing")
 async def submit_briefing(
     request: Request,
@@ -355,7 +405,12 @@ async def submit_briefing(
 ):
     """
     Hauptendpoint für Briefing-Submission mit Gold Standard+ Analyse
+
+    Idempotent: gleicher `Idempotency-Key`-Header bzw. gleiches normalisiertes
+    Briefing innerhalb von IDEMPOTENCY_WINDOW_SECONDS → bestehende job_id.
+    Redis-Aufrufe (sync, Pool wartet bis REDIS_POOL_TIMEOUT) laufen im Threadpool.
     """
+    idem_key = job_id = None
     try:
         # Empfange Rohdaten
         raw_data = await request.json()
@@ -372,23 +427,48 @@ async def submit_briefing(
         # Email extrahieren
         email = extract_email_from_data(data)
         
-        # Job-ID generieren
-        job_id = f"job_{datetime.now().strftime('%Y%m%d%H%M%S')}_{hash(email) % 10000}"
+        # Job-ID generieren; Duplikate (Doppelklick, Retry) liefern den laufenden Job
+        job_id = idempotency.new_job_id()
+        idem_key, idem_source = idempotency.request_key(request.headers, raw_data, caller=email)
+        existing_job = await run_in_threadpool(idempotency.claim, idem_key, job_id)
+        if existing_job:
+            logger.info(f"🔁 Doppelte Submission ({idem_source}) → JobID={existing_job}")
+            duplicate = await run_in_threadpool(_duplicate_response, existing_job, email)
+            return JSONResponse(status_code=200, content=duplicate)
         
         logger.info(f"📨 Briefing empfangen: Email={email}, JobID={job_id}")
         logger.info(f"📋 Kritische Parameter: Bundesland={data.get('bundesland_code')}, "
                    f"Branche={data.get('branche')}, Größe={data.get('unternehmensgroesse')}, "
                    f"Hauptleistung={data.get('hauptleistung')[:50] if data.get('hauptleistung') else 'N/A'}")
         
-        # Starte Hintergrund-Analyse
-        if GPT_ANALYZE_AVAILABLE:
+        # Starte Hintergrund-Analyse: Queue-Pipeline (analyze → pdf → mail) oder In-Process
+        queued = False
+        if GPT_ANALYZE_AVAILABLE and queue_enabled():
+            try:
+                import fair_queue
+                # Mandant und Lane bestimmt der Server: Partner-/Admin-Token, sonst E-Mail und "interactive";
+                # Vielsender werden in enqueue_pipeline (choose_lane) in die Batch-Lane zurückgestuft
+                await run_in_threadpool(report_pipeline.enqueue_pipeline, job_id, data,
+                                        lane=fair_queue.lane_of(raw_data, request.headers),
+                                        tenant=fair_queue.tenant_of(raw_data, request.headers))
+                queued = True
+            except Exception as e:
+                logger.warning(f"Queue nicht erreichbar, verarbeite im Prozess: {e}")
+        if GPT_ANALYZE_AVAILABLE and not queued:
+            ticket = report_executor.get_executor().admit()
+            if ticket is None:
+                await run_in_threadpool(idempotency.release, idem_key, job_id)  # späterer Retry darf neu starten
+                return _overloaded_response(data, email, job_id)
             background_tasks.add_task(
+                report_executor.run_admitted,
+                ticket,
                 process_analysis_background,
                 data,
                 email,
                 job_id
             )
             
+        if GPT_ANALYZE_AVAILABLE:
             message = ("Vielen Dank für Ihre Angaben! 🎯\n\n"
                       "Ihre individuelle KI-Statusanalyse wird jetzt mit aktuellen Live-Daten "
                       f"für {data.get('branche_label', 'Ihre Branche')} in "
@@ -405,7 +485,8 @@ async def submit_briefing(
                 "ok": True,
                 "message": message,
                 "job_id": job_id,
-                "status": "processing" if GPT_ANALYZE_AVAILABLE else "maintenance",
+                "status": ("queued" if queued else "processing") if GPT_ANALYZE_AVAILABLE else "maintenance",
+                "events_url": f"/api/jobs/{job_id}/events" if os.getenv("REDIS_URL") else None,
                 "email": email,
                 "parameters": {
                     "bundesland": data.get('bundesland_code'),
@@ -418,6 +499,8 @@ async def submit_briefing(
         
     except Exception as e:
         logger.error(f"Fehler bei Briefing-Verarbeitung: {str(e)}", exc_info=True)
+        if idem_key and job_id:
+            await run_in_threadpool(idempotency.release, idem_key, job_id)
         
         # User-freundliche Fehlermeldung
         return JSONResponse(
@@ -435,18 +518,108 @@ async def submit_briefing_async(request: Request, background_tasks: BackgroundTa
     """Alias für Hauptendpoint"""
     return await submit_briefing(request, background_tasks)
 
+@router.post("/briefing/batch", dependencies=[Depends(_require_admin)])
+async def submit_briefing_batch(request: Request):
+    """
+    Mehrere Briefings in einem Aufruf (JSON-Array, {"items": [...]} oder JSONL); nur mit Admin-Token.
+
+    Läuft immer als Job in der Lane "batch" (eigene Worker, fair je Mandant X-Tenant-Id)
+    → 202 mit job_id; Status und signierte Ergebnis-Links über GET /api/briefing/batch/<job_id>.
+    provider=online (Default) | openai-batch | anthropic-batch (Provider-Batch-API).
+    """
+    import batch_processor
+    try:
+        items, options = batch_processor.parse_items(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(items) > batch_processor.MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"max. {batch_processor.MAX_ITEMS} Briefings pro Batch")
+    lang = str(request.query_params.get("lang") or options.get("lang") or "de")
+    provider = str(request.query_params.get("provider") or options.get("provider") or "online")
+
+    from llm_batch import COMPLETERS
+    if provider not in COMPLETERS:
+        raise HTTPException(status_code=400, detail=f"unbekannter Provider: {provider}")
+    if not queue_enabled():
+        # nicht im Web-Prozess: das umginge Admission-Control und die Lanes
+        raise HTTPException(status_code=503, detail="Batches benötigen die Queue (ENABLE_QUEUE)")
+    import fair_queue
+    from queue_utils import get_redis_connection
+    tenant = fair_queue.tenant_of(options, request.headers)
+    job = await run_in_threadpool(batch_processor.enqueue, get_redis_connection(), items, lang, provider, tenant)
+    return JSONResponse(status_code=202, content={"ok": True, "status": "queued", "job_id": job.id,
+                                                  "items": len(items), "provider": provider})
+
+
+@router.get("/briefing/batch/{job_id}", dependencies=[Depends(_require_admin)])
+def get_briefing_batch(job_id: str):
+    """Status eines Batch-Jobs; fertig mit Summary und signierten Links je Briefing."""
+    if not queue_enabled():
+        raise HTTPException(status_code=503, detail="Batches benötigen die Queue (ENABLE_QUEUE)")
+    from rq.exceptions import NoSuchJobError
+    from rq.job import Job
+    from queue_utils import get_redis_connection
+    try:
+        job = Job.fetch(job_id, connection=get_redis_connection())
+    except NoSuchJobError:
+        raise HTTPException(status_code=404, detail="Batch nicht gefunden")
+    if job.func_name != "batch_processor.run_batch_job":
+        raise HTTPException(status_code=404, detail="Batch nicht gefunden")
+    status = getattr(job.get_status(refresh=False), "value", None) or "unknown"
+    out: Dict[str, Any] = {"ok": status != "failed", "job_id": job_id, "status": status}
+    if status == "finished":
+        out["result"] = job.return_value()
+    return out
+
 @router.get("/briefing/status/{job_id}")
-async def get_job_status(job_id: str):
+def get_job_status(job_id: str):
     """
     Prüft Status eines Analyse-Jobs
+
+    Bewusst sync: Status-Hash, Queue-Position und Dateifallback blockieren;
+    FastAPI führt den Handler im Threadpool aus, nicht auf dem Event-Loop.
     """
-    # TODO: In Produktion würde dies aus Datenbank/Redis gelesen
-    
-    # Für Testing: Prüfe ob HTML-Datei existiert
-    output_dir = Path(os.getenv("REPORT_OUTPUT_DIR", "/tmp/ki-reports"))
-    matching_files = list(output_dir.glob(f"*{job_id}*.html"))
-    
-    if matching_files:
+    # Queue-Pipeline: Status je Stufe – aus dem Status-Hash (job_events.py), Dateien nur als Fallback
+    if report_pipeline is not None:
+        conn = None
+        if queue_enabled():
+            from queue_utils import get_redis_connection
+            conn = get_redis_connection()
+        pipeline_status = report_pipeline.read_status(job_id, connection=conn)
+        if pipeline_status:
+            state = pipeline_status["state"]
+            download = pipeline_status.get("download_available")  # None beim Datei-Fallback
+            out = {
+                "ok": state != "failed",
+                "job_id": job_id,
+                "status": state,
+                "stages": pipeline_status["stages"],
+                "download_available": bool(download) or report_pipeline.has_artifact(job_id, "report.html"),
+            }
+            if pipeline_status["stages"].get("analyze", {}).get("state") == "queued" and queue_enabled():
+                # Warteposition (inkl. höher priorisierter Lanes) und ETA aus der mittleren Laufzeit
+                try:
+                    import fair_queue
+                    from queue_utils import get_redis_connection
+                    out["queue"] = fair_queue.position(get_redis_connection(), f"{job_id}-analyze")
+                except Exception as e:
+                    logger.warning(f"Queue-Position nicht verfügbar: {e}")
+            return out
+
+    # In-Process-Reports: Status-Hash, falls Redis konfiguriert ist
+    if os.getenv("REDIS_URL"):
+        try:
+            from queue_utils import get_redis_connection
+            fields = job_events.read(get_redis_connection(), job_id)
+        except Exception as e:
+            logger.debug(f"Status-Hash nicht lesbar: {e}")
+            fields = {}
+        if fields.get("state"):
+            return {"ok": fields["state"] != "failed", "job_id": job_id, "status": fields["state"],
+                    "tier": fields.get("tier")}
+
+    # Ohne Redis: ein stat() auf das Job-Verzeichnis (report_store.py)
+    if report_store.locate(job_id):
         return {
             "ok": True,
             "job_id": job_id,
@@ -464,21 +637,29 @@ async def get_job_status(job_id: str):
     }
 
 @router.get("/briefing/download/{job_id}")
-async def download_report(job_id: str):
+async def download_report(job_id: str, request: Request):
     """
     Download des generierten Reports (für Testing)
     """
-    output_dir = Path(os.getenv("REPORT_OUTPUT_DIR", "/tmp/ki-reports"))
-    matching_files = list(output_dir.glob(f"*{job_id}*.html"))
-    
-    if not matching_files:
+    if report_pipeline is not None and queue_enabled():
+        try:
+            import artifact_store
+            from queue_utils import get_redis_connection
+            redis = get_redis_connection()
+            for kind, ext in (("pdf", "pdf"), ("html", "html")):
+                ref = artifact_store.load_ref(redis, report_pipeline.ref_key(job_id, kind))
+                if ref:
+                    response = artifact_store.artifact_response(request, ref, f"ki-statusbericht-{job_id}.{ext}")
+                    if response is not None:
+                        return response
+        except Exception as e:
+            logger.warning(f"Artifact-Store nicht erreichbar: {e}")
+    pdf, html = report_store.locate(job_id, "report.pdf"), report_store.locate(job_id, "report.html")
+    if pdf is not None:
+        return FileResponse(path=pdf, media_type="application/pdf", filename=f"ki-statusbericht-{job_id}.pdf")
+    if html is None:
         raise HTTPException(status_code=404, detail="Report nicht gefunden")
-    
-    return FileResponse(
-        path=matching_files[0],
-        media_type="text/html",
-        filename=f"ki-statusbericht-{job_id}.html"
-    )
+    return FileResponse(path=html, media_type="text/html", filename=f"ki-statusbericht-{job_id}.html")
 
 @router.post("/briefing/test")
 async def test_analysis():
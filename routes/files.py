@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Downloads behind signed, expiring links (signed_links.py), e.g. large report PDFs
+that mails link to instead of attaching.
+
+    GET /api/files/{token}   streams the artifact (Range, ETag); 410 when the link or
+                             the artifact expired, 404 for invalid tokens
+"""
+from __future__ import annotations
+
+import logging
+
+from fastapi import APIRouter, HTTPException, Request
+
+import signed_links
+from artifact_store import artifact_response
+
+logger = logging.getLogger("ki-backend.files")
+router = APIRouter(tags=["files"])
+
+
+@router.get("/files/{token}")
+def download_file(token: str, request: Request):
+    try:
+        data = signed_links.verify(token)
+    except signed_links.SignatureExpired:
+        raise HTTPException(status_code=410, detail="Link expired")
+    except signed_links.BadSignature:
+        raise HTTPException(status_code=404, detail="Not found")
+    try:
+        response = artifact_response(request, {"sha256": data["sha256"], "content_type": data.get("content_type")},
+                                     data.get("filename"))
+    except ValueError:  # keine gültige Prüfsumme
+        raise HTTPException(status_code=404, detail="Not found")
+    if response is None:
+        raise HTTPException(status_code=410, detail="File expired")
+    return response
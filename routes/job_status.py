@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Push-based job status (job_events.py): Server-Sent Events and WebSocket.
+
+    GET /api/jobs/{job_id}/events   text/event-stream, event "status" per change,
+                                    comment line as heartbeat, ends at a terminal state
+    WS  /api/jobs/{job_id}/ws       same payloads as JSON messages
+
+Works for report pipelines (/api/briefing, payload as /api/briefing/status) and
+plain queue jobs (/api/analyze, payload as /api/result). Replaces polling.
+"""
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any, Dict
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+import job_events
+
+logger = logging.getLogger("ki-backend.job_status")
+router = APIRouter(tags=["jobs"])
+
+HEARTBEAT_SECONDS = 15.0
+
+
+def view(job_id: str, fields: Dict[str, str]) -> Dict[str, Any]:
+    """Status hash → response payload, shaped like the polling endpoints."""
+    if any(k.startswith("stage:") for k in fields):
+        import report_pipeline
+        st = report_pipeline.status_from_fields(job_id, fields)
+        return {"ok": st["state"] != "failed", "job_id": job_id, "status": st["state"],
+                "stages": st["stages"], "download_available": st["download_available"]}
+    out: Dict[str, Any] = {"ok": fields.get("state") != "failed", "job_id": job_id,
+                           "status": fields.get("state", "unknown"), "has_pdf": fields.get("has_pdf") == "1"}
+    if fields.get("result"):
+        out["result"] = json.loads(fields["result"])
+    if fields.get("error"):
+        out["error"] = fields["error"]
+    return out
+
+
+def _terminal(job_id: str):
+    return lambda fields: view(job_id, fields)["status"] in job_events.TERMINAL
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events_sse(job_id: str):
+    async def gen():
+        yield "retry: 3000\n\n"
+        try:
+            async for fields in job_events.stream(job_id, _terminal(job_id), heartbeat=HEARTBEAT_SECONDS):
+                if fields is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"event: status\ndata: {json.dumps(view(job_id, fields), ensure_ascii=False)}\n\n"
+        except Exception as exc:
+            logger.warning("status stream %s aborted: %s", job_id, exc)
+            yield "event: error\ndata: {\"error\": \"status stream unavailable\"}\n\n"
+
+    return StreamingResponse(gen(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.websocket("/jobs/{job_id}/ws")
+async def job_events_ws(websocket: WebSocket, job_id: str):
+    await websocket.accept()
+    try:
+        async for fields in job_events.stream(job_id, _terminal(job_id), heartbeat=HEARTBEAT_SECONDS):
+            await websocket.send_json({"type": "ping"} if fields is None else view(job_id, fields))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as exc:
+        logger.warning("status websocket %s aborted: %s", job_id, exc)
+        await websocket.close(code=1011)
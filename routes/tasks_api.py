@@ -1,17 +1,28 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import json
 import logging
 from typing import Optional
+from uuid import uuid4
 
-from fastapi import APIRouter, HTTPException, status, Query
+from fastapi import APIRouter, Body, Depends, HTTPException, status, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field, EmailStr
 from rq.job import Job
 from rq import Queue
 from redis import Redis
 
+import dead_letters
+import job_events
+from artifact_store import artifact_response, load_ref
+from job_payload import describe, pack
+from queue_metrics import collect, queue_counts
 from queue_utils import get_queue, get_queue_names, get_redis_connection
+from redis_pool import get_async_redis, pool_stats
+from retry_policy import policy_for
+from routes.admin_status import _require_admin
 from tasks import analyze_and_render
 
 logger = logging.getLogger("ki-backend.tasks_api")
@@ -29,34 +40,104 @@ def enqueue_analyze(payload: AnalyzeIn):
     if not (payload.html or payload.url):
         raise HTTPException(status_code=400, detail="Provide 'html' or 'url'")
     q = get_queue("reports")
-    job: Job = q.enqueue(analyze_and_render, payload.model_dump(), job_timeout=q.default_timeout, result_ttl=3600)
-    return {"ok": True, "status": "queued", "job_id": job.id, "queue": job.origin}
+    packed = pack(payload.model_dump())
+    job_id = str(uuid4())
+    job_events.publish(q.connection, job_id, state="queued")  # vor enqueue: der Worker könnte schneller sein
+    job: Job = q.enqueue(analyze_and_render, packed, job_id=job_id, job_timeout=q.default_timeout, result_ttl=3600,
+                         retry=policy_for("render").rq_retry(),
+                         description=describe("tasks.analyze_and_render", packed))
+    return {"ok": True, "status": "queued", "job_id": job.id, "queue": job.origin,
+            "events_url": f"/api/jobs/{job.id}/events"}
 
 @router.get("/result/{job_id}")
-def get_result(job_id: str, download: bool = Query(default=False)):
+def get_result(job_id: str, request: Request, download: bool = Query(default=False)):
     redis: Redis = get_redis_connection()
+    if not download:
+        # Polling: ein HGETALL auf den Status-Hash statt Job.fetch + Artifact-Lookup
+        fields = job_events.read(redis, job_id)
+        if fields.get("state"):
+            result = json.loads(fields["result"]) if fields.get("result") else None
+            return JSONResponse({"ok": True, "status": fields["state"], "job_id": job_id,
+                                 "has_pdf": fields.get("has_pdf") == "1", "result": result})
     try:
         job = Job.fetch(job_id, connection=redis)
         status_str = job.get_status()
     except Exception:
         job = None
         status_str = "unknown"
-    pdf_key = f"pdf:{job_id}"
-    pdf = redis.get(pdf_key)
+    ref = load_ref(redis, f"artifact:{job_id}")
+    legacy_key = f"pdf:{job_id}"  # Jobs von vor dem Artifact-Store
+    has_legacy = not ref and bool(redis.exists(legacy_key))
     if download:
-        if pdf:
-            filename = "ki-report.pdf"
-            if job and isinstance(job.result, dict) and job.result.get("filename"):
-                filename = job.result["filename"]
-            return StreamingResponse(iter([pdf]), media_type="application/pdf", headers={
-                "Content-Disposition": f'attachment; filename="{filename}"'
-            })
+        filename = "ki-report.pdf"
+        if job and isinstance(job.result, dict) and job.result.get("filename"):
+            filename = job.result["filename"]
+        if ref:
+            response = artifact_response(request, ref, filename)
+            if response is None:
+                raise HTTPException(status_code=410, detail="Result expired")
+            return response
+        if has_legacy:
+            pdf = redis.get(legacy_key)
+            if pdf:
+                return StreamingResponse(iter([pdf]), media_type="application/pdf", headers={
+                    "Content-Disposition": f'attachment; filename="{filename}"'
+                })
         raise HTTPException(status_code=202, detail="Result not ready")
     result = job.result if job and job.is_finished else None
-    return JSONResponse({"ok": True, "status": status_str, "job_id": job_id, "has_pdf": bool(pdf), "result": result})
+    return JSONResponse({"ok": True, "status": status_str, "job_id": job_id,
+                         "has_pdf": bool(ref or has_legacy), "result": result})
+
+def _counts():
+    redis: Redis = get_redis_connection()
+    return {n: queue_counts(Queue(n, connection=redis)) for n in get_queue_names()}
 
 @router.get("/queue/ping")
-def queue_ping():
+async def queue_ping():
+    # PING über den asyncio-Pool blockiert den Event-Loop nicht; RQ ist synchron → Threadpool
+    pong = await get_async_redis().ping()
+    counts = await run_in_threadpool(_counts)
+    return {"ok": True, "redis": "ok" if pong else "down", "queues": get_queue_names(), "counts": counts,
+            "pools": pool_stats()}
+
+@router.get("/queue/stats")
+def queue_stats():
+    """Zähler, Alter des ältesten Jobs und Warte-/Laufzeit-Histogramme je Queue."""
+    return {"ok": True, "queues": collect(get_redis_connection(), get_queue_names())}
+
+# ---------- Dead-Letter-Queue (Admin) ----------
+
+class RequeueIn(BaseModel):
+    job_ids: Optional[list[str]] = None
+    stage: Optional[str] = None
+    exception: Optional[str] = None
+    all: bool = False
+
+@router.get("/queue/dlq", dependencies=[Depends(_require_admin)])
+def dlq_list(stage: Optional[str] = None, exception: Optional[str] = None,
+             limit: int = Query(default=100, ge=1, le=1000)):
     redis: Redis = get_redis_connection()
-    pong = redis.ping()
-    return {"ok": True, "redis": "ok" if pong else "down", "queues": get_queue_names()}
+    names = get_queue_names()
+    return {"ok": True, "counts": dead_letters.summary(redis, names),
+            "jobs": dead_letters.list_dead(redis, names, stage=stage, exception=exception, limit=limit)}
+
+@router.get("/queue/dlq/{job_id}", dependencies=[Depends(_require_admin)])
+def dlq_get(job_id: str):
+    info = dead_letters.get_dead(get_redis_connection(), job_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Job not in dead-letter queue")
+    return {"ok": True, "job": info}
+
+@router.post("/queue/dlq/requeue", dependencies=[Depends(_require_admin)])
+def dlq_requeue(body: RequeueIn = Body(...)):
+    if not (body.job_ids or body.stage or body.exception or body.all):
+        raise HTTPException(status_code=400, detail="Provide job_ids, a filter (stage/exception) or all=true")
+    result = dead_letters.requeue(get_redis_connection(), get_queue_names(), job_ids=body.job_ids,
+                                  stage=body.stage, exception=body.exception)
+    return {"ok": True, **result}
+
+@router.delete("/queue/dlq/{job_id}", dependencies=[Depends(_require_admin)])
+def dlq_delete(job_id: str):
+    if not dead_letters.delete(get_redis_connection(), job_id):
+        raise HTTPException(status_code=404, detail="Job not in dead-letter queue")
+    return {"ok": True, "deleted": job_id}
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_worker_startup.py — misst Start- und Pro-Job-Overhead der Worker-Modi.
+
+Ein "Job-Prolog" ist alles, was ein Report-Job vor der eigentlichen Arbeit braucht:
+Job-Module importieren, Templates/Prompts laden, Referenzdaten, HTTP-Clients
+(= worker_preload.preload ohne gc.freeze).
+
+Gemessen wird:
+  interpreter_ms        python -c pass
+  cold_process_ms       frischer Interpreter + Prolog (Worker-Start ohne Preload)
+  fork_cold_job_ms      Fork-Kind ohne Preload im Parent (RQ-Default bisher, pro Job)
+  fork_warm_job_ms      Fork-Kind nach Preload im Parent (RQ_PRELOAD=1, pro Job)
+  warm_job_ms           gleicher Prozess nach Preload (RQ_WORKER_MODE=warm/thread, pro Job)
+
+Usage:
+    python scripts/bench_worker_startup.py [--runs 5]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def _prolog_ms() -> float:
+    from worker_preload import preload
+    t0 = time.perf_counter()
+    preload(freeze=False)
+    return (time.perf_counter() - t0) * 1000
+
+
+def _in_fork() -> float:
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # child
+        os.close(r)
+        try:
+            ms = _prolog_ms()
+        except Exception:
+            ms = -1.0
+        os.write(w, str(ms).encode())
+        os._exit(0)
+    os.close(w)
+    data = os.read(r, 64)
+    os.close(r)
+    os.waitpid(pid, 0)
+    return float(data or b"-1")
+
+
+def _subprocess_ms(code: str) -> float:
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=False,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - t0) * 1000
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+    logging.disable(logging.INFO)
+    os.chdir(ROOT)
+    med = lambda xs: round(statistics.median(xs), 1)
+
+    res = {
+        "interpreter_ms": med([_subprocess_ms("pass") for _ in range(args.runs)]),
+        "cold_process_ms": med([_subprocess_ms(
+            "import sys; sys.path.insert(0, '.'); from worker_preload import preload; preload(freeze=False)")
+            for _ in range(args.runs)]),
+        # muss vor jedem Import im Parent laufen
+        "fork_cold_job_ms": med([_in_fork() for _ in range(args.runs)]),
+    }
+    from worker_preload import preload
+    res["preload_ms"] = preload()["total"]
+    res["fork_warm_job_ms"] = med([_in_fork() for _ in range(args.runs)])
+    res["warm_job_ms"] = med([_prolog_ms() for _ in range(args.runs)])
+    print(json.dumps(res, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+build_data_snapshot.py — kompiliert data/ in einen Snapshot.
+
+Usage:
+    python scripts/build_data_snapshot.py [--data-dir ./data] [--out data/.snapshot.bin] [--check]
+
+--check: prüft nur, ob ein vorhandener Snapshot zu den Quelldateien passt (Exit 1 sonst).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import data_snapshot  # noqa: E402
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Build compiled data snapshot")
+    ap.add_argument("--data-dir", default=str(data_snapshot.DATA_DIR))
+    ap.add_argument("--out", default=None)
+    ap.add_argument("--check", action="store_true")
+    args = ap.parse_args()
+
+    data_dir = Path(args.data_dir).resolve()
+    out = Path(args.out) if args.out else data_dir / ".snapshot.bin"
+    if args.check:
+        ok = data_snapshot.read_snapshot(out, data_dir, verify=True) is not None
+        print(json.dumps({"path": str(out), "fresh": ok}))
+        return 0 if ok else 1
+
+    t0 = time.perf_counter()
+    info = data_snapshot.write_snapshot(out, data_dir)
+    info["build_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    print(json.dumps(info, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
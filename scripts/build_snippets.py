@@ -7,22 +7,33 @@ build_snippets.py — Gold-Standard data builder for Prompt-Creator-Assistent
 - Erzeugt robuste HTML-Snippets: TOOLS_HTML, FUNDING_HTML, COMPLIANCE_HTML
 - Prüft Schemata & meldet Warnungen statt zu brechen
 - Schreibt einen Build-Report (JSON)
+- Inkrementell: Eingaben (Dateien + Schema + Datum) werden gehasht; unveränderte
+  Snippets werden übersprungen (Manifest: <out>/.build_manifest.json)
+- Unabhängige Snippets laufen parallel; Zeiten landen in <out>/BUILD_TIMINGS.json
 
 Usage:
     python build_snippets.py --data-dir ./data --out-dir ./output --date 2025-10-03
+    python build_snippets.py --force            # alles neu bauen
+    python build_snippets.py --watch            # bei Datenänderungen neu bauen
 """
 from __future__ import annotations
 
 import argparse
-import csv
 import datetime as dt
+import hashlib
 import html
 import json
 import logging
 import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Any, Optional
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import data_snapshot  # noqa: E402
+
 # ------------- Logging setup -------------
 LOG_FMT = "%(levelname)s %(asctime)s %(name)s: %(message)s"
 logging.basicConfig(level=logging.INFO, format=LOG_FMT)
@@ -30,6 +41,9 @@ log = logging.getLogger("build_snippets")
 
 # ------------- Utilities -------------
 def read_text_if_exists(p: Path) -> Optional[str]:
+    cached = data_snapshot.text(p)
+    if cached is not None:
+        return cached
     try:
         if p.exists():
             return p.read_text(encoding="utf-8")
@@ -38,6 +52,9 @@ def read_text_if_exists(p: Path) -> Optional[str]:
     return None
 
 def read_json_if_exists(p: Path) -> Optional[Any]:
+    cached = data_snapshot.json_data(p)
+    if cached is not None:
+        return cached
     try:
         if p.exists():
             return json.loads(p.read_text(encoding="utf-8"))
@@ -45,22 +62,10 @@ def read_json_if_exists(p: Path) -> Optional[Any]:
         log.warning("Failed parsing JSON %s: %s", p, e)
     return None
 
-def sniff_delimiter(header_line: str) -> str:
-    if header_line.count(";") > header_line.count(","):
-        return ";"
-    return ","
-
 def read_csv_flexible(p: Path) -> List[Dict[str, str]]:
-    """Robust CSV reader that tolerates ';' or ',' delimiters and BOM."""
+    """Robust CSV reader that tolerates ';' or ',' delimiters and BOM (shared parser: data_snapshot.parse_csv)."""
     try:
-        raw = p.read_text(encoding="utf-8-sig")
-        lines = [ln for ln in raw.splitlines() if ln.strip()]
-        if not lines:
-            return []
-        delim = sniff_delimiter(lines[0])
-        reader = csv.DictReader(lines, delimiter=delim)
-        rows = [ { (k or '').strip(): (v or '').strip() for k, v in row.items() } for row in reader ]
-        return rows
+        return data_snapshot.read_csv(p)
     except Exception as e:
         log.warning("Failed parsing CSV %s: %s", p, e)
         return []
@@ -278,31 +283,145 @@ def build_benchmarks(data_dir: Path, out_dir: Path, date_str: str, report: Dict[
     (out_dir / "benchmarks.json").write_text(json.dumps(out_json, ensure_ascii=False, indent=2), encoding="utf-8")
     report["benchmarks"] = {"csv_files": len(csv_files), "json_files": len(json_files)}
 
-def main() -> int:
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--data-dir", default="data", help="Path to data directory")
-    ap.add_argument("--out-dir", default="output", help="Path to output directory")
-    ap.add_argument("--date", default=None, help="ISO date override for 'Stand:'")
-    args = ap.parse_args()
+# ------------- Incremental build -------------
+# Erhöhen, wenn sich die Render-Logik ändert (invalidiert alle Manifest-Hashes)
+BUILD_VERSION = "2"
+MANIFEST_NAME = ".build_manifest.json"
+
+def _inputs_tools(d: Path) -> List[Path]:
+    return [d / "tools.csv", d / "tools.md"]
+
+def _inputs_funding(d: Path) -> List[Path]:
+    return [d / "foerdermittel.csv", d / "foerdermittel.md"]
+
+def _inputs_compliance(d: Path) -> List[Path]:
+    return [d / "check_datenschutz.md", d / "check_innovationspotenzial.md"]
+
+def _inputs_benchmarks(d: Path) -> List[Path]:
+    return sorted(d.glob("benchmark_*.csv")) + sorted(d.glob("benchmarks_*.json"))
+
+# name -> (inputs, outputs, uses_schema, run(data_dir, out_dir, schema, date_str, report))
+BUILDERS: Dict[str, tuple] = {
+    "TOOLS_HTML": (_inputs_tools, ["TOOLS_HTML.html"], True,
+                   lambda d, o, sc, ds, r: build_tools_html(d, o, sc, ds, r)),
+    "FUNDING_HTML": (_inputs_funding, ["FUNDING_HTML.html"], True,
+                     lambda d, o, sc, ds, r: build_funding_html(d, o, sc, ds, r)),
+    "COMPLIANCE_HTML": (_inputs_compliance, ["COMPLIANCE_HTML.html"], False,
+                        lambda d, o, sc, ds, r: build_compliance_html(d, o, ds, r)),
+    "benchmarks": (_inputs_benchmarks, ["benchmarks.json"], False,
+                   lambda d, o, sc, ds, r: build_benchmarks(d, o, ds, r)),
+}
+
+def hash_inputs(paths: List[Path], schema: Optional[Dict[str, Any]], date_str: str) -> str:
+    h = hashlib.sha256(f"{BUILD_VERSION}\0{date_str}\0".encode("utf-8"))
+    if schema is not None:
+        h.update(json.dumps(schema, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    for p in paths:
+        h.update(b"\0" + p.name.encode("utf-8") + b"\0")
+        try:
+            h.update(p.read_bytes())
+        except FileNotFoundError:
+            h.update(b"<missing>")
+    return h.hexdigest()
 
-    data_dir = Path(args.data_dir).resolve()
-    out_dir = Path(args.out_dir).resolve()
+def _read_manifest(out_dir: Path) -> Dict[str, Any]:
+    return read_json_if_exists(out_dir / MANIFEST_NAME) or {}
+
+def run_build(data_dir: Path, out_dir: Path, date_str: str, force: bool = False, jobs: int = 4) -> Dict[str, Any]:
+    t_start = time.perf_counter()
     ensure_dir(out_dir)
-    date_str = today_iso(args.date)
     report: Dict[str, Any] = {"date": date_str, "data_dir": str(data_dir), "out_dir": str(out_dir)}
-
     schema = load_schema(data_dir)
-    build_tools_html(data_dir, out_dir, schema, date_str, report)
-    build_funding_html(data_dir, out_dir, schema, date_str, report)
-    build_compliance_html(data_dir, out_dir, date_str, report)
-    build_benchmarks(data_dir, out_dir, date_str, report)
+    manifest = _read_manifest(out_dir)
+    timings: Dict[str, Any] = {}
+
+    todo: Dict[str, str] = {}
+    for name, (inputs, outputs, uses_schema, _) in BUILDERS.items():
+        digest = hash_inputs(inputs(data_dir), schema if uses_schema else None, date_str)
+        prev = manifest.get(name) or {}
+        if not force and prev.get("hash") == digest and all((out_dir / o).exists() for o in outputs):
+            report.update(prev.get("report") or {})
+            timings[name] = {"status": "skipped", "ms": 0.0, "hash": digest}
+        else:
+            todo[name] = digest
+
+    def _run(name: str) -> tuple:
+        t0 = time.perf_counter()
+        part: Dict[str, Any] = {}
+        BUILDERS[name][3](data_dir, out_dir, schema, date_str, part)
+        return name, part, round((time.perf_counter() - t0) * 1000, 2)
+
+    if todo:
+        with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(todo)))) as ex:
+            for name, part, ms in ex.map(_run, list(todo)):
+                report.update(part)
+                manifest[name] = {"hash": todo[name], "outputs": BUILDERS[name][1], "report": part,
+                                  "built_at": dt.datetime.now(dt.timezone.utc).isoformat()}
+                timings[name] = {"status": "built", "ms": ms, "hash": todo[name]}
 
     # include form mapping if present
     fm = read_json_if_exists(data_dir.parent / "build" / "form_mapping.json") or {}
     report["form_mapping_keys"] = len(fm)
 
+    (out_dir / MANIFEST_NAME).write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
     (out_dir / "BUILD_REPORT.json").write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
-    log.info("Done. Report written to %s", out_dir / "BUILD_REPORT.json")
+    summary = {
+        "date": date_str,
+        "total_ms": round((time.perf_counter() - t_start) * 1000, 2),
+        "built": sorted(n for n, t in timings.items() if t["status"] == "built"),
+        "skipped": sorted(n for n, t in timings.items() if t["status"] == "skipped"),
+        "builders": timings,
+    }
+    (out_dir / "BUILD_TIMINGS.json").write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    log.info("Done in %.1f ms (built=%s, skipped=%s). Report written to %s",
+             summary["total_ms"], summary["built"], summary["skipped"], out_dir / "BUILD_REPORT.json")
+    return summary
+
+def _watch_state(data_dir: Path) -> Dict[str, float]:
+    state: Dict[str, float] = {}
+    for p in data_dir.iterdir() if data_dir.exists() else []:
+        if p.is_file() and not p.name.startswith("."):
+            state[p.name] = p.stat().st_mtime
+    return state
+
+def rebuild(data_dir: Path, out_dir: Path, date_str: str, jobs: int = 4) -> Dict[str, Any]:
+    """Watch-Iteration: Snapshot neu einlesen (veraltet → Rohdateien), sonst baut der
+    Lauf aus alten Daten und das Manifest hält den neuen Input-Hash fest."""
+    data_snapshot.reset_snapshot()
+    return run_build(data_dir, out_dir, date_str, jobs=jobs)
+
+def watch(data_dir: Path, out_dir: Path, date_override: Optional[str], jobs: int, interval: float) -> None:
+    """Polling-Watch (keine Zusatz-Abhängigkeit); baut nur geänderte Snippets neu."""
+    log.info("Watching %s (interval %.1fs) – Ctrl+C to stop", data_dir, interval)
+    state = _watch_state(data_dir)
+    run_build(data_dir, out_dir, today_iso(date_override), jobs=jobs)
+    try:
+        while True:
+            time.sleep(interval)
+            current = _watch_state(data_dir)
+            if current != state:
+                state = current
+                rebuild(data_dir, out_dir, today_iso(date_override), jobs=jobs)
+    except KeyboardInterrupt:
+        log.info("Watch stopped.")
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data-dir", default="data", help="Path to data directory")
+    ap.add_argument("--out-dir", default="output", help="Path to output directory")
+    ap.add_argument("--date", default=None, help="ISO date override for 'Stand:'")
+    ap.add_argument("--force", action="store_true", help="Ignore manifest and rebuild everything")
+    ap.add_argument("--jobs", type=int, default=int(os.getenv("BUILD_JOBS", "4")), help="Parallel builders")
+    ap.add_argument("--watch", action="store_true", help="Rebuild on data changes")
+    ap.add_argument("--interval", type=float, default=1.0, help="Watch poll interval in seconds")
+    args = ap.parse_args()
+
+    data_dir = Path(args.data_dir).resolve()
+    out_dir = Path(args.out_dir).resolve()
+    if args.watch:
+        watch(data_dir, out_dir, args.date, args.jobs, args.interval)
+        return 0
+    run_build(data_dir, out_dir, today_iso(args.date), force=args.force, jobs=args.jobs)
     return 0
 
 if __name__ == "__main__":
@@ -2,9 +2,11 @@
 # -*- coding: utf-8 -*-
 """
 Mini-Eval:
-- 5 Briefings → HTML (optional PDF via PDF_SERVICE_URL)
+- 5 Briefings → HTML (optional PDF via PDF_SERVICE_URL, alle PDFs in einem render_many-Aufruf)
 - Prüfungen: ≥5 Progress-Bars, Benchmark-Tabelle vorhanden, ≥5 http-Links
 - Ergebnisse als CSV & Markdown
+- Reports werden gemeinsam über batch_processor erzeugt (geteilte Live-Daten/Prompts);
+  EVAL_PROVIDER=openai-batch|anthropic-batch nutzt die günstigere Provider-Batch-API
 
 Ausführen:  python scripts/eval_runner.py
 """
@@ -18,14 +20,15 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Tuple
 
-import httpx
-
-from gpt_analyze import analyze_briefing
+from batch_processor import run_batch
+from llm_batch import get_completer
+from pdf_client import render_many
 
 OUT_DIR = Path(os.getenv("EVAL_OUT_DIR", "eval_reports"))
 MAKE_PDFS = os.getenv("MAKE_PDFS", "false").lower() == "true"
 PDF_SERVICE_URL = os.getenv("PDF_SERVICE_URL", "").strip()
 PDF_TIMEOUT = float(os.getenv("PDF_TIMEOUT", "25"))
+EVAL_PROVIDER = os.getenv("EVAL_PROVIDER", "online")
 
 
 @dataclass
@@ -34,16 +37,18 @@ class EvalCase:
     payload: Dict[str, object]
 
 
-def _pdf_or_none(html: str, name: str) -> bytes | None:
-    if not (MAKE_PDFS and PDF_SERVICE_URL and html):
-        return None
-    try:
-        with httpx.Client(timeout=PDF_TIMEOUT) as client:
-            r = client.post(PDF_SERVICE_URL, json={"html": html, "fileName": f"{name}.pdf"})
-            r.raise_for_status()
-            return r.content
-    except Exception:
-        return None
+def _pdfs(docs: List[Tuple[str, str]]) -> Dict[str, bytes]:
+    """slug → PDF for all reports at once (batched or pipelined, see pdf_client.render_many)."""
+    docs = [(html, slug) for html, slug in docs if html]
+    if not (MAKE_PDFS and PDF_SERVICE_URL and docs):
+        return {}
+    out: Dict[str, bytes] = {}
+    for (_, slug), res in zip(docs, render_many([(html, f"{slug}.pdf") for html, slug in docs],
+                                                service_url=PDF_SERVICE_URL, timeout=PDF_TIMEOUT)):
+        print(f"PDF {slug}: {res['source']} {res['seconds']:.2f}s {res['error'] or 'ok'}")
+        if res["pdf"]:
+            out[slug] = res["pdf"]
+    return out
 
 
 def _check_progress_bars(html: str) -> Tuple[bool, int]:
@@ -68,14 +73,25 @@ def run_eval(cases: List[EvalCase]) -> None:
     OUT_DIR.mkdir(parents=True, exist_ok=True)
     rows: List[Dict[str, object]] = []
 
-    for case in cases:
-        html = analyze_briefing(case.payload, lang=str(case.payload.get("lang", "de")))
+    htmls: Dict[int, str] = {}
+
+    def _keep(index: int, item_id: str, result: Dict[str, object]) -> Dict[str, object]:
+        htmls[index] = str(result["html"])
+        return {}
+
+    for event in run_batch([c.payload for c in cases], completer=get_completer(EVAL_PROVIDER), sink=_keep):
+        if event["type"] == "summary":
+            print(f"Batch: {event}")
+
+    pdfs = _pdfs([(htmls.get(i, ""), _slug(c.name)) for i, c in enumerate(cases)])
+
+    for i, case in enumerate(cases):
+        html = htmls.get(i, "")
         slug = _slug(case.name)
         (OUT_DIR / f"{slug}.html").write_text(html, encoding="utf-8")
 
-        pdf = _pdf_or_none(html, slug)
-        if pdf:
-            (OUT_DIR / f"{slug}.pdf").write_bytes(pdf)
+        if slug in pdfs:
+            (OUT_DIR / f"{slug}.pdf").write_bytes(pdfs[slug])
 
         ok_bars, n_bars = _check_progress_bars(html)
         ok_bm = _check_benchmark_table(html)
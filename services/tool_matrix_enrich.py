@@ -19,6 +19,8 @@ from dataclasses import dataclass, asdict
 from pathlib import Path
 from typing import Any, Dict, Iterable, List
 
+import data_snapshot
+
 logger = logging.getLogger("tool_matrix_enrich")
 
 DATA_DIR = Path("data")
@@ -40,14 +42,7 @@ class ToolRow:
     audit_export: str = "unknown"
 
 def _read_csv(path: Path) -> List[Dict[str, str]]:
-    if not path.exists():
-        return []
-    out: List[Dict[str, str]] = []
-    with path.open("r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            out.append({(k or "").strip(): (v or "").strip() for k, v in row.items()})
-    return out
+    return data_snapshot.read_csv(path)
 
 def _coalesce(primary: Iterable[Dict[str, str]], fallback: Iterable[Dict[str, str]]) -> List[Dict[str, str]]:
     """Merge by name; primary rows win, fallback fills gaps."""
@@ -74,10 +74,13 @@ class Settings(BaseSettings):
     ADMIN_EMAIL: Optional[str] = Field(default=os.getenv("ADMIN_EMAIL"))
     SMTP_HOST: Optional[str] = Field(default=os.getenv("SMTP_HOST"))
     SMTP_PORT: int = Field(default=int(os.getenv("SMTP_PORT", "587")))
-    SMTP_USER: Optional[str] = Field(default=os.getenv("SMTP_USER"))
+    SMTP_USER: Optional[str] = Field(default=os.getenv("SMTP_USER") or os.getenv("SMTP_USERNAME"))
     SMTP_PASSWORD: Optional[str] = Field(default=os.getenv("SMTP_PASSWORD"))
-    SMTP_TLS: bool = Field(default=os.getenv("SMTP_TLS", "true").lower() == "true")
+    SMTP_TLS: bool = Field(default=os.getenv("SMTP_TLS", os.getenv("SMTP_USE_TLS", "true")).lower() == "true")
     SMTP_SSL: bool = Field(default=os.getenv("SMTP_SSL", "false").lower() == "true")
+    SMTP_FROM: Optional[str] = Field(default=os.getenv("SMTP_FROM") or os.getenv("MAIL_FROM"))
+    SMTP_FROM_NAME: str = Field(default=os.getenv("SMTP_FROM_NAME", "KI-Sicherheit"))
+    ATTACH_HTML_FALLBACK: bool = Field(default=os.getenv("ATTACH_HTML_FALLBACK", "true").lower() == "true")
 
     # Misc
     DEBUG: bool = Field(default=os.getenv("DEBUG", "false").lower() == "true")
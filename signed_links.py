@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Signed, expiring download links for artifacts.
+
+Mails carry attachments above MAIL_ATTACH_MAX_BYTES as such a link instead of
+inline base64 (mail_utils). The token is an itsdangerous URLSafeTimedSerializer
+signature over the artifact's sha256, filename and content type – no database
+row, no Redis key. GET /api/files/<token> (routes/files.py) verifies it and
+streams from the artifact store (Range/ETag via artifact_store.artifact_response).
+
+    url = signed_links.url_for(ref, "KI-Status-Report.pdf")   # None without PUBLIC_API_URL
+    path = signed_links.path_for(ref, "a.html")                 # relative, for API responses
+    data = signed_links.verify(token)   # raises SignatureExpired / BadSignature
+
+ENV: PUBLIC_API_URL (public base URL of this backend), DOWNLOAD_LINK_TTL (seconds,
+default 7 days; keep below the artifact retention), DOWNLOAD_LINK_SECRET (default SECRET_KEY)
+"""
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, Optional
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+PUBLIC_API_URL = os.getenv("PUBLIC_API_URL", "").strip().rstrip("/")
+LINK_TTL = int(os.getenv("DOWNLOAD_LINK_TTL", str(7 * 86400)))
+SECRET = os.getenv("DOWNLOAD_LINK_SECRET") or os.getenv("SECRET_KEY", "dev-insecure-change-me")
+SALT = "artifact-download"
+
+_serializer = URLSafeTimedSerializer(SECRET, salt=SALT)
+
+
+def sign(ref: Dict[str, Any], filename: str) -> str:
+    return _serializer.dumps({"sha256": ref["sha256"], "filename": filename,
+                              "content_type": ref.get("content_type") or "application/octet-stream"})
+
+
+def verify(token: str, max_age: Optional[int] = None) -> Dict[str, str]:
+    """Link payload; raises SignatureExpired (too old) or BadSignature (forged/garbled)."""
+    data = _serializer.loads(token, max_age=LINK_TTL if max_age is None else max_age)
+    if not isinstance(data, dict) or "sha256" not in data:
+        raise BadSignature("unexpected link payload")
+    return data
+
+
+def path_for(ref: Dict[str, Any], filename: str) -> str:
+    return f"/api/files/{sign(ref, filename)}"
+
+
+def url_for(ref: Dict[str, Any], filename: str) -> Optional[str]:
+    """Absolute download URL; None if PUBLIC_API_URL is unset (a relative link is useless in a mail)."""
+    if not PUBLIC_API_URL:
+        return None
+    return PUBLIC_API_URL + path_for(ref, filename)
+
+
+def link(ref: Dict[str, Any], filename: str) -> str:
+    """Absolute URL if PUBLIC_API_URL is set, else the path (API clients resolve it)."""
+    return url_for(ref, filename) or path_for(ref, filename)
+
+
+__all__ = ["sign", "verify", "url_for", "path_for", "link", "BadSignature", "SignatureExpired", "LINK_TTL"]
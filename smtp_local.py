@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Local SMTP stand-in (tests, development without a mail server).
+
+A small threaded server on 127.0.0.1 that speaks enough SMTP for smtplib
+(EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT; AUTH PLAIN/LOGIN accepted) and
+records what it receives – including how many connections and logins were
+needed, which is what the SMTP pool in mail_utils is about.
+
+    with LocalSmtpServer() as srv:       # srv.port
+        ...
+        srv.messages                     # [{"from", "to", "data", "conn"}]
+        srv.connections, srv.logins
+        srv.reject["spam@example.com"] = "550 no such user"   # per-recipient reply
+        srv.disconnect_after = 1         # drop the connection after n messages
+
+For a development mailer: SMTP_HOST=127.0.0.1 SMTP_PORT=<port> SMTP_TLS=false.
+"""
+from __future__ import annotations
+
+import os
+import socketserver
+import threading
+from typing import Any, Dict, List, Optional
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "_Server"
+
+    def _reply(self, line: str) -> None:
+        self.wfile.write((line + "\r\n").encode("utf-8"))
+
+    def handle(self) -> None:
+        owner = self.server.owner
+        with owner._lock:
+            owner.connections += 1
+            conn_no = owner.connections
+        self._reply("220 localhost ESMTP stand-in")
+        mail_from: Optional[str] = None
+        rcpts: List[str] = []
+        sent_here = 0
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode("utf-8", "replace").rstrip("\r\n")
+            cmd = line[:4].upper()
+            if cmd == "EHLO":
+                self.wfile.write(b"250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+            elif cmd == "HELO":
+                self._reply("250 localhost")
+            elif cmd == "AUTH":
+                parts = line.split()
+                if len(parts) == 2 and parts[1].upper() == "LOGIN":
+                    self._reply("334 VXNlcm5hbWU6")
+                    self.rfile.readline()
+                    self._reply("334 UGFzc3dvcmQ6")
+                    self.rfile.readline()
+                with owner._lock:
+                    owner.logins += 1
+                self._reply("235 2.7.0 Authentication successful")
+            elif cmd == "MAIL":
+                mail_from, rcpts = line.split(":", 1)[1].split()[0].strip("<>"), []
+                self._reply("250 OK")
+            elif cmd == "RCPT":
+                rcpt = line.split(":", 1)[1].split()[0].strip("<>")
+                reply = owner.reject.get(rcpt)
+                if reply:
+                    self._reply(reply)
+                else:
+                    rcpts.append(rcpt)
+                    self._reply("250 OK")
+            elif cmd == "DATA":
+                if not rcpts:
+                    self._reply("503 need RCPT")
+                    continue
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk in (b".\r\n", b".\n"):
+                        break
+                    lines.append(chunk[1:] if chunk.startswith(b"..") else chunk)
+                with owner._lock:
+                    owner.messages.append({"from": mail_from, "to": list(rcpts), "data": b"".join(lines),
+                                           "conn": conn_no})
+                sent_here += 1
+                self._reply("250 OK queued")
+                if owner.disconnect_after and sent_here >= owner.disconnect_after:
+                    return  # Verbindungsabbruch simulieren
+            elif cmd == "RSET":
+                mail_from, rcpts = None, []
+                self._reply("250 OK")
+            elif cmd == "NOOP":
+                self._reply("250 OK")
+            elif cmd == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    owner: "LocalSmtpServer"
+
+
+class LocalSmtpServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self._server = _Server((host, port), _Handler)
+        self._server.owner = self
+        self.host, self.port = self._server.server_address[:2]
+        self.messages: List[Dict[str, Any]] = []
+        self.connections = 0
+        self.logins = 0
+        self.reject: Dict[str, str] = {}
+        self.disconnect_after = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "LocalSmtpServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="smtp-local", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "LocalSmtpServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+__all__ = ["LocalSmtpServer"]
+
+
+if __name__ == "__main__":
+    import time
+    srv = LocalSmtpServer(port=int(os.getenv("SMTP_LOCAL_PORT", "2525"))).start()
+    print(f"SMTP stand-in on {srv.host}:{srv.port}")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"{len(srv.messages)} message(s), {srv.connections} connection(s)")
+    except KeyboardInterrupt:
+        srv.stop()
@@ -0,0 +1,121 @@
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+import artifact_store
+from artifact_store import ArtifactStore, FileSystemBackend, S3Backend
+
+
+class FakeS3:
+    """Minimaler lokaler S3-Ersatz (Teilmenge der boto3-API)."""
+
+    class NotFound(Exception):
+        response = {"Error": {"Code": "404"}}
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, ContentType, Metadata):
+        self.objects[Key] = (bytes(Body), ContentType, dict(Metadata))
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise self.NotFound()
+        body, ct, md = self.objects[Key]
+        return {"ContentLength": len(body), "ContentType": ct, "Metadata": md}
+
+    def copy_object(self, Bucket, Key, CopySource, ContentType, Metadata, MetadataDirective):
+        body, _, _ = self.objects[CopySource["Key"]]
+        self.objects[Key] = (body, ContentType, dict(Metadata))
+
+    def get_object(self, Bucket, Key, Range):
+        start, end = (int(x) for x in Range.split("=")[1].split("-"))
+        return {"Body": io.BytesIO(self.objects[Key][0][start:end + 1])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+    def list_objects_v2(self, Bucket, Prefix, **kw):
+        return {"Contents": [{"Key": k} for k in self.objects if k.startswith(Prefix)], "IsTruncated": False}
+
+
+@pytest.fixture(params=["fs", "s3"])
+def store(request, tmp_path):
+    backend = FileSystemBackend(tmp_path) if request.param == "fs" else S3Backend("bucket", client=FakeS3())
+    return ArtifactStore(backend, artifact_store.parse_retention("pdf:30,html:1"))
+
+
+def test_put_dedupes_streams_and_sweeps(store):
+    data = b"%PDF" + bytes(range(256)) * 600
+    ref = store.put(data, "application/pdf", kind="pdf")
+    assert ref == store.put(data, "application/pdf", kind="pdf")
+    assert ref["sha256"] == __import__("hashlib").sha256(data).hexdigest()
+    assert store.read(ref["sha256"]) == data
+    assert b"".join(store.iter_bytes(ref["sha256"], 10, 99, chunk_size=7)) == data[10:100]
+
+    html = store.put(b"<html/>", "text/html", kind="html")
+    # html läuft nach 1 Tag ab, pdf erst nach 30
+    assert store.sweep(now=html["expires_at"] + 1) == 1
+    assert store.stat(html["sha256"]) is None and store.stat(ref["sha256"]) is not None
+    with pytest.raises(ValueError):
+        store.stat("../etc/passwd")
+
+
+def test_parse_range():
+    assert artifact_store.parse_range(None, 100) is None
+    assert artifact_store.parse_range("bytes=0-9", 100) == (0, 9)
+    assert artifact_store.parse_range("bytes=90-", 100) == (90, 99)
+    assert artifact_store.parse_range("bytes=-10", 100) == (90, 99)
+    assert artifact_store.parse_range("bytes=0-1,5-6", 100) is None
+    with pytest.raises(ValueError):
+        artifact_store.parse_range("bytes=100-", 100)
+
+
+def test_artifact_response_range_and_etag(tmp_path):
+    from fastapi import FastAPI, Request
+    from fastapi.testclient import TestClient
+
+    store = ArtifactStore(FileSystemBackend(tmp_path))
+    data = bytes(range(256)) * 1000
+    ref = store.put(data, "application/pdf", kind="pdf")
+    app = FastAPI()
+
+    @app.get("/a")
+    def get_a(request: Request):
+        return artifact_store.artifact_response(request, ref, "r.pdf", store=store)
+
+    c = TestClient(app)
+    full = c.get("/a")
+    assert full.status_code == 200 and full.content == data
+    etag = full.headers["etag"]
+    assert c.get("/a", headers={"If-None-Match": etag}).status_code == 304
+    part = c.get("/a", headers={"Range": "bytes=1000-1999"})
+    assert part.status_code == 206 and part.content == data[1000:2000]
+    assert part.headers["content-range"] == f"bytes 1000-1999/{len(data)}"
+    assert c.get("/a", headers={"Range": "bytes=1000-1999", "If-Range": '"other"'}).status_code == 200
+    assert c.get("/a", headers={"Range": f"bytes={len(data)}-"}).status_code == 416
+
+
+def test_job_payload_offloads_and_compresses(tmp_path):
+    import pickle
+    import job_payload
+
+    store = ArtifactStore(FileSystemBackend(tmp_path))
+    payload = {"html": "<p>Bericht</p>" * 20000, "email": "a@example.com", "answers": ["x" * 40] * 100}
+    packed = job_payload.pack(payload, store=store)
+    assert job_payload.is_packed(packed)
+    assert len(pickle.dumps(packed)) < 2000 < len(pickle.dumps(payload))
+    assert job_payload.unpack(packed, store=store) == payload
+    small = {"url": "https://example.com"}
+    assert job_payload.pack(small, store=store) == small == job_payload.unpack(small)
+    assert job_payload.describe("tasks.analyze_and_render", packed) == "tasks.analyze_and_render(<packed>)"
+    # Bytes bleiben Bytes (inline base64), verschachtelte Bytes werden abgelehnt statt repr()
+    binary = dict(payload, pdf=b"%PDF\x00\xff", blob=b"\x01" * (job_payload.INLINE_MAX + 1))
+    assert job_payload.unpack(job_payload.pack(binary, store=store), store=store) == binary
+    with pytest.raises(TypeError):
+        job_payload.pack(dict(payload, nested={"pdf": b"%PDF"}), store=store)
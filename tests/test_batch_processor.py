@@ -0,0 +1,170 @@
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+import batch_processor
+import gpt_analyze
+import llm_batch
+
+
+class CountingCompleter:
+    name = "test"
+
+    def __init__(self):
+        self.calls = []
+
+    def complete_many(self, requests):
+        self.calls.append(len(requests))
+        return {cid: f"<p>{name}</p>" for cid, (name, _) in requests.items()}
+
+
+def _items():
+    a = {"id": "a", "branche": "beratung", "bundesland_code": "DE-BE", "unternehmensgroesse": "solo"}
+    return [a, dict(a, id="a2"), {"id": "b", "branche": "handel", "bundesland_code": "DE-BY"},
+            {"id": "c", "branche": "handel", "bundesland_code": "DE-BY", "hauptleistung": "Onlineshop"}]
+
+
+def test_parse_items_formats():
+    items = [{"branche": "it"}, {"branche": "handel"}]
+    assert batch_processor.parse_items(json.dumps(items))[0] == items
+    assert batch_processor.parse_items("\n".join(json.dumps(i) for i in items).encode())[0] == items
+    assert batch_processor.parse_items({"items": items, "lang": "en"}) == (items, {"lang": "en"})
+    with pytest.raises(ValueError):
+        batch_processor.parse_items("[1, 2]")
+
+
+def test_run_batch_shares_live_data_and_prompts(monkeypatch):
+    live_calls = []
+    monkeypatch.setattr(gpt_analyze, "fetch_live_data",
+                        lambda n, lang="de": live_calls.append(n.branche) or {"news": [], "tools": [], "funding": []})
+    completer = CountingCompleter()
+    htmls = {}
+    events = list(batch_processor.run_batch(_items(), completer=completer,
+                                            sink=lambda i, item_id, r: htmls.setdefault(item_id, r["html"]) and {}))
+    summary = events[-1]
+    assert summary["ok"] == 4 and summary["failed"] == 0
+    # c hat eine eigene Hauptleistung → eigene Suchanfragen, keine fremden News/Tools
+    assert sorted(live_calls) == ["beratung", "handel", "handel"] and summary["live_groups"] == 3
+    n_overlays = len(gpt_analyze.OVERLAY_NAMES)
+    assert summary["overlay_requests"] == 4 * n_overlays
+    # a und a2 sind bis auf die id identisch → ihre Prompts werden geteilt
+    assert summary["overlay_unique"] == 3 * n_overlays == completer.calls[0]
+    assert sorted(htmls) == ["a", "a2", "b", "c"]
+    assert [e["id"] for e in events if e["type"] == "item"] == ["a", "a2", "b", "c"]
+
+
+def _openai_stand_in():
+    state = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path.endswith("/files") and request.method == "POST":
+            body = request.content.decode()
+            state["lines"] = [json.loads(l) for l in body.splitlines() if l.startswith("{")]
+            return httpx.Response(200, json={"id": "file-in"})
+        if path.endswith("/batches") and request.method == "POST":
+            assert json.loads(request.content)["input_file_id"] == "file-in"
+            return httpx.Response(200, json={"id": "batch-1", "status": "validating"})
+        if path.endswith("/batches/batch-1"):
+            state["polls"] = state.get("polls", 0) + 1
+            status = "completed" if state["polls"] > 1 else "in_progress"
+            return httpx.Response(200, json={"id": "batch-1", "status": status, "output_file_id": "file-out"})
+        if path.endswith("/files/file-out/content"):
+            # letzter Eintrag fehlt → Online-Nachholung
+            out = [{"custom_id": l["custom_id"], "response": {"status_code": 200, "body": {
+                "choices": [{"message": {"content": "```html\n<p>batch</p>\n```"}}]}}} for l in state["lines"][:-1]]
+            return httpx.Response(200, text="\n".join(json.dumps(o) for o in out))
+        return httpx.Response(404)
+
+    return httpx.Client(transport=httpx.MockTransport(handler)), state
+
+
+def test_openai_batch_completer_with_stand_in():
+    client, state = _openai_stand_in()
+    fallback = CountingCompleter()
+    comp = llm_batch.OpenAIBatchCompleter(client=client, poll_seconds=0, fallback=fallback)
+    msgs = [{"role": "user", "content": "x"}]
+    out = comp.complete_many({"k1": ("roadmap", msgs), "k2": ("risks", msgs), "k3": ("business", msgs)})
+    assert out == {"k1": "<p>batch</p>", "k2": "<p>batch</p>", "k3": "<p>business</p>"}
+    assert fallback.calls == [1] and state["polls"] == 2
+    assert state["lines"][0]["url"] == "/v1/chat/completions"
+
+
+def test_anthropic_batch_completer_with_stand_in():
+    def handler(request):
+        if request.url.path.endswith("/messages/batches"):
+            ids = [r["custom_id"] for r in json.loads(request.content)["requests"]]
+            handler.ids = ids
+            return httpx.Response(200, json={"id": "mb-1", "processing_status": "in_progress"})
+        if request.url.path.endswith("/messages/batches/mb-1"):
+            return httpx.Response(200, json={"id": "mb-1", "processing_status": "ended",
+                                             "results_url": "https://stand-in.local/results/mb-1"})
+        if request.url.path.endswith("/results/mb-1"):
+            rows = [{"custom_id": i, "result": {"type": "succeeded", "message": {
+                "content": [{"type": "text", "text": f"<p>{i}</p>"}]}}} for i in handler.ids]
+            return httpx.Response(200, text="\n".join(json.dumps(r) for r in rows))
+        return httpx.Response(404)
+
+    comp = llm_batch.AnthropicBatchCompleter(client=httpx.Client(transport=httpx.MockTransport(handler)),
+                                             poll_seconds=0, fallback=CountingCompleter())
+    assert comp.complete_many({"k1": ("roadmap", [{"role": "user", "content": "x"}])}) == {"k1": "<p>k1</p>"}
+
+
+def test_batch_endpoint_queues_lane_job_with_signed_links(monkeypatch, tmp_path):
+    fakeredis = pytest.importorskip("fakeredis")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    import artifact_store
+    import fair_queue
+    import queue_utils
+    from routes import admin_status, briefing, files
+
+    conn = fakeredis.FakeStrictRedis()
+    monkeypatch.setenv("ARTIFACT_DIR", str(tmp_path))
+    monkeypatch.setenv("ENABLE_QUEUE", "true")
+    monkeypatch.setenv("REDIS_URL", "redis://stand-in")
+    monkeypatch.setattr(queue_utils, "get_redis_connection", lambda: conn)
+    monkeypatch.setattr(admin_status, "ADMIN_API_TOKEN", "geheim")
+    artifact_store.reset_store()
+    monkeypatch.setattr(gpt_analyze, "fetch_live_data", lambda n, lang="de": {"news": [], "tools": [], "funding": []})
+    monkeypatch.setattr(gpt_analyze, "complete_overlay", lambda name, msgs: f"<p>{name}</p>")
+    app = FastAPI()
+    app.include_router(briefing.router, prefix="/api")
+    app.include_router(files.router, prefix="/api")
+    c = TestClient(app)
+    body = "\n".join(json.dumps(i) for i in _items())
+    assert c.post("/api/briefing/batch", content=body).status_code in (401, 403)
+
+    auth = {"X-Admin-Token": "geheim", "X-Tenant-Id": "partner-1"}
+    r = c.post("/api/briefing/batch", content=body, headers=auth)
+    assert r.status_code == 202 and r.json()["items"] == 4
+    job_id = r.json()["job_id"]
+    assert c.get(f"/api/briefing/batch/{job_id}", headers=auth).json()["status"] in ("queued", "deferred")
+    fair_queue.FairSimpleWorker([fair_queue.lane_queue(conn, "batch")], connection=conn).work(burst=True)
+
+    out = c.get(f"/api/briefing/batch/{job_id}", headers=auth).json()
+    assert out["status"] == "finished" and out["result"]["summary"]["ok"] == 4
+    items = out["result"]["items"]
+    assert [e["id"] for e in items] == ["a", "a2", "b", "c"]
+    assert c.get(items[0]["url"]).text.startswith("<")
+    events = c.get(out["result"]["events_url"]).text.splitlines()
+    assert json.loads(events[0])["type"] == "accepted" and out["result"]["events"]["kind"] == "batch"
+    artifact_store.reset_store()
+
+
+def test_batch_payload_outlives_job_timeout_and_retries(tmp_path):
+    import time
+    import artifact_store
+    import job_payload
+
+    store = artifact_store.ArtifactStore(artifact_store.FileSystemBackend(tmp_path))
+    ttl = batch_processor.payload_ttl()
+    assert ttl > batch_processor.JOB_TIMEOUT * 2
+    packed = job_payload.pack({"items": [], "notes": "x" * (job_payload.INLINE_MAX + 1)}, store=store, min_ttl=ttl)
+    assert store.stat(packed["notes"]["__artifact__"])["expires_at"] >= time.time() + ttl - 5
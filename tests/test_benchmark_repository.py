@@ -0,0 +1,43 @@
+import os, sys, json
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+from benchmark_repository import BenchmarkRepository, KPIS
+
+def test_free_text_branche_and_size_resolve_exactly():
+    repo = BenchmarkRepository(BASE / "data")
+    e = repo.entry("IT & Software", "11-100")
+    assert (e.branche, e.size, e.level) == ("it_software", "kmu", 1)
+    assert set(e.values) == set(KPIS)
+    assert all(0 <= v <= 100 for v in e.values.values())
+    assert repo.entry("beratung", "2-10 (Kleines Team)").origin == "benchmarks_beratung_small.json"
+    aliases = len(repo._aliases)
+    for i in range(50):  # Freitext wird aufgelöst, aber nicht gemerkt
+        assert repo.canonical_branche(f"Beratung Nr. {i}") == "beratung"
+        assert repo.canonical_branche(f"Quatsch {i}") == "default"
+    assert len(repo._aliases) == aliases
+
+def test_fallback_chain_and_validation_report(tmp_path):
+    (tmp_path / "benchmarks_bau_kmu.json").write_text(json.dumps({"digitalisierung": 58, "innovation": 0.5}))
+    (tmp_path / "benchmark_default.csv").write_text("Kriterium,Solo,Klein,KMU\nDigitalisierungsgrad,5,6,7\n")
+    repo = BenchmarkRepository(tmp_path)
+    assert repo.get("bau", "kmu")["digitalisierung"] == 58
+    assert repo.get("bau", "kmu")["innovation"] == 50
+    assert repo.entry("bau", "solo").level == 3
+    assert repo.get("unbekannt", "solo")["digitalisierung"] == 50
+    report = repo.validation_report()
+    assert report["exact"] == 1
+    assert {(m["branche"], m["size"]) for m in report["missing"]} == {("bau", "solo"), ("bau", "team")}
+
+def test_hot_reload_on_change(tmp_path, monkeypatch):
+    import benchmark_repository
+    monkeypatch.setattr(benchmark_repository, "RELOAD_SECONDS", 0.000001)
+    p = tmp_path / "benchmarks_it_kmu.json"
+    p.write_text(json.dumps({"digitalisierung": 40}))
+    repo = BenchmarkRepository(tmp_path)
+    assert repo.get("it", "kmu")["digitalisierung"] == 40
+    p.write_text(json.dumps({"digitalisierung": 80}))
+    os.utime(p, (p.stat().st_mtime + 5, p.stat().st_mtime + 5))
+    assert repo.get("it", "kmu")["digitalisierung"] == 80
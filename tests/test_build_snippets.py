@@ -0,0 +1,55 @@
+import sys, json
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE / "scripts"))
+
+import build_snippets
+
+def _data(tmp_path):
+    d = tmp_path / "data"
+    d.mkdir()
+    (d / "check_datenschutz.md").write_text("- AVV prüfen\n- DSFA\n", encoding="utf-8")
+    (d / "benchmark_it.csv").write_text("Kategorie,Wert_Durchschnitt\nDigitalisierungsgrad,6.5\n", encoding="utf-8")
+    return d
+
+def test_second_run_skips_unchanged(tmp_path):
+    d, out = _data(tmp_path), tmp_path / "out"
+    first = build_snippets.run_build(d, out, "2025-10-03")
+    assert set(first["built"]) == set(build_snippets.BUILDERS)
+    second = build_snippets.run_build(d, out, "2025-10-03")
+    assert second["built"] == [] and set(second["skipped"]) == set(build_snippets.BUILDERS)
+    report = json.loads((out / "BUILD_REPORT.json").read_text(encoding="utf-8"))
+    assert report["COMPLIANCE_HTML"] == {"items": 2}
+    assert json.loads((out / "BUILD_TIMINGS.json").read_text(encoding="utf-8"))["skipped"] == second["skipped"]
+
+def test_only_changed_builder_reruns(tmp_path):
+    d, out = _data(tmp_path), tmp_path / "out"
+    build_snippets.run_build(d, out, "2025-10-03")
+    (d / "check_datenschutz.md").write_text("- AVV prüfen\n", encoding="utf-8")
+    res = build_snippets.run_build(d, out, "2025-10-03")
+    assert res["built"] == ["COMPLIANCE_HTML"]
+    (out / "benchmarks.json").unlink()
+    assert build_snippets.run_build(d, out, "2025-10-03")["built"] == ["benchmarks"]
+    assert set(build_snippets.run_build(d, out, "2025-10-03", force=True)["built"]) == set(build_snippets.BUILDERS)
+
+def test_rebuild_rereads_snapshot_after_data_edit(tmp_path, monkeypatch):
+    import os, time
+    import data_snapshot
+    d, out = _data(tmp_path), tmp_path / "out"
+    snap = tmp_path / "snap.bin"
+    data_snapshot.write_snapshot(snap, d)
+    monkeypatch.setattr(data_snapshot, "SNAPSHOT_PATH", snap)
+    monkeypatch.setattr(data_snapshot, "DATA_DIR", d.resolve())
+    monkeypatch.setattr(data_snapshot, "SNAPSHOT_RECHECK_SECONDS", 3600)
+    data_snapshot.reset_snapshot()
+    try:
+        build_snippets.run_build(d, out, "2025-10-03")
+        p = d / "check_datenschutz.md"
+        p.write_text("- AVV prüfen\n", encoding="utf-8")
+        os.utime(p, (time.time() + 5, time.time() + 5))
+        assert build_snippets.rebuild(d, out, "2025-10-03")["built"] == ["COMPLIANCE_HTML"]
+        report = json.loads((out / "BUILD_REPORT.json").read_text(encoding="utf-8"))
+        assert report["COMPLIANCE_HTML"] == {"items": 1}
+    finally:
+        data_snapshot.reset_snapshot()
@@ -0,0 +1,39 @@
+import sys, time
+from pathlib import Path
+
+import pytest
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+from concurrent_worker import ConcurrentWorkerPool, parse_concurrency
+
+def spin(seconds):
+    # kurze Schritte, damit TimerDeathPenalty greifen kann
+    end = time.time() + seconds
+    while time.time() < end:
+        time.sleep(0.02)
+    return seconds
+
+def test_parse_concurrency():
+    assert parse_concurrency("reports:8,pdf:4,2", ["reports", "emails"]) == [
+        (("reports",), 8), (("pdf",), 4), (("reports", "emails"), 2)]
+    assert parse_concurrency("", ["reports"]) == [(("reports",), 1)]
+    with pytest.raises(ValueError):
+        parse_concurrency("reports:x", ["reports"])
+
+def test_jobs_run_concurrently_and_time_out():
+    fakeredis = pytest.importorskip("fakeredis")
+    from rq import Queue
+    conn = fakeredis.FakeStrictRedis()
+    q = Queue("reports", connection=conn)
+    ok = [q.enqueue(spin, 0.6) for _ in range(4)]
+    slow = q.enqueue(spin, 5, job_timeout=1)
+    pool = ConcurrentWorkerPool(conn, [(("reports",), 5)], name_prefix="t")
+    t0 = time.time()
+    pool.start(burst=True, logging_level="WARNING")
+    pool.join()
+    elapsed = time.time() - t0
+    assert all(j.get_status(refresh=True) == "finished" for j in ok)
+    assert slow.get_status(refresh=True) == "failed"
+    assert elapsed < 2.5  # seriell wären es > 3.4 s
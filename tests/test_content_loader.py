@@ -0,0 +1,42 @@
+import sys
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+import content_loader
+
+def _setup(tmp_path, monkeypatch):
+    content = tmp_path / "content"
+    content.mkdir()
+    (content / "4-Saeulen-KI-Readiness.en.html").write_text("<html><body><p>Four pillars</p></body></html>", encoding="utf-8")
+    monkeypatch.setenv("CONTENT_DIR", str(content))
+    monkeypatch.setenv("CONTENT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(content_loader, "_MEMO", {})
+    calls = []
+    def fake_translate(html, lang):
+        calls.append(lang)
+        return "<p>Vier Säulen</p>"
+    monkeypatch.setattr(content_loader, "_translate", fake_translate)
+    return calls
+
+def test_translation_is_cached_persistently(tmp_path, monkeypatch):
+    calls = _setup(tmp_path, monkeypatch)
+    assert content_loader.load_content_sections("de")["pillars"]["html"] == "<p>Vier Säulen</p>"
+    content_loader.load_content_sections("de")
+    assert calls == ["de"]
+    # frischer Prozess: nur noch der Datei-Cache
+    monkeypatch.setattr(content_loader, "_MEMO", {})
+    assert content_loader.load_content_sections("de")["pillars"]["html"] == "<p>Vier Säulen</p>"
+    assert calls == ["de"]
+    assert len(list((tmp_path / "cache").glob("*.json"))) == 1
+
+def test_failed_translation_is_not_cached(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    monkeypatch.setattr(content_loader, "_translate", lambda html, lang: None)
+    assert content_loader.load_content_sections("de")["pillars"]["html"] == "<p>Four pillars</p>"
+    assert not (tmp_path / "cache").exists()
+
+def test_docx_extraction():
+    html = content_loader._docx_to_html(BASE / "content" / "Formel-fuer-Transformation.docx")
+    assert html.startswith("<p>10-20-70")
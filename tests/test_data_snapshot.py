@@ -0,0 +1,90 @@
+import os, sys, time
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+import data_snapshot
+
+def _make_data(tmp_path):
+    d = tmp_path / "data"
+    d.mkdir()
+    (d / "funding_whitelist.csv").write_text("﻿region;title;url\nBE;A;https://a\nDE;B;https://b\n", encoding="utf-8")
+    (d / "tools.json").write_text('[{"name": "X"}]', encoding="utf-8")
+    (d / "notes.md").write_text("# Hi", encoding="utf-8")
+    return d
+
+def test_roundtrip_and_index(tmp_path):
+    d = _make_data(tmp_path)
+    out = tmp_path / "snap.bin"
+    info = data_snapshot.write_snapshot(out, d)
+    assert info["files"] == 3
+    snap = data_snapshot.read_snapshot(out, d)
+    f = snap["files"]["funding_whitelist.csv"]
+    assert f["rows"][0] == {"region": "BE", "title": "A", "url": "https://a"}
+    assert f["index"]["region"] == {"be": [0], "de": [1]}
+    assert snap["files"]["tools.json"]["data"] == [{"name": "X"}]
+    assert snap["files"]["notes.md"]["text"] == "# Hi"
+
+def test_stale_snapshot_is_ignored(tmp_path):
+    d = _make_data(tmp_path)
+    out = tmp_path / "snap.bin"
+    data_snapshot.write_snapshot(out, d)
+    p = d / "notes.md"
+    p.write_text("# changed", encoding="utf-8")
+    os.utime(p, (time.time() + 5, time.time() + 5))
+    assert data_snapshot.read_snapshot(out, d) is None
+    assert data_snapshot.read_snapshot(out, d, verify=False) is not None
+
+def test_loader_helpers_fall_back_without_snapshot(tmp_path, monkeypatch):
+    d = _make_data(tmp_path)
+    out = tmp_path / "snap.bin"
+    data_snapshot.write_snapshot(out, d)
+    monkeypatch.setattr(data_snapshot, "SNAPSHOT_PATH", out)
+    monkeypatch.setattr(data_snapshot, "DATA_DIR", d.resolve())
+    data_snapshot.reset_snapshot()
+    try:
+        rows = data_snapshot.csv_rows(d / "funding_whitelist.csv")
+        assert [r["title"] for r in rows] == ["A", "B"]
+        rows[0]["title"] = "mutated"
+        assert data_snapshot.csv_rows(d / "funding_whitelist.csv")[0]["title"] == "A"
+        assert data_snapshot.csv_rows(tmp_path / "elsewhere.csv") is None
+    finally:
+        data_snapshot.reset_snapshot()
+
+def test_raw_and_snapshot_csv_parse_identically(tmp_path, monkeypatch):
+    d = _make_data(tmp_path)
+    (d / "tools.csv").write_text('name;category\nA;x;extra\n\n B ; y \n;\nC;"zwei\nZeilen"\n', encoding="utf-8")
+    raw = [data_snapshot.read_csv(d / n) for n in ("funding_whitelist.csv", "tools.csv")]
+    assert raw[1] == [{"name": "A", "category": "x", "": "extra"}, {"name": "B", "category": "y"},
+                      {"name": "C", "category": "zwei\nZeilen"}]
+    out = tmp_path / "snap.bin"
+    data_snapshot.write_snapshot(out, d)
+    monkeypatch.setattr(data_snapshot, "SNAPSHOT_PATH", out)
+    monkeypatch.setattr(data_snapshot, "DATA_DIR", d.resolve())
+    data_snapshot.reset_snapshot()
+    try:
+        assert data_snapshot.get_snapshot() is not None
+        assert [data_snapshot.read_csv(d / n) for n in ("funding_whitelist.csv", "tools.csv")] == raw
+        assert data_snapshot.read_csv(d / "missing.csv") == []
+    finally:
+        data_snapshot.reset_snapshot()
+
+def test_snapshot_is_rechecked_after_data_changes(tmp_path, monkeypatch):
+    d = _make_data(tmp_path)
+    out = tmp_path / "snap.bin"
+    data_snapshot.write_snapshot(out, d)
+    monkeypatch.setattr(data_snapshot, "SNAPSHOT_PATH", out)
+    monkeypatch.setattr(data_snapshot, "DATA_DIR", d.resolve())
+    monkeypatch.setattr(data_snapshot, "SNAPSHOT_RECHECK_SECONDS", 0)
+    data_snapshot.reset_snapshot()
+    try:
+        assert data_snapshot.text(d / "notes.md") == "# Hi"
+        p = d / "notes.md"
+        p.write_text("# changed", encoding="utf-8")
+        os.utime(p, (time.time() + 5, time.time() + 5))
+        assert data_snapshot.get_snapshot() is None      # veraltet → Rohdateien
+        data_snapshot.write_snapshot(out, d)
+        assert data_snapshot.text(d / "notes.md") == "# changed"   # neu gebauter Snapshot
+    finally:
+        data_snapshot.reset_snapshot()
@@ -0,0 +1,99 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import fair_queue  # noqa: E402
+from rq import Worker  # noqa: E402
+from rq.job import Job, JobStatus  # noqa: E402
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    monkeypatch.setattr(fair_queue, "READY_DEPTH", 1)
+    monkeypatch.setattr(fair_queue, "WEIGHTS", {"default": 1.0})
+    return fakeredis.FakeStrictRedis()
+
+
+def _submit(conn, tenant, n, lane="batch"):
+    return [fair_queue.submit(conn, lane, tenant, "json.loads", "1") for _ in range(n)]
+
+
+def _drain(conn, lane="batch"):
+    """Simulates a worker: take the head of the lane queue, then refill."""
+    q = fair_queue.lane_queue(conn, lane)
+    order = []
+    while True:
+        job_id = conn.lpop(q.key)
+        if job_id is None:
+            break
+        order.append(Job.fetch(job_id.decode(), connection=conn).meta["tenant"])
+        fair_queue.pump(conn, lane)
+    return order
+
+
+def test_tenants_alternate_instead_of_fifo(conn):
+    first = _submit(conn, "partner", 4)
+    _submit(conn, "user@example.com", 2)
+    assert first[0].get_status() == JobStatus.QUEUED
+    assert first[1].get_status() == JobStatus.DEFERRED
+    assert fair_queue.staged_count(conn, "batch") == 5
+    assert _drain(conn) == ["partner", "partner", "user@example.com", "partner", "user@example.com", "partner"]
+    assert fair_queue.staged_count(conn, "batch") == 0
+
+
+def test_weights_give_more_slots(conn, monkeypatch):
+    monkeypatch.setattr(fair_queue, "WEIGHTS", {"big": 2.0, "default": 1.0})
+    _submit(conn, "small", 1)   # sofort in der Queue
+    _submit(conn, "big", 4)
+    _submit(conn, "small", 2)
+    assert _drain(conn) == ["small", "big", "big", "small", "big", "big", "small"]
+
+
+def test_bulk_sender_is_demoted(conn, monkeypatch):
+    monkeypatch.setattr(fair_queue, "INTERACTIVE_MAX_PENDING", 2)
+    _submit(conn, "partner", 3, lane="interactive")  # 1 bereit, 2 wartend
+    assert fair_queue.choose_lane(conn, "interactive", "partner") == "batch"
+    assert fair_queue.choose_lane(conn, "interactive", "someone") == "interactive"
+    assert fair_queue.choose_lane(conn, "maintenance", "partner") == "maintenance"
+
+
+def test_position_and_eta(conn):
+    _submit(conn, "x", 1, lane="interactive")
+    jobs = _submit(conn, "partner", 3)
+    late = _submit(conn, "user", 1)[0]
+    Worker([fair_queue.lane_queue(conn, "batch")], connection=conn).register_birth()
+    conn.hset("rq:metrics:reports-batch:run", mapping={"sum": 60, "count": 2})
+
+    queued = fair_queue.position(conn, jobs[0].id)
+    assert queued["state"] == "queued" and queued["lane"] == "batch"
+    assert queued["position"] == 1  # hinter dem interaktiven Job
+    staged = fair_queue.position(conn, late.id)
+    # vor ihm: 1 interaktiv, 1 bereit, 1 weiterer Partner-Job (Round Robin)
+    assert staged == {"lane": "batch", "state": "staged", "position": 3, "eta_seconds": 120}
+    assert fair_queue.position(conn, "missing") is None
+
+
+def test_tenant_and_lane_detection(monkeypatch):
+    monkeypatch.setattr(fair_queue, "ADMIN_TOKEN", "adm")
+    monkeypatch.setattr(fair_queue, "PARTNER_TOKENS", fair_queue._parse_tokens("Partner-A:pa-secret"))
+    claims = {"x-tenant-id": "Partner-A", "x-report-lane": "batch"}
+    # öffentlich: Header und Felder zählen nicht, Mandant = normalisierte E-Mail, Lane = interactive
+    assert fair_queue.tenant_of({"email": "a@b.de"}, claims) == "a@b.de"
+    assert fair_queue.tenant_of({"partner_id": "P1", "email": "A+7@B.de"}) == "a@b.de"
+    assert fair_queue.tenant_of({}) == "anonymous"
+    assert fair_queue.lane_of({"lane": "batch"}, claims) == "interactive"
+    assert fair_queue.tenant_of({}, dict(claims, **{"x-partner-token": "wrong"})) == "anonymous"
+    # Partner-Token: eigener Mandant, Lane wählbar
+    partner = dict(claims, **{"x-tenant-id": "other", "authorization": "Bearer pa-secret"})
+    assert fair_queue.tenant_of({"email": "a@b.de"}, partner) == "partner-a"
+    assert fair_queue.lane_of({}, partner) == "batch"
+    assert fair_queue.lane_of({"lane": "bogus"}, {"x-partner-token": "pa-secret"}) == "interactive"
+    # Admin darf den Mandanten benennen
+    assert fair_queue.tenant_of({"partner_id": "P1"}, {"x-admin-token": "adm"}) == "p1"
+    assert fair_queue.tenant_of({}, {"x-admin-token": "adm"}) == "admin"
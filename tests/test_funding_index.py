@@ -0,0 +1,41 @@
+import sys
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+from ENHANCED_FUNDING_DATABASE import FUNDING_PROGRAMS_2025, match_funding_programs_smart
+from funding_index import build_funding_index, normalize_region, normalize_size
+
+def test_normalizers():
+    assert normalize_region("DE-BE") == "BE"
+    assert normalize_region("Nordrhein-Westfalen") == "NW"
+    assert normalize_region("") == "DE"
+    assert normalize_size("2-10 (Kleines Team)") == "team"
+    assert normalize_size("11-100") == "kmu"
+    assert normalize_size("solo") == "solo"
+
+def test_scores_match_smart_matcher():
+    idx = build_funding_index(BASE / "data")
+    enhanced = {p["name"] for progs in FUNDING_PROGRAMS_2025.values() for p in progs}
+    for answers in ({"bundesland": "BE", "unternehmensgroesse": "solo"},
+                    {"bundesland": "BY", "unternehmensgroesse": "11-100"}):
+        expected = {p["name"]: p["final_score"] for p in match_funding_programs_smart(answers)}
+        got = {p["name"]: p["final_score"] for p in idx.match(answers, k=len(idx)) if p["name"] in enhanced}
+        for name, score in expected.items():
+            assert got[name] == score
+
+def test_region_filter_excludes_other_states():
+    idx = build_funding_index(BASE / "data")
+    items = idx.match({"bundesland_code": "DE-BY", "unternehmensgroesse": "kmu"}, k=len(idx))
+    assert items
+    assert {it["region"] for it in items} <= {"Bundesweit", "BY"}
+
+def test_match_many_and_summary():
+    idx = build_funding_index(BASE / "data")
+    briefings = [{"bundesland": "BE"}, {"bundesland": "BE"}, {"bundesland": "HE", "unternehmensgroesse": "kmu"}]
+    res = idx.match_many(briefings, k=3)
+    assert len(res) == 3 and res[0] == res[1]
+    summary = idx.summarize(briefings, k=3)
+    assert summary["briefings"] == 3
+    assert sum(summary["programs"].values()) == sum(len(r) for r in res)
@@ -36,3 +36,19 @@ def test_metrics_prometheus_format():
     text = r.text
     assert "http_requests_total" in text
     assert "app_build_info" in text
+
+def test_metrics_collects_queue_stats_off_the_event_loop(monkeypatch):
+    import asyncio
+    seen = []
+
+    def lines():
+        try:
+            asyncio.get_running_loop()
+            seen.append("loop")
+        except RuntimeError:
+            seen.append("thread")
+        return ["queue_depth 0\n"]
+
+    monkeypatch.setattr(observability, "_queue_metric_lines", lines)
+    r = client.get("/metrics")
+    assert "queue_depth 0" in r.text and seen == ["thread"]
@@ -0,0 +1,101 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+import idempotency
+
+
+def test_canonical_hash_ignores_noise():
+    a = {"email": "Max@Example.com ", "ki_einsatz": ["chatgpt", "claude"], "branche": "beratung",
+         "timestamp": "2025-01-01T10:00:00", "notiz": ""}
+    b = {"branche": " beratung", "ki_einsatz": ["claude", "chatgpt"], "email": "max@example.com",
+         "timestamp": "2025-01-01T10:00:07"}
+    assert idempotency.canonical_hash(a) == idempotency.canonical_hash(b)
+    assert idempotency.canonical_hash(a) != idempotency.canonical_hash({**b, "branche": "handel"})
+
+
+def test_header_key_wins():
+    key, source = idempotency.request_key({"Idempotency-Key".lower(): "abc"}, {"x": 1})
+    assert source == "header" and key == idempotency.request_key({"x-idempotency-key": "abc"}, {"y": 2})[0]
+    assert idempotency.request_key({}, {"x": 1})[1] == "body"
+
+
+def test_claim_memory_and_release(monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    assert idempotency.claim("k-mem", "job_1") is None
+    assert idempotency.claim("k-mem", "job_2") == "job_1"
+    idempotency.release("k-mem", "job_1")
+    assert idempotency.claim("k-mem", "job_3") is None
+    assert idempotency.claim("k-exp", "job_4", ttl=0) is None
+    assert idempotency.claim("k-exp", "job_5") is None  # abgelaufen
+
+
+def test_claim_redis():
+    fakeredis = pytest.importorskip("fakeredis")
+    r = fakeredis.FakeStrictRedis()
+    assert idempotency.claim("k", "job_a", redis=r) is None
+    assert idempotency.claim("k", "job_b", redis=r) == "job_a"
+    assert r.ttl(idempotency.KEY_PREFIX + "k") > 0
+
+
+def test_job_ids_unique():
+    assert len({idempotency.new_job_id() for _ in range(200)}) == 200
+
+
+def test_duplicate_submission_returns_existing_job(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from routes import briefing
+
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    monkeypatch.setattr(briefing, "GPT_ANALYZE_AVAILABLE", True)
+    started = []
+    monkeypatch.setattr(briefing, "process_analysis_background", lambda data, email, job_id: started.append(job_id))
+    app = FastAPI()
+    app.include_router(briefing.router, prefix="/api")
+    c = TestClient(app)
+    body = {"email": "dup@example.com", "branche": "beratung", "bundesland": "BE", "unternehmensgroesse": "solo"}
+    first = c.post("/api/briefing", json=body).json()
+    second = c.post("/api/briefing", json={**body, "timestamp": "später"}).json()
+    assert second["duplicate"] and second["job_id"] == first["job_id"]
+    assert started == [first["job_id"]]
+    third = c.post("/api/briefing", json=body, headers={"Idempotency-Key": "neu-1"}).json()
+    assert third["job_id"] != first["job_id"] and len(started) == 2
+
+
+def test_header_key_is_scoped_to_caller():
+    h = {"idempotency-key": "form-1"}
+    a = idempotency.request_key(h, {"email": "a@example.com"})[0]
+    assert a == idempotency.request_key(h, {"email": "A@example.com "})[0]
+    assert a != idempotency.request_key(h, {"email": "b@example.com"})[0]
+    assert a == idempotency.request_key(h, {}, caller="a@example.com")[0]
+
+
+def test_release_job_frees_key(monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    assert idempotency.claim("k-fail", "job_x") is None
+    idempotency.release_job("job_x")
+    assert idempotency.claim("k-fail", "job_y") is None
+    fakeredis = pytest.importorskip("fakeredis")
+    r = fakeredis.FakeStrictRedis()
+    assert idempotency.claim("k-fail", "job_z", redis=r) is None
+    idempotency.release_job("job_unknown", redis=r)
+    assert idempotency.claim("k-fail", "job_w", redis=r) == "job_z"
+    idempotency.release_job("job_z", redis=r)
+    assert idempotency.claim("k-fail", "job_w", redis=r) is None
+
+
+def test_failed_background_job_releases_claim(monkeypatch):
+    import asyncio
+    from routes import briefing
+
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    monkeypatch.setattr(briefing, "generate_report_async", lambda data: (_ for _ in ()).throw(RuntimeError("llm down")))
+    assert idempotency.claim("k-bg", "job_bg") is None
+    out = asyncio.run(briefing.process_analysis_background({}, "a@example.com", "job_bg"))
+    assert out["success"] is False
+    assert idempotency.claim("k-bg", "job_again") is None
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+import job_events  # noqa: E402
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def test_publish_writes_hash_and_pushes_snapshot():
+    conn = fakeredis.FakeStrictRedis()
+    ps = conn.pubsub(ignore_subscribe_messages=True)
+    ps.subscribe(job_events.key("j1"))
+    job_events.publish(conn, "j1", state="queued")
+    snap = job_events.publish(conn, "j1", state="finished", has_pdf=True, result={"filename": "a.pdf"})
+    assert snap["state"] == "finished" and snap["has_pdf"] == "1"
+    assert job_events.read(conn, "j1")["result"] == '{"filename": "a.pdf"}'
+    assert 0 < conn.ttl(job_events.key("j1")) <= job_events.STATUS_TTL
+    msgs = [m for m in (ps.get_message(timeout=0.1) for _ in range(4)) if m]
+    assert [json.loads(m["data"])["state"] for m in msgs] == ["queued", "finished"]
+    assert job_events.read(conn, "missing") == {}
+
+
+def test_publish_without_redis_is_best_effort(monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    assert job_events.publish(None, "j2", state="processing") is None
+
+
+def test_stream_fans_out_until_terminal(monkeypatch):
+    from fakeredis import aioredis
+    server = fakeredis.FakeServer()
+    writer = fakeredis.FakeStrictRedis(server=server)
+    job_events.publish(writer, "j3", state="queued")
+
+    async def scenario():
+        h = job_events.StatusHub(aioredis.FakeRedis(server=server, decode_responses=True))
+        monkeypatch.setattr(job_events, "hub", lambda: h)
+
+        async def consume():
+            return [s and s["state"] async for s in job_events.stream("j3", heartbeat=0.05)]
+
+        a, b = asyncio.create_task(consume()), asyncio.create_task(consume())
+        await asyncio.sleep(0.2)  # Snapshot gelesen, psubscribe aktiv
+        assert h.subscribers() == 2
+        job_events.publish(writer, "j3", state="started")
+        await asyncio.sleep(0.1)
+        job_events.publish(writer, "j3", state="finished")
+        out = await asyncio.wait_for(asyncio.gather(a, b), 5)
+        assert h.subscribers() == 0
+        return out
+
+    for states in asyncio.run(scenario()):
+        states = [s for s in states if s]  # Heartbeats (None) entfernen
+        assert states == ["queued", "started", "finished"]
+
+
+def test_pipeline_status_served_from_hash(tmp_path, monkeypatch):
+    import artifact_store
+    import gpt_analyze
+    import report_pipeline
+    from rq import Queue, SimpleWorker
+    from routes.job_status import view
+
+    monkeypatch.setenv("REPORT_OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setenv("ARTIFACT_DIR", str(tmp_path / "artifacts"))
+    artifact_store.reset_store()
+    monkeypatch.setattr(report_pipeline, "MAX_RETRIES", 0)
+    monkeypatch.setattr(gpt_analyze, "build_html_report",
+                        lambda payload, lang: {"html": "<html>r</html>", "meta": {"score": 1, "tier": "reduced"}})
+    import tasks
+    monkeypatch.setattr(tasks, "PDF_SERVICE_URL", "")
+    conn = fakeredis.FakeStrictRedis()
+    report_pipeline.enqueue_pipeline("r9", {"lang": "de"}, connection=conn)
+    assert report_pipeline.read_status("r9", connection=conn)["stages"]["analyze"]["state"] == "queued"
+    SimpleWorker([Queue("reports", connection=conn)], connection=conn).work(burst=True)
+    st = report_pipeline.read_status("r9", connection=conn)
+    assert st["download_available"] is True
+    assert st["stages"]["analyze"]["tier"] == "reduced"
+    assert st["stages"] == report_pipeline.read_status("r9")["stages"]
+    assert view("r9", job_events.read(conn, "r9"))["status"] == "processing"
+
+
+def test_stream_catches_event_before_hub_subscribed(monkeypatch):
+    from fakeredis import aioredis
+    server = fakeredis.FakeServer()
+    writer = fakeredis.FakeStrictRedis(server=server)
+    job_events.publish(writer, "j4", state="queued")
+
+    async def scenario():
+        client = aioredis.FakeRedis(server=server, decode_responses=True)
+        gate, pubsub = asyncio.Event(), client.pubsub
+
+        def slow_pubsub(**kwargs):  # psubscribe erst nach dem terminalen Event
+            ps = pubsub(**kwargs)
+            psubscribe = ps.psubscribe
+
+            async def delayed(*args):
+                await gate.wait()
+                return await psubscribe(*args)
+            ps.psubscribe = delayed
+            return ps
+
+        client.pubsub = slow_pubsub
+        h = job_events.StatusHub(client)
+        monkeypatch.setattr(job_events, "hub", lambda: h)
+
+        async def consume():
+            return [s and s["state"] async for s in job_events.stream("j4", heartbeat=0.05, max_seconds=2)]
+
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.1)  # Snapshot "queued" gelesen, Hub noch nicht abonniert
+        job_events.publish(writer, "j4", state="finished")
+        gate.set()
+        return await asyncio.wait_for(task, 5)
+
+    assert [s for s in asyncio.run(scenario()) if s] == ["queued", "finished"]
@@ -0,0 +1,97 @@
+import sys
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+import load_governor  # noqa: E402
+from load_governor import LoadSignals, ProviderHealth, TierPolicy, choose_tier  # noqa: E402
+
+POLICY = TierPolicy(reduced_wait=60, minimal_wait=300, reduced_latency=20, minimal_latency=60)
+CLOSED = {"openai": "closed", "anthropic": "closed"}
+
+
+def test_simulated_load_maps_to_tiers():
+    cases = [
+        (LoadSignals(10, 5.0, CLOSED, "openai"), "full"),
+        (LoadSignals(90, 5.0, CLOSED, "openai"), "reduced"),
+        (LoadSignals(10, 25.0, CLOSED, "openai"), "reduced"),
+        (LoadSignals(400, 5.0, CLOSED, "openai"), "minimal"),
+        (LoadSignals(10, 70.0, CLOSED, "openai"), "minimal"),
+        (LoadSignals(10, None, {"openai": "open", "anthropic": "closed"}, "openai"), "reduced"),
+        (LoadSignals(10, None, {"openai": "closed", "anthropic": "open"}, "openai"), "full"),
+        (LoadSignals(0, None, {"openai": "open", "anthropic": "open"}, "openai"), "minimal"),
+    ]
+    for signals, tier in cases:
+        assert choose_tier(signals, POLICY)[0] == tier, signals
+    tier, reasons = choose_tier(LoadSignals(90, 70.0, CLOSED, "openai"), POLICY)
+    assert tier == "minimal" and len(reasons) == 2
+
+
+def test_policy_from_env_and_force(monkeypatch):
+    monkeypatch.setenv("LOAD_TIER_REDUCED_WAIT", "5")
+    monkeypatch.setenv("LOAD_TIER_FORCE", "minimal")
+    policy = TierPolicy.from_env()
+    assert policy.reduced_wait == 5 and policy.force == "minimal"
+    assert choose_tier(LoadSignals(), policy) == ("minimal", ["forced"])
+    monkeypatch.setenv("LOAD_TIER_FORCE", "bogus")
+    assert TierPolicy.from_env().force == ""
+
+
+def test_breaker_opens_and_half_opens(monkeypatch):
+    health = ProviderHealth(failures=2, cooldown=30)
+    now = [1000.0]
+    monkeypatch.setattr(load_governor.time, "monotonic", lambda: now[0])
+    health.record("openai", 1.0, False)
+    assert health.state("openai") == "closed"
+    health.record("openai", 3.0, False)
+    assert health.state("openai") == "open" and not health.allow("openai")
+    now[0] += 31
+    assert health.state("openai") == "half_open" and health.allow("openai")
+    assert not health.allow("openai")  # nur ein Probe-Aufruf
+    health.record("openai", 2.0, False)
+    assert health.state("openai") == "open" and not health.allow("openai")
+    now[0] += 31
+    assert health.allow("openai") and not health.allow("openai")
+    now[0] += 31
+    assert health.allow("openai")  # hängender Probe wird nach einem Cooldown ersetzt
+    health.record("openai", 1.0, True)
+    assert health.state("openai") == "closed"
+    assert 1.0 < health.latency("openai") < 3.0
+    assert health.allow("openai") and health.allow("openai")
+
+
+def test_report_records_tier_and_degrades(monkeypatch):
+    import gpt_analyze
+
+    calls = {"live": 0, "llm": 0}
+
+    def fake_live(n, lang="de"):
+        calls["live"] += 1
+        return {"news": [], "tools": [], "funding": []}
+
+    def fake_complete(name, messages):
+        calls["llm"] += 1
+        return f"<p>{name}</p>"
+
+    monkeypatch.setattr(gpt_analyze, "fetch_live_data", fake_live)
+    monkeypatch.setattr(gpt_analyze, "complete_overlay", fake_complete)
+    monkeypatch.setattr(gpt_analyze, "overlay_messages", lambda name, lang, ctx, cf: [{"role": "user", "content": f"{name}:{sorted(cf.items())}"}])
+    gpt_analyze._OVERLAY_CACHE.clear()
+    raw = {"branche": "beratung", "unternehmensgroesse": "solo", "bundesland": "BE", "hauptleistung": "Beratung"}
+
+    full = gpt_analyze.build_html_report(raw, "de", tier="full")
+    assert full["meta"]["tier"] == "full" and calls == {"live": 1, "llm": len(gpt_analyze.OVERLAY_NAMES)}
+
+    reduced = gpt_analyze.build_html_report(raw, "de", tier="reduced")
+    assert reduced["meta"]["tier"] == "reduced"
+    assert calls == {"live": 1, "llm": len(gpt_analyze.OVERLAY_NAMES)}  # kein Live-Abruf, Overlays aus dem Cache
+
+    other = dict(raw, bundesland="HH", hauptleistung="Coaching")  # andere Firma, gleiche Branche/Größe
+    gpt_analyze.build_html_report(other, "de", tier="reduced")
+    assert calls["llm"] == 2 * len(gpt_analyze.OVERLAY_NAMES)  # kein Treffer über Firmen hinweg
+
+    monkeypatch.setenv("LOAD_TIER_FORCE", "minimal")
+    minimal = gpt_analyze.build_html_report(raw, "de")
+    assert minimal["meta"]["tier"] == "minimal" and minimal["meta"]["tier_reasons"] == ["forced"]
+    assert calls["llm"] == 2 * len(gpt_analyze.OVERLAY_NAMES)
@@ -0,0 +1,142 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+import artifact_store  # noqa: E402
+import mail_outbox  # noqa: E402
+import mail_utils  # noqa: E402
+from smtp_local import LocalSmtpServer  # noqa: E402
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def smtp(monkeypatch, tmp_path):
+    monkeypatch.setenv("ARTIFACT_DIR", str(tmp_path))
+    artifact_store.reset_store()
+    from settings import settings
+    srv = LocalSmtpServer().start()
+    for name, value in {"SMTP_HOST": srv.host, "SMTP_PORT": srv.port, "SMTP_USER": "u", "SMTP_PASSWORD": "p",
+                        "SMTP_TLS": False, "SMTP_SSL": False, "SMTP_FROM": "noreply@example.com"}.items():
+        monkeypatch.setattr(settings, name, value)
+    monkeypatch.setattr(mail_utils, "POOL", mail_utils.SmtpPool())
+    yield srv
+    mail_utils.POOL.close_all()
+    srv.stop()
+
+
+def _mail(to, subject="Ihr Ergebnis", attachments=None):
+    return mail_utils._build_message(to, subject, "<p>x</p>", attachments)
+
+
+def test_batches_over_one_authenticated_session(smtp):
+    conn = fakeredis.FakeStrictRedis()
+    ids = [mail_outbox.submit(_mail("a@example.com", attachments={"r.pdf": b"%PDF"}), "r1-mail_user", connection=conn),
+           mail_outbox.submit(_mail("admin@example.com"), "r1-mail_admin", kind="admin", connection=conn),
+           mail_outbox.submit(_mail("b@example.com"), connection=conn)]
+    # Job-Retry: gleiche ID → kein zweiter Eintrag
+    assert mail_outbox.submit(_mail("a@example.com"), "r1-mail_user", connection=conn) == ids[0]
+    assert smtp.messages == []  # persistiert, noch nicht versendet
+    out = mail_outbox.drain(conn)
+    assert out["sent"] == 3 and smtp.connections == 1 and smtp.logins == 1
+    assert sorted(m["to"][0] for m in smtp.messages) == ["a@example.com", "admin@example.com", "b@example.com"]
+    assert b"r.pdf" in smtp.messages[0]["data"]
+    # nächste Runde: Session aus dem Pool, kein neuer Login
+    mail_outbox.submit(_mail("c@example.com"), connection=conn)
+    assert mail_outbox.drain(conn)["sent"] == 1
+    assert smtp.connections == 1 and mail_utils.POOL.stats["reused"] == 1
+    assert conn.hget(mail_outbox.key(ids[0]), "state") == b"sent"
+    assert mail_outbox.status(conn)["due"] == 0
+
+
+def test_throttles_per_recipient_and_hour(smtp, monkeypatch):
+    monkeypatch.setattr(mail_outbox, "THROTTLE_PER_HOUR", 2)
+    conn = fakeredis.FakeStrictRedis()
+    for _ in range(3):
+        mail_outbox.submit(_mail("viel@example.com"), connection=conn)
+    mail_outbox.submit(_mail("admin@example.com"), kind="admin", connection=conn)
+    now = time.time()
+    out = mail_outbox.drain(conn, now=now)
+    assert out["sent"] == 3 and out["throttled"] == 1
+    assert mail_outbox.drain(conn, now=now)["claimed"] == 0  # wartet auf die nächste Stunde
+    assert mail_outbox.drain(conn, now=(now // 3600 + 1) * 3600 + 61)["sent"] == 1
+
+
+def test_retries_transient_and_fails_permanent_errors(smtp):
+    conn = fakeredis.FakeStrictRedis()
+    smtp.reject["grey@example.com"] = "450 4.7.1 greylisted"
+    smtp.reject["gone@example.com"] = "550 5.1.1 no such user"
+    grey = mail_outbox.submit(_mail("grey@example.com"), connection=conn)
+    gone = mail_outbox.submit(_mail("gone@example.com"), connection=conn)
+    ok = mail_outbox.submit(_mail("ok@example.com"), connection=conn)
+    now = time.time()
+    out = mail_outbox.drain(conn, now=now)
+    assert (out["sent"], out["retry"], out["failed"]) == (1, 1, 1)
+    assert conn.hget(mail_outbox.key(ok), "state") == b"sent"
+    assert conn.hget(mail_outbox.key(gone), "state") == b"failed"
+    assert conn.hget(mail_outbox.key(grey), "attempts") == b"1"
+    assert mail_outbox.drain(conn, now=now)["claimed"] == 0  # Backoff
+    del smtp.reject["grey@example.com"]
+    assert mail_outbox.drain(conn, now=now + 24 * 3600)["sent"] == 1
+    # endgültig fehlgeschlagene Nachricht wird beim erneuten Einreichen wieder eingereiht
+    del smtp.reject["gone@example.com"]
+    mail_outbox.submit(_mail("gone@example.com"), gone, connection=conn)
+    assert mail_outbox.drain(conn)["sent"] == 1
+
+
+def test_reconnects_when_server_drops_the_session(smtp):
+    conn = fakeredis.FakeStrictRedis()
+    smtp.disconnect_after = 1
+    for i in range(3):
+        mail_outbox.submit(_mail(f"u{i}@example.com"), connection=conn)
+    out = mail_outbox.drain(conn)
+    assert out["sent"] == 3 and out["retry"] == 0
+    assert smtp.connections == 3
+
+
+def test_sends_directly_without_redis(smtp, monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    mail_utils.queue_email("direct@example.com", "Betreff", "<p>x</p>")
+    assert [m["to"] for m in smtp.messages] == [["direct@example.com"]]
+
+
+def test_prometheus_lines_include_latency_histogram(smtp):
+    conn = fakeredis.FakeStrictRedis()
+    mail_outbox.submit(_mail("m@example.com"), connection=conn)
+    mail_outbox.drain(conn)
+    text = "".join(mail_outbox.prometheus_lines(lambda m, v, l=None: f"{m}{l or ''} {v}\n"))
+    assert "mail_send_seconds_bucket{'le': '+Inf'}" in text and "smtp_sessions_total" in text
+
+
+def test_worker_drains_outbox_without_mailer(smtp):
+    import fair_queue
+
+    class Base:
+        def handle_job_success(self, job, queue, started_job_registry):
+            pass
+
+    class Worker(fair_queue.FairWorkerMixin, Base):
+        connection = fakeredis.FakeStrictRedis()
+
+    w = Worker()
+    assert mail_outbox.worker_drain(w.connection) == {}  # leere Outbox: kein SMTP
+    mail_outbox.submit(_mail("w@example.com"), "r9-mail_user", connection=w.connection)
+    w.handle_job_success(type("Job", (), {"meta": {}})(), None, None)
+    assert [m["to"] for m in smtp.messages] == [["w@example.com"]] and smtp.connections == 1
+
+
+def test_alert_when_outbox_stalls(smtp, monkeypatch):
+    conn = fakeredis.FakeStrictRedis()
+    monkeypatch.setenv("REDIS_URL", "redis://fake")
+    monkeypatch.setattr(mail_outbox, "_connection", lambda connection=None: conn)
+    monkeypatch.setattr(mail_outbox, "ALERT_SECONDS", 60.0)
+    prom = lambda m, v, l=None: f"{m} {v}\n"  # noqa: E731
+    mail_outbox.submit(_mail("s@example.com"), "r8-mail_user", connection=conn)
+    assert "alert_mail_outbox_stalled 0.0" in "".join(mail_outbox.prometheus_lines(prom))
+    conn.zadd(mail_outbox.DUE, {"r8-mail_user": time.time() - 120})
+    assert "alert_mail_outbox_stalled 1.0" in "".join(mail_outbox.prometheus_lines(prom))
@@ -0,0 +1,126 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+import artifact_store  # noqa: E402
+import pdf_client  # noqa: E402
+
+
+@pytest.fixture
+def service(monkeypatch, tmp_path):
+    monkeypatch.setenv("ARTIFACT_DIR", str(tmp_path))
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    artifact_store.reset_store()
+    pdf_client._LOCAL.clear()
+    monkeypatch.setattr(pdf_client, "_delay", lambda attempt, response: 0)
+    calls = []
+    replies = []
+
+    def handler(request):
+        calls.append(request)
+        status = replies.pop(0) if replies else 200
+        if status != 200:
+            return httpx.Response(status)
+        return httpx.Response(200, content=b"%PDF-" + request.content[-8:], headers={"content-type": "application/pdf"})
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(pdf_client.http_clients, "get_client", lambda name, timeout: client)
+    return calls, replies
+
+
+def test_retries_transient_status_then_caches_by_html(service):
+    calls, replies = service
+    replies.extend([503, 502])
+    pdf = pdf_client.render(html="<html>a</html>", service_url="http://pdf.local")
+    assert pdf.startswith(b"%PDF-") and len(calls) == 3
+    # gleiches HTML (Re-Download, Mail-Retry) → kein weiterer Aufruf
+    assert pdf_client.render(html="<html>a</html>", service_url="http://pdf.local") == pdf
+    assert len(calls) == 3
+    pdf_client.render(html="<html>b</html>", service_url="http://pdf.local")
+    assert len(calls) == 4
+
+
+def test_client_errors_are_not_retried(service):
+    calls, replies = service
+    replies.append(400)
+    with pytest.raises(httpx.HTTPStatusError):
+        pdf_client.render(html="<html>c</html>", service_url="http://pdf.local")
+    assert len(calls) == 1
+    replies.extend([503] * (pdf_client.RETRIES + 1))
+    with pytest.raises(pdf_client.PdfServiceUnavailable):
+        pdf_client.render(html="<html>d</html>", service_url="http://pdf.local")
+    assert pdf_client.render_or_none("<html>e</html>", service_url="") is None
+
+
+def test_concurrency_is_limited(monkeypatch, tmp_path):
+    monkeypatch.setenv("ARTIFACT_DIR", str(tmp_path))
+    artifact_store.reset_store()
+    monkeypatch.setattr(pdf_client, "_SEMAPHORE", threading.BoundedSemaphore(2))
+    state = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def handler(request):
+        with lock:
+            state["now"] += 1
+            state["peak"] = max(state["peak"], state["now"])
+        time.sleep(0.05)
+        with lock:
+            state["now"] -= 1
+        return httpx.Response(200, content=b"%PDF", headers={"content-type": "application/pdf"})
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(pdf_client.http_clients, "get_client", lambda name, timeout: client)
+    threads = [threading.Thread(target=pdf_client.render, kwargs={"html": f"<p>{i}</p>", "service_url": "http://x"})
+               for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert state["peak"] == 2
+
+
+@pytest.fixture
+def local_service(monkeypatch, tmp_path):
+    import pdf_local
+
+    monkeypatch.setenv("ARTIFACT_DIR", str(tmp_path))
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    artifact_store.reset_store()
+    pdf_client._LOCAL.clear()
+    pdf_client._NO_BATCH.clear()
+    svc = pdf_local.LocalPdfService(fail={"bad.pdf": "template error"})
+    monkeypatch.setattr(pdf_client.http_clients, "get_client", lambda name, timeout: svc.client())
+    monkeypatch.setattr(pdf_client, "BATCH_MAX", 2)
+    return svc
+
+
+def test_render_many_batches_and_reports_per_document(local_service):
+    svc = local_service
+    pdf_client.render(html="<p>cached</p>", service_url="http://pdf.local")
+    docs = [{"html": "<p>cached</p>", "filename": "a.pdf"}, ("<p>de</p>", "de.pdf"),
+            ("<p>en</p>", "en.pdf"), ("<p>x</p>", "bad.pdf")]
+    results = pdf_client.render_many(docs, service_url="http://pdf.local", batch_url="http://pdf.local/batch")
+    assert [r["filename"] for r in results] == ["a.pdf", "de.pdf", "en.pdf", "bad.pdf"]
+    assert [r["source"] for r in results] == ["cache", "batch", "batch", "batch"]
+    assert results[1]["pdf"].startswith(b"%PDF-1.4") and b"(de)" in results[1]["pdf"]
+    assert results[3]["pdf"] is None and results[3]["error"] == "template error"
+    assert [c["documents"] for c in svc.calls if c["batch"]] == [2, 1]  # PDF_BATCH_MAX = 2
+    # Batch-Ergebnisse landen im Cache
+    assert pdf_client.render_many([("<p>en</p>", "en.pdf")], service_url="http://pdf.local")[0]["source"] == "cache"
+
+
+def test_render_many_falls_back_to_pipelined_singles(local_service):
+    svc = local_service
+    svc.batch = False
+    docs = [(f"<p>{i}</p>", f"{i}.pdf") for i in range(5)]
+    results = pdf_client.render_many(docs, service_url="http://pdf.local", batch_url="http://pdf.local/batch")
+    assert all(r["pdf"] and r["source"] == "single" and r["seconds"] >= 0 for r in results)
+    assert [c["batch"] for c in svc.calls].count(True) == 1  # 404 → Batch-URL für den Prozess aus
+    assert svc.documents == 5
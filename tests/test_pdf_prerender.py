@@ -0,0 +1,77 @@
+import gzip
+import json
+import sys
+from pathlib import Path
+
+import httpx
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+import artifact_store  # noqa: E402
+import pdf_client  # noqa: E402
+import pdf_prerender  # noqa: E402
+
+
+def test_inlines_known_assets_and_prefers_webp():
+    html = ('<img src="{{ASSETS_BASE}}/dsgvo.svg"><img src="/assets/ki-sicherheit-logo.png">'
+            '<img src="https://cdn.example.com/x.png"><img src="/assets/../main.py">')
+    out = pdf_prerender.inline_assets(html)
+    assert 'src="data:image/svg+xml;charset=utf-8,' in out
+    assert 'src="data:image/webp;base64,' in out  # kleinere .webp-Variante statt PNG
+    assert 'src="https://cdn.example.com/x.png"' in out
+    assert 'src="/assets/../main.py"' in out
+
+
+def test_purges_unused_rules_and_keeps_element_rules():
+    html = ('<html><head><style>/* c */ body{margin:0} .used{color:red} .unused{color:blue} '
+            '#gone p{x:y} @media print{.unused{a:b} .used a[href]::after{c:d}} @page{size:A4}</style></head>'
+            '<body>\n  <p class="used">x</p>  <!-- note -->\n</body></html>')
+    out = pdf_prerender.prepare(html)
+    assert "body{margin:0}" in out and ".used{color:red}" in out
+    assert ".unused" not in out and "#gone" not in out and "/* c */" not in out
+    assert "@media print{.used a[href]::after{c:d}}" in out and "@page{size:A4}" in out
+    assert "<!-- note -->" not in out and "<body> <p" in out
+
+
+def test_service_receives_gzipped_prerendered_html(monkeypatch, tmp_path):
+    monkeypatch.setenv("ARTIFACT_DIR", str(tmp_path))
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    artifact_store.reset_store()
+    pdf_client._LOCAL.clear()
+    monkeypatch.setattr(pdf_client, "GZIP", True)
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        assert request.headers["content-encoding"] == "gzip"
+        payload = json.loads(gzip.decompress(request.content))
+        assert "data:image/svg+xml" in payload["html"]
+        return httpx.Response(200, content=b"%PDF-1", headers={"content-type": "application/pdf"})
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(pdf_client.http_clients, "get_client", lambda name, timeout: client)
+    html = '<html><body><img src="/assets/dsgvo.svg"></body></html>'
+    assert pdf_client.render(html=html, service_url="http://pdf.local") == b"%PDF-1"
+    assert len(seen) == 1
+
+
+def test_falls_back_to_plain_json_on_415(monkeypatch, tmp_path):
+    monkeypatch.setenv("ARTIFACT_DIR", str(tmp_path))
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    artifact_store.reset_store()
+    pdf_client._LOCAL.clear()
+    monkeypatch.setattr(pdf_client, "GZIP", True)
+    encodings = []
+
+    def handler(request):
+        encodings.append(request.headers.get("content-encoding"))
+        if encodings[-1] == "gzip":
+            return httpx.Response(415)
+        json.loads(request.content)
+        return httpx.Response(200, content=b"%PDF-2", headers={"content-type": "application/pdf"})
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(pdf_client.http_clients, "get_client", lambda name, timeout: client)
+    assert pdf_client.render(html="<p>415</p>", service_url="http://pdf.local") == b"%PDF-2"
+    assert encodings == ["gzip", None] and pdf_client.GZIP is False
@@ -0,0 +1,40 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from rq import Queue
+
+import queue_metrics
+
+
+def test_counts_histograms_and_prometheus():
+    conn = fakeredis.FakeStrictRedis()
+    reports, pdf = Queue("reports", connection=conn), Queue("pdf", connection=conn)
+    reports.enqueue(len, "abc")
+    reports.enqueue("json.loads", "{kaputt")
+    pdf.enqueue(len, "x")
+    stats = queue_metrics.collect(conn, ["reports", "pdf"])
+    assert stats["reports"]["counts"]["queued"] == 2
+    assert stats["reports"]["oldest_age_seconds"] >= 0
+
+    queue_metrics.MetricsSimpleWorker([reports], connection=conn).work(burst=True)
+    stats = queue_metrics.collect(conn, ["reports", "pdf"])
+    c = stats["reports"]["counts"]
+    assert (c["queued"], c["finished"], c["failed"]) == (0, 1, 1)
+    assert stats["reports"]["wait"]["count"] == 2 and stats["reports"]["run"]["count"] == 2
+    assert stats["reports"]["wait"]["buckets"][-1] == ("+Inf", 2)
+    assert stats["reports"]["jobs"] == {"finished": 1, "failed": 1}
+    assert stats["pdf"]["counts"]["queued"] == 1 and stats["pdf"]["wait"]["count"] == 0
+
+    from app.observability import _prom_line
+    text = "".join(queue_metrics.prometheus_lines(stats, _prom_line))
+    assert 'rq_queue_jobs{queue="pdf",state="queued"} 1.0' in text
+    assert 'rq_job_wait_seconds_bucket{le="+Inf",queue="reports"} 2.0' in text
+    assert "# TYPE rq_job_run_seconds histogram\n" in text
+    assert all(line.startswith("#") or " " in line for line in text.splitlines())
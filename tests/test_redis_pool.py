@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import redis_pool  # noqa: E402
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    server = fakeredis.FakeServer()
+    base = redis_pool._pool_kwargs
+
+    def fake_kwargs(decode):
+        kw = base(decode)
+        kw.update(connection_class=fakeredis.FakeConnection, server=server, max_connections=3)
+        return kw
+
+    monkeypatch.setenv("REDIS_URL", "redis://localhost:6379/0")
+    monkeypatch.setattr(redis_pool, "_pool_kwargs", fake_kwargs)
+    redis_pool.reset()
+    yield server
+    redis_pool.reset()
+
+
+def test_clients_are_shared_per_decode_mode(pool):
+    assert redis_pool.get_redis() is redis_pool.get_redis()
+    raw, text = redis_pool.get_redis(), redis_pool.get_redis(decode=True)
+    assert raw is not text
+    raw.set("k", "v")
+    assert raw.get("k") == b"v"
+    assert text.get("k") == "v"
+
+
+def test_queue_utils_and_rate_limiter_use_the_pool(pool):
+    import queue_utils
+    import rate_limiter
+    assert queue_utils.get_redis_connection() is redis_pool.get_redis()
+    assert rate_limiter._redis_client() is redis_pool.get_redis(decode=True)
+    assert rate_limiter.is_limited("ip", 2, 60) == (False, 1)
+    assert rate_limiter.is_limited("ip", 2, 60) == (True, 0)
+
+
+def test_pool_stats_and_health(pool):
+    r = redis_pool.get_redis()
+    for _ in range(5):
+        r.ping()
+    stats = redis_pool.pool_stats()["binary"]
+    assert stats == {"max": 3, "created": 1, "idle": 1, "in_use": 0}
+    assert redis_pool.health()["ok"] is True
+    lines = redis_pool.prometheus_lines(lambda m, v, labels: f"{m}{labels}={v}\n")
+    assert any("'state': 'idle'" in line for line in lines)
+
+
+def test_missing_url_raises(monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    redis_pool.reset()
+    with pytest.raises(RuntimeError):
+        redis_pool.get_redis()
+
+
+def test_async_client_per_loop(pool, monkeypatch):
+    from fakeredis import aioredis as fake_aio
+    base = redis_pool._pool_kwargs
+
+    def async_kwargs(decode):
+        kw = base(decode)
+        kw["connection_class"] = fake_aio.FakeConnection
+        kw.pop("health_check_interval")  # not supported by fakeredis' async connection
+        return kw
+
+    monkeypatch.setattr(redis_pool, "_pool_kwargs", async_kwargs)
+
+    async def go():
+        r = redis_pool.get_async_redis(decode=True)
+        assert r is redis_pool.get_async_redis(decode=True)
+        await r.set("a", "1")
+        return await r.get("a")
+
+    assert asyncio.run(go()) == "1"
+    assert "async-decoded" in redis_pool.pool_stats()
@@ -0,0 +1,84 @@
+import asyncio
+import sys
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+import report_executor  # noqa: E402
+from report_executor import ReportExecutor  # noqa: E402
+
+
+def test_admission_is_bounded():
+    ex = ReportExecutor(workers=1, queue_max=1)
+    a, b = ex.admit(), ex.admit()
+    assert a and b and ex.admit() is None
+    assert ex.stats()["rejected"] == 1 and ex.stats()["queued"] == 2
+    a.release()
+    a.release()  # idempotent
+    assert ex.admit() is not None and ex.admit() is None
+
+
+def test_run_uses_pool_and_tracks_duration(monkeypatch):
+    ex = ReportExecutor(workers=2, queue_max=0)
+    assert asyncio.run(ex.run(lambda x: x * 2, 21)) == 42
+    try:
+        asyncio.run(ex.run(lambda: 1 / 0))
+    except ZeroDivisionError:
+        pass
+    s = ex.stats()
+    assert (s["completed"], s["failed"], s["active"]) == (1, 1, 0)
+    assert s["avg_seconds"] is not None
+    assert report_executor.RETRY_AFTER_MIN <= ex.retry_after() <= report_executor.RETRY_AFTER_MAX
+    monkeypatch.setattr(report_executor, "_EXECUTOR", ex)
+    lines = "".join(report_executor.prometheus_lines(lambda m, v, labels=None: f"{m}{labels or ''} {v}\n"))
+    assert "report_executor_completed_total{'outcome': 'error'} 1.0" in lines
+    ex.shutdown()
+
+
+def _client(monkeypatch, tmp_path, mode):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from routes import briefing
+
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    monkeypatch.setenv("REPORT_OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(briefing, "GPT_ANALYZE_AVAILABLE", True)
+    monkeypatch.setattr(briefing, "process_analysis_background", lambda data, email, job_id: None)
+    monkeypatch.setattr(report_executor, "OVERLOAD_MODE", mode)
+    ex = ReportExecutor(workers=1, queue_max=0)
+    monkeypatch.setattr(report_executor, "_EXECUTOR", ex)
+    app = FastAPI()
+    app.include_router(briefing.router, prefix="/api")
+    return TestClient(app), ex
+
+
+BODY = {"email": "last@example.com", "branche": "beratung", "bundesland": "BE", "unternehmensgroesse": "solo"}
+
+
+def test_saturated_endpoint_sheds_with_retry_after(monkeypatch, tmp_path):
+    c, ex = _client(monkeypatch, tmp_path, "reject")
+    assert c.post("/api/briefing", json=BODY).json()["status"] == "processing"
+    assert ex.admitted == 0  # Ticket nach dem Hintergrund-Task freigegeben
+
+    held = ex.admit()
+    r = c.post("/api/briefing", json={**BODY, "email": "zwei@example.com"})
+    assert r.status_code == 503 and int(r.headers["Retry-After"]) >= report_executor.RETRY_AFTER_MIN
+    assert r.json()["status"] == "overloaded"
+    held.release()
+    # Claim freigegeben: derselbe Body wird jetzt angenommen statt als Duplikat gemeldet
+    r = c.post("/api/briefing", json={**BODY, "email": "zwei@example.com"})
+    assert r.status_code == 200 and not r.json().get("duplicate")
+
+
+def test_saturated_endpoint_degrades_to_preview(monkeypatch, tmp_path):
+    import gpt_analyze
+    monkeypatch.setattr(gpt_analyze, "render_overlay", lambda *a, **k: (_ for _ in ()).throw(AssertionError("LLM")))
+    c, ex = _client(monkeypatch, tmp_path, "preview")
+    ex.admit()
+    r = c.post("/api/briefing", json={**BODY, "email": "drei@example.com"})
+    data = r.json()
+    assert r.status_code == 200 and data["status"] == "preview" and data["degraded"]
+    assert isinstance(data["score"], (int, float))
+    import report_store
+    assert report_store.locate(data["job_id"]) == report_store.job_dir(data["job_id"]) / "report.html"
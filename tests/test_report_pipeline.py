@@ -0,0 +1,112 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+import artifact_store
+import report_pipeline
+
+fakeredis = pytest.importorskip("fakeredis")
+
+def _run_all(conn):
+    from rq import Queue, SimpleWorker
+    queues = [Queue(n, connection=conn) for n in ("reports", "pdf", "emails", "reports-batch", "reports-maint")]
+    SimpleWorker(queues, connection=conn).work(burst=True)
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    monkeypatch.setenv("REPORT_OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setenv("ARTIFACT_DIR", str(tmp_path / "artifacts"))
+    artifact_store.reset_store()
+    monkeypatch.setattr(report_pipeline, "MAX_RETRIES", 0)
+    calls = {"analyze": 0, "pdf": 0, "mail": []}
+    import gpt_analyze, tasks, mail_utils
+    def fake_report(payload, lang):
+        calls["analyze"] += 1
+        return {"html": "<html>r</html>", "meta": {"score": 70, "badge": "B"}}
+    def fake_pdf(html=None, url=None):
+        calls["pdf"] += 1
+        if calls["pdf"] == 1:
+            raise RuntimeError("pdf service down")
+        return b"%PDF-1.7"
+    monkeypatch.setattr(gpt_analyze, "build_html_report", fake_report)
+    monkeypatch.setattr(tasks, "PDF_SERVICE_URL", "http://pdf.local")
+    monkeypatch.setattr(tasks, "_fetch_pdf", fake_pdf)
+    monkeypatch.setattr(mail_utils, "queue_email",
+                        lambda **kw: calls["mail"].append((kw["to_address"], sorted(kw["attachments"] or {}))))
+    from settings import settings
+    monkeypatch.setattr(settings, "ADMIN_EMAIL", "admin@example.com")
+    return calls
+
+def test_pipeline_resumes_at_failed_stage(env):
+    conn = fakeredis.FakeStrictRedis()
+    ids = report_pipeline.enqueue_pipeline("r1", {"email": "kunde@example.com", "lang": "de"}, connection=conn)
+    assert set(ids) == set(report_pipeline.STAGES)
+    _run_all(conn)
+    # PDF fehlgeschlagen → Mails trotzdem mit HTML-Fallback
+    assert env["analyze"] == 1
+    assert sorted(env["mail"]) == [("admin@example.com", ["KI-Status-Report.html"]),
+                                   ("kunde@example.com", ["KI-Status-Report.html"])]
+    assert report_pipeline.read_status("r1")["stages"]["pdf"]["state"] == "failed"
+
+    env["mail"].clear()
+    report_pipeline.resume_pipeline("r1", connection=conn)
+    _run_all(conn)
+    assert env["analyze"] == 1 and env["pdf"] == 2
+    assert env["mail"] == []  # bereits versendet
+    assert report_pipeline.load_artifact("r1", "report.pdf") == b"%PDF-1.7"
+    assert report_pipeline.read_status("r1")["state"] == "completed"
+    ref = artifact_store.load_ref(conn, report_pipeline.ref_key("r1", "pdf"))
+    assert artifact_store.get_store().read(ref["sha256"]) == b"%PDF-1.7"
+
+def test_stages_on_workers_without_shared_disk(env, tmp_path, monkeypatch):
+    from rq import Queue, SimpleWorker
+    import gpt_analyze
+    monkeypatch.setattr(gpt_analyze, "produce_admin_attachments",
+                        lambda payload, lang: {"briefing_raw.json": "{}"}, raising=False)
+    env["pdf"] = 1  # PDF-Dienst antwortet sofort
+    conn = fakeredis.FakeStrictRedis()
+    report_pipeline.enqueue_pipeline("r2", {"email": "kunde@example.com", "lang": "de"}, connection=conn)
+
+    def work(disk, *queues):
+        monkeypatch.setenv("REPORT_OUTPUT_DIR", str(tmp_path / disk))
+        SimpleWorker([Queue(q, connection=conn) for q in queues], connection=conn).work(burst=True)
+
+    work("reports-host", "reports")
+    work("pdf-host", "pdf")
+    work("mail-host", "emails")
+    assert sorted(env["mail"]) == [("admin@example.com", ["KI-Status-Report.pdf", "briefing_raw.json"]),
+                                   ("kunde@example.com", ["KI-Status-Report.pdf"])]
+    # Resume von einem Host ohne lokale Kopie des Briefings
+    monkeypatch.setenv("REPORT_OUTPUT_DIR", str(tmp_path / "maint-host"))
+    env["mail"].clear()
+    report_pipeline.resume_pipeline("r2", connection=conn)
+    work("maint-host", "reports", "reports-maint", "pdf", "emails")
+    assert env["analyze"] == 1 and env["pdf"] == 2 and env["mail"] == []
+
+def test_failed_analyze_releases_idempotency_claim(env, monkeypatch):
+    import gpt_analyze
+    import idempotency
+    monkeypatch.setattr(gpt_analyze, "build_html_report", lambda payload, lang: 1 / 0)
+    conn = fakeredis.FakeStrictRedis()
+    assert idempotency.claim("k-r3", "r3", redis=conn) is None
+    report_pipeline.enqueue_pipeline("r3", {"email": "kunde@example.com"}, connection=conn)
+    _run_all(conn)
+    assert report_pipeline.read_status("r3", conn)["state"] == "failed"
+    assert idempotency.claim("k-r3", "r4", redis=conn) is None
+
+
+def test_admin_mail_escapes_briefing_fields(env, monkeypatch):
+    import mail_utils
+    bodies = []
+    monkeypatch.setattr(mail_utils, "queue_email", lambda **kw: bodies.append((kw["to_address"], kw["html_body"])))
+    conn = fakeredis.FakeStrictRedis()
+    report_pipeline.enqueue_pipeline("r5", {"email": "<x>@example.com", "company_name": "<script>alert(1)</script>"},
+                                     connection=conn)
+    _run_all(conn)
+    admin = dict(bodies)["admin@example.com"]
+    assert "<script>" not in admin and "&lt;script&gt;alert(1)&lt;/script&gt;" in admin
+    assert "&lt;x&gt;@example.com" in admin
@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+import report_store  # noqa: E402
+
+
+def _age(path: Path, days: float) -> None:
+    t = time.time() - days * 86400
+    for p in [path, *path.rglob("*")] if path.is_dir() else [path]:
+        os.utime(p, (t, t))
+
+
+def test_sharded_layout_and_legacy_dirs(monkeypatch, tmp_path):
+    monkeypatch.setenv("REPORT_OUTPUT_DIR", str(tmp_path))
+    d = report_store.job_dir("job_20260101_abc")
+    assert d.parent.parent.parent == tmp_path / "jobs" and len(d.parent.name) == 2
+    assert report_store.locate("job_20260101_abc") is None
+    path = report_store.save_report("job_20260101_abc", "<html/>", {"score": 1})
+    assert report_store.locate("job_20260101_abc") == path and (d / "meta.json").exists()
+    (tmp_path / "jobs" / "alt").mkdir()
+    assert report_store.job_dir("alt") == tmp_path / "jobs" / "alt"
+
+
+def test_sweep_removes_expired_jobs_and_legacy_files(monkeypatch, tmp_path):
+    monkeypatch.setenv("REPORT_OUTPUT_DIR", str(tmp_path))
+    report_store.save("old", "report.html", b"x")
+    report_store.save("new", "report.html", b"y")
+    report_store.save("legacy", "report.html", b"z")
+    (tmp_path / "report_a_example.com_2024.html").write_text("a")
+    (tmp_path / "admin").mkdir()
+    (tmp_path / "admin" / "job_x_briefing.json").write_text("{}")
+    _age(report_store.job_dir("old"), 40)
+    _age(tmp_path / "report_a_example.com_2024.html", 40)
+    _age(tmp_path / "admin" / "job_x_briefing.json", 40)
+    assert report_store.sweep(retention_days=30) == 3
+    assert report_store.locate("old") is None and report_store.locate("new") is not None
+    assert not (tmp_path / "report_a_example.com_2024.html").exists()
+    # leere Shards des gelöschten Jobs sind weg
+    assert not report_store.job_dir("old").parent.exists()
+
+
+def test_status_and_download_without_glob(monkeypatch, tmp_path):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from routes import briefing
+
+    monkeypatch.setenv("REPORT_OUTPUT_DIR", str(tmp_path))
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    monkeypatch.setattr(Path, "glob", lambda *a, **k: (_ for _ in ()).throw(AssertionError("glob")))
+    app = FastAPI()
+    app.include_router(briefing.router, prefix="/api")
+    c = TestClient(app)
+    assert c.get("/api/briefing/status/job_1_ab").json()["status"] == "processing"
+    assert c.get("/api/briefing/download/job_1_ab").status_code == 404
+    report_store.save_report("job_1_ab", "<html>ok</html>", {})
+    assert c.get("/api/briefing/status/job_1_ab").json()["status"] == "completed"
+    r = c.get("/api/briefing/download/job_1_ab")
+    assert r.status_code == 200 and r.text == "<html>ok</html>"
@@ -0,0 +1,158 @@
+import smtplib
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+import retry_policy  # noqa: E402
+from retry_policy import RetryPolicy, policy_for  # noqa: E402
+
+
+def test_exponential_backoff_is_capped():
+    p = RetryPolicy(max_attempts=5, base_delay=10, factor=3, max_delay=100, jitter=0)
+    assert p.delays() == [10, 30, 90, 100]
+    assert p.rq_retry().max == 4
+    assert RetryPolicy(max_attempts=1).rq_retry() is None
+    jittered = RetryPolicy(max_attempts=2, base_delay=100, jitter=0.2).delays()[0]
+    assert 80 <= jittered <= 120
+
+
+def _status_error(code):
+    req = httpx.Request("POST", "http://pdf.local")
+    return httpx.HTTPStatusError("x", request=req, response=httpx.Response(code, request=req))
+
+
+def test_only_transient_errors_are_retryable():
+    p = RetryPolicy()
+    assert p.is_retryable(ConnectionRefusedError())
+    assert p.is_retryable(httpx.ConnectTimeout("slow"))
+    assert p.is_retryable(_status_error(503)) and p.is_retryable(_status_error(429))
+    assert not p.is_retryable(_status_error(404))
+    assert p.is_retryable(smtplib.SMTPResponseException(451, b"greylisted"))
+    assert not p.is_retryable(smtplib.SMTPResponseException(550, b"no such user"))
+    assert not p.is_retryable(ValueError("bad briefing"))
+
+
+def test_env_override(monkeypatch):
+    monkeypatch.setenv("RETRY_POLICY_PDF", "attempts=2,base=1,on=ValueError")
+    p = policy_for("pdf")
+    assert p.max_attempts == 2 and p.base_delay == 1 and p.factor == 3
+    assert p.is_retryable(ValueError()) and not p.is_retryable(ConnectionError())
+    assert policy_for("unknown") == retry_policy.POLICIES["default"]
+
+
+def test_worker_retries_transient_and_dead_letters(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    from rq import Queue, Retry
+    import dead_letters
+    from fair_queue import FairSimpleWorker
+    from queue_metrics import failure_totals
+
+    conn = fakeredis.FakeStrictRedis()
+    q = Queue("pdf", connection=conn)
+    flaky = q.enqueue("socket.create_connection", ("127.0.0.1", 1), 0.5, retry=Retry(max=1))
+    broken = q.enqueue("json.loads", "{nope", retry=Retry(max=3))
+    FairSimpleWorker([q], connection=conn).work(burst=True)
+
+    # ConnectionRefusedError: zweiter Versuch, dann tot; JSONDecodeError: sofort tot
+    assert failure_totals(conn, "pdf") == {"default|ConnectionRefusedError|retry": 1,
+                                          "default|ConnectionRefusedError|dead": 1,
+                                          "default|JSONDecodeError|dead": 1}
+    dead = dead_letters.list_dead(conn, ["pdf"])
+    assert {d["job_id"] for d in dead} == {flaky.id, broken.id}
+    assert dead_letters.list_dead(conn, ["pdf"], exception="JSONDecodeError")[0]["job_id"] == broken.id
+    assert "JSONDecodeError" in dead_letters.get_dead(conn, broken.id)["traceback"]
+
+    assert dead_letters.requeue(conn, ["pdf"], exception="ConnectionRefusedError") == {"requeued": 1, "missing": [], "errors": {}}
+    assert q.job_ids == [flaky.id]
+    assert dead_letters.summary(conn, ["pdf"]) == {"pdf": 1}
+    assert dead_letters.delete(conn, broken.id) is True
+    assert dead_letters.requeue(conn, ["pdf"], job_ids=[broken.id]) == {"requeued": 0, "missing": [broken.id], "errors": {}}
+
+
+def test_requeued_lane_job_is_staged_again(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    import dead_letters
+    import fair_queue
+    from rq.job import JobStatus
+
+    conn = fakeredis.FakeStrictRedis()
+    monkeypatch.setattr(fair_queue, "READY_DEPTH", 1)
+    job = fair_queue.submit(conn, "batch", "partner", "json.loads", "{nope")
+    q = fair_queue.lane_queue(conn, "batch")
+    fair_queue.FairSimpleWorker([q], connection=conn).work(burst=True)
+    assert job.get_status() == JobStatus.FAILED
+
+    fair_queue.submit(conn, "batch", "partner", "json.loads", "1")  # belegt den Platz in der Queue
+    assert dead_letters.requeue(conn, ["reports-batch"], job_ids=[job.id])["requeued"] == 1
+    assert job.get_status() == JobStatus.DEFERRED
+    assert fair_queue.staged_count(conn, "batch", "partner") == 1
+
+
+def test_requeue_repacks_expired_analyze_payload(monkeypatch, tmp_path):
+    fakeredis = pytest.importorskip("fakeredis")
+    import artifact_store
+    import dead_letters
+    import gpt_analyze
+    import job_payload
+    import report_pipeline
+    from fair_queue import FairSimpleWorker, lane_queue
+
+    monkeypatch.setenv("REPORT_OUTPUT_DIR", str(tmp_path / "reports"))
+    monkeypatch.setenv("ARTIFACT_DIR", str(tmp_path / "artifacts"))
+    artifact_store.reset_store()
+    monkeypatch.setattr(report_pipeline, "MAX_RETRIES", 0)
+    monkeypatch.setattr(job_payload, "INLINE_MAX", 16)
+    seen = []
+
+    def build(payload, lang):
+        seen.append(payload["notes"])
+        if len(seen) == 1:
+            raise ValueError("model refused")
+        return {"html": "<html>ok</html>", "meta": {}}
+
+    monkeypatch.setattr(gpt_analyze, "build_html_report", build)
+    conn = fakeredis.FakeStrictRedis()
+    ids = report_pipeline.enqueue_pipeline("r9", {"email": "a@example.com", "notes": "x" * 64}, connection=conn)
+    q = lane_queue(conn, "interactive")
+    FairSimpleWorker([q], connection=conn).work(burst=True)
+    job = q.fetch_job(ids["analyze"])
+    store = artifact_store.get_store()
+    # Payload-Retention abgelaufen, Dead Letter liegt noch da
+    store.delete(job.args[1]["notes"]["__artifact__"])
+    assert not job_payload.readable(job.args[1])
+
+    assert dead_letters.requeue(conn, ["reports"], job_ids=[job.id])["requeued"] == 1
+    FairSimpleWorker([q], connection=conn).work(burst=True)
+    assert seen == ["x" * 64, "x" * 64]
+    assert report_pipeline.load_artifact("r9", "report.html") == b"<html>ok</html>"
+
+
+def test_requeue_refuses_expired_render_payload(monkeypatch, tmp_path):
+    fakeredis = pytest.importorskip("fakeredis")
+    import artifact_store
+    import dead_letters
+    import job_payload
+    from rq import Queue
+    from rq.registry import FailedJobRegistry
+
+    monkeypatch.setenv("ARTIFACT_DIR", str(tmp_path))
+    artifact_store.reset_store()
+    conn = fakeredis.FakeStrictRedis()
+    packed = job_payload.pack({"html": "<p>x</p>" * 5000, "email": "a@example.com"})
+    q = Queue("render", connection=conn)
+    job = q.enqueue("tasks.analyze_and_render", packed)
+    q.remove(job)
+    FailedJobRegistry("render", connection=conn).add(job, ttl=600)
+    # Payload-Retention abgelaufen, kein Briefing zum Neuaufbau
+    artifact_store.get_store().delete(packed["html"]["__artifact__"])
+
+    out = dead_letters.requeue(conn, ["render"], job_ids=[job.id])
+    artifact_store.reset_store()
+    assert out["requeued"] == 0 and out["missing"] == [job.id]
+    assert "cannot be rebuilt" in out["errors"][job.id]
+    assert job.id in FailedJobRegistry("render", connection=conn) and q.count == 0
@@ -0,0 +1,66 @@
+import email
+import email.policy
+import re
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+import artifact_store  # noqa: E402
+import mail_utils  # noqa: E402
+import signed_links  # noqa: E402
+from routes import files  # noqa: E402
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setenv("ARTIFACT_DIR", str(tmp_path))
+    artifact_store.reset_store()
+    monkeypatch.setattr(signed_links, "PUBLIC_API_URL", "https://api.example.com")
+    app = FastAPI()
+    app.include_router(files.router, prefix="/api")
+    return TestClient(app)
+
+
+def test_attachment_part_is_encoded_once_and_shared():
+    pdf = b"%PDF-" + bytes(range(256)) * 64
+    user = mail_utils._build_message("kunde@example.com", "s", "<p>x</p>", {"r.pdf": pdf, "r.html": b"<p>r</p>"})
+    admin = mail_utils._build_message("admin@example.com", "s", "<p>y</p>", {"r.pdf": pdf, "a.json": b"{}"})
+    assert next(user.iter_attachments()) is next(admin.iter_attachments())
+    parsed = email.message_from_bytes(admin.as_bytes(), policy=email.policy.default)
+    assert [p.get_filename() for p in parsed.iter_attachments()] == ["r.pdf", "a.json"]
+    assert next(parsed.iter_attachments()).get_content() == pdf
+
+
+def test_large_attachment_becomes_signed_streaming_link(store, monkeypatch):
+    monkeypatch.setattr(mail_utils, "ATTACH_MAX_BYTES", 1000)
+    pdf = b"%PDF-" + b"x" * 5000
+    msg = mail_utils._build_message("kunde@example.com", "s", "<p>Ihr Report</p>",
+                                    {"KI-Status-Report.pdf": pdf, "klein.json": b"{}"})
+    assert [p.get_filename() for p in msg.iter_attachments()] == ["klein.json"]
+    body = msg.get_body(("html",)).get_content()
+    url = re.search(r'href="([^"]+)"', body).group(1)
+    assert url.startswith("https://api.example.com/api/files/")
+    path = url[len("https://api.example.com"):]
+
+    r = store.get(path)
+    assert r.status_code == 200 and r.content == pdf
+    assert r.headers["content-type"] == "application/pdf"
+    assert 'filename="KI-Status-Report.pdf"' in r.headers["content-disposition"]
+    assert store.get(path, headers={"Range": "bytes=0-4"}).content == b"%PDF-"
+
+    assert store.get(path[:-2] + "xx").status_code == 404
+    monkeypatch.setattr(signed_links, "LINK_TTL", -1)
+    assert store.get(path).status_code == 410
+
+
+def test_without_public_url_large_files_stay_attached(monkeypatch):
+    monkeypatch.setattr(signed_links, "PUBLIC_API_URL", "")
+    monkeypatch.setattr(mail_utils, "ATTACH_MAX_BYTES", 10)
+    msg = mail_utils._build_message("kunde@example.com", "s", "<p>x</p>", {"r.pdf": b"%PDF-" + b"y" * 100})
+    assert [p.get_filename() for p in msg.iter_attachments()] == ["r.pdf"]
@@ -35,3 +35,33 @@ def test_berlin_badge_detection(module_without_keys):
     assert m._is_berlin_funding("https://www.berlin.de/foerderung") is True
     assert m._is_berlin_funding("https://ibb.de/programm") is True
     assert m._is_berlin_funding("https://example.com/") is False
+
+
+def test_tavily_search_uses_pooled_client(module_without_keys, monkeypatch: pytest.MonkeyPatch):
+    import contextlib
+
+    import httpx
+
+    m = module_without_keys
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"results": [
+            {"title": "KI-Förderung", "url": "https://www.bmwk.de/ki", "published_date": "2025-10-01", "score": 0.9},
+        ]})
+
+    @contextlib.contextmanager
+    def client(name, timeout):
+        assert name == "tavily"
+        yield httpx.Client(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(m, "TAVILY_KEY", "tvly-test")
+    monkeypatch.setattr(m.http_clients, "client", client)
+    monkeypatch.setattr(m, "_sleep_backoff", lambda attempt: None)
+    out = m.tavily_search("KI Beratung", max_results=3, days=7)
+    assert [it["url"] for it in out] == ["https://www.bmwk.de/ki"]
+    assert out[0]["domain"] == "www.bmwk.de"
+    assert len(calls) == 2 and calls[0].url == "https://api.tavily.com/search"
@@ -0,0 +1,23 @@
+import sys
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE))
+
+import http_clients
+import worker_preload
+
+def test_preload_fills_caches(monkeypatch):
+    monkeypatch.setattr(worker_preload, "JOB_MODULES", ("gpt_analyze",))
+    timings = worker_preload.preload(freeze=False)
+    assert set(timings) == {"imports", "templates_prompts", "reference_data", "http_pools", "total"}
+    import gpt_analyze
+    assert gpt_analyze._load_prompt_cached.cache_info().currsize >= 15
+    assert gpt_analyze._template_cached.cache_info().currsize == 2
+
+def test_shared_clients_are_reused_and_dropped_after_fork():
+    with http_clients.client("test", 5.0) as a, http_clients.client("test", 5.0) as b:
+        assert a is b and not a.is_closed
+    assert http_clients.get_client("test", 9.0) is not a
+    http_clients._forget_after_fork()
+    assert http_clients.get_client("test", 5.0) is not a
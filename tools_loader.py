@@ -8,12 +8,13 @@ Loader/Filter für data/tools.csv(.json) – robust gegen List/str-Mischformen.
 
 from __future__ import annotations
 
-import csv
 import json
 import logging
 import os
 from typing import Any, Dict, List
 
+import data_snapshot
+
 log = logging.getLogger("tools_loader")
 if not log.handlers:
     import sys
@@ -33,17 +34,13 @@ def _s(x: Any) -> str:
 
 
 def _load_csv(path: str) -> List[Dict[str, Any]]:
-    items: List[Dict[str, Any]] = []
-    if not os.path.exists(path):
-        return items
-    with open(path, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            items.append({k: _s(v) for k, v in row.items()})
-    return items
+    return data_snapshot.read_csv(path)
 
 
 def _load_json(path: str) -> List[Dict[str, Any]]:
+    data = data_snapshot.json_data(path)
+    if isinstance(data, list):
+        return [{k: _s(v) for k, v in it.items()} for it in data]
     if not os.path.exists(path):
         return []
     try:
@@ -9,7 +9,7 @@ Returns normalized list of dicts: {title, url, date, domain, score}
 from __future__ import annotations
 from typing import Dict, List, Optional
 import os, time, random, json
-import httpx
+import http_clients
 import logging
 
 try:
@@ -84,7 +84,7 @@ def tavily_search(query: str, max_results: int = 6, days: Optional[int] = None)
     start = time.time()
     while attempt < 3:
         try:
-            with httpx.Client(timeout=15.0) as cli:
+            with http_clients.client("tavily", 15.0) as cli:
                 r = cli.post("https://api.tavily.com/search", json=payload)
                 if r.status_code == 200:
                     data = r.json() or {}
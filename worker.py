@@ -2,7 +2,11 @@
 # -*- coding: utf-8 -*-
 """RQ worker entrypoint for Railway.
 Start with: python worker.py
-Configure with env: REDIS_URL, RQ_QUEUES (comma separated), RQ_JOB_TIMEOUT, RQ_LOG_LEVEL
+Configure with env: REDIS_URL, RQ_QUEUES (comma separated, priority order), RQ_JOB_TIMEOUT, RQ_LOG_LEVEL
+  RQ_WORKER_MODE=fork    one job at a time in a forked child (default)
+  RQ_WORKER_MODE=warm    one job at a time in this process, no fork (caches/HTTP pools persist)
+  RQ_WORKER_MODE=thread  RQ_CONCURRENCY jobs in parallel threads (see concurrent_worker.py)
+  RQ_PRELOAD=1           import job modules and load templates/prompts/data before the first job
 """
 from __future__ import annotations
 
@@ -10,8 +14,9 @@ import logging
 import os
 
 from redis import Redis
-from rq import Connection, Worker, Queue
+from rq import Queue
 
+from fair_queue import FairSimpleWorker, FairWorker
 from queue_utils import get_redis_connection, get_queue_names
 
 def main() -> int:
@@ -21,11 +26,27 @@ def main() -> int:
 
     conn: Redis = get_redis_connection()
     names = get_queue_names()
+    mode = os.getenv("RQ_WORKER_MODE", "fork").strip().lower()
+    logger.info("Starting RQ worker. Queues=%s Mode=%s", names, mode)
+    # Warm everything in the parent so forked jobs share it copy-on-write
+    if os.getenv("RQ_PRELOAD", "1").lower() in ("1", "true", "yes"):
+        try:
+            from worker_preload import preload
+            preload()
+        except Exception as exc:
+            logger.warning("Worker preload failed: %s", exc)
+
+    if mode == "thread":
+        from concurrent_worker import ConcurrentWorkerPool, concurrency_groups_from_env
+        pool = ConcurrentWorkerPool(conn, concurrency_groups_from_env(names),
+                                    default_timeout=int(os.getenv("RQ_JOB_TIMEOUT", "600")))
+        return pool.run(with_scheduler=True, logging_level=log_level)
+
     queues = [Queue(n, connection=conn) for n in names]
-    logger.info("Starting RQ worker. Queues=%s", names)
-    with Connection(conn):
-        worker = Worker(queues, connection=conn)
-        worker.work(with_scheduler=True, logging_level=log_level)
+    # zeichnen Warte-/Laufzeit je Queue auf (queue_metrics.py) und füllen die Lanes nach (fair_queue.py)
+    worker_class = FairSimpleWorker if mode == "warm" else FairWorker
+    worker = worker_class(queues, connection=conn)
+    worker.work(with_scheduler=True, logging_level=log_level)
     return 0
 
 if __name__ == "__main__":
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Warm-up for worker processes: import and fill everything a report job needs once.
+
+Called by worker.py before the first job (RQ_PRELOAD=1, default):
+  - job modules (gpt_analyze, tasks, worker_tasks, content_loader, ...)
+  - templates + all prompts (gpt_analyze lru_caches)
+  - data snapshot, funding index, benchmark table, tools
+  - pooled HTTP clients (OpenAI, Anthropic, PDF)
+then gc.freeze() so forked job children don't dirty the shared pages.
+
+In fork mode the children inherit all of this copy-on-write (HTTP pools are
+rebuilt per child, see http_clients). In warm/thread mode jobs run in this very
+process, so the caches and connection pools persist across jobs.
+"""
+from __future__ import annotations
+
+import gc
+import importlib
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Tuple
+
+log = logging.getLogger("worker_preload")
+
+JOB_MODULES = tuple(m.strip() for m in os.getenv(
+    "RQ_PRELOAD_MODULES", "gpt_analyze,tasks,worker_tasks,content_loader,postprocess_report").split(",") if m.strip())
+
+
+def _import_modules() -> None:
+    for name in JOB_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as exc:
+            # optional/broken modules must not block the worker
+            log.warning("Preload: import %s failed: %s", name, exc)
+
+
+def _templates_and_prompts() -> None:
+    import gpt_analyze as ga
+    for lang in ("de", "en"):
+        ga._template(lang)
+        d = ga.PROMPTS_DIR / lang
+        for p in sorted(d.glob("*.md")) if d.exists() else []:
+            name = p.stem[: -len(f"_{lang}")] if p.stem.endswith(f"_{lang}") else p.stem
+            ga._load_prompt_cached(lang, name)
+
+
+def _reference_data() -> None:
+    import data_snapshot
+    data_snapshot.get_snapshot()
+    from funding_index import get_funding_index
+    from benchmark_repository import get_benchmark_repository
+    import tools_loader
+    get_funding_index()
+    get_benchmark_repository()
+    tools_loader.load_tools()
+
+
+def _http_pools() -> None:
+    import http_clients
+    import gpt_analyze as ga
+    http_clients.get_client("openai", ga.OPENAI_TIMEOUT)
+    http_clients.get_client("anthropic", ga.ANTHROPIC_TIMEOUT)
+    try:
+        import tasks
+        http_clients.get_client("pdf", tasks.PDF_TIMEOUT)
+    except Exception:
+        pass
+
+
+STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ("imports", _import_modules),
+    ("templates_prompts", _templates_and_prompts),
+    ("reference_data", _reference_data),
+    ("http_pools", _http_pools),
+]
+
+
+def preload(freeze: bool = True) -> Dict[str, float]:
+    """Runs all warm-up steps; returns per-step durations in ms."""
+    timings: Dict[str, float] = {}
+    t_all = time.perf_counter()
+    for name, fn in STEPS:
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except Exception as exc:
+            log.warning("Preload step %s failed: %s", name, exc)
+        timings[name] = round((time.perf_counter() - t0) * 1000, 1)
+    if freeze and hasattr(gc, "freeze"):
+        gc.collect()
+        gc.freeze()
+    timings["total"] = round((time.perf_counter() - t_all) * 1000, 1)
+    log.info("Worker preload done: %s", timings)
+    return timings
+
+
+__all__ = ["preload", "JOB_MODULES"]
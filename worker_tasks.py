@@ -2,13 +2,13 @@
 from __future__ import annotations
 from typing import Dict, Any, Optional
 from datetime import datetime
-import httpx
+from rq import get_current_job
 
 from db import get_session
 from models import Task
-from mail_utils import send_email_with_attachments_sync
+from mail_utils import queue_email
 from settings import settings
-from pdf_client import render_pdf
+from pdf_client import render_or_none
 
 # Analyzer is expected to be available in project
 from analyzer import run_analysis  # type: ignore
@@ -19,24 +19,20 @@ def _subject(prefix: str, lang: str) -> str:
     return f"{prefix} – KI-Status-Report ({today})" if lang.upper().startswith("DE") else f"{prefix} – AI Status Report ({today})"
 
 def process_report(report_id: str, payload: Dict[str, Any]) -> None:
-    """RQ worker entry point: generates report, pdf, sends mails, and updates DB."""
+    """RQ worker entry point: generates report, pdf, sends mails, and updates DB.
+
+    Legacy single-job variant; queue_redis.enqueue_report now enqueues the staged
+    pipeline in report_pipeline (analyze → pdf → mail).
+    """
     lang = (payload.get("lang") or settings.DEFAULT_LANG or "DE").upper()
     company = payload.get("company") or payload.get("unternehmen") or payload.get("firma") or "Unbekannt"
     email = payload.get("email") or payload.get("to")
     # 1) Generate HTML report
     try:
         html = run_analysis(payload)  # sync variant expected
-        pdf_bytes = None
-        try:
-            # Call async pdf via sync client (httpx can be used sync as well if needed)
-            # We'll do a direct httpx call here to avoid running event loop in worker.
-            if settings.PDF_SERVICE_URL and html:
-                with httpx.Client(timeout=settings.PDF_TIMEOUT/1000) as client:
-                    r = client.post(settings.PDF_SERVICE_URL, json={"html": html, "filename": "report.pdf"})
-                    if r.status_code == 200:
-                        pdf_bytes = r.content
-        except Exception:
-            pdf_bytes = None
+        # gemeinsamer PDF-Client (Pool, Limit, Retries, Cache); None bei Fehler
+        pdf_bytes = render_or_none(html, "report.pdf", service_url=settings.PDF_SERVICE_URL or "",
+                                   timeout=settings.PDF_TIMEOUT / 1000)
 
         # 2) Store result
         with get_session() as s:
@@ -56,6 +52,7 @@ def process_report(report_id: str, payload: Dict[str, Any]) -> None:
         elif settings.ATTACH_HTML_FALLBACK and html:
             attachments_user["KI-Status-Report.html"] = html.encode("utf-8")
 
+        # gleiche Bytes; mail_utils kodiert den PDF-Part nur einmal für beide Mails
         attachments_admin = dict(attachments_user)
 
         try:
@@ -65,27 +62,35 @@ def process_report(report_id: str, payload: Dict[str, Any]) -> None:
         except Exception:
             pass
 
+        # in den Outbox – der Mail-Sender verschickt beide über eine SMTP-Session
+        job = get_current_job()
+        conn = job.connection if job else None
         if settings.SEND_USER_MAIL and isinstance(email, str) and "@" in email:
-            send_email_with_attachments_sync(
+            queue_email(
                 to_address=email,
                 subject=_subject("Ihr Ergebnis", "DE" if lang.startswith("DE") else "EN"),
                 html_body="<p>Ihr KI-Status-Report ist da.</p>",
                 attachments=attachments_user or None,
+                message_id=f"{report_id}-mail_user", kind="user", connection=conn,
             )
 
         if settings.SEND_ADMIN_MAIL and settings.ADMIN_EMAIL:
-            send_email_with_attachments_sync(
+            queue_email(
                 to_address=settings.ADMIN_EMAIL,
                 subject=_subject("Admin: neuer Report", "DE" if lang.startswith("DE") else "EN"),
                 html_body=f"<p>Neuer Report: <b>{company}</b> ({email or '—'})</p>",
                 attachments=attachments_admin or None,
+                message_id=f"{report_id}-mail_admin", kind="admin", connection=conn,
             )
 
     except Exception as e:
+        # RQ wiederholt den Job laut retry_policy.py; "failed" erst ohne Versuche
+        job = get_current_job()
+        final = not (job and job.retries_left)
         with get_session() as s:
             t = s.get(Task, report_id)
             if t:
-                t.status = "failed"
+                t.status = "failed" if final else "retrying"
                 t.error = str(e)
-                t.finished_at = datetime.utcnow()
+                t.finished_at = datetime.utcnow() if final else None
         raise